@@ -35,9 +35,10 @@ def open_db(path, *args, **kwargs):
     :class:`~instaseis.instaseis_db.InstaseisDB` or
     :class:`~instaseis.remote_instaseis_db.RemoteInstaseisDB` classes.
 
-    :type path: str
+    :type path: str or list of str
     :param path: Filepath or URL. Instaseis will determine if it is a local
-        file path or a HTTP URL and delegate to the corresponding class.
+        file path or a HTTP URL and delegate to the corresponding class. A
+        list of URLs opens a cluster of servers.
     :returns: An initialized database object.
     :rtype: :class:`~instaseis.instaseis_db.InstaseisDB` or
         :class:`~instaseis.remote_instaseis_db.RemoteInstaseisDB`
@@ -60,6 +61,22 @@ def open_db(path, *args, **kwargs):
         components           : vertical and horizontal
         velocity model       : ak135f
 
+    Remote databases can keep the downloaded raw seismograms in a
+    persistent cache on disc. Repeated requests are then served from the
+    cache without contacting the server.
+
+    >>> db = instaseis.open_db("http://webadress.com:8765",
+    ...                        cache_dir="/path/to/cache",
+    ...                        cache_size_gb=5)  # doctest: +SKIP
+
+    A list of URLs of servers with the same database returns a database
+    distributing the requests over all servers:
+
+    >>> db = instaseis.open_db(["http://server1.com:8765",
+    ...                         "http://server2.com:8765"])  # doctest: +SKIP
+    >>> print(db)  # doctest: +SKIP
+    ClusterInstaseisDB reciprocal Green's function Database (v7) ...
+
     The special syntax ``syngine://MODEL_NAME`` will connect to the IRIS
     syngine web service for the specified model.
 
@@ -79,7 +96,10 @@ def open_db(path, *args, **kwargs):
         :func:`~instaseis.open_db` function. Instaseis will recursively
         search the child directories for the  necessary files and open them.
     """
-    if path.startswith("syngine://"):
+    if isinstance(path, (list, tuple)):
+        from .database_interfaces import cluster_instaseis_db
+        return cluster_instaseis_db.ClusterInstaseisDB(path, *args, **kwargs)
+    elif path.startswith("syngine://"):
         model = re.sub("syngine://", "", path).strip()
         from instaseis.database_interfaces import syngine_instaseis_db
         return syngine_instaseis_db.SyngineInstaseisDB(model=model, *args,
@@ -100,4 +120,5 @@ if __version__.startswith("0.0.0-tar/zipball"):  # pragma: no cover
                   "release or install from git.", UserWarning)
 
 
-from .source import Source, Receiver, ForceSource, FiniteSource  # NoQa
+from .source import (Source, Receiver, ReceiverArray, ForceSource,  # NoQa
+                     FiniteSource)
@@ -0,0 +1,551 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+The individual Instaseis benchmarks.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2014
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from future.utils import with_metaclass
+
+from abc import ABCMeta, abstractmethod, abstractproperty
+import collections
+import numpy as np
+import obspy
+import os
+import random
+import subprocess
+import sys
+import time
+import timeit
+
+from instaseis import (open_db, Source, ForceSource, FiniteSource,
+                       Receiver)
+from .results import (ChunkReadCounter, get_cache_statistics, get_peak_rss,
+                      get_statistics)
+
+# Write interval.
+WRITE_INTERVAL = 0.05
+
+
+def plot_gnuplot(times):
+    try:
+        gnuplot = subprocess.Popen(["gnuplot"],
+                                   stdin=subprocess.PIPE)
+        gnuplot.stdin.write("set term dumb 79 15\n".encode())
+        gnuplot.stdin.write("set xlabel 'Seismogram Number'\n".encode())
+        gnuplot.stdin.write("plot '-' using 1:2 title 'time per sm' with "
+                            "linespoints \n".encode())
+        for i, j in zip(np.arange(len(times)), times):
+            gnuplot.stdin.write(("%f %f\n" % (i, j)).encode())
+        gnuplot.stdin.write("e\n".encode())
+        gnuplot.stdin.flush()
+        sys.stdout.flush()
+    except OSError:
+        print("Could not plot graph. No gnuplot installed?")
+
+
+def _random_point_on_sphere():
+    lat = np.rad2deg(np.arcsin(2 * random.random() - 1))
+    lng = random.random() * 360.0 - 180.0
+    return lat, lng
+
+
+class InstaseisBenchmark(with_metaclass(ABCMeta)):
+    # True if the benchmark needs a reciprocal database, False if it needs a
+    # forward database, and None if it works with both.
+    reciprocal = None
+    # Set if the benchmark only works with displ_only databases.
+    requires_displ_only = False
+    # Set if the benchmark needs vertical and horizontal components in
+    # reciprocal databases.
+    requires_all_components = False
+
+    def __init__(self, path, time_per_benchmark, save_output=False,
+                 seed=None, count=None, profile=True, plot=True):
+        self.path = path
+        self.time_per_benchmark = time_per_benchmark
+        self.save_output = save_output
+        self.seed = seed
+        self.count = count
+        self.profile = profile
+        self.plot = plot
+        # Number of seismograms calculated by each call to iterate().
+        self.seismograms_per_iteration = 1
+
+    @classmethod
+    def check_database(cls, db):
+        """
+        Returns None if the benchmark can be run with the given database,
+        otherwise the reason why not.
+        """
+        info = db.info
+        if cls.reciprocal is True and not info.is_reciprocal:
+            return "needs a reciprocal database"
+        if cls.reciprocal is False and info.is_reciprocal:
+            return "needs a forward database"
+        if cls.requires_displ_only and info.dump_type != "displ_only":
+            return "needs a displ_only database"
+        if cls.requires_all_components and info.is_reciprocal and \
+                info.components != "vertical and horizontal":
+            return "needs a database with vertical and horizontal components"
+        return None
+
+    @abstractmethod
+    def setup(self):
+        pass
+
+    @abstractmethod
+    def iterate(self):
+        pass
+
+    @abstractproperty
+    def description(self):
+        pass
+
+    def random_source(self, depth_range=None):
+        """
+        Source at a random position. The depth is only randomized for
+        reciprocal databases as it is fixed for forward databases.
+        """
+        lat, lng = _random_point_on_sphere()
+        if not self.db.info.is_reciprocal:
+            return Source(latitude=lat, longitude=lng)
+        if depth_range is None:
+            depth_range = self.db.info.max_radius - self.db.info.min_radius
+        return Source(latitude=lat, longitude=lng,
+                      depth_in_m=random.random() * depth_range)
+
+    def random_receiver(self):
+        lat, lng = _random_point_on_sphere()
+        return Receiver(latitude=lat, longitude=lng)
+
+    def run(self):
+        """
+        Run the benchmark and return the results as a dictionary.
+        """
+        # Set seeds to be able to reproduce results.
+        if self.seed is not None:
+            print("\tSetting random seed to %i" % self.seed)
+            np.random.seed(self.seed)
+            random.seed(self.seed)
+        a = timeit.default_timer()
+        self.setup()
+        b = timeit.default_timer()
+        print("\tTime for initialization: %s sec" % (b - a))
+
+        profiler = self.db.enable_profiling() if self.profile else None
+        # Only local databases read chunks.
+        chunk_reads = None
+        if self.profile and getattr(self.db, "meshes", None):
+            chunk_reads = ChunkReadCounter()
+            self.db.add_stage_observer(chunk_reads)
+
+        starttime = timeit.default_timer()
+        endtime = starttime + self.time_per_benchmark
+        all_times = []
+
+        last_write_time = starttime
+        latest_times = []
+        count = 0
+
+        print("\tStarting...", end="\r")
+        t = starttime
+        while ((self.count is not None and count < self.count) or
+                (self.count is None and t < endtime)):
+            count += 1
+            s = timeit.default_timer()
+            self.iterate()
+            t = timeit.default_timer()
+            all_times.append(t - s)
+
+            # Pretty and immediate output.
+            latest_times.append(t - s)
+
+            if t >= (last_write_time + WRITE_INTERVAL):
+                cumtime = sum(latest_times)
+                speed = len(latest_times) * \
+                    self.seismograms_per_iteration / cumtime
+                if self.count is None:
+                    print("\tseismograms/sec: {0:>8.2f}, remaining time: "
+                          "{1:>2.1f} sec".format(speed, endtime - t),
+                          end="\r")
+                else:
+                    print("\tseismograms/sec: {0:>8.2f}, remaining runs: "
+                          "{1:>6d}".format(speed, self.count - count),
+                          end="\r")
+                sys.stdout.flush()
+                latest_times = []
+                last_write_time = t
+        print(79 * " ", end="\r")
+
+        if profiler is not None:
+            self.db.disable_profiling()
+        if chunk_reads is not None:
+            self.db.remove_stage_observer(chunk_reads)
+
+        all_times = np.array(all_times, dtype="float64")
+        cumtime = sum(all_times)
+        count = len(all_times)
+        nseis = count * self.seismograms_per_iteration
+        print("\t%i seismograms in %.2f sec" % (nseis, cumtime))
+        print("\t%g sec/seismogram" % (cumtime / nseis))
+        print("\t%g seismograms/sec" % (nseis / cumtime))
+        if chunk_reads is not None:
+            print("\t%g chunk reads/seismogram" % (
+                chunk_reads.chunk_reads / nseis))
+        for p in [0, 10, 25, 50, 75, 90, 100]:
+            print("\t {0:>3}th percentile: {1} sec".format(
+                p, np.percentile(all_times, p)))
+        sys.stdout.flush()
+        if self.plot:
+            plot_gnuplot(all_times)
+            time.sleep(0.1)
+        if self.save_output:
+            folder = "benchmark_results"
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+            _i = 0
+            while True:
+                _i += 1
+                filename = os.path.join(folder, "%s_%04i.txt" % (
+                    self.__class__.__name__, _i))
+                if not os.path.exists(filename):
+                    break
+            np.savetxt(filename, all_times,
+                       header="time per seismogram [run at %s]" % (
+                           obspy.UTCDateTime()))
+
+        return collections.OrderedDict([
+            ("name", self.__class__.__name__),
+            ("description", self.description),
+            ("status", "ok"),
+            ("initialization_time", b - a),
+            ("iterations", count),
+            ("seismograms_per_iteration", self.seismograms_per_iteration),
+            ("total_time", cumtime),
+            ("iterations_per_second", count / cumtime),
+            ("seismograms_per_second", nseis / cumtime),
+            ("time_per_iteration", get_statistics(all_times)),
+            ("stages", profiler.get_results()
+             if profiler is not None else None),
+            ("chunk_reads_per_seismogram", chunk_reads.chunk_reads / nseis
+             if chunk_reads is not None else None),
+            ("peak_rss_in_bytes", get_peak_rss()),
+            ("cache", get_cache_statistics(self.db))])
+
+
+class BufferedFixedSrcRecRoDOffSeismogramGeneration(InstaseisBenchmark):
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=250)
+
+    def iterate(self):
+        src = Source(latitude=10, longitude=10)
+        rec = Receiver(latitude=20, longitude=20)
+        self.db.get_seismograms(source=src, receiver=rec)
+
+    @property
+    def description(self):
+        return "Buffered, fixed source and receiver, " \
+               "read_on_demand=False"
+
+
+class BufferedFixedSrcRecRoDOffSeismogramGenerationNoObsPy(InstaseisBenchmark):
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=250)
+
+    def iterate(self):
+        src = Source(latitude=10, longitude=10)
+        rec = Receiver(latitude=20, longitude=20)
+        self.db.get_seismograms(source=src, receiver=rec,
+                                return_obspy_stream=False)
+
+    @property
+    def description(self):
+        return "Buffered, fixed source and receiver, " \
+               "read_on_demand=False, no ObsPy output, best case!"
+
+
+class UnbufferedFixedSrcRecRoDOffSeismogramGenerationNoObsPy(
+        InstaseisBenchmark):
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=0)
+
+    def iterate(self):
+        src = Source(latitude=10, longitude=10)
+        rec = Receiver(latitude=20, longitude=20)
+        self.db.get_seismograms(source=src, receiver=rec)
+
+    @property
+    def description(self):
+        return "Unbuffered, fixed source and receiver, " \
+               "read_on_demand=False"
+
+
+class BufferedFixedSrcRecRoDOnSeismogramGeneration(InstaseisBenchmark):
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=True,
+                          buffer_size_in_mb=250)
+
+    def iterate(self):
+        src = Source(latitude=10, longitude=10)
+        rec = Receiver(latitude=20, longitude=20)
+        self.db.get_seismograms(source=src, receiver=rec)
+
+    @property
+    def description(self):
+        return "Buffered, fixed source and receiver, " \
+               "read_on_demand=True"
+
+
+class Buffered2DegreeLatLngDepthScatter(InstaseisBenchmark):
+    reciprocal = True
+
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=250)
+        self.max_depth = self.db.info.max_radius - self.db.info.min_radius
+
+    def iterate(self):
+        rec = Receiver(latitude=20, longitude=20)
+        lat = random.random() * 2
+        lat += 44
+        lng = random.random() * 2
+        lng += 44
+        depth_in_m = random.random() * min(200000, self.max_depth)
+        src = Source(latitude=lat, longitude=lng, depth_in_m=depth_in_m)
+        self.db.get_seismograms(source=src, receiver=rec)
+
+    @property
+    def description(self):
+        return "Buffered, 2 Degree/200 km source position scatter"
+
+
+class BufferedHalfDegreeLatLngDepthScatter(InstaseisBenchmark):
+    reciprocal = True
+
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=250)
+
+    def iterate(self):
+        rec = Receiver(latitude=20, longitude=20)
+        lat = random.random() * 0.5
+        lat += 44
+        lng = random.random() * 0.5
+        lng += 44
+        depth_in_m = random.random() * 50000
+        src = Source(latitude=lat, longitude=lng, depth_in_m=depth_in_m)
+        self.db.get_seismograms(source=src, receiver=rec)
+
+    @property
+    def description(self):
+        return "Buffered, 0.5 Degree/50 km (depth) source position scatter"
+
+
+class BufferedFullyRandom(InstaseisBenchmark):
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=250)
+
+    def iterate(self):
+        rec = self.random_receiver()
+        src = self.random_source()
+        self.db.get_seismograms(source=src, receiver=rec)
+
+    @property
+    def description(self):
+        return "Buffered, random src and receiver"
+
+
+class UnbufferedFullyRandom(InstaseisBenchmark):
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=0)
+
+    def iterate(self):
+        rec = self.random_receiver()
+        src = self.random_source()
+        self.db.get_seismograms(source=src, receiver=rec)
+
+    @property
+    def description(self):
+        return "Unbuffered, random src and receiver"
+
+
+class UnbufferedAndRandomReadOnDemandTrue(InstaseisBenchmark):
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=True,
+                          buffer_size_in_mb=0)
+
+    def iterate(self):
+        rec = self.random_receiver()
+        src = self.random_source()
+        self.db.get_seismograms(source=src, receiver=rec)
+
+    @property
+    def description(self):
+        return "Unbuffered, random src and receiver, read_on_demand=True, " \
+               "worst case!"
+
+
+class UnbufferedFullyRandomAllComponents(InstaseisBenchmark):
+    """
+    All five components at once. Merged databases read them with a single
+    access so compare this for merged and unmerged databases.
+    """
+    requires_all_components = True
+
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=0)
+
+    def iterate(self):
+        rec = self.random_receiver()
+        src = self.random_source()
+        self.db.get_seismograms(source=src, receiver=rec,
+                                components=("Z", "N", "E", "R", "T"),
+                                return_obspy_stream=False)
+
+    @property
+    def description(self):
+        return "Unbuffered, random src and receiver, all components"
+
+
+class BufferedRandomForceSource(InstaseisBenchmark):
+    reciprocal = True
+    requires_displ_only = True
+
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=250)
+        self.max_depth = self.db.info.max_radius - self.db.info.min_radius
+
+    def iterate(self):
+        rec = self.random_receiver()
+        lat, lng = _random_point_on_sphere()
+        src = ForceSource(latitude=lat, longitude=lng,
+                          depth_in_m=random.random() * self.max_depth,
+                          f_r=1E10, f_t=-1E10, f_p=1E10)
+        self.db.get_seismograms(source=src, receiver=rec)
+
+    @property
+    def description(self):
+        return "Buffered, random force source and receiver"
+
+
+class BufferedRandomGreensFunction(InstaseisBenchmark):
+    reciprocal = True
+    requires_all_components = True
+
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=250)
+        self.max_depth = self.db.info.max_radius - self.db.info.min_radius
+
+    def iterate(self):
+        info = self.db.info
+        distance = info.min_d + random.random() * (info.max_d - info.min_d)
+        self.db.get_greens_function(
+            epicentral_distance_in_degree=distance,
+            source_depth_in_m=random.random() * self.max_depth,
+            return_obspy_stream=False)
+
+    @property
+    def description(self):
+        return "Buffered, Green's functions at random distances and depths"
+
+
+class FiniteSourceEmulation(InstaseisBenchmark):
+    reciprocal = True
+
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=250)
+        self.counter = 0
+        self.current_depth_counter = 0
+        # Depth increases in 1 km steps up to a depth of 25 km.
+        self.depths = range(0, 25001, 1000)
+        self.depth_count = len(self.depths)
+
+        # Fix Receiver
+        self.rec = Receiver(latitude=45.0, longitude=45.0)
+
+    def iterate(self):
+        if self.current_depth_counter >= self.depth_count:
+            self.counter += 1
+            self.current_depth_counter = 0
+
+        # Fix latitude.
+        lat = 0.0
+        # Longitude values increase in 1 km steps.
+        lng = self.counter * 0.01
+        src = Source(latitude=lat, longitude=lng,
+                     depth_in_m=self.depths[self.current_depth_counter])
+
+        self.db.get_seismograms(source=src, receiver=self.rec)
+        self.current_depth_counter += 1
+
+    @property
+    def description(self):
+        return "Finite source emulation."
+
+
+class BufferedHaskellFiniteSource(InstaseisBenchmark):
+    """
+    A real finite source with 20 point sources recorded at random receivers.
+    Each iteration is one call to get_seismograms_finite_source().
+    """
+    reciprocal = True
+
+    def setup(self):
+        self.db = open_db(self.path, read_on_demand=False,
+                          buffer_size_in_mb=250)
+        info = self.db.info
+        min_depth = info.planet_radius - info.max_radius
+        depth_range = info.max_radius - info.min_radius
+        # Keep the whole fault within the depth range of the database.
+        width = min(10000.0, 0.5 * depth_range)
+        self.finite_source = FiniteSource.from_Haskell(
+            latitude=10.0, longitude=10.0,
+            depth_in_m=min_depth + min(20000.0, 0.5 * depth_range),
+            strike=60.0, dip=45.0, rake=90.0, M0=1E20, fault_length=50000.0,
+            fault_width=width, rupture_velocity=2500.0, nl=10, nw=2,
+            trise=2.0 * info.dt, dt=info.dt)
+        self.finite_source.lp_sliprate(freq=1.0 / info.period,
+                                       zerophase=True)
+        self.finite_source.resample_sliprate(dt=info.dt, nsamp=info.npts)
+        self.seismograms_per_iteration = self.finite_source.npointsources
+
+    def iterate(self):
+        self.db.get_seismograms_finite_source(
+            sources=self.finite_source, receiver=self.random_receiver())
+
+    @property
+    def description(self):
+        return "Buffered, Haskell finite source with 20 point sources, " \
+               "random receiver"
+
+
+def get_subclasses(cls):
+    """
+    Recursively get all subclasses of the benchmark class.
+    """
+    subclasses = []
+
+    sub = cls.__subclasses__()
+    subclasses.extend(sub)
+
+    for subclass in sub:
+        subclasses.extend(get_subclasses(subclass))
+
+    return subclasses
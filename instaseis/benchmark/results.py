@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Structured benchmark results and their comparison.
+
+A result file is a JSON document with the keys ``"environment"``,
+``"databases"``, and ``"benchmarks"``. Each benchmark entry has the
+throughput, percentiles of the time per iteration, the per stage breakdown
+as recorded by :mod:`instaseis.profiling`, the number of HDF5 chunks read
+per seismogram, the peak resident memory of the process, and the buffer
+statistics of the database.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import sys
+import threading
+
+import numpy as np
+import obspy
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+# Version of the result file format.
+FORMAT_VERSION = 1
+
+PERCENTILES = (0, 10, 25, 50, 75, 90, 99, 100)
+
+
+def get_statistics(times):
+    """
+    Statistics of an array of timings.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    return collections.OrderedDict([
+        ("mean", float(times.mean())),
+        ("std", float(times.std())),
+        ("percentiles", collections.OrderedDict(
+            (str(p), float(np.percentile(times, p))) for p in PERCENTILES))])
+
+
+def get_peak_rss():
+    """
+    Peak resident set size of the current process in bytes or None if it
+    cannot be determined on the current platform.
+    """
+    if resource is None:  # pragma: no cover
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on OSX, kilobytes everywhere else.
+    if sys.platform == "darwin":  # pragma: no cover
+        return int(rss)
+    return int(rss) * 1024
+
+
+def get_cache_statistics(db):
+    """
+    Statistics of the buffers of all meshes of a database. Returns None for
+    databases without meshes, e.g. remote databases.
+    """
+    meshes = getattr(db, "meshes", None)
+    if not meshes:
+        return None
+    stats = collections.OrderedDict()
+    for mesh_name, mesh in zip(meshes._fields, meshes):
+        if not mesh:
+            continue
+        for buffer_name in ("strain", "displ"):
+            b = getattr(mesh, buffer_name + "_buffer")
+            stats["%s.%s" % (mesh_name, buffer_name)] = \
+                collections.OrderedDict([
+                    ("hits", b.hits),
+                    ("misses", b.misses),
+                    ("hit_ratio", b.efficiency),
+                    ("size_in_bytes", int(round(b.get_size_mb() * 1024 ** 2))),
+                    ("items", len(b))])
+    return stats
+
+
+class ChunkReadCounter(object):
+    """
+    Stage observer counting the HDF5 chunks read from disc.
+
+    HDF5 keeps the recently used chunks of each dataset in a chunk cache so
+    reading a chunk again is free as long as it is still cached. The cache
+    is modelled as a least recently used cache with the size configured for
+    the file. Every index read from a contiguous dataset counts as one
+    chunk.
+
+    >>> counter = ChunkReadCounter()  # doctest: +SKIP
+    >>> db.add_stage_observer(counter)  # doctest: +SKIP
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.chunk_reads = 0
+        # Cached chunks and capacity per dataset.
+        self._caches = {}
+
+    def __call__(self, stage):
+        if not stage.reads:
+            return
+        with self._lock:
+            for dataset, indices, axis in stage.reads:
+                self.chunk_reads += self._read(dataset, indices, axis)
+
+    def _get_cache(self, dataset, axis):
+        key = (dataset.file.filename, dataset.name)
+        if key not in self._caches:
+            self._caches[key] = self._create_cache(dataset, axis)
+        return self._caches[key]
+
+    @staticmethod
+    def _create_cache(dataset, axis):
+        # The other axes are always read completely so chunks along them
+        # are read and cached together.
+        other = 1
+        for _i, (n, c) in enumerate(zip(dataset.shape, dataset.chunks)):
+            if _i != axis:
+                other *= int(math.ceil(n / float(c)))
+        nbytes = dataset.file.id.get_access_plist().get_cache()[2]
+        chunk_nbytes = np.prod(dataset.chunks) * dataset.dtype.itemsize
+        return collections.OrderedDict(), int(nbytes // (chunk_nbytes *
+                                                         other)), other
+
+    def _read(self, dataset, indices, axis):
+        indices = np.asarray(indices, dtype=np.int64)
+        if not dataset.chunks:
+            return len(np.unique(indices))
+        cache, capacity, other = self._get_cache(dataset, axis)
+        count = 0
+        for chunk in np.unique(indices // dataset.chunks[axis]):
+            chunk = int(chunk)
+            if chunk in cache:
+                # Most recently used.
+                cache[chunk] = cache.pop(chunk)
+                continue
+            count += 1
+            cache[chunk] = True
+            while len(cache) > capacity:
+                cache.popitem(last=False)
+        return count * other
+
+    def reset(self):
+        with self._lock:
+            self.chunk_reads = 0
+            self._caches = {}
+
+
+def get_environment():
+    """
+    Information about the machine and the versions of the relevant
+    libraries.
+    """
+    import h5py
+    import scipy
+
+    import instaseis
+
+    return collections.OrderedDict([
+        ("hostname", platform.node()),
+        ("platform", platform.platform()),
+        ("machine", platform.machine()),
+        ("processor", platform.processor()),
+        ("cpu_count", multiprocessing.cpu_count()),
+        ("python", platform.python_version()),
+        ("python_implementation", platform.python_implementation()),
+        ("instaseis", instaseis.__version__),
+        ("numpy", np.__version__),
+        ("scipy", scipy.__version__),
+        ("obspy", obspy.__version__),
+        ("h5py", h5py.version.version),
+        ("hdf5", h5py.version.hdf5_version),
+        ("command", " ".join(sys.argv)),
+        ("time", str(obspy.UTCDateTime()))])
+
+
+def get_database_info(db, path):
+    """
+    The JSON serializable parts of the info dictionary of a database.
+    """
+    meshes = getattr(db, "meshes", None)
+    info = collections.OrderedDict([
+        ("path", path),
+        ("class", db.__class__.__name__),
+        ("is_merged", hasattr(meshes, "merged")),
+        ("element_order", meshes.merged.element_order
+         if hasattr(meshes, "merged") else None),
+        ("quantization_error", meshes.merged.quantization_error
+         if hasattr(meshes, "merged") else None)])
+    for key, value in sorted(db.info.items()):
+        if isinstance(value, np.ndarray):
+            continue
+        elif isinstance(value, obspy.UTCDateTime):
+            value = str(value)
+        elif isinstance(value, np.generic):
+            value = value.item()
+        info[key] = value
+    return info
+
+
+def write_results(filename, environment, databases, benchmarks):
+    """
+    Write a result file.
+
+    :param environment: The output of :func:`get_environment`.
+    :param databases: List of the outputs of :func:`get_database_info`.
+    :param benchmarks: List of the results of the individual benchmarks.
+        Each must have a ``"database"`` key with the path of the database
+        it ran on.
+    """
+    data = collections.OrderedDict([
+        ("format_version", FORMAT_VERSION),
+        ("environment", environment),
+        ("databases", databases),
+        ("benchmarks", benchmarks)])
+    with io.open(filename, "wt") as fh:
+        fh.write(json.dumps(data, indent=2))
+
+
+def read_results(filename):
+    with io.open(filename, "rt") as fh:
+        data = json.load(fh)
+    if data.get("format_version") != FORMAT_VERSION:
+        raise ValueError("'%s' is not a benchmark result file of version %i."
+                         % (filename, FORMAT_VERSION))
+    return data
+
+
+def _get_keyed_benchmarks(results):
+    # Identified by name only if all ran on the same database so results of
+    # different databases can be compared with each other.
+    benchmarks = [_i for _i in results["benchmarks"]
+                  if _i["status"] == "ok"]
+    if len(results["databases"]) <= 1:
+        return collections.OrderedDict((_i["name"], _i) for _i in benchmarks)
+    return collections.OrderedDict(
+        ("%s [%s]" % (_i["name"], os.path.basename(_i["database"])), _i)
+        for _i in benchmarks)
+
+
+def compare_results(old, new, threshold=0.05):
+    """
+    Compare two benchmark results.
+
+    The median time per iteration is compared. A change is significant if it
+    is larger than the relative threshold and the interquartile ranges of
+    both runs don't overlap.
+
+    Returns a list of dictionaries, one per benchmark, with the keys
+    ``"name"``, ``"old"``, and ``"new"`` (median time per iteration in
+    seconds), ``"change"`` (relative change of the median), and
+    ``"status"``: ``"faster"``, ``"slower"``, ``"unchanged"``,
+    ``"added"``, or ``"removed"``.
+
+    :param old: The old results as returned by :func:`read_results`.
+    :param new: The new results as returned by :func:`read_results`.
+    :param threshold: The relative change considered significant.
+    """
+    old = _get_keyed_benchmarks(old)
+    new = _get_keyed_benchmarks(new)
+
+    comparison = []
+    for name in list(old.keys()) + [_i for _i in new if _i not in old]:
+        entry = collections.OrderedDict([
+            ("name", name), ("old", None), ("new", None), ("change", None)])
+        if name not in new:
+            entry["old"] = old[name]["time_per_iteration"]["percentiles"]["50"]
+            entry["status"] = "removed"
+        elif name not in old:
+            entry["new"] = new[name]["time_per_iteration"]["percentiles"]["50"]
+            entry["status"] = "added"
+        else:
+            p_old = old[name]["time_per_iteration"]["percentiles"]
+            p_new = new[name]["time_per_iteration"]["percentiles"]
+            entry["old"] = p_old["50"]
+            entry["new"] = p_new["50"]
+            entry["change"] = p_new["50"] / p_old["50"] - 1.0
+            overlap = p_new["25"] <= p_old["75"] and \
+                p_old["25"] <= p_new["75"]
+            if abs(entry["change"]) <= threshold or overlap:
+                entry["status"] = "unchanged"
+            elif entry["change"] < 0:
+                entry["status"] = "faster"
+            else:
+                entry["status"] = "slower"
+        comparison.append(entry)
+    return comparison
+
+
+def format_comparison(comparison):
+    """
+    Format the output of :func:`compare_results` as a table.
+    """
+    def _ms(value):
+        return "-" if value is None else "%.3f" % (value * 1000.0)
+
+    width = max([len(_i["name"]) for _i in comparison] + [9])
+    header = "%-*s %10s %10s %8s  %s" % (
+        width, "Benchmark", "Old [ms]", "New [ms]", "Change", "Status")
+    lines = [header, "-" * len(header)]
+    for entry in comparison:
+        change = "-" if entry["change"] is None else \
+            "%+.1f%%" % (entry["change"] * 100.0)
+        lines.append("%-*s %10s %10s %8s  %s" % (
+            width, entry["name"], _ms(entry["old"]), _ms(entry["new"]),
+            change, entry["status"]))
+    return "\n".join(lines)
+
+
+def format_chunk_reads(databases, benchmarks):
+    """
+    Table of the chunk reads per seismogram of each benchmark (rows) and
+    database (columns) - e.g. to compare the element orders of merged
+    databases. Returns None if no chunk reads have been recorded.
+
+    :param databases: List of the outputs of :func:`get_database_info`.
+    :param benchmarks: List of the results of the individual benchmarks.
+    """
+    values = collections.OrderedDict()
+    for b in benchmarks:
+        if b.get("chunk_reads_per_seismogram") is None:
+            continue
+        values.setdefault(b["name"], {})[b["database"]] = \
+            b["chunk_reads_per_seismogram"]
+    if not values:
+        return None
+
+    columns = ["%s [%s]" % (os.path.basename(_i["path"]),
+                            _i.get("element_order") or "unmerged")
+               for _i in databases]
+    widths = [max(len(_i), 8) for _i in columns]
+    width = max([len(_i) for _i in values] + [9])
+    header = "%-*s  %s" % (width, "Benchmark", "  ".join(
+        "%*s" % (w, c) for w, c in zip(widths, columns)))
+    lines = ["Chunk reads per seismogram", header, "-" * len(header)]
+    for name, row in values.items():
+        lines.append("%-*s  %s" % (width, name, "  ".join(
+            "%*s" % (w, "-" if db["path"] not in row else
+                     "%.3f" % row[db["path"]])
+            for w, db in zip(widths, databases))))
+    return "\n".join(lines)
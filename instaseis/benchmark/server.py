@@ -0,0 +1,619 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Load tests for the Instaseis server.
+
+Starts a server for a local database in the same process or targets a
+running server and drives concurrent requests against its routes with
+tornado's asynchronous HTTP client, e.g.
+
+    $ python -m instaseis.benchmark.server --db DB_FOLDER \\
+        --workload seismograms:3 --workload finite_source:1 \\
+        --concurrency 20 --duration 60 --output load.json
+
+    $ python -m instaseis.benchmark.server --url http://localhost:8765
+
+Throughput, latencies, and errors are reported for every interval and as a
+summary at the end together with the metrics of the server if it offers the
+``/metrics`` route. Keep in mind that an in-process server shares the
+interpreter with the load generator.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import argparse
+import collections
+import datetime
+import io
+import json
+import math
+import random
+import time
+
+import numpy as np
+import tornado.gen
+import tornado.httpclient
+import tornado.httpserver
+import tornado.ioloop
+import tornado.locks
+import tornado.netutil
+
+try:
+    from urllib.parse import urlencode
+except ImportError:  # pragma: no cover
+    from urllib import urlencode
+
+from .results import get_environment, get_statistics
+
+
+WORKLOADS = ("seismograms", "seismograms_raw", "greens_function",
+             "finite_source")
+
+# Workloads that need a reciprocal database.
+RECIPROCAL_WORKLOADS = ("greens_function", "finite_source")
+
+# A single request as recorded by the load test.
+Record = collections.namedtuple(
+    "Record", ["workload", "start", "end", "code", "nbytes"])
+
+
+class RequestGenerator(object):
+    """
+    Generates random requests for the different routes of a server.
+
+    :param info: The information about the database as returned by the
+        ``/info`` route of the server.
+    :param seed: Seed of the random number generator.
+    :param finite_source_size: The number of point sources of the finite
+        sources.
+    """
+    def __init__(self, info, seed=None, finite_source_size=10):
+        self.info = info
+        self.random = random.Random(seed)
+        self.finite_source_size = finite_source_size
+
+        if info["components"] == "vertical only":
+            self.components = "Z"
+        elif info["components"] == "horizontal only":
+            self.components = "NE"
+        else:
+            self.components = "ZNE"
+
+    def check_workload(self, workload):
+        """
+        Raises a ValueError if the workload cannot run against the database.
+        """
+        if workload not in WORKLOADS:
+            raise ValueError("Unknown workload '%s'. Available: %s" % (
+                workload, ", ".join(WORKLOADS)))
+        if workload in RECIPROCAL_WORKLOADS and \
+                not self.info["is_reciprocal"]:
+            raise ValueError("Workload '%s' needs a reciprocal database." %
+                             workload)
+
+    def _random_point(self):
+        lat = math.degrees(math.asin(2.0 * self.random.random() - 1.0))
+        lng = self.random.random() * 360.0 - 180.0
+        return lat, lng
+
+    def _random_depth(self):
+        if not self.info["is_reciprocal"]:
+            return self.info["source_depth"] * 1000.0
+        max_depth = self.info["planet_radius"] - self.info["min_radius"]
+        return self.random.random() * 0.9 * max_depth
+
+    def _random_moment_tensor(self):
+        return [self.random.uniform(-1.0, 1.0) * 1E19 for _ in range(6)]
+
+    def seismograms(self):
+        src_lat, src_lng = self._random_point()
+        rec_lat, rec_lng = self._random_point()
+        params = {
+            "sourcelatitude": src_lat, "sourcelongitude": src_lng,
+            "sourcedepthinmeters": self._random_depth(),
+            "sourcemomenttensor": ",".join(
+                "%g" % _i for _i in self._random_moment_tensor()),
+            "receiverlatitude": rec_lat, "receiverlongitude": rec_lng,
+            "components": self.components, "format": "miniseed"}
+        return "GET", "/seismograms", params, None
+
+    def seismograms_raw(self):
+        src_lat, src_lng = self._random_point()
+        rec_lat, rec_lng = self._random_point()
+        params = dict(zip(["mrr", "mtt", "mpp", "mrt", "mrp", "mtp"],
+                          self._random_moment_tensor()))
+        params.update({
+            "sourcelatitude": src_lat, "sourcelongitude": src_lng,
+            "sourcedepthinmeters": self._random_depth(),
+            "receiverlatitude": rec_lat, "receiverlongitude": rec_lng,
+            "components": self.components})
+        return "GET", "/seismograms_raw", params, None
+
+    def greens_function(self):
+        params = {
+            "sourcedistanceindegrees": self.random.random() * 180.0,
+            "sourcedepthinmeters": self._random_depth(),
+            "format": "miniseed"}
+        return "GET", "/greens_function", params, None
+
+    def finite_source(self):
+        rec_lat, rec_lng = self._random_point()
+        params = {
+            "receiverlatitude": rec_lat, "receiverlongitude": rec_lng,
+            "components": self.components, "format": "miniseed"}
+        return "POST", "/finite_source", params, self.get_usgs_param_file()
+
+    def get_usgs_param_file(self):
+        """
+        A USGS param file with a single segment of point sources along a
+        random line.
+        """
+        lat, lng = self._random_point()
+        # Stay away from the poles to be able to simply offset the
+        # longitude.
+        lat = max(min(lat, 80.0), -80.0)
+        depth = self._random_depth() / 1000.0
+        strike = self.random.random() * 360.0
+        lines = [
+            "#Total number of fault_segments=     1",
+            "#Fault_segment =   1 nx(Along-strike)= %i Dx= 5.00km "
+            "ny(downdip)=  1 Dy= 5.00km" % self.finite_source_size,
+            "#Lat. Lon. depth slip rake strike dip t_rup t_ris t_fal mo"]
+        for _i in range(self.finite_source_size):
+            lines.append(
+                "%.6f %.6f %.6f 100.0 90.0 %.2f 60.0 %.2f 2.0 2.0 "
+                "1.0e+25" % (lat, lng + 0.05 * _i, depth, strike, 1.5 * _i))
+        return ("\n".join(lines) + "\n").encode()
+
+    def get_request(self, workload):
+        """
+        Returns a tuple of the HTTP method, the route, the query parameters,
+        and the body of a random request for the given workload.
+        """
+        return getattr(self, workload)()
+
+
+def parse_workloads(workloads):
+    """
+    Parse workload specifications of the form ``NAME[:WEIGHT]`` to an
+    ordered dictionary mapping names to weights.
+    """
+    parsed = collections.OrderedDict()
+    for spec in workloads:
+        name, _, weight = spec.partition(":")
+        weight = float(weight) if weight else 1.0
+        if weight <= 0:
+            raise ValueError("Weight of workload '%s' must be positive." %
+                             name)
+        parsed[name] = weight
+    return parsed
+
+
+def parse_metrics(text):
+    """
+    Parse the Prometheus text exposition format as rendered by the server.
+
+    Returns a dictionary mapping metric names to lists of (labels, value)
+    tuples.
+    """
+    metrics = collections.defaultdict(list)
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        name_and_labels, value = line.rsplit(" ", 1)
+        labels = {}
+        if "{" in name_and_labels:
+            name, _, label_string = name_and_labels.partition("{")
+            for item in label_string.rstrip("}").split('",'):
+                if not item:
+                    continue
+                key, _, v = item.partition("=")
+                labels[key] = v.strip('"')
+        else:
+            name = name_and_labels
+        metrics[name].append((labels, float(value)))
+    return metrics
+
+
+def summarize_metrics(metrics):
+    """
+    Condense the parsed metrics of a server to the most interesting values.
+    """
+    def _sum(name, **labels):
+        return sum(v for metric_labels, v in metrics.get(name, [])
+                   if all(metric_labels.get(k) == _v
+                          for k, _v in labels.items()))
+
+    hits = _sum("instaseis_buffer_hits_total")
+    misses = _sum("instaseis_buffer_misses_total")
+
+    stages = collections.OrderedDict()
+    for labels, count in sorted(
+            metrics.get("instaseis_stage_duration_seconds_count", []),
+            key=lambda x: x[0]["stage"]):
+        if not count:
+            continue
+        total = _sum("instaseis_stage_duration_seconds_sum",
+                     stage=labels["stage"])
+        stages[labels["stage"]] = collections.OrderedDict([
+            ("count", int(count)), ("mean_time", total / count)])
+
+    return collections.OrderedDict([
+        ("requests", int(_sum("instaseis_requests_total"))),
+        ("async_threads", int(_sum("instaseis_async_threads"))),
+        ("job_queue_depth", int(_sum("instaseis_job_queue_depth"))),
+        ("disk_read_bytes", int(_sum("instaseis_disk_read_bytes_total"))),
+        ("buffer_hit_ratio",
+         hits / (hits + misses) if (hits + misses) else None),
+        ("stages", stages)])
+
+
+def summarize_records(records, duration):
+    """
+    Throughput, error rate, and latency statistics of a list of records.
+
+    :param records: List of :class:`Record` objects.
+    :param duration: The duration in seconds they were recorded in.
+    """
+    codes = collections.Counter(_i.code for _i in records)
+    errors = sum(1 for _i in records if not 200 <= _i.code < 300)
+    summary = collections.OrderedDict([
+        ("requests", len(records)),
+        ("errors", errors),
+        ("error_rate", errors / len(records) if records else 0.0),
+        ("codes", collections.OrderedDict(
+            (str(k), v) for k, v in sorted(codes.items()))),
+        ("throughput", len(records) / duration if duration else 0.0),
+        ("received_bytes", sum(_i.nbytes for _i in records)),
+        ("latency", get_statistics([_i.end - _i.start for _i in records])
+         if records else None)])
+    return summary
+
+
+def start_server(db_path, buffer_size_in_mb=100, **kwargs):
+    """
+    Start a server for a local database on a free port of the current
+    IOLoop.
+
+    Returns the server and its URL. All keyword arguments are passed to
+    :func:`instaseis.server.app.create_application`.
+    """
+    from ..server.app import create_application
+
+    application = create_application(
+        db_path=db_path, buffer_size_in_mb=buffer_size_in_mb, **kwargs)
+    sockets = tornado.netutil.bind_sockets(0, "127.0.0.1")
+    port = sockets[0].getsockname()[1]
+    server = tornado.httpserver.HTTPServer(application)
+    server.add_sockets(sockets)
+    return server, "http://127.0.0.1:%i" % port
+
+
+class LoadTest(object):
+    """
+    Drives concurrent requests against a server.
+
+    :param url: The URL of the server.
+    :param workloads: Dictionary mapping workload names to their relative
+        weights.
+    :param concurrency: The number of requests in flight at any time.
+    :param duration: The maximum duration of the test in seconds.
+    :param max_requests: The maximum number of requests.
+    :param interval: The length of a reporting interval in seconds.
+    :param seed: Seed of the random number generator.
+    :param finite_source_size: The number of point sources of the finite
+        sources.
+    :param timeout: The timeout of a single request in seconds.
+    :param quiet: Don't print the intermediate results.
+    """
+    def __init__(self, url, workloads, concurrency=10, duration=30.0,
+                 max_requests=None, interval=1.0, seed=None,
+                 finite_source_size=10, timeout=120.0, quiet=False):
+        self.url = url.rstrip("/")
+        self.workloads = workloads
+        self.concurrency = concurrency
+        self.duration = duration
+        self.max_requests = max_requests
+        self.interval = interval
+        self.seed = seed
+        self.finite_source_size = finite_source_size
+        self.timeout = timeout
+        self.quiet = quiet
+
+        self.records = []
+        self.timeline = []
+        self._issued = 0
+        self._finished = tornado.locks.Event()
+
+    def _fetch(self, client, path, **kwargs):
+        return client.fetch(
+            tornado.httpclient.HTTPRequest(
+                self.url + path, request_timeout=self.timeout, **kwargs),
+            raise_error=False)
+
+    @tornado.gen.coroutine
+    def _get_metrics(self, client):
+        response = yield self._fetch(client, "/metrics")
+        if response.code != 200:
+            raise tornado.gen.Return(None)
+        raise tornado.gen.Return(summarize_metrics(parse_metrics(
+            response.body.decode())))
+
+    @tornado.gen.coroutine
+    def _worker(self, client, generator, choices):
+        while True:
+            if time.time() >= self._deadline or (
+                    self.max_requests is not None and
+                    self._issued >= self.max_requests):
+                break
+            self._issued += 1
+            workload = choices[generator.random.random()]
+            method, path, params, body = generator.get_request(workload)
+            start = time.time()
+            response = yield self._fetch(
+                client, path + "?" + urlencode(params), method=method,
+                body=body)
+            self.records.append(Record(
+                workload=workload, start=start, end=time.time(),
+                code=response.code, nbytes=len(response.body or b"")))
+
+    @tornado.gen.coroutine
+    def _monitor(self, client):
+        index = 0
+        previous = yield self._get_metrics(client)
+        interval_start = self._start
+        while True:
+            # Wakes up early once all requests are done.
+            try:
+                yield self._finished.wait(timeout=datetime.timedelta(
+                    seconds=max(interval_start + self.interval - time.time(),
+                                0.0)))
+            except tornado.gen.TimeoutError:
+                pass
+            now = time.time()
+            records = self.records[index:]
+            index += len(records)
+            entry = summarize_records(records, now - interval_start)
+            entry["time"] = now - self._start
+            metrics = yield self._get_metrics(client)
+            if metrics is not None:
+                del metrics["stages"]
+                metrics["disk_read_rate"] = None if previous is None else \
+                    (metrics["disk_read_bytes"] -
+                     previous["disk_read_bytes"]) / (now - interval_start)
+                previous = metrics
+            entry["server"] = metrics
+            self.timeline.append(entry)
+            if not self.quiet:
+                print(format_interval(entry))
+            if self._finished.is_set():
+                break
+            interval_start = now
+
+    @tornado.gen.coroutine
+    def _run(self):
+        client = tornado.httpclient.AsyncHTTPClient(
+            force_instance=True, max_clients=self.concurrency)
+        try:
+            response = yield self._fetch(client, "/info")
+            if response.code != 200:
+                raise ValueError("Could not get the database information "
+                                 "from '%s': HTTP %i" % (self.url,
+                                                         response.code))
+            info = json.loads(response.body.decode())
+
+            generator = RequestGenerator(
+                info=info, seed=self.seed,
+                finite_source_size=self.finite_source_size)
+            for name in self.workloads:
+                generator.check_workload(name)
+            choices = _WeightedChoice(self.workloads)
+
+            initial_metrics = yield self._get_metrics(client)
+
+            self._start = time.time()
+            self._deadline = self._start + self.duration
+            monitor = self._monitor(client)
+            yield [self._worker(client, generator, choices)
+                   for _ in range(self.concurrency)]
+            self._end = time.time()
+            self._finished.set()
+            yield monitor
+
+            final_metrics = yield self._get_metrics(client)
+        finally:
+            client.close()
+
+        raise tornado.gen.Return(self._get_results(
+            info, initial_metrics, final_metrics))
+
+    def _get_results(self, info, initial_metrics, final_metrics):
+        duration = self._end - self._start
+        per_workload = collections.OrderedDict()
+        for name in self.workloads:
+            per_workload[name] = summarize_records(
+                [_i for _i in self.records if _i.workload == name], duration)
+
+        server = None
+        if initial_metrics is not None and final_metrics is not None:
+            server = final_metrics
+            server["disk_read_bytes"] -= initial_metrics["disk_read_bytes"]
+            server["requests"] -= initial_metrics["requests"]
+
+        return collections.OrderedDict([
+            ("url", self.url),
+            ("database", collections.OrderedDict(
+                (k, info.get(k)) for k in (
+                    "is_reciprocal", "components", "dump_type", "npts",
+                    "dt", "period", "filesize"))),
+            ("settings", collections.OrderedDict([
+                ("workloads", self.workloads),
+                ("concurrency", self.concurrency),
+                ("duration", self.duration),
+                ("max_requests", self.max_requests),
+                ("seed", self.seed),
+                ("finite_source_size", self.finite_source_size)])),
+            ("duration", duration),
+            ("total", summarize_records(self.records, duration)),
+            ("workloads", per_workload),
+            ("server", server),
+            ("timeline", self.timeline)])
+
+    def run(self):
+        """
+        Run the load test on the current IOLoop and return the results.
+        """
+        return tornado.ioloop.IOLoop.current().run_sync(self._run)
+
+
+class _WeightedChoice(object):
+    """
+    Maps a uniform random number in [0, 1) to one of the weighted items.
+    """
+    def __init__(self, weights):
+        self.names = list(weights.keys())
+        cumsum = np.cumsum(list(weights.values()), dtype=np.float64)
+        self.bounds = cumsum / cumsum[-1]
+
+    def __getitem__(self, value):
+        return self.names[min(int(np.searchsorted(self.bounds, value,
+                                                  side="right")),
+                              len(self.names) - 1)]
+
+
+def _ms(value):
+    return value * 1000.0
+
+
+def format_interval(entry):
+    """
+    Format a single entry of the timeline as a line of text.
+    """
+    line = "%7.1fs %8.1f req/s %6i errors" % (
+        entry["time"], entry["throughput"], entry["errors"])
+    if entry["latency"]:
+        p = entry["latency"]["percentiles"]
+        line += "  latency [ms] p50 %8.1f  p90 %8.1f  p99 %8.1f" % (
+            _ms(p["50"]), _ms(p["90"]), _ms(p["99"]))
+    server = entry.get("server")
+    if server:
+        line += "  | threads %3i  queue %3i" % (
+            server["async_threads"], server["job_queue_depth"])
+        if server["disk_read_rate"] is not None:
+            line += "  read %7.1f MB/s" % (
+                server["disk_read_rate"] / 1024.0 ** 2)
+        if server["buffer_hit_ratio"] is not None:
+            line += "  hit ratio %.2f" % server["buffer_hit_ratio"]
+    return line
+
+
+def format_summary(results):
+    """
+    Format the results of a load test as a table.
+    """
+    header = "%-18s %9s %7s %9s %10s %10s %10s %10s" % (
+        "Workload", "Requests", "Errors", "Req/s", "Mean [ms]", "p50 [ms]",
+        "p90 [ms]", "p99 [ms]")
+    lines = [header, "-" * len(header)]
+    for name, s in list(results["workloads"].items()) + \
+            [("total", results["total"])]:
+        if s["latency"]:
+            p = s["latency"]["percentiles"]
+            latencies = "%10.1f %10.1f %10.1f %10.1f" % (
+                _ms(s["latency"]["mean"]), _ms(p["50"]), _ms(p["90"]),
+                _ms(p["99"]))
+        else:
+            latencies = "%10s %10s %10s %10s" % ("-", "-", "-", "-")
+        lines.append("%-18s %9i %7i %9.2f %s" % (
+            name, s["requests"], s["errors"], s["throughput"], latencies))
+
+    server = results["server"]
+    if server:
+        lines.append("")
+        lines.append("Server: %i requests, %.1f MB read, buffer hit ratio "
+                     "%s" % (server["requests"],
+                             server["disk_read_bytes"] / 1024.0 ** 2,
+                             "-" if server["buffer_hit_ratio"] is None else
+                             "%.2f" % server["buffer_hit_ratio"]))
+        for stage, s in server["stages"].items():
+            lines.append("  %-28s %8i calls %10.3f ms" % (
+                stage, s["count"], _ms(s["mean_time"])))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m instaseis.benchmark.server",
+        description="Load test an Instaseis server.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--db", type=str,
+                        help="start a server for this database in the "
+                             "same process")
+    target.add_argument("--url", type=str,
+                        help="the URL of a running server")
+    parser.add_argument("--workload", action="append",
+                        help="NAME[:WEIGHT] - one of %s. Can be given "
+                             "multiple times. Defaults to 'seismograms'." %
+                             ", ".join(WORKLOADS))
+    parser.add_argument("--concurrency", type=int, default=10,
+                        help="number of concurrent requests")
+    parser.add_argument("--duration", type=float, default=30.0,
+                        help="maximum duration of the test in seconds")
+    parser.add_argument("--requests", type=int, default=None,
+                        help="maximum number of requests")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="length of the reporting intervals in seconds")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the random number generator")
+    parser.add_argument("--finite_source_size", type=int, default=10,
+                        help="number of point sources per finite source")
+    parser.add_argument("--timeout", type=float, default=120.0,
+                        help="timeout of a single request in seconds")
+    parser.add_argument("--buffer_size_in_mb", type=int, default=100,
+                        help="buffer size of an in-process server")
+    parser.add_argument("--max_concurrent_jobs", type=int, default=2,
+                        help="concurrent jobs of an in-process server")
+    parser.add_argument("--output", type=str, default=None,
+                        help="write the results to this JSON file")
+    parser.add_argument("--quiet", action="store_true",
+                        help="don't print the intermediate results")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.db:
+        server, url = start_server(
+            args.db, buffer_size_in_mb=args.buffer_size_in_mb,
+            max_concurrent_jobs=args.max_concurrent_jobs)
+    else:
+        url = args.url
+
+    try:
+        results = LoadTest(
+            url=url, workloads=parse_workloads(
+                args.workload or ["seismograms"]),
+            concurrency=args.concurrency, duration=args.duration,
+            max_requests=args.requests, interval=args.interval,
+            seed=args.seed, finite_source_size=args.finite_source_size,
+            timeout=args.timeout, quiet=args.quiet).run()
+    finally:
+        if server is not None:
+            server.stop()
+
+    print()
+    print(format_summary(results))
+
+    if args.output:
+        results["environment"] = get_environment()
+        with io.open(args.output, "wt") as fh:
+            fh.write(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -269,7 +269,34 @@ def is_master(config):
         return True
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--update-perf-baseline", action="store_true", default=False,
+        help="Write the results of the performance tests to the baseline "
+             "file instead of comparing against it. Run with '-m perf -n 0'.")
+
+
+def pytest_collection_modifyitems(config, items):
+    """
+    The performance tests are slow and need a quiet machine - only run them
+    if explicitly selected with `-m perf`.
+    """
+    if "perf" in (config.getoption("markexpr") or ""):
+        return
+    skip = pytest.mark.skip(reason="Performance test - run with `-m perf`.")
+    for item in items:
+        if "perf" in item.keywords:
+            item.add_marker(skip)
+
+
 def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "perf: performance regression tests compared against a "
+                   "stored baseline. Only run with `-m perf`.")
+    if config.getoption("update_perf_baseline") and \
+            getattr(config.option, "numprocesses", None):
+        raise pytest.UsageError("--update-perf-baseline only works without "
+                                "pytest-xdist. Pass '-n 0'.")
     if is_master(config):
         config.dbs = repack_databases()
     else:
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Asynchronous (:mod:`asyncio`) interface to Instaseis databases.
+
+Extracting seismograms blocks for the time it takes to read the data from
+disc or to download it from a server. The
+:class:`~instaseis.database_interfaces.async_instaseis_db.AsyncInstaseisDB`
+wrapper runs the extractions on a bounded pool of worker threads so they do
+not block the event loop of asyncio based services. Requires Python >= 3.5.
+
+>>> import asyncio  # doctest: +SKIP
+>>> from instaseis.database_interfaces.async_instaseis_db import \\
+...     AsyncInstaseisDB  # doctest: +SKIP
+>>> db = AsyncInstaseisDB("/path/to/DB")  # doctest: +SKIP
+>>> async def main():  # doctest: +SKIP
+...     st = await db.get_seismograms(source=src, receiver=rec)
+...     async for index, st in db.iter_seismograms_many(src, receivers):
+...         print(receivers[index], st)
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import threading
+
+from .base_instaseis_db import BaseInstaseisDB, _get_pairs
+from .scheduler import LocalityScheduler
+from .. import open_db
+
+
+# Default number of worker threads for local databases. Remote databases
+# use one worker per pooled connection.
+DEFAULT_MAX_WORKERS = 4
+
+
+class AsyncInstaseisDB(object):
+    """
+    Asynchronous wrapper around any Instaseis database.
+
+    All extraction methods return awaitables. Local databases are read on a
+    bounded pool of worker threads. Remote databases send the requests over
+    the pooled keep-alive connections of the database with one worker per
+    connection.
+
+    Cancelling an extraction is cooperative: queued source-receiver pairs
+    are never started and finite sources stop after the point source that
+    is currently being processed.
+
+    :param db: A database object or the path or URL of a database which is
+        then opened with :func:`~instaseis.open_db`.
+    :type db: :class:`~instaseis.database_interfaces.base_instaseis_db.BaseInstaseisDB`
+        or str
+    :param max_workers: The number of worker threads. Defaults to
+        :data:`DEFAULT_MAX_WORKERS` for local databases and to the maximum
+        number of concurrent requests for remote databases.
+    :type max_workers: int, optional
+    :param loop: The event loop. Defaults to the current event loop at the
+        time of each call.
+
+    All further keyword arguments are passed to :func:`~instaseis.open_db`.
+    """  # NOQA
+    def __init__(self, db, max_workers=None, loop=None, **kwargs):
+        if not isinstance(db, BaseInstaseisDB):
+            db = open_db(db, **kwargs)
+        elif kwargs:
+            raise ValueError("Keyword arguments can only be passed if the "
+                             "database is opened by this class.")
+        if max_workers is None:
+            http = getattr(db, "_http", None)
+            max_workers = DEFAULT_MAX_WORKERS if http is None else \
+                http.max_concurrency
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1.")
+        self.db = db
+        self.max_workers = int(max_workers)
+        self._loop = loop
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers)
+
+    def __str__(self):
+        return "Async" + str(self.db)
+
+    @property
+    def info(self):
+        """
+        Information about the database. Is downloaded only once for remote
+        databases.
+        """
+        return self.db.info
+
+    def _run(self, func, *args, **kwargs):
+        """
+        Runs a function on the worker threads and returns an
+        :class:`asyncio.Future` with its result.
+        """
+        loop = self._loop or asyncio.get_event_loop()
+        return loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs))
+
+    def _gather(self, futures):
+        """
+        Combines futures into a single one resolving to all results.
+        Cancelling it cancels all of them.
+        """
+        if not futures:
+            future = (self._loop or asyncio.get_event_loop()).create_future()
+            future.set_result([])
+            return future
+        return asyncio.gather(*futures)
+
+    def _get_ordered_pairs(self, sources, receivers):
+        """
+        The source-receiver pairs and the order in which they are submitted
+        to the workers. Neighbouring pairs of local databases then share
+        their buffers and HDF5 chunks.
+        """
+        pairs = _get_pairs(sources, receivers)
+        return pairs, LocalityScheduler(self.db).get_order(pairs)
+
+    def get_seismograms(self, source, receiver, **kwargs):
+        """
+        Asynchronously extract the seismograms of a single source-receiver
+        pair. All arguments are passed to
+        :meth:`~instaseis.database_interfaces.base_instaseis_db.BaseInstaseisDB.get_seismograms`.
+
+        >>> st = await db.get_seismograms(src, rec)  # doctest: +SKIP
+        """  # NOQA
+        return self._run(self.db.get_seismograms, source=source,
+                         receiver=receiver, **kwargs)
+
+    def get_greens_function(self, *args, **kwargs):
+        """
+        Asynchronously extract Green's functions. All arguments are passed to
+        :meth:`~instaseis.database_interfaces.base_instaseis_db.BaseInstaseisDB.get_greens_function`.
+        """  # NOQA
+        return self._run(self.db.get_greens_function, *args, **kwargs)
+
+    def get_seismograms_many(self, sources, receivers, **kwargs):
+        """
+        Asynchronously extract the seismograms of many source-receiver pairs.
+        The pairs are processed concurrently on the workers.
+
+        :param sources: The sources. A single source is used for all
+            receivers.
+        :type sources: :class:`instaseis.source.Source` or list of them
+        :param receivers: The receivers. A single receiver is used for all
+            sources.
+        :type receivers: :class:`instaseis.source.Receiver`, list of them or
+            :class:`instaseis.source.ReceiverArray`
+
+        All other keyword arguments are passed to
+        :meth:`~instaseis.database_interfaces.base_instaseis_db.BaseInstaseisDB.get_seismograms`.
+
+        :returns: An awaitable resolving to one result per pair in the order
+            of the pairs. Cancelling it cancels all pairs that have not yet
+            been started.
+
+        >>> streams = await db.get_seismograms_many(src, receivers)  # doctest: +SKIP
+        """  # NOQA
+        pairs, order = self._get_ordered_pairs(sources, receivers)
+        futures = [None] * len(pairs)
+        for index in order:
+            futures[index] = self.get_seismograms(
+                source=pairs[index][0], receiver=pairs[index][1], **kwargs)
+        return self._gather(futures)
+
+    def iter_seismograms_many(self, sources, receivers, **kwargs):
+        """
+        Like :meth:`get_seismograms_many` but returns an asynchronous
+        iterator yielding tuples of the index of a pair and its result as
+        soon as they are available.
+
+        >>> async for index, st in db.iter_seismograms_many(  # doctest: +SKIP
+        ...         src, receivers):
+        ...     process(receivers[index], st)
+
+        The extractions start once the iteration starts. Call
+        :meth:`~AsyncSeismogramIterator.cancel` on the iterator if it is not
+        exhausted to cancel the remaining pairs.
+        """
+        pairs, order = self._get_ordered_pairs(sources, receivers)
+
+        def _get_seismograms(index):
+            return index, self.db.get_seismograms(
+                source=pairs[index][0], receiver=pairs[index][1], **kwargs)
+
+        return AsyncSeismogramIterator(
+            lambda: [self._run(_get_seismograms, _i) for _i in order],
+            loop=self._loop)
+
+    def get_seismograms_finite_source(self, sources, receiver, **kwargs):
+        """
+        Asynchronously extract the seismograms of a finite source. All
+        arguments are passed to
+        :meth:`~instaseis.database_interfaces.base_instaseis_db.BaseInstaseisDB.get_seismograms_finite_source`.
+
+        Cancelling the returned awaitable stops the extraction after the
+        current point source.
+
+        >>> st = await db.get_seismograms_finite_source(  # doctest: +SKIP
+        ...     finite_source, rec)
+        """  # NOQA
+        cancelled = threading.Event()
+        progress_callback = kwargs.pop("progress_callback", None)
+
+        def _progress_callback(current, total):
+            if progress_callback and progress_callback(current, total):
+                return True
+            return cancelled.is_set()
+
+        def _get_seismograms():
+            st = self.db.get_seismograms_finite_source(
+                sources=sources, receiver=receiver,
+                progress_callback=_progress_callback, **kwargs)
+            if st is None:
+                raise asyncio.CancelledError
+            return st
+
+        future = self._run(_get_seismograms)
+
+        def _done(future):
+            if future.cancelled():
+                cancelled.set()
+
+        future.add_done_callback(_done)
+        return future
+
+    def get_seismograms_finite_source_many(self, sources, receivers,
+                                           **kwargs):
+        """
+        Asynchronously extract the seismograms of a finite source at many
+        receivers. Each receiver is processed by one worker.
+
+        :returns: An awaitable resolving to one stream per receiver.
+        """
+        futures = [self.get_seismograms_finite_source(
+            sources=sources, receiver=_i, **kwargs) for _i in receivers]
+        return self._gather(futures)
+
+    def close(self, wait=True):
+        """
+        Shut down the worker threads. Queued extractions are still finished.
+        """
+        self._executor.shutdown(wait=wait)
+
+
+class AsyncSeismogramIterator(object):
+    """
+    Asynchronous iterator over the results of concurrently running
+    extractions in the order they finish.
+
+    :param submit: Function starting the extractions and returning their
+        futures. Called once the iteration starts.
+    :param loop: The event loop. Defaults to the current event loop once the
+        iteration starts.
+    """
+    def __init__(self, submit, loop=None):
+        self._submit = submit
+        self._loop = loop
+        self._futures = None
+        # Finished futures that have not yet been handed out.
+        self._done = collections.deque()
+        self._remaining = 0
+        self._waiter = None
+
+    def __aiter__(self):
+        if self._futures is None:
+            self._loop = self._loop or asyncio.get_event_loop()
+            self._futures = self._submit()
+            self._remaining = len(self._futures)
+            for future in self._futures:
+                future.add_done_callback(self._on_done)
+        return self
+
+    def _on_done(self, future):
+        if self._waiter is not None and not self._waiter.done():
+            self._set_result(self._waiter, future)
+            self._waiter = None
+        else:
+            self._done.append(future)
+
+    @staticmethod
+    def _set_result(waiter, future):
+        if future.cancelled():
+            waiter.cancel()
+        elif future.exception() is not None:
+            waiter.set_exception(future.exception())
+        else:
+            waiter.set_result(future.result())
+
+    def __anext__(self):
+        self.__aiter__()
+        if not self._remaining:
+            raise StopAsyncIteration
+        self._remaining -= 1
+        waiter = self._loop.create_future()
+        if self._done:
+            self._set_result(waiter, self._done.popleft())
+        else:
+            self._waiter = waiter
+        return waiter
+
+    def cancel(self):
+        """
+        Cancel all extractions that have not yet been started.
+        """
+        for future in self._futures or []:
+            future.cancel()
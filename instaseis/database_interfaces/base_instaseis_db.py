@@ -16,9 +16,18 @@ from __future__ import (absolute_import, division, print_function,
 from future.utils import with_metaclass
 
 from abc import ABCMeta, abstractmethod
+import contextlib
+import itertools
 import math
+import time
+import timeit
 import warnings
 
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
 import numpy as np
 from obspy.core import AttribDict, Stream, Trace, UTCDateTime
 from obspy.geodetics import locations2degrees
@@ -28,6 +37,7 @@ import scipy.signal
 
 from ..source import Source, ForceSource, Receiver
 from ..helpers import get_band_code, sizeof_fmt, rfftfreq
+from .scheduler import DEFAULT_WINDOW, LocalityScheduler
 
 
 DEFAULT_MU = 32e9
@@ -51,6 +61,12 @@ STF_MAP = {
     'gauss_2': 3}
 
 
+try:
+    _cpu_timer = time.process_time
+except AttributeError:  # pragma: no cover
+    _cpu_timer = time.clock
+
+
 def _diff_and_integrate(n_derivative, data, comp, dt_out):
     for _ in np.arange(n_derivative):
         data[comp] = np.gradient(data[comp], [dt_out])
@@ -61,10 +77,179 @@ def _diff_and_integrate(n_derivative, data, comp, dt_out):
         data[comp] = cumtrapz(data[comp], dx=dt_out, initial=0.0)
 
 
+class _Stage(object):
+    """
+    Context manager timing a single stage of a seismogram extraction.
+
+    The observers are called with the stage object once the stage is done.
+    Stages reading data from disc should set the ``nbytes`` attribute and
+    record what they read with :meth:`add_read`.
+    """
+    def __init__(self, name, observers):
+        self.name = name
+        self.observers = observers
+        self.nbytes = 0
+        self.reads = []
+        self.wall_time = None
+        self.cpu_time = None
+        self.allocated_bytes = None
+
+    def __enter__(self):
+        if tracemalloc is not None and tracemalloc.is_tracing():
+            self._memory = tracemalloc.get_traced_memory()
+        else:
+            self._memory = None
+        self._start = timeit.default_timer()
+        self._cpu_start = _cpu_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_time = timeit.default_timer() - self._start
+        self.cpu_time = _cpu_timer() - self._cpu_start
+        if self._memory is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak is global so it only tells something about this
+            # stage if it increased during it.
+            if peak <= self._memory[1]:
+                peak = current
+            self.allocated_bytes = max(peak - self._memory[0], 0)
+        for observer in self.observers:
+            observer(self)
+
+    def add_read(self, dataset, indices, axis=0):
+        """
+        Record a read of the given indices along an axis of a HDF5 dataset.
+        All other axes are read completely.
+        """
+        self.reads.append((dataset, indices, axis))
+
+
+class _NullStage(object):
+    """
+    Does nothing - used if nobody is interested in the timings.
+    """
+    nbytes = 0
+    reads = ()
+
+    def __enter__(self):
+        return self
+
+    def add_read(self, dataset, indices, axis=0):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
 class BaseInstaseisDB(with_metaclass(ABCMeta)):
     """
     Base class for all Instaseis database classes defining the user interface.
     """
+    # Functions called after each timed stage of the seismogram extraction.
+    _stage_observers = ()
+    # The profiler if profiling is enabled.
+    profiler = None
+
+    def enable_profiling(self, trace_memory=False):
+        """
+        Start profiling all seismogram extractions of this database.
+
+        Returns a :class:`~instaseis.profiling.Profiler` object that
+        collects the timings and creates reports. Calling this method again
+        returns the same profiler.
+
+        :type trace_memory: bool, optional
+        :param trace_memory: Also record the memory allocated in each stage.
+            Starts :mod:`tracemalloc` (Python 3 only) which slows down
+            everything considerably.
+
+        >>> db = instaseis.open_db("/path/to/DB")  # doctest: +SKIP
+        >>> profiler = db.enable_profiling()  # doctest: +SKIP
+        >>> st = db.get_seismograms(source=src, receiver=rec)  # doctest: +SKIP
+        >>> print(profiler)  # doctest: +SKIP
+        """
+        # Avoid a circular import.
+        from ..profiling import Profiler
+
+        if self.profiler is None:
+            self.profiler = Profiler()
+            self.add_stage_observer(self.profiler.observe)
+            for name in Profiler.PROFILED_METHODS:
+                if hasattr(self, name):
+                    setattr(self, name,
+                            self.profiler.wrap(name, getattr(self, name)))
+        if trace_memory:
+            if tracemalloc is None:  # pragma: no cover
+                raise NotImplementedError(
+                    "Tracing the memory requires Python >= 3.4.")
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.profiler.started_memory_tracing = True
+        return self.profiler
+
+    def disable_profiling(self):
+        """
+        Stop profiling. Returns the profiler with all results so far.
+        """
+        from ..profiling import Profiler
+
+        profiler = self.profiler
+        if profiler is None:
+            return None
+        self.remove_stage_observer(profiler.observe)
+        if profiler.started_memory_tracing:
+            tracemalloc.stop()
+            profiler.started_memory_tracing = False
+        for name in Profiler.PROFILED_METHODS:
+            # Remove the wrappers from the instance.
+            if name in self.__dict__:
+                delattr(self, name)
+        del self.profiler
+        return profiler
+
+    def add_stage_observer(self, observer):
+        """
+        Register a function that is called after each stage of every
+        seismogram extraction with information about that stage.
+
+        The function is passed an object with the ``name`` of the stage,
+        its ``wall_time`` and ``cpu_time`` (of the whole process) in
+        seconds, ``nbytes``, the number of bytes read from disc during the
+        stage, ``reads``, a list of ``(dataset, indices, axis)`` tuples of
+        the HDF5 datasets read during the stage and the indices read along
+        one of their axes, and ``allocated_bytes``, the peak memory
+        allocated during the stage if :mod:`tracemalloc` is tracing,
+        otherwise ``None``. The
+        stages are ``"element_lookup"``, ``"read_planning"`` (only for
+        batches like finite sources), ``"hdf5_read"``, ``"strain"``,
+        ``"interpolation"``, ``"reconvolution"``, ``"resampling"``, and
+        ``"serialization"`` (only used by the server). Observers might be
+        called from multiple threads at once and should be fast.
+
+        :param observer: The function to call.
+        """
+        self._stage_observers = tuple(self._stage_observers) + (observer,)
+
+    def remove_stage_observer(self, observer):
+        """
+        Remove a previously registered stage observer.
+
+        :param observer: The function to remove.
+        """
+        self._stage_observers = tuple(
+            _i for _i in self._stage_observers if _i != observer)
+
+    def _stage(self, name):
+        """
+        Returns a context manager timing the given stage.
+        """
+        if not self._stage_observers:
+            return _NULL_STAGE
+        return _Stage(name, self._stage_observers)
+
     def get_greens_function(self, epicentral_distance_in_degree,
                             source_depth_in_m, origin_time=UTCDateTime(0),
                             kind='displacement', return_obspy_stream=True,
@@ -294,31 +479,34 @@ class BaseInstaseisDB(with_metaclass(ABCMeta)):
                         np.exp(- 1j * rfftfreq(self.info.nfft) *
                                2. * np.pi * source.time_shift / self.info.dt)
 
-                # Apply a 5 percent, at least 5 samples taper at the end.
-                # The first sample is guaranteed to be zero in any case.
-                tlen = max(int(math.ceil(0.05 * len(data[comp]))), 5)
-                taper = np.ones_like(data[comp])
-                taper[-tlen:] = scipy.signal.hann(tlen * 2)[tlen:]
-                dataf = np.fft.rfft(taper * data[comp], n=self.info.nfft)
+                with self._stage("reconvolution"):
+                    # Apply a 5 percent, at least 5 samples taper at the end.
+                    # The first sample is guaranteed to be zero in any case.
+                    tlen = max(int(math.ceil(0.05 * len(data[comp]))), 5)
+                    taper = np.ones_like(data[comp])
+                    taper[-tlen:] = scipy.signal.hann(tlen * 2)[tlen:]
+                    dataf = np.fft.rfft(taper * data[comp],
+                                        n=self.info.nfft)
 
-                # Ensure numerical stability by not dividing with zero.
-                f = stf_conv_f
-                _l = np.abs(stf_deconv_f)
-                _idx = np.where(_l > 0.0)
-                f[_idx] /= stf_deconv_f[_idx]
-                f[_l == 0] = 0 + 0j
+                    # Ensure numerical stability by not dividing with zero.
+                    f = stf_conv_f
+                    _l = np.abs(stf_deconv_f)
+                    _idx = np.where(_l > 0.0)
+                    f[_idx] /= stf_deconv_f[_idx]
+                    f[_l == 0] = 0 + 0j
 
-                data[comp] = np.fft.irfft(dataf * f)[:self.info.npts]
+                    data[comp] = np.fft.irfft(dataf * f)[:self.info.npts]
 
             if dt is not None:
-                data[comp] = lanczos_interpolation(
-                    data=np.require(data[comp], requirements=["C"]),
-                    old_start=0, old_dt=self.info.dt,
-                    new_start=time_information["time_shift_at_beginning"],
-                    new_dt=dt,
-                    new_npts=time_information["npts_before_shift_removal"],
-                    a=kernelwidth,
-                    window="blackman")
+                with self._stage("resampling"):
+                    data[comp] = lanczos_interpolation(
+                        data=np.require(data[comp], requirements=["C"]),
+                        old_start=0, old_dt=self.info.dt,
+                        new_start=time_information["time_shift_at_beginning"],
+                        new_dt=dt,
+                        new_npts=time_information["npts_before_shift_removal"],
+                        a=kernelwidth,
+                        window="blackman")
 
             # Integrate/differentiate before removing the source shift in
             # order to reduce boundary effects at the start of the signal.
@@ -340,6 +528,59 @@ class BaseInstaseisDB(with_metaclass(ABCMeta)):
         else:
             return data
 
+    def get_seismograms_batch(self, sources, receivers, window=None,
+                              **kwargs):
+        """
+        Extract seismograms for a batch of source-receiver pairs.
+
+        The pairs are processed in an order that reuses the buffered
+        elements and HDF5 chunks as much as possible but the seismograms are
+        returned in the order of the pairs.
+
+        :param sources: The sources. A single source is used for all
+            receivers.
+        :type sources: :class:`instaseis.source.Source` or list of them
+        :param receivers: The receivers. A single receiver is used for all
+            sources.
+        :type receivers: :class:`instaseis.source.Receiver`, list of them or
+            :class:`instaseis.source.ReceiverArray`
+        :type window: int, optional
+        :param window: Maximum number of consecutive pairs that can be
+            reordered. Defaults to
+            :data:`~instaseis.database_interfaces.scheduler.DEFAULT_WINDOW`.
+
+        All other keyword arguments are passed to
+        :meth:`~instaseis.database_interfaces.base_instaseis_db.BaseInstaseisDB.get_seismograms`.
+
+        :returns: One result of
+            :meth:`~instaseis.database_interfaces.base_instaseis_db.BaseInstaseisDB.get_seismograms`
+            per pair.
+        :rtype: list
+        """  # NOQA
+        pairs = _get_pairs(sources, receivers)
+        scheduler = LocalityScheduler(
+            self, window=DEFAULT_WINDOW if window is None else window)
+        return scheduler.map(
+            lambda src, rec: self.get_seismograms(
+                source=src, receiver=rec, **kwargs), pairs)
+
+    def _coalesced_reads(self, pairs, components, order=None):
+        """
+        Generator yielding the indices of the source-receiver pairs in groups
+        in the given order. Implementations can read the data of each group
+        in one go before yielding it.
+        """
+        if order is None:
+            order = list(range(len(pairs)))
+        yield list(order)
+
+    def _get_locality_keys(self, pairs):
+        """
+        Sort keys grouping source-receiver pairs that read the same parts of
+        the database. ``None`` if not supported by a database.
+        """
+        return None
+
     @staticmethod
     def _convert_to_stream(receiver, components, data, dt_out, starttime,
                            add_band_code=True):
@@ -430,43 +671,85 @@ class BaseInstaseisDB(with_metaclass(ABCMeta)):
         if not self.info.is_reciprocal:
             raise NotImplementedError
 
+        data_summed = self._sum_finite_source(
+            sources=sources, receiver=receiver, components=components,
+            correct_mu=correct_mu, progress_callback=progress_callback)
+        if data_summed is None:
+            return None
+        return self._finite_source_to_stream(
+            data_summed=data_summed, receiver=receiver,
+            components=components, kind=kind, dt=dt,
+            kernelwidth=kernelwidth)
+
+    def _sum_finite_source(self, sources, receiver, components,
+                           correct_mu=False, progress_callback=None):
+        """
+        Sum of the seismograms of all point sources of a finite source at
+        the sampling of the database, reconvolved with their sliprates. The
+        sum is linear so partial sums over subsets of the point sources add
+        up to the full sum.
+
+        Returns a dictionary with an array per component or ``None`` if the
+        progress callback cancelled the calculation.
+        """
         data_summed = {}
         count = len(sources)
-        for _i, source in enumerate(sources):
-            # Don't perform the diff/integration here, but after the
-            # resampling later on.
-            data = self.get_seismograms(
-                source, receiver, components, reconvolve_stf=True,
-                # Effectively results in nothing happening.
-                kind=INV_KIND_MAP[STF_MAP[self.info.stf]],
-                return_obspy_stream=False, remove_source_shift=False)
-
-            if correct_mu:
-                corr_fac = data["mu"] / DEFAULT_MU,
-            else:
-                corr_fac = 1
-
-            for comp in components:
-                if comp in data_summed:
-                    data_summed[comp] += data[comp] * corr_fac
+        # The sum does not depend on the order so process the point sources
+        # in the order that is most efficient to read. The data of many
+        # point sources is then read in a few large I/O operations.
+        pairs = [(_i, receiver) for _i in sources]
+        reads = contextlib.closing(self._coalesced_reads(
+            pairs, components, order=LocalityScheduler(self).get_order(
+                pairs)))
+        with reads as groups:
+            for _i, index in enumerate(
+                    itertools.chain.from_iterable(groups)):
+                # The same object as in the planning of the reads.
+                source = pairs[index][0]
+                # Don't perform the diff/integration here, but after the
+                # resampling later on.
+                data = self.get_seismograms(
+                    source, receiver, components, reconvolve_stf=True,
+                    # Effectively results in nothing happening.
+                    kind=INV_KIND_MAP[STF_MAP[self.info.stf]],
+                    return_obspy_stream=False, remove_source_shift=False)
+
+                if correct_mu:
+                    corr_fac = data["mu"] / DEFAULT_MU,
                 else:
-                    data_summed[comp] = data[comp] * corr_fac
-            # Only used for the GUI.
-            if progress_callback:  # pragma: no cover
-                cancel = progress_callback(_i + 1, count)
-                if cancel:
-                    return None
-
+                    corr_fac = 1
+
+                for comp in components:
+                    if comp in data_summed:
+                        data_summed[comp] += data[comp] * corr_fac
+                    else:
+                        data_summed[comp] = data[comp] * corr_fac
+                # Only used for the GUI.
+                if progress_callback:  # pragma: no cover
+                    cancel = progress_callback(_i + 1, count)
+                    if cancel:
+                        return None
+        return data_summed
+
+    def _finite_source_to_stream(self, data_summed, receiver, components,
+                                 kind, dt, kernelwidth):
+        """
+        Resamples and differentiates or integrates the summed seismograms of
+        a finite source and converts them to a stream.
+        """
         if dt is not None:
             for comp in components:
                 # We don't need to align a sample to the peak of the source
                 # time function here.
                 new_npts = int(round(
-                    (len(data[comp]) - 1) * self.info.dt / dt, 6) + 1)
-                data_summed[comp] = lanczos_interpolation(
-                    data=np.require(data_summed[comp], requirements=["C"]),
-                    old_start=0, old_dt=self.info.dt, new_start=0, new_dt=dt,
-                    new_npts=new_npts, a=kernelwidth, window="blackman")
+                    (len(data_summed[comp]) - 1) * self.info.dt / dt, 6) + 1)
+                with self._stage("resampling"):
+                    data_summed[comp] = lanczos_interpolation(
+                        data=np.require(data_summed[comp],
+                                        requirements=["C"]),
+                        old_start=0, old_dt=self.info.dt, new_start=0,
+                        new_dt=dt, new_npts=new_npts, a=kernelwidth,
+                        window="blackman")
 
                 # The resampling assumes zeros outside the data range. This
                 # does not introduce any errors at the beginning as the data is
@@ -783,6 +1066,28 @@ class BaseInstaseisDB(with_metaclass(ABCMeta)):
         return components
 
 
+def _get_pairs(sources, receivers):
+    """
+    Source-receiver pairs of a batch. A single source or receiver is paired
+    with all the others. Receiver arrays yield views on their columns.
+    """
+    if isinstance(sources, (Source, ForceSource)):
+        sources = [sources]
+    if isinstance(receivers, Receiver):
+        receivers = [receivers]
+    sources = list(sources)
+    receivers = list(receivers)
+
+    if len(sources) == 1:
+        sources = sources * len(receivers)
+    elif len(receivers) == 1:
+        receivers = receivers * len(sources)
+    if len(sources) != len(receivers):
+        raise ValueError("Sources and receivers must have the same length "
+                         "or one of them must be a single object.")
+    return list(zip(sources, receivers))
+
+
 def _get_seismogram_times(info, origin_time, dt, kernelwidth,
                           remove_source_shift, reconvolve_stf=False):
     """
@@ -22,13 +22,16 @@ import collections
 import numpy as np
 from obspy.signal.util import next_pow_2
 import os
+import threading
 
 from .base_instaseis_db import BaseInstaseisDB
+from . import io_planner
 from .. import finite_elem_mapping
 from .. import helpers
 from .. import rotations
 from .. import sem_derivatives
 from .. import spectral_basis
+from ..source import ForceSource, Receiver, Source
 
 
 ElementInfo = collections.namedtuple("ElementInfo", [
@@ -65,6 +68,21 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
         self.db_path = db_path
         self.buffer_size_in_mb = buffer_size_in_mb
         self.read_on_demand = read_on_demand
+        self._local = threading.local()
+
+    @property
+    def _planned_lookups(self):
+        """
+        Coordinates and element information of the source-receiver pairs
+        whose reads have been planned but that have not yet been extracted.
+        Keyed by the ids of the source and receiver objects. Per thread as
+        each thread works on its own batch.
+        """
+        try:
+            return self._local.planned_lookups
+        except AttributeError:
+            self._local.planned_lookups = {}
+            return self._local.planned_lookups
 
     def _get_element_info(self, coordinates):
         """
@@ -174,6 +192,27 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
         :param components: The requests components. Any combinations of
             ``"Z"``, ``"N"``, ``"E"``, ``"R"``, and ``"T"``
         """
+        # Reuse the element lookup of the read planning.
+        planned = self._planned_lookups.pop((id(source), id(receiver)), None)
+        if planned is not None and planned[0] is source and \
+                planned[1] is receiver:
+            coordinates, element_info = planned[2:]
+        else:
+            with self._stage("element_lookup"):
+                coordinates = self._get_coordinates(source=source,
+                                                    receiver=receiver)
+                element_info = self._get_element_info(
+                    coordinates=coordinates)
+
+        return self._get_data(
+            source=source, receiver=receiver, components=components,
+            coordinates=coordinates, element_info=element_info)
+
+    def _get_coordinates(self, source, receiver):
+        """
+        The coordinates in the frame of the database at which the wavefield
+        has to be sampled for a source-receiver pair.
+        """
         if self.info.is_reciprocal:
             a, b = source, receiver
         else:
@@ -185,13 +224,198 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
             a.z(planet_radius=self.info.planet_radius),
             b.longitude, b.colatitude)
 
-        coordinates = Coordinates(s=rotmesh_s, phi=rotmesh_phi, z=rotmesh_z)
+        return Coordinates(s=rotmesh_s, phi=rotmesh_phi, z=rotmesh_z)
 
-        element_info = self._get_element_info(coordinates=coordinates)
+    @staticmethod
+    def _get_rotation_matrix(source, receiver, coordinates):
+        """
+        Rotation of a source to the frame of the database in reciprocal
+        mode.
+        """
+        return rotations.get_rotation_matrix_src_to_rec(
+            np.deg2rad(source.longitude), np.deg2rad(source.colatitude),
+            np.deg2rad(receiver.longitude), np.deg2rad(receiver.colatitude),
+            coordinates.phi)
 
-        return self._get_data(
-            source=source, receiver=receiver, components=components,
-            coordinates=coordinates, element_info=element_info)
+    def _get_locality_keys(self, pairs):
+        """
+        Sort keys of source-receiver pairs. Pairs with close keys read the
+        same or neighbouring elements and HDF5 chunks.
+
+        The element is approximated by the closest point of the kd-tree -
+        good enough to group the pairs but much cheaper than the exact
+        lookup.
+        """
+        keys = np.zeros(len(pairs), dtype=np.int64)
+        # Pairs that still have to be parsed are processed first.
+        valid = [_i for _i, (source, receiver) in enumerate(pairs)
+                 if isinstance(source, (Source, ForceSource)) and
+                 isinstance(receiver, Receiver)]
+        if not valid:
+            return keys
+
+        if self.info.is_reciprocal:
+            a = [pairs[_i][0] for _i in valid]
+            b = [pairs[_i][1] for _i in valid]
+        else:
+            a = [pairs[_i][1] for _i in valid]
+            b = [pairs[_i][0] for _i in valid]
+        xyz = rotations.coord_transform_lat_lon_depth_to_xyz(
+            [_i.latitude for _i in a], [_i.longitude for _i in a],
+            [_i.depth_in_m or 0.0 for _i in a],
+            planet_radius=self.info.planet_radius)
+        s_, _, z_ = rotations.rotate_frame_rd(
+            xyz[:, 0], xyz[:, 1], xyz[:, 2], [_i.longitude for _i in b],
+            [_i.colatitude for _i in b])
+
+        _, ids = self.parsed_mesh.kdtree.query(
+            np.array([s_, z_]).T, k=1)
+        ids = np.asarray(ids, dtype=np.int64)
+
+        mesh = self.parsed_mesh
+        if "MergedSnapshots" in mesh.f:
+            # Merged databases store each element in one piece.
+            ds = mesh.f["MergedSnapshots"]
+            chunk_size = ds.chunks[0] if ds.chunks else 1
+            point_ids = ids
+        else:
+            # The data is stored per GLL point - use the midpoint of the
+            # elements.
+            if self.info.dump_type == "displ_only" and \
+                    not self.read_on_demand:
+                npol = self.info.spatial_order
+                point_ids = mesh.sem_mesh[ids, npol // 2, npol // 2]
+            else:
+                point_ids = ids
+            var, axis = next(iter(sorted(mesh.time_axis.items())))
+            ds = mesh.f["Snapshots"][var]
+            chunk_size = ds.chunks[1 - axis] if ds.chunks else 1
+
+        # Sort by chunk and then by element.
+        keys[valid] = (point_ids // chunk_size) * (ids.max() + 1) + ids + 1
+        return keys
+
+    def _get_coalesced_datasets(self, components):
+        """
+        The datasets that have to be read for the given components as a list
+        of ``(mesh, name, dataset, axis)`` tuples. ``axis`` is the axis of
+        the spatial index.
+        """
+        if hasattr(self.meshes, "merged"):
+            mesh = self.meshes.merged
+            return [(mesh, "MergedSnapshots", mesh.f["MergedSnapshots"], 0)]
+
+        meshes = []
+        if "Z" in components:
+            meshes.append(self.meshes.pz)
+        if any(comp in components for comp in ["N", "E", "R", "T"]):
+            meshes.append(self.meshes.px)
+
+        datasets = []
+        for mesh in meshes:
+            for name, axis in sorted(mesh.time_axis.items()):
+                datasets.append(
+                    (mesh, name, mesh.f["Snapshots"][name], 1 - axis))
+        return datasets
+
+    def _coalesced_reads(self, pairs, components, order=None):
+        """
+        Generator yielding the indices of the pairs in consecutive groups.
+
+        All the elements required by a group that are not yet buffered are
+        read before the group is yielded. Adjacent elements are merged into
+        a few large reads and kept in memory until the next group is
+        requested.
+        """
+        if order is None:
+            order = list(range(len(pairs)))
+        datasets = self._get_coalesced_datasets(components)
+        # Only implemented for reciprocal databases for now - it is mainly
+        # used for finite sources.
+        if not self.info.is_reciprocal or not datasets:
+            yield list(order)
+            return
+
+        max_ids = max(io_planner.MAX_BLOCK_SIZE_IN_MB * 1024 ** 2 // sum(
+            io_planner.get_bytes_per_index(_i[2], _i[3]) for _i in datasets),
+            1)
+
+        group = []
+        ids = set()
+        try:
+            for index in order:
+                new_ids = self._get_ids_to_read(*pairs[index],
+                                                datasets=datasets)
+                if group and len(ids.union(new_ids)) > max_ids:
+                    for _i in self._read_blocks(datasets, group, ids):
+                        yield _i
+                    group = []
+                    ids = set()
+                group.append(index)
+                ids.update(new_ids)
+
+            if group:
+                for _i in self._read_blocks(datasets, group, ids):
+                    yield _i
+        finally:
+            # Lookups of pairs that have not been extracted.
+            self._planned_lookups.clear()
+
+    def _get_ids_to_read(self, source, receiver, datasets):
+        """
+        Indices of the datasets a source-receiver pair requires and that are
+        not yet buffered.
+        """
+        if not isinstance(source, (Source, ForceSource)) or \
+                not isinstance(receiver, Receiver):
+            return []
+
+        try:
+            with self._stage("read_planning"):
+                coordinates = self._get_coordinates(source=source,
+                                                    receiver=receiver)
+                ei = self._get_element_info(coordinates=coordinates)
+        except Exception:
+            # The error is raised again once the pair is extracted.
+            return []
+        # Handed over to the extraction so the element is only looked up
+        # once. The objects are kept so their ids cannot be reused.
+        self._planned_lookups[(id(source), id(receiver))] = (
+            source, receiver, coordinates, ei)
+
+        # The buffers store the final strain or displacement.
+        if isinstance(source, Source):
+            buffers = [_i[0].strain_buffer for _i in datasets]
+        else:
+            buffers = [_i[0].displ_buffer for _i in datasets]
+        if all(_i.is_buffered(ei.id_elem) for _i in buffers):
+            return []
+
+        if datasets[0][1] == "MergedSnapshots" or \
+                self.info.dump_type != "displ_only":
+            return [ei.id_elem]
+        return ei.gll_point_ids.ravel()
+
+    def _read_blocks(self, datasets, group, ids):
+        """
+        Read the blocks for a group, yield the group, and discard the blocks
+        again.
+        """
+        ids = sorted(ids)
+        try:
+            if ids:
+                with self._stage("hdf5_read") as stage:
+                    nbytes = 0
+                    for mesh, name, ds, axis in datasets:
+                        block = io_planner.DataBlock(ds, ids, axis=axis)
+                        mesh.blocks[name] = block
+                        nbytes += block.nbytes
+                        stage.add_read(ds, ids, axis=axis)
+                    stage.nbytes = nbytes
+            yield group
+        finally:
+            for mesh, name, _, _ in datasets:
+                mesh.blocks.pop(name, None)
 
     def _get_strain_interp(self, mesh, id_elem, gll_point_ids, G, GT,
                            col_points_xi, col_points_eta, corner_points,
@@ -217,40 +441,14 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
                 # support legacy as well as modern, transposed databases.
                 time_axis = mesh.time_axis[var]
 
-                # Chunk the I/O by requesting successive indices in one go -
-                # this actually makes quite a big difference on some file
-                # systems.
-                chunks = helpers.io_chunker(s_ids)
-                _temp = []
-                m = mesh_dict[var]
-                if time_axis == 0:
-                    for _c in chunks:
-                        if isinstance(_c, list):
-                            _temp.append(m[:, _c[0]:_c[1]])
-                        else:
-                            _temp.append(m[:, _c])
+                block = mesh.blocks.get(var)
+                if block is not None and s_ids in block:
+                    _temp = block.take(s_ids)
+                    if time_axis != 0:
+                        _temp = _temp.T
                 else:
-                    for _c in chunks:
-                        if isinstance(_c, list):
-                            _temp.append(m[_c[0]:_c[1], :].T)
-                        else:
-                            _temp.append(m[_c, :].T)
-
-                _t = np.empty((_temp[0].shape[0], 25),
-                              dtype=_temp[0].dtype)
-
-                k = 0
-                for _i in _temp:
-                    if len(_i.shape) == 1:
-                        _t[:, k] = _i
-                        k += 1
-                    else:
-                        for _j in range(_i.shape[1]):
-                            _t[:, k + _j] = _i[:, _j]
-
-                        k += _j + 1
-
-                _temp = _t
+                    _temp = self._read_gll_points(mesh_dict[var], s_ids,
+                                                  time_axis)
 
                 for ipol in range(mesh.npol + 1):
                     for jpol in range(mesh.npol + 1):
@@ -264,9 +462,10 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
                 "dipole": sem_derivatives.strain_dipole_td,
                 "quadpole": sem_derivatives.strain_quadpole_td}
 
-            strain = strain_fct_map[mesh.excitation_type](
-                utemp, G, GT, col_points_xi, col_points_eta, mesh.npol,
-                mesh.ndumps, corner_points, eltype, axis)
+            with self._stage("strain"):
+                strain = strain_fct_map[mesh.excitation_type](
+                    utemp, G, GT, col_points_xi, col_points_eta, mesh.npol,
+                    mesh.ndumps, corner_points, eltype, axis)
 
             mesh.strain_buffer.add(id_elem, strain)
         else:
@@ -274,9 +473,11 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
 
         final_strain = np.empty((strain.shape[0], 6), order="F")
 
-        for i in range(6):
-            final_strain[:, i] = spectral_basis.lagrange_interpol_2D_td(
-                col_points_xi, col_points_eta, strain[:, :, :, i], xi, eta)
+        with self._stage("interpolation"):
+            for i in range(6):
+                final_strain[:, i] = spectral_basis.lagrange_interpol_2D_td(
+                    col_points_xi, col_points_eta, strain[:, :, :, i], xi,
+                    eta)
 
         if not mesh.excitation_type == "monopole":
             final_strain[:, 3] *= -1.0
@@ -284,6 +485,48 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
 
         return final_strain
 
+    def _read_gll_points(self, m, s_ids, time_axis):
+        """
+        Read the given sorted GLL points of a variable. Returns an array of
+        shape (npts, len(s_ids)).
+        """
+        # Chunk the I/O by requesting successive indices in one go -
+        # this actually makes quite a big difference on some file
+        # systems.
+        chunks = helpers.io_chunker(s_ids)
+        _temp = []
+        with self._stage("hdf5_read") as stage:
+            if time_axis == 0:
+                for _c in chunks:
+                    if isinstance(_c, list):
+                        _temp.append(m[:, _c[0]:_c[1]])
+                    else:
+                        _temp.append(m[:, _c])
+            else:
+                for _c in chunks:
+                    if isinstance(_c, list):
+                        _temp.append(m[_c[0]:_c[1], :].T)
+                    else:
+                        _temp.append(m[_c, :].T)
+            stage.nbytes = sum(_i.nbytes for _i in _temp)
+            stage.add_read(m, s_ids, axis=1 - time_axis)
+
+        _t = np.empty((_temp[0].shape[0], len(s_ids)),
+                      dtype=_temp[0].dtype)
+
+        k = 0
+        for _i in _temp:
+            if len(_i.shape) == 1:
+                _t[:, k] = _i
+                k += 1
+            else:
+                for _j in range(_i.shape[1]):
+                    _t[:, k + _j] = _i[:, _j]
+
+                k += _j + 1
+
+        return _t
+
     def _get_strain(self, mesh, id_elem):
         if id_elem not in mesh.strain_buffer:
             strain_temp = np.zeros((self.info.npts, 6), order="F")
@@ -300,8 +543,15 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
                 # support legacy as well as modern, transposed databases.
                 time_axis = mesh.time_axis[var]
 
-                if time_axis == 0:
-                    strain_temp[:, i] = mesh_dict[var][:, id_elem]
+                block = mesh.blocks.get(var)
+                if block is not None and id_elem in block:
+                    strain_temp[:, i] = np.squeeze(block.take([id_elem]))
+                elif time_axis == 0:
+                    with self._stage("hdf5_read") as stage:
+                        temp = mesh_dict[var][:, id_elem]
+                        stage.nbytes = temp.nbytes
+                        stage.add_read(mesh_dict[var], [id_elem], axis=1)
+                    strain_temp[:, i] = temp
                 else:  # pragma: no cover
                     # We don't have an example for this yet so we just raise
                     # here for now - implementing it should just be a matter
@@ -350,15 +600,26 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
                 ids = gll_point_ids.flatten()
                 s_ids = np.sort(ids)
 
+                block = mesh.blocks.get(var)
+                if block is not None and s_ids in block:
+                    temp = block.take(s_ids)
+                else:
+                    with self._stage("hdf5_read") as stage:
+                        if time_axis == 0:
+                            temp = mesh_dict[var][:, s_ids]
+                        else:
+                            temp = mesh_dict[var][s_ids, :]
+                        stage.nbytes = temp.nbytes
+                        stage.add_read(mesh_dict[var], s_ids,
+                                       axis=1 - time_axis)
+
                 if time_axis == 0:
-                    temp = mesh_dict[var][:, s_ids]
                     for ipol in range(mesh.npol + 1):
                         for jpol in range(mesh.npol + 1):
                             idx = ipol * 5 + jpol
                             utemp[:, jpol, ipol, i] = \
                                 temp[:, np.argwhere(s_ids == ids[idx])[0][0]]
                 else:
-                    temp = mesh_dict[var][s_ids, :]
                     for ipol in range(mesh.npol + 1):
                         for jpol in range(mesh.npol + 1):
                             idx = ipol * 5 + jpol
@@ -371,9 +632,12 @@ class BaseNetCDFInstaseisDB(with_metaclass(ABCMeta, BaseInstaseisDB)):
 
         final_displacement = np.empty((utemp.shape[0], 3), order="F")
 
-        for i in range(3):
-            final_displacement[:, i] = spectral_basis.lagrange_interpol_2D_td(
-                col_points_xi, col_points_eta, utemp[:, :, :, i], xi, eta)
+        with self._stage("interpolation"):
+            for i in range(3):
+                final_displacement[:, i] = \
+                    spectral_basis.lagrange_interpol_2D_td(
+                        col_points_xi, col_points_eta, utemp[:, :, :, i], xi,
+                        eta)
 
         return final_displacement
 
@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disc cache for remote databases.
+
+Remote databases download the raw seismograms of every source-receiver
+pair and process them locally. The raw seismograms only depend on the
+request parameters and on the database behind the server so they can be
+reused across runs.
+
+The seismograms are appended to a few large segment files instead of
+being stored in one file each, which keeps the number of files and the
+cost of evictions independent of the number of cached seismograms. Each
+segment has a small index file listing the offsets of its records. Every
+process appends to its own segment and starts a new one once it is full.
+The oldest segments are deleted as a whole once the cache exceeds its
+size. Seismograms read from the oldest segments are copied to the newest
+one so frequently used seismograms survive the eviction of their segment.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import hashlib
+import io
+import json
+import os
+import struct
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from ..helpers import _delta_shuffle_compress, _delta_shuffle_decompress
+
+from future import standard_library
+with standard_library.hooks():
+    from urllib.parse import urlencode
+
+
+DEFAULT_CACHE_SIZE_GB = 10.0
+# Upper limit of the size of a segment. Smaller caches use smaller segments
+# so an eviction only removes a small part of them.
+MAX_SEGMENT_SIZE_IN_MB = 64.0
+# Seismograms read from the oldest part of a full cache are copied to the
+# newest segment.
+COPY_FORWARD_FRACTION = 0.25
+
+_HEADER = struct.Struct(str("<4sI"))
+_MAGIC = b"ISC1"
+
+
+def get_key(*values):
+    """
+    Hash of any number of JSON serializable values.
+    """
+    values = json.dumps(values, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(values.encode("utf-8")).hexdigest()
+
+
+def get_request_key(identity, params):
+    """
+    Key of the raw seismograms of a request. The parameters are encoded
+    exactly as they are sent to the server.
+
+    :param identity: Identity of the database behind the server.
+    :param params: The request parameters.
+    :type params: dict
+    """
+    return get_key(identity, urlencode(sorted(params.items())))
+
+
+def _encode(data):
+    """
+    Serializes the seismograms of a key to a single record. Float32 arrays
+    are compressed losslessly, all other arrays are stored as they are.
+    """
+    arrays = []
+    blobs = []
+    for name in sorted(data):
+        if name == "mu":
+            continue
+        array = np.asarray(data[name])
+        if array.dtype == np.float32:
+            blob = _delta_shuffle_compress(array.ravel())
+            dtype = "z<f4"
+        else:
+            array = array.astype(array.dtype.newbyteorder("<"))
+            blob = array.tobytes()
+            dtype = array.dtype.str
+        arrays.append([name, dtype, list(array.shape), len(blob)])
+        blobs.append(blob)
+    header = json.dumps({"mu": float(data["mu"]),
+                         "arrays": arrays}).encode("utf-8")
+    return b"".join([_HEADER.pack(_MAGIC, len(header)), header] + blobs)
+
+
+def _decode(record):
+    """
+    Inverse of :func:`_encode`. Raises a ``ValueError`` for broken records.
+    """
+    magic, header_size = _HEADER.unpack(record[:_HEADER.size])
+    if magic != _MAGIC:
+        raise ValueError("Not a cached seismogram.")
+    offset = _HEADER.size + header_size
+    header = json.loads(record[_HEADER.size:offset].decode("utf-8"))
+    data = {"mu": header["mu"]}
+    for name, dtype, shape, size in header["arrays"]:
+        blob = record[offset:offset + size]
+        if len(blob) != size:
+            raise ValueError("Truncated record.")
+        offset += size
+        npts = int(np.prod(shape))
+        if dtype == "z<f4":
+            array = _delta_shuffle_decompress(blob, npts)
+        else:
+            array = np.frombuffer(blob, dtype=dtype).copy()
+        data[name] = array.reshape(shape)
+    return data
+
+
+class SeismogramCache(object):
+    """
+    Cache of raw seismograms in a directory evicting the least recently used
+    ones first.
+
+    The cache can be shared by several processes. Each process sees the
+    seismograms written by the others.
+
+    :param cache_dir: The directory of the cache. Will be created if it does
+        not exist.
+    :type cache_dir: str
+    :param cache_size_gb: The maximum size of all cached seismograms in GB.
+    :type cache_size_gb: float, optional
+    :param segment_size_in_mb: The size of each segment file. Defaults to a
+        16th of the cache size but at most 64 MB.
+    :type segment_size_in_mb: float, optional
+    """
+    def __init__(self, cache_dir, cache_size_gb=DEFAULT_CACHE_SIZE_GB,
+                 segment_size_in_mb=None):
+        if cache_size_gb <= 0:
+            raise ValueError("cache_size_gb must be positive.")
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size_in_bytes = int(cache_size_gb * 1024 ** 3)
+        if segment_size_in_mb is None:
+            self.segment_size_in_bytes = min(
+                int(MAX_SEGMENT_SIZE_IN_MB * 1024 ** 2),
+                self.max_size_in_bytes // 16)
+        else:
+            self.segment_size_in_bytes = int(segment_size_in_mb * 1024 ** 2)
+        self._segment_dir = os.path.join(self.cache_dir, "segments")
+        self._document_dir = os.path.join(self.cache_dir, "documents")
+        for directory in (self._segment_dir, self._document_dir):
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        # The segment, offset, and size of the record of each key.
+        self._entries = {}
+        # Sizes of all segments, the oldest first.
+        self._segments = collections.OrderedDict()
+        # Number of bytes of each index file already read.
+        self._index_offsets = {}
+        # The segment this process appends to.
+        self._current_segment = None
+        self.size_in_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        with self._lock:
+            self._refresh()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _get_filename(self, segment, extension=".seg"):
+        return os.path.join(self._segment_dir, segment + extension)
+
+    def _refresh(self):
+        """
+        Picks up the segments written and deleted by other processes. Must
+        be called with the lock held.
+        """
+        segments = sorted(_i[:-4] for _i in os.listdir(self._segment_dir)
+                          if _i.endswith(".seg"))
+        for segment in set(self._segments) - set(segments):
+            self._forget(segment)
+
+        for segment in segments:
+            if segment == self._current_segment:
+                continue
+            try:
+                size = os.path.getsize(self._get_filename(segment))
+                with io.open(self._get_filename(segment, ".idx"),
+                             "rb") as fh:
+                    fh.seek(self._index_offsets.get(segment, 0))
+                    lines = fh.read()
+            except (IOError, OSError):
+                continue
+            # Only complete lines, the rest might still be written.
+            lines = lines[:lines.rfind(b"\n") + 1]
+            self._index_offsets[segment] = \
+                self._index_offsets.get(segment, 0) + len(lines)
+            for line in lines.decode("utf-8").splitlines():
+                key, offset, nbytes = line.split()
+                self._entries[key] = (segment, int(offset), int(nbytes))
+            self.size_in_bytes += size - self._segments.get(segment, 0)
+            self._segments[segment] = size
+        # Keep the order of creation.
+        self._segments = collections.OrderedDict(
+            sorted(self._segments.items()))
+
+    def _forget(self, segment):
+        """
+        Removes a segment from the bookkeeping. Must be called with the lock
+        held.
+        """
+        self.size_in_bytes -= self._segments.pop(segment, 0)
+        self._index_offsets.pop(segment, None)
+        if segment == self._current_segment:
+            self._current_segment = None
+        for key in [_k for _k, _v in self._entries.items()
+                    if _v[0] == segment]:
+            del self._entries[key]
+
+    def _is_old(self, segment):
+        """
+        Whether the segment belongs to the part of a full cache that is
+        evicted next. Must be called with the lock held.
+        """
+        newer = 0
+        for _s in reversed(self._segments):
+            if _s == segment:
+                break
+            newer += self._segments[_s]
+        return newer > (1.0 - COPY_FORWARD_FRACTION) * self.max_size_in_bytes
+
+    def get(self, key):
+        """
+        The cached seismograms of a key as a dictionary of the arrays of each
+        component and ``"mu"``, None if not cached.
+        """
+        with self._lock:
+            location = self._entries.get(key)
+            if location is None:
+                # Might have been written by another process.
+                self._refresh()
+                location = self._entries.get(key)
+        try:
+            if location is None:
+                raise ValueError("Not cached.")
+            segment, offset, nbytes = location
+            with io.open(self._get_filename(segment), "rb") as fh:
+                fh.seek(offset)
+                record = fh.read(nbytes)
+            data = _decode(record)
+        except Exception:
+            with self._lock:
+                self.misses += 1
+                if location is not None and \
+                        self._entries.get(key) == location:
+                    del self._entries[key]
+            return None
+
+        with self._lock:
+            self.hits += 1
+            copy_forward = self._is_old(segment)
+        if copy_forward:
+            self._append(key, record)
+        return data
+
+    def put(self, key, data):
+        """
+        Caches the seismograms of a key and removes the oldest segments if
+        the cache is too large.
+
+        :param data: Dictionary with the arrays of each component and
+            ``"mu"``.
+        """
+        self._append(key, _encode(data))
+
+    def _append(self, key, record):
+        with self._lock:
+            segment = self._current_segment
+            if segment is not None and \
+                    not os.path.exists(self._get_filename(segment)):
+                # Evicted by another process.
+                self._forget(segment)
+                segment = None
+            if segment is None or (
+                    self._segments[segment] and
+                    self._segments[segment] + len(record) >
+                    self.segment_size_in_bytes):
+                # Names sort in the order of creation.
+                segment = "%020i-%s" % (int(time.time() * 1E6),
+                                        uuid.uuid4().hex[:8])
+                self._current_segment = segment
+                self._segments[segment] = 0
+                self._index_offsets[segment] = 0
+
+            offset = self._segments[segment]
+            with io.open(self._get_filename(segment), "ab") as fh:
+                fh.write(record)
+            # The index is written last so other processes only see
+            # complete records.
+            line = ("%s %i %i\n" % (key, offset, len(record))).encode(
+                "utf-8")
+            with io.open(self._get_filename(segment, ".idx"), "ab") as fh:
+                fh.write(line)
+            self._index_offsets[segment] += len(line)
+            self._segments[segment] += len(record)
+            self.size_in_bytes += len(record)
+            self._entries[key] = (segment, offset, len(record))
+
+            while self.size_in_bytes > self.max_size_in_bytes:
+                oldest = next(_s for _s in self._segments
+                              if _s != self._current_segment) \
+                    if len(self._segments) > 1 else None
+                if oldest is None:
+                    break
+                self._remove(oldest)
+
+    def _remove(self, segment):
+        """
+        Deletes a segment. Must be called with the lock held.
+        """
+        self._forget(segment)
+        for extension in (".idx", ".seg"):
+            try:
+                os.remove(self._get_filename(segment, extension))
+            except OSError:
+                pass
+
+    def _write(self, filename, write):
+        """
+        Writes to a temporary file first so other readers never see
+        partially written files.
+        """
+        directory = os.path.dirname(filename)
+        temp_filename = os.path.join(directory, ".%s.tmp" % uuid.uuid4().hex)
+        try:
+            with io.open(temp_filename, "wb") as fh:
+                write(fh)
+            if os.path.exists(filename):  # pragma: no cover
+                os.remove(filename)
+            os.rename(temp_filename, filename)
+        finally:
+            if os.path.exists(temp_filename):  # pragma: no cover
+                os.remove(temp_filename)
+
+    def get_document(self, name):
+        """
+        A cached JSON document, e.g. the information about a database. None
+        if not cached.
+        """
+        filename = os.path.join(self._document_dir, get_key(name) + ".json")
+        try:
+            with io.open(filename, "rt", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def put_document(self, name, document):
+        """
+        Caches a JSON document. Documents do not count towards the size of
+        the cache.
+        """
+        document = json.dumps(document, sort_keys=True).encode("utf-8")
+        self._write(
+            os.path.join(self._document_dir, get_key(name) + ".json"),
+            lambda fh: fh.write(document))
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Instaseis database class distributing the requests over several servers.
+
+All servers have to serve the same database. Single seismograms go to the
+least busy server. Finite sources are split into chunks of point sources,
+each server sums the seismograms of a chunk at the sampling of the database
+and the client adds up these partial sums and does the final processing.
+Requests to servers that are not reachable or fail with a server error are
+sent to the other servers.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import threading
+import timeit
+
+import numpy as np
+import requests
+
+from .cache import DEFAULT_CACHE_SIZE_GB
+from .http_session import DEFAULT_MAX_CONCURRENCY
+from .remote_instaseis_db import RemoteInstaseisDB, get_url
+from .. import FiniteSource, InstaseisError
+from ..helpers import read_raw32, write_point_sources
+
+
+# Servers that failed are only used again after this many seconds or if all
+# other servers failed as well.
+DEFAULT_FAILOVER_TIMEOUT_IN_S = 30.0
+
+
+class _Server(object):
+    """
+    Load and health of a single server of the cluster.
+    """
+    def __init__(self, url):
+        self.url = url
+        # Number of currently running requests.
+        self.active = 0
+        self.requests = 0
+        self.failures = 0
+        self.unavailable_until = 0.0
+
+
+class ClusterInstaseisDB(RemoteInstaseisDB):
+    """
+    Remote Instaseis database interface using any number of servers with the
+    same database.
+    """
+    def __init__(self, urls, max_concurrency=None, max_retries=1,
+                 failover_timeout_in_s=DEFAULT_FAILOVER_TIMEOUT_IN_S,
+                 chunks_per_server=4, cache_dir=None,
+                 cache_size_gb=DEFAULT_CACHE_SIZE_GB, transfer_format=None,
+                 *args, **kwargs):
+        """
+        :param urls: URLs of the Instaseis servers.
+        :type urls: list of str
+        :param max_concurrency: The maximum number of concurrent requests to
+            all servers. Defaults to
+            :data:`~instaseis.database_interfaces.http_session.DEFAULT_MAX_CONCURRENCY`
+            per server.
+        :type max_concurrency: int
+        :param max_retries: The number of times a request is retried with
+            the same server before it is sent to another server.
+        :type max_retries: int
+        :param failover_timeout_in_s: Servers that failed are not used for
+            this many seconds unless all others failed as well.
+        :type failover_timeout_in_s: float
+        :param chunks_per_server: Finite sources are split into this many
+            chunks of point sources per server. More chunks balance the load
+            better, less chunks cause less requests.
+        :type chunks_per_server: int
+        :param cache_dir: Directory of a persistent cache of the raw
+            seismograms of single point sources.
+        :type cache_dir: str
+        :param cache_size_gb: The maximum size of the cache in GB.
+        :type cache_size_gb: float
+        :param transfer_format: The format used to transfer the waveforms
+            from the servers. See
+            :class:`~instaseis.database_interfaces.remote_instaseis_db.RemoteInstaseisDB`.
+        :type transfer_format: str
+        """  # NOQA
+        urls = list(urls)
+        if not urls:
+            raise ValueError("At least one server URL is required.")
+        if len(set(urls)) != len(urls):
+            raise ValueError("The server URLs must be unique.")
+        if chunks_per_server < 1:
+            raise ValueError("chunks_per_server must be at least 1.")
+        self.servers = [_Server(_i) for _i in urls]
+        self.failover_timeout_in_s = float(failover_timeout_in_s)
+        self.chunks_per_server = int(chunks_per_server)
+        self._lock = threading.Lock()
+        if max_concurrency is None:
+            max_concurrency = DEFAULT_MAX_CONCURRENCY * len(urls)
+        super(ClusterInstaseisDB, self).__init__(
+            url=urls[0], max_concurrency=max_concurrency,
+            max_retries=max_retries, cache_dir=cache_dir,
+            cache_size_gb=cache_size_gb, transfer_format=transfer_format,
+            *args, **kwargs)
+
+    @property
+    def urls(self):
+        return [_i.url for _i in self.servers]
+
+    def _acquire_server(self, tried):
+        """
+        The least busy server that has not yet been tried. Servers that
+        recently failed are only used if all others failed as well.
+        """
+        with self._lock:
+            candidates = [_i for _i in self.servers if _i not in tried]
+            if not candidates:
+                return None
+            now = timeit.default_timer()
+            available = [_i for _i in candidates
+                         if _i.unavailable_until <= now]
+            server = min(available or candidates,
+                         key=lambda x: (x.active, x.requests))
+            server.active += 1
+            server.requests += 1
+            return server
+
+    def _release_server(self, server, failed):
+        with self._lock:
+            server.active -= 1
+            if failed:
+                server.failures += 1
+                server.unavailable_until = \
+                    timeit.default_timer() + self.failover_timeout_in_s
+            else:
+                server.unavailable_until = 0.0
+
+    def _request(self, path, data=None, **kwargs):
+        """
+        Sends a request to the least busy server and returns the response.
+        Connection errors and server errors fail over to the other servers.
+        Client errors are raised right away as they would occur with every
+        server.
+        """
+        tried = set()
+        errors = []
+        while True:
+            server = self._acquire_server(tried)
+            if server is None:
+                raise InstaseisError(
+                    "The request failed with all %i servers: %s" % (
+                        len(self.servers), " | ".join(errors)))
+            tried.add(server)
+            url = get_url(server.url, path, **kwargs)
+            try:
+                if data is None:
+                    r = self._http.get(url)
+                else:
+                    r = self._http.post(url, data=data)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._release_server(server, failed=True)
+                errors.append("Could not connect to '%s': %s" % (
+                    server.url, str(e)))
+                continue
+
+            # Too many requests is no failure of the server but others might
+            # still be able to handle the request.
+            retry = r.status_code >= 500 or r.status_code == 429
+            self._release_server(server, failed=r.status_code >= 500)
+            if r.status_code == 200:
+                return r
+            msg = "Status code %i when downloading '%s'. Reason: '%s'" % (
+                r.status_code, url, r.reason)
+            if not retry:
+                raise InstaseisError(msg)
+            errors.append(msg)
+
+    def _sum_finite_source(self, sources, receiver, components,
+                           correct_mu=False, progress_callback=None):
+        """
+        Splits the point sources into chunks which are summed by the
+        servers and adds up their partial sums.
+        """
+        if not isinstance(sources, FiniteSource):
+            sources = FiniteSource(pointsources=list(sources))
+        count = len(sources)
+        if not count:
+            raise ValueError("The finite source has no point sources.")
+        chunks = np.array_split(
+            np.arange(count),
+            min(count, len(self.servers) * self.chunks_per_server))
+
+        params = {"components": "".join(components).upper(),
+                  "receiverlatitude": receiver.latitude,
+                  "receiverlongitude": receiver.longitude,
+                  # The route does not support MiniSEED.
+                  "format": "raw32" if self.transfer_format == "raw32"
+                  else "raw32z"}
+        if receiver.depth_in_m is not None:
+            params["receiverdepthinmeters"] = receiver.depth_in_m
+        if receiver.network:
+            params["networkcode"] = receiver.network
+        if receiver.station:
+            params["stationcode"] = receiver.station
+        if correct_mu:
+            params["correctmu"] = 1
+
+        lock = threading.Lock()
+        progress = {"count": 0, "cancelled": False}
+
+        def _get_partial_sum(indices):
+            # Don't start anything new once cancelled.
+            if progress["cancelled"]:
+                return None
+            r = self._request(
+                path="finite_source_raw",
+                data=write_point_sources(sources, indices), **params)
+            data = dict((tr.stats.channel[-1].upper(),
+                         np.require(tr.data, dtype=np.float64))
+                        for tr in read_raw32(r.content))
+            if progress_callback:
+                with lock:
+                    progress["count"] += len(indices)
+                    if progress_callback(progress["count"], count):
+                        progress["cancelled"] = True
+            return data
+
+        partial_sums = self._http.map(_get_partial_sum, chunks)
+        if progress["cancelled"]:
+            return None
+
+        data_summed = {}
+        for data in partial_sums:
+            for comp in components:
+                if comp in data_summed:
+                    data_summed[comp] += data[comp]
+                else:
+                    data_summed[comp] = data[comp].copy()
+        return data_summed
@@ -89,7 +89,12 @@ class ForwardMergedInstaseisDB(BaseNetCDFInstaseisDB):
 
         # Get from netcdf file or buffer.
         if ei.id_elem not in self.parsed_mesh.displ_buffer:
-            utemp = self.meshes.merged.f["MergedSnapshots"][ei.id_elem]
+            with self._stage("hdf5_read") as stage:
+                ds = self.meshes.merged.f["MergedSnapshots"]
+                utemp = ds[ei.id_elem]
+                stage.nbytes = utemp.nbytes
+                stage.add_read(ds, [ei.id_elem])
+            utemp = self.meshes.merged.dequantize(utemp, ei.id_elem)
 
             # utemp is currently (nvars, jpol, ipol, npts)
             # 1. Roll to (npts, nvar, jpol, ipol)
@@ -108,45 +113,46 @@ class ForwardMergedInstaseisDB(BaseNetCDFInstaseisDB):
         displ_3 = np.zeros((utemp.shape[0], 3), order="F")
         displ_4 = np.zeros((utemp.shape[0], 3), order="F")
 
-        # Now just fill them all.
-        # displ_1 is generated from MZZ which has only two displacement
-        # components.
-        displ_1[:, 0] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 0], x1=ei.xi, x2=ei.eta)
-        displ_1[:, 2] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 1], x1=ei.xi, x2=ei.eta)
-        # displ_2 is generated from MXX+MYY which has only two displacement
-        # components.
-        displ_2[:, 0] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 2], x1=ei.xi, x2=ei.eta)
-        displ_2[:, 2] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 3], x1=ei.xi, x2=ei.eta)
-        # displ_3 is generated from MXZ/MYZ which has three displacement
-        # components.
-        displ_3[:, 0] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 4], x1=ei.xi, x2=ei.eta)
-        displ_3[:, 1] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 5], x1=ei.xi, x2=ei.eta)
-        displ_3[:, 2] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 6], x1=ei.xi, x2=ei.eta)
-        # displ_3 is generated from MXY/MXX-MYY which has three displacement
-        # components.
-        displ_4[:, 0] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 7], x1=ei.xi, x2=ei.eta)
-        displ_4[:, 1] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 8], x1=ei.xi, x2=ei.eta)
-        displ_4[:, 2] = spectral_basis.lagrange_interpol_2D_td(
-            points1=ei.col_points_xi, points2=ei.col_points_eta,
-            coefficients=utemp[:, :, :, 9], x1=ei.xi, x2=ei.eta)
+        with self._stage("interpolation"):
+            # Now just fill them all.
+            # displ_1 is generated from MZZ which has only two
+            # displacement components.
+            displ_1[:, 0] = spectral_basis.lagrange_interpol_2D_td(
+                points1=ei.col_points_xi, points2=ei.col_points_eta,
+                coefficients=utemp[:, :, :, 0], x1=ei.xi, x2=ei.eta)
+            displ_1[:, 2] = spectral_basis.lagrange_interpol_2D_td(
+                points1=ei.col_points_xi, points2=ei.col_points_eta,
+                coefficients=utemp[:, :, :, 1], x1=ei.xi, x2=ei.eta)
+            # displ_2 is generated from MXX+MYY which has only two
+            # displacement components.
+            displ_2[:, 0] = spectral_basis.lagrange_interpol_2D_td(
+                points1=ei.col_points_xi, points2=ei.col_points_eta,
+                coefficients=utemp[:, :, :, 2], x1=ei.xi, x2=ei.eta)
+            displ_2[:, 2] = spectral_basis.lagrange_interpol_2D_td(
+                points1=ei.col_points_xi, points2=ei.col_points_eta,
+                coefficients=utemp[:, :, :, 3], x1=ei.xi, x2=ei.eta)
+            # displ_3 is generated from MXZ/MYZ which has three displacement
+            # components.
+            displ_3[:, 0] = spectral_basis.lagrange_interpol_2D_td(
+                points1=ei.col_points_xi, points2=ei.col_points_eta,
+                coefficients=utemp[:, :, :, 4], x1=ei.xi, x2=ei.eta)
+            displ_3[:, 1] = spectral_basis.lagrange_interpol_2D_td(
+                points1=ei.col_points_xi, points2=ei.col_points_eta,
+                coefficients=utemp[:, :, :, 5], x1=ei.xi, x2=ei.eta)
+            displ_3[:, 2] = spectral_basis.lagrange_interpol_2D_td(
+                points1=ei.col_points_xi, points2=ei.col_points_eta,
+                coefficients=utemp[:, :, :, 6], x1=ei.xi, x2=ei.eta)
+            # displ_3 is generated from MXY/MXX-MYY which has three
+            # displacement components.
+            displ_4[:, 0] = spectral_basis.lagrange_interpol_2D_td(
+                points1=ei.col_points_xi, points2=ei.col_points_eta,
+                coefficients=utemp[:, :, :, 7], x1=ei.xi, x2=ei.eta)
+            displ_4[:, 1] = spectral_basis.lagrange_interpol_2D_td(
+                points1=ei.col_points_xi, points2=ei.col_points_eta,
+                coefficients=utemp[:, :, :, 8], x1=ei.xi, x2=ei.eta)
+            displ_4[:, 2] = spectral_basis.lagrange_interpol_2D_td(
+                points1=ei.col_points_xi, points2=ei.col_points_eta,
+                coefficients=utemp[:, :, :, 9], x1=ei.xi, x2=ei.eta)
 
         mij = source.tensor / self.parsed_mesh.amplitude
         # mij is [m_rr, m_tt, m_pp, m_rt, m_rp, m_tp]
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pooled HTTP connections with retries for the remote databases.
+
+A new connection per request costs a TCP (and possibly TLS) handshake for
+every single seismogram. The session here keeps the connections alive and
+reuses them, retries requests that failed for transient reasons, and can
+run many requests concurrently.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import threading
+import time
+
+import requests
+
+from future import standard_library
+with standard_library.hooks():
+    import queue
+
+
+# Default number of concurrent requests of a batch.
+DEFAULT_MAX_CONCURRENCY = 8
+# Status codes of responses that might succeed when tried again later.
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+# Upper limit of the waiting time before a retry requested by the server.
+MAX_RETRY_WAIT_IN_S = 60.0
+
+
+class HTTPSession(object):
+    """
+    Keep-alive HTTP session with retries.
+
+    :param max_concurrency: The maximum number of requests running at the
+        same time. Also the number of connections kept alive.
+    :type max_concurrency: int, optional
+    :param max_retries: Retry a failed request up to this many times.
+    :type max_retries: int, optional
+    :param backoff_in_s: Wait this long before the first retry. The waiting
+        time doubles with every further retry. Servers can request longer
+        waiting times with a ``Retry-After`` header.
+    :type backoff_in_s: float, optional
+    :param headers: Headers sent with each request.
+    :type headers: dict, optional
+    """
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 max_retries=3, backoff_in_s=0.5, headers=None):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        if max_retries < 0:
+            raise ValueError("max_retries must not be negative.")
+        self.max_concurrency = int(max_concurrency)
+        self.max_retries = int(max_retries)
+        self.backoff_in_s = float(backoff_in_s)
+
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        # One pool per scheme with enough connections for all workers.
+        for prefix in ("http://", "https://"):
+            self.session.mount(prefix, requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=self.max_concurrency))
+
+    def get(self, url, headers=None):
+        """
+        GET request of a URL. Connection errors, timeouts, and responses
+        with one of the :data:`RETRY_STATUS_CODES` are retried. The response
+        of the last attempt is returned.
+
+        :param url: The URL.
+        :type url: str
+        :param headers: Additional headers of the request.
+        :type headers: dict
+        """
+        return self.request("GET", url, headers=headers)
+
+    def post(self, url, data):
+        """
+        POST request of binary data to a URL. Retried just like
+        :meth:`get`.
+
+        :param url: The URL.
+        :type url: str
+        :param data: The body of the request.
+        :type data: bytes
+        """
+        return self.request(
+            "POST", url, data=data,
+            headers={"Content-Type": "application/octet-stream"})
+
+    def request(self, method, url, **kwargs):
+        """
+        Request with retries. All keyword arguments are passed to
+        :meth:`requests.Session.request`.
+
+        :param method: The HTTP method.
+        :type method: str
+        :param url: The URL.
+        :type url: str
+        """
+        for attempt in range(self.max_retries + 1):
+            wait = self.backoff_in_s * 2 ** attempt
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if r.status_code not in RETRY_STATUS_CODES or \
+                        attempt == self.max_retries:
+                    return r
+                try:
+                    wait = max(wait, float(r.headers["Retry-After"]))
+                except (KeyError, ValueError):
+                    pass
+            time.sleep(min(wait, MAX_RETRY_WAIT_IN_S))
+
+    def map(self, func, items):
+        """
+        Call a function for all items with up to ``max_concurrency`` threads
+        and return the results in the order of the items. The first
+        exception is raised once all calls are finished.
+
+        :param func: Function called with a single item.
+        :param items: The items.
+        """
+        items = list(items)
+        if self.max_concurrency == 1 or len(items) < 2:
+            return [func(_i) for _i in items]
+
+        results = [None] * len(items)
+        errors = []
+        todo = queue.Queue()
+        for index in range(len(items)):
+            todo.put(index)
+
+        def _work():
+            while True:
+                try:
+                    index = todo.get_nowait()
+                except queue.Empty:
+                    return
+                # Don't start anything new after a failure.
+                if errors:
+                    continue
+                try:
+                    results[index] = func(items[index])
+                except Exception as e:
+                    errors.append((index, e))
+
+        workers = [threading.Thread(target=_work) for _ in
+                   range(min(self.max_concurrency, len(items)))]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        if errors:
+            raise sorted(errors, key=lambda x: x[0])[0][1]
+        return results
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Coalesced reads of many elements.
+
+Reading the elements of a large batch of source-receiver pairs one by one
+results in many small I/O operations. The functions here merge the required
+indices into a few contiguous ranges and read them into one in-memory block
+per dataset. The usual code paths then take the data from the block instead
+of the file.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+
+
+# Upper limit of the size of all blocks read in one go.
+MAX_BLOCK_SIZE_IN_MB = 100
+# Gaps between two ranges smaller than this are read as well to merge them.
+MAX_GAP_IN_BYTES = 1024 ** 2
+
+
+def get_read_ranges(ids, max_gap=0):
+    """
+    Merge indices into contiguous ranges.
+
+    :param ids: The indices to read.
+    :type ids: array-like of int
+    :param max_gap: Two ranges are merged if no more than this number of
+        indices lies between them.
+    :type max_gap: int, optional
+
+    :returns: A list of ``(start, stop)`` tuples with exclusive stops.
+
+    >>> get_read_ranges([5, 1, 2, 3, 8, 2])
+    [(1, 4), (5, 6), (8, 9)]
+    >>> get_read_ranges([5, 1, 2, 3, 8, 2], max_gap=1)
+    [(1, 6), (8, 9)]
+    """
+    ids = np.unique(np.asarray(ids, dtype=np.int64))
+    if not len(ids):
+        return []
+    # Positions where a new range starts.
+    breaks = np.where(np.diff(ids) > max_gap + 1)[0] + 1
+    starts = ids[np.concatenate([[0], breaks])]
+    stops = ids[np.concatenate([breaks - 1, [len(ids) - 1]])] + 1
+    return [(int(_a), int(_b)) for _a, _b in zip(starts, stops)]
+
+
+def get_bytes_per_index(dataset, axis):
+    """
+    Number of bytes of a single index along an axis of a dataset.
+    """
+    shape = list(dataset.shape)
+    shape.pop(axis)
+    return int(np.prod(shape)) * dataset.dtype.itemsize
+
+
+class DataBlock(object):
+    """
+    Parts of a dataset along one axis, read in a few large I/O operations
+    and kept in memory.
+    """
+    def __init__(self, dataset, ids, axis=0, max_gap_in_bytes=None):
+        """
+        :param dataset: The HDF5 dataset.
+        :param ids: The indices along the axis to read.
+        :type ids: array-like of int
+        :param axis: The axis the indices refer to.
+        :type axis: int, optional
+        :param max_gap_in_bytes: Also read gaps up to this size to reduce the
+            number of I/O operations. Defaults to :data:`MAX_GAP_IN_BYTES`.
+        :type max_gap_in_bytes: int, optional
+        """
+        if max_gap_in_bytes is None:
+            max_gap_in_bytes = MAX_GAP_IN_BYTES
+        self.axis = axis
+        self.ranges = get_read_ranges(
+            ids, max_gap=max_gap_in_bytes // max(get_bytes_per_index(
+                dataset, axis), 1))
+
+        parts = []
+        for start, stop in self.ranges:
+            index = [slice(None)] * len(dataset.shape)
+            index[axis] = slice(start, stop)
+            parts.append(dataset[tuple(index)])
+        if parts:
+            self.data = np.concatenate(parts, axis=axis)
+        else:
+            shape = list(dataset.shape)
+            shape[axis] = 0
+            self.data = np.empty(shape, dtype=dataset.dtype)
+        self.ids = np.concatenate(
+            [np.arange(_a, _b) for _a, _b in self.ranges] +
+            [np.empty(0, dtype=np.int64)])
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def _get_positions(self, ids):
+        ids = np.asarray(ids)
+        positions = np.searchsorted(self.ids, ids)
+        positions[positions >= len(self.ids)] = 0
+        return positions, ids
+
+    def __contains__(self, ids):
+        """
+        True if all the given indices are in the block.
+        """
+        if not len(self.ids):
+            return False
+        positions, ids = self._get_positions(np.atleast_1d(ids))
+        return bool(np.all(self.ids[positions] == ids))
+
+    def take(self, ids):
+        """
+        The data of the given indices along the axis of the block.
+        """
+        positions, _ = self._get_positions(ids)
+        return self.data.take(positions, axis=self.axis)
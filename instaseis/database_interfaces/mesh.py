@@ -25,6 +25,7 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
 from collections import OrderedDict
+import threading
 
 import h5py
 import numpy as np
@@ -54,6 +55,13 @@ class Buffer(object):
             self._fails += 1
         return contains
 
+    def is_buffered(self, key):
+        """
+        Check if an item is in the buffer without counting it as a hit or a
+        miss.
+        """
+        return key in self._buffer
+
     def get(self, key):
         """
         Return an item from the buffer and move it to the end, so it is removed
@@ -87,6 +95,32 @@ class Buffer(object):
     def get_size_mb(self):
         return float(self._total_size) / 1024 ** 2
 
+    @property
+    def hits(self):
+        """
+        Return the number of calls to the __contains__() routine that
+        returned True.
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        """
+        Return the number of calls to the __contains__() routine that
+        returned False.
+        """
+        return self._fails
+
+    @property
+    def requests(self):
+        """
+        Return the number of calls to the __contains__() routine.
+        """
+        return self._hits + self._fails
+
+    def __len__(self):
+        return len(self._buffer)
+
     @property
     def efficiency(self):
         """
@@ -133,6 +167,41 @@ class Mesh(object):
         self._find_time_axis()
         self.strain_buffer = Buffer(strain_buffer_size_in_mb)
         self.displ_buffer = Buffer(displ_buffer_size_in_mb)
+        self._local = threading.local()
+
+    @property
+    def blocks(self):
+        """
+        In-memory blocks of the datasets read in one go. The data is taken
+        from these before reading from the file. Per thread as each thread
+        works on its own batch.
+        """
+        try:
+            return self._local.blocks
+        except AttributeError:
+            self._local.blocks = {}
+            return self._local.blocks
+
+    @property
+    def is_quantized(self):
+        return self.snapshot_scale is not None
+
+    def dequantize(self, data, ids):
+        """
+        Convert quantized snapshots back to floating point numbers. Returns
+        the data unchanged for files that are not quantized.
+
+        :param data: The merged snapshots of one or more elements with the
+            variables on the first axis after the elements.
+        :param ids: The element ids. A single id or one per element.
+        """
+        if self.snapshot_scale is None:
+            return data
+        scale = self.snapshot_scale[ids]
+        offset = self.snapshot_offset[ids]
+        # Broadcast over the remaining axes.
+        shape = scale.shape + (1,) * (data.ndim - scale.ndim)
+        return data * scale.reshape(shape) + offset.reshape(shape)
 
     def _get_str_attr(self, name):
         attr = self.f.attrs[name]
@@ -180,6 +249,22 @@ class Mesh(object):
 
         self.ndumps = self.f.attrs["number of strain dumps"][0]
         self.excitation_type = self._get_str_attr("excitation type")
+        # Only set for merged files. See the repack_db script.
+        if "element order" in self.f.attrs:
+            self.element_order = self._get_str_attr("element order")
+        else:
+            self.element_order = None
+        # Merged files can store the snapshots quantized to 16 bit integers
+        # with a scale and an offset per element and variable.
+        if "MergedSnapshotsScale" in self.f:
+            self.snapshot_scale = self.f["MergedSnapshotsScale"][:]
+            self.snapshot_offset = self.f["MergedSnapshotsOffset"][:]
+            self.quantization_error = float(np.max(
+                self.f.attrs["quantization relative error"]))
+        else:
+            self.snapshot_scale = None
+            self.snapshot_offset = None
+            self.quantization_error = None
 
         # The rest is not needed for every mesh.
 
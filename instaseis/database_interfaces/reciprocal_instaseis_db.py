@@ -161,16 +161,10 @@ class ReciprocalInstaseisDB(BaseNetCDFInstaseisDB):
                       self.info.dump_type == 'strain_only'):
                     strain_x = self._get_strain(self.meshes.px, ei.id_elem)
 
-            mij = rotations \
-                .rotate_symm_tensor_voigt_xyz_src_to_xyz_earth(
-                    source.tensor_voigt, np.deg2rad(source.longitude),
-                    np.deg2rad(source.colatitude))
-            mij = rotations \
-                .rotate_symm_tensor_voigt_xyz_earth_to_xyz_src(
-                    mij, np.deg2rad(receiver.longitude),
-                    np.deg2rad(receiver.colatitude))
-            mij = rotations.rotate_symm_tensor_voigt_xyz_to_src(
-                mij, coordinates.phi)
+            mij = rotations.rotate_symm_tensor_voigt(
+                source.tensor_voigt, self._get_rotation_matrix(
+                    source=source, receiver=receiver,
+                    coordinates=coordinates))
             mij /= self.parsed_mesh.amplitude
 
             if "Z" in components:
@@ -230,14 +224,10 @@ class ReciprocalInstaseisDB(BaseNetCDFInstaseisDB):
                                                  ei.col_points_eta, ei.xi,
                                                  ei.eta)
 
-            force = rotations.rotate_vector_xyz_src_to_xyz_earth(
-                source.force_tpr, np.deg2rad(source.longitude),
-                np.deg2rad(source.colatitude))
-            force = rotations.rotate_vector_xyz_earth_to_xyz_src(
-                force, np.deg2rad(receiver.longitude),
-                np.deg2rad(receiver.colatitude))
-            force = rotations.rotate_vector_xyz_to_src(
-                force, coordinates.phi)
+            force = rotations.rotate_vector(
+                source.force_tpr, self._get_rotation_matrix(
+                    source=source, receiver=receiver,
+                    coordinates=coordinates))
             force /= self.parsed_mesh.amplitude
 
             if "Z" in components:
@@ -114,16 +114,10 @@ class ReciprocalMergedInstaseisDB(BaseNetCDFInstaseisDB):
                 # non-displacement databases.
                 raise NotImplementedError
 
-            mij = rotations \
-                .rotate_symm_tensor_voigt_xyz_src_to_xyz_earth(
-                    source.tensor_voigt, np.deg2rad(source.longitude),
-                    np.deg2rad(source.colatitude))
-            mij = rotations \
-                .rotate_symm_tensor_voigt_xyz_earth_to_xyz_src(
-                    mij, np.deg2rad(receiver.longitude),
-                    np.deg2rad(receiver.colatitude))
-            mij = rotations.rotate_symm_tensor_voigt_xyz_to_src(
-                mij, coordinates.phi)
+            mij = rotations.rotate_symm_tensor_voigt(
+                source.tensor_voigt, self._get_rotation_matrix(
+                    source=source, receiver=receiver,
+                    coordinates=coordinates))
             mij /= self.parsed_mesh.amplitude
 
             if "Z" in components:
@@ -176,14 +170,10 @@ class ReciprocalMergedInstaseisDB(BaseNetCDFInstaseisDB):
                 ei.id_elem, ei.gll_point_ids, ei.col_points_xi,
                 ei.col_points_eta, ei.xi, ei.eta)
 
-            force = rotations.rotate_vector_xyz_src_to_xyz_earth(
-                source.force_tpr, np.deg2rad(source.longitude),
-                np.deg2rad(source.colatitude))
-            force = rotations.rotate_vector_xyz_earth_to_xyz_src(
-                force, np.deg2rad(receiver.longitude),
-                np.deg2rad(receiver.colatitude))
-            force = rotations.rotate_vector_xyz_to_src(
-                force, coordinates.phi)
+            force = rotations.rotate_vector(
+                source.force_tpr, self._get_rotation_matrix(
+                    source=source, receiver=receiver,
+                    coordinates=coordinates))
             force /= self.parsed_mesh.amplitude
 
             if "Z" in components:
@@ -224,8 +214,17 @@ class ReciprocalMergedInstaseisDB(BaseNetCDFInstaseisDB):
         return data
 
     def _get_and_reorder_utemp(self, id_elem):
-        # We can now read it in a single go!
-        utemp = self.meshes.merged.f["MergedSnapshots"][id_elem]
+        block = self.meshes.merged.blocks.get("MergedSnapshots")
+        if block is not None and id_elem in block:
+            utemp = block.take([id_elem])[0]
+        else:
+            # We can now read it in a single go!
+            with self._stage("hdf5_read") as stage:
+                ds = self.meshes.merged.f["MergedSnapshots"]
+                utemp = ds[id_elem]
+                stage.nbytes = utemp.nbytes
+                stage.add_read(ds, [id_elem])
+        utemp = self.meshes.merged.dequantize(utemp, id_elem)
 
         # utemp is currently (nvars, jpol, ipol, npts)
         # 1. Roll to (npts, nvar, jpol, ipol)
@@ -257,9 +256,10 @@ class ReciprocalMergedInstaseisDB(BaseNetCDFInstaseisDB):
                 utemp_x = utemp[:, :, :, :3]
                 utemp_x = np.require(utemp_x, requirements=["F"],
                                      dtype=np.float64)
-                strain_x = strain_fct_map["dipole"](
-                    utemp_x, G, GT, col_points_xi, col_points_eta,
-                    mesh.npol, mesh.ndumps, corner_points, eltype, axis)
+                with self._stage("strain"):
+                    strain_x = strain_fct_map["dipole"](
+                        utemp_x, G, GT, col_points_xi, col_points_eta,
+                        mesh.npol, mesh.ndumps, corner_points, eltype, axis)
             else:
                 strain_x = None
 
@@ -282,9 +282,10 @@ class ReciprocalMergedInstaseisDB(BaseNetCDFInstaseisDB):
                     utemp_z = np.require(utemp_z, requirements=["F"],
                                          dtype=np.float64)
 
-                strain_z = strain_fct_map["monopole"](
-                    utemp_z, G, GT, col_points_xi, col_points_eta,
-                    mesh.npol, mesh.ndumps, corner_points, eltype, axis)
+                with self._stage("strain"):
+                    strain_z = strain_fct_map["monopole"](
+                        utemp_z, G, GT, col_points_xi, col_points_eta,
+                        mesh.npol, mesh.ndumps, corner_points, eltype, axis)
             else:
                 strain_z = None
 
@@ -299,9 +300,12 @@ class ReciprocalMergedInstaseisDB(BaseNetCDFInstaseisDB):
                 continue
             final_strain = np.empty((strain.shape[0], 6), order="F")
 
-            for i in range(6):
-                final_strain[:, i] = spectral_basis.lagrange_interpol_2D_td(
-                    col_points_xi, col_points_eta, strain[:, :, :, i], xi, eta)
+            with self._stage("interpolation"):
+                for i in range(6):
+                    final_strain[:, i] = \
+                        spectral_basis.lagrange_interpol_2D_td(
+                            col_points_xi, col_points_eta,
+                            strain[:, :, :, i], xi, eta)
 
             if not name == "strain_z":
                 final_strain[:, 3] *= -1.0
@@ -324,21 +328,22 @@ class ReciprocalMergedInstaseisDB(BaseNetCDFInstaseisDB):
         utemp_x = utemp[:, :, :, :3]
         utemp_x = np.require(utemp_x, requirements=["F"],
                              dtype=np.float64)
-        for i in range(3):
-            final_displacement_x[:, i] = \
-                spectral_basis.lagrange_interpol_2D_td(
-                    col_points_xi, col_points_eta,
-                    utemp_x[:, :, :, i], xi, eta)
 
         utemp_z = utemp[:, :, :, -3:]
         utemp_z[:, :, :, 0] = utemp_z[:, :, :, 1]
         utemp_z[:, :, :, 1][:] = 0
         utemp_z = np.require(utemp_z, requirements=["F"], dtype=np.float64)
         final_displacement_z = np.empty((utemp.shape[0], 3), order="F")
-        for i in range(3):
-            final_displacement_z[:, i] = \
-                spectral_basis.lagrange_interpol_2D_td(
-                    col_points_xi, col_points_eta,
-                    utemp_z[:, :, :, i], xi, eta)
+
+        with self._stage("interpolation"):
+            for i in range(3):
+                final_displacement_x[:, i] = \
+                    spectral_basis.lagrange_interpol_2D_td(
+                        col_points_xi, col_points_eta,
+                        utemp_x[:, :, :, i], xi, eta)
+                final_displacement_z[:, i] = \
+                    spectral_basis.lagrange_interpol_2D_td(
+                        col_points_xi, col_points_eta,
+                        utemp_z[:, :, :, i], xi, eta)
 
         return final_displacement_x, final_displacement_z
@@ -12,40 +12,114 @@ Instaseis database class for remote access over HTTP.
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import copy
 import io
 import numpy as np
 import obspy
-import requests
 import warnings
 
-from .base_instaseis_db import BaseInstaseisDB, DEFAULT_MU
+from .base_instaseis_db import BaseInstaseisDB, DEFAULT_MU, _get_pairs
+from .cache import (DEFAULT_CACHE_SIZE_GB, SeismogramCache, get_key,
+                    get_request_key)
+from .http_session import DEFAULT_MAX_CONCURRENCY, HTTPSession
 from .. import InstaseisError, InstaseisWarning, Source, ForceSource, \
     __version__
+from ..helpers import read_raw32
 
 from future import standard_library
 with standard_library.hooks():
     from urllib.parse import urlencode, urlparse
 
 
+def get_url(base_url, path, **kwargs):
+    """
+    URL of a route of an Instaseis server.
+
+    :param base_url: URL of the server.
+    :param path: The route.
+
+    All keyword arguments are encoded as URL parameters.
+
+    >>> print(get_url("http://localhost:8765/", "info"))
+    http://localhost:8765/info
+    """
+    scheme, netloc, base_path = urlparse(base_url)[:3]
+    base_path = base_path.strip("/")
+    # Not tested in the test-suite as it would be awkward to do with the
+    # current setup. But manually vetted and should be good.
+    if base_path:  # pragma: no cover
+        path = "/" + base_path + "/" + path
+
+    url = "%s://%s" % (scheme, netloc)
+    if path:
+        url += "/%s" % path
+    if kwargs:
+        url += "?%s" % urlencode(kwargs)
+    return url
+
+
 class RemoteInstaseisDB(BaseInstaseisDB):
     """
     Remote Instaseis database interface.
     """
-    def __init__(self, url, *args, **kwargs):
+    def __init__(self, url, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 max_retries=3, cache_dir=None,
+                 cache_size_gb=DEFAULT_CACHE_SIZE_GB, transfer_format=None,
+                 *args, **kwargs):
         """
         :param url: URL to the remote Instaseis server.
         :type db_path: str
+        :param max_concurrency: The maximum number of concurrent requests of
+            :meth:`get_seismograms_batch`.
+        :type max_concurrency: int
+        :param max_retries: The number of times a request is retried if the
+            connection failed or the server is temporarily unavailable.
+        :type max_retries: int
+        :param cache_dir: Directory of a persistent cache of the raw
+            seismograms. The cached database information is revalidated with
+            the server when opening the database and the seismograms cached
+            for a database that changed since are no longer used. Cached
+            seismograms are served without contacting the server and the
+            cache can be used with a warning if the server is unreachable.
+            No cache if not given.
+        :type cache_dir: str
+        :param cache_size_gb: The maximum size of the cache in GB. The least
+            recently used seismograms are removed if it grows larger.
+        :type cache_size_gb: float
+        :param transfer_format: The format used to transfer the waveforms
+            from the server. ``"raw32z"`` and ``"raw32"`` are much cheaper to
+            encode and decode than ``"miniseed"``. Defaults to ``"raw32z"``
+            if the server supports it and to ``"miniseed"`` otherwise.
+        :type transfer_format: str
         """
+        if transfer_format not in (None, "miniseed", "raw32", "raw32z"):
+            raise ValueError("transfer_format must be one of 'miniseed', "
+                             "'raw32', or 'raw32z'.")
         self.url = url
-        self._scheme, self._netloc, self._path = urlparse(url)[:3]
-        self._path = self._path.strip("/")
+        self.transfer_format = transfer_format
+        # All requests share the connections of a single session.
+        self._http = HTTPSession(max_concurrency=max_concurrency,
+                                 max_retries=max_retries)
+
+        self._cache = None
+        cached_document = None
+        if cache_dir is not None:
+            self._cache = SeismogramCache(cache_dir=cache_dir,
+                                          cache_size_gb=cache_size_gb)
+            cached_document = self._cache.get_document(self.url)
 
         # Parse the root message of the server.
         try:
-            root = self._download_url(self._get_url(path=""))
+            root = self._download_url(path="")
         except Exception as e:
-            raise InstaseisError("Failed to connect to remote Instaseis "
-                                 "server due to: %s" % (str(e)))
+            msg = ("Failed to connect to remote Instaseis server due to: "
+                   "%s" % (str(e)))
+            if cached_document is None:
+                raise InstaseisError(msg)
+            warnings.warn(msg + ". Using the cached database information.",
+                          InstaseisWarning)
+            self._set_document(cached_document)
+            return
 
         # XXX: Add Instaseis version checks! Make sure server and client are
         # on the same version!
@@ -58,8 +132,55 @@ class RemoteInstaseisDB(BaseInstaseisDB):
                    "client (%s) differ and thus things might not work as "
                    "expected." % (root["version"], __version__))
             warnings.warn(msg, InstaseisWarning)
+
+        # Older servers do not advertise the formats of /seismograms_raw
+        # and only support MiniSEED.
+        document = {"version": root["version"],
+                    "formats": root.get("formats", ["miniseed"])}
+        if self._cache is None:
+            document["info"] = self._download_url(path="info")
+        else:
+            document["info"], document["etag"] = self._download_info(
+                cached_document)
+            self._cache.put_document(self.url, document)
+        self._set_document(document)
         self._get_info()
 
+    def _download_info(self, cached_document=None):
+        """
+        Downloads the information about the database and its ETag. Only
+        transferred if it changed since it has been cached.
+        """
+        url = self._get_url("info")
+        headers = {}
+        if cached_document is not None and cached_document.get("etag"):
+            headers["If-None-Match"] = cached_document["etag"]
+        r = self._http.get(url, headers=headers)
+        if r.status_code == 304:
+            return cached_document["info"], cached_document["etag"]
+        elif r.status_code != 200:
+            raise InstaseisError(
+                "Status code %i when downloading '%s'. Reason: '%s'" % (
+                    r.status_code, url, r.reason))
+        return r.json(), r.headers.get("Etag")
+
+    def _set_document(self, document):
+        """
+        Uses the information about the server and its database and chooses
+        the fastest transfer format supported by the server if none has been
+        given.
+        """
+        self._document = document
+        if self._cache is not None:
+            # The server version and the database information identify the
+            # seismograms in the cache.
+            self._cache_identity = get_key(document["version"],
+                                           document["info"])
+        if self.transfer_format is None:
+            formats = self._document.get("formats", ["miniseed"])
+            self.transfer_format = \
+                "raw32z" if "raw32z" in formats else "miniseed"
+
     def _get_seismograms(self, source, receiver, components=("Z", "N", "E")):
         """
         Extract seismograms for a moment tensor point source from the AxiSEM
@@ -75,6 +196,8 @@ class RemoteInstaseisDB(BaseInstaseisDB):
         """
         # Collect parameters.
         params = {"components": "".join(components).upper()}
+        if self.transfer_format != "miniseed":
+            params["format"] = self.transfer_format
 
         # Start with the receiver.
         params["receiverlatitude"] = receiver.latitude
@@ -105,20 +228,33 @@ class RemoteInstaseisDB(BaseInstaseisDB):
         else:
             raise NotImplementedError
 
-        url = self._get_url(path="seismograms_raw", **params)
+        # The format does not change the data.
+        if self._cache is not None:
+            key = get_request_key(self._cache_identity, dict(
+                (_k, _v) for _k, _v in params.items() if _k != "format"))
+            data = self._cache.get(key)
+            if data is not None:
+                return data
 
-        r = requests.get(url)
-        if "Instaseis-Mu" not in r.headers:  # pragma: no cover
+        r = self._request(path="seismograms_raw", **params)
+
+        if self.transfer_format == "miniseed":
+            with io.BytesIO(r.content) as fh:
+                fh.seek(0, 0)
+                st = obspy.read(fh)
+        else:
+            st = read_raw32(r.content)
+
+        if "Instaseis-Mu" in r.headers:
+            mu = float(r.headers["Instaseis-Mu"])
+        # The raw32 formats also carry mu in the payload.
+        elif hasattr(st[0].stats, "instaseis"):  # pragma: no cover
+            mu = st[0].stats.instaseis.mu
+        else:  # pragma: no cover
             warnings.warn("Mu is not passed via the HTTP headers. Maybe some "
                           "proxy removed it? Mu is now always the default mu.",
                           InstaseisWarning)
             mu = DEFAULT_MU
-        else:
-            mu = float(r.headers["Instaseis-Mu"])
-
-        with io.BytesIO(r.content) as fh:
-            fh.seek(0, 0)
-            st = obspy.read(fh)
 
         # Convert back to dictionary of numpy arrays...this is a bit
         # redundant but plays nice with the rest of Instaseis and still
@@ -130,39 +266,81 @@ class RemoteInstaseisDB(BaseInstaseisDB):
         for tr in st:
             data[tr.stats.channel[-1].upper()] = tr.data
 
+        if self._cache is not None:
+            self._cache.put(key, data)
+
         return data
 
+    def get_seismograms_batch(self, sources, receivers, window=None,
+                              **kwargs):
+        """
+        Extract seismograms for a batch of source-receiver pairs.
+
+        Up to ``max_concurrency`` seismograms are requested from the server
+        at the same time. The seismograms are returned in the order of the
+        pairs.
+
+        :param sources: The sources. A single source is used for all
+            receivers.
+        :type sources: :class:`instaseis.source.Source` or list of them
+        :param receivers: The receivers. A single receiver is used for all
+            sources.
+        :type receivers: :class:`instaseis.source.Receiver`, list of them or
+            :class:`instaseis.source.ReceiverArray`
+        :param window: Has no effect for remote databases.
+
+        All other keyword arguments are passed to
+        :meth:`~instaseis.database_interfaces.base_instaseis_db.BaseInstaseisDB.get_seismograms`.
+
+        :returns: One result of
+            :meth:`~instaseis.database_interfaces.base_instaseis_db.BaseInstaseisDB.get_seismograms`
+            per pair.
+        :rtype: list
+        """  # NOQA
+        pairs = _get_pairs(sources, receivers)
+        # Make sure the info is downloaded only once.
+        self.info
+        return self._http.map(
+            lambda pair: self.get_seismograms(
+                source=pair[0], receiver=pair[1], **kwargs), pairs)
+
     def _get_url(self, path, **kwargs):
-        # Not tested in the test-suite as it would be awkward to do with the
-        # current setup. But manually vetted and should be good.
-        if self._path:  # pragma: no cover
-            path = "/" + self._path + "/" + path
-
-        url = "%s://%s" % (self._scheme, self._netloc)
-        if path:
-            url += "/%s" % path
-        if kwargs:
-            url += "?%s" % urlencode(kwargs)
-        return url
-
-    def _download_url(self, url):
+        return get_url(self.url, path, **kwargs)
+
+    def _request(self, path, data=None, **kwargs):
+        """
+        Sends a request to the server and returns the response. Raises an
+        error if the request failed.
+
+        :param path: The route.
+        :param data: The body of a POST request. GET request if not given.
+        :type data: bytes
+
+        All keyword arguments are sent as URL parameters.
+        """
+        url = self._get_url(path, **kwargs)
+        if data is None:
+            r = self._http.get(url)
+        else:
+            r = self._http.post(url, data=data)
+        if r.status_code != 200:
+            raise InstaseisError(
+                "Status code %i when downloading '%s'. Reason: '%s'" % (
+                    r.status_code, url, r.reason))
+        return r
+
+    def _download_url(self, path, **kwargs):
         """
-        Helper function downloading data from a URL.
+        Helper function downloading a JSON document from the server.
         """
-        r = requests.get(url)
-        # Not tested in test suite as it would be awkward to do. Manually
-        # tested and should be good.
-        if r.status_code != 200:  # pragma: no cover
-            raise InstaseisError("Status code %i when downloading '%s'" % (
-                r.status_code, url))
-        return r.json()
+        return self._request(path, **kwargs).json()
 
     def _get_info(self):
         """
         Returns a dictionary with information about the currently loaded
         database.
         """
-        info = self._download_url(self._get_url(path="info"))
+        info = copy.deepcopy(self._document["info"])
         info["directory"] = self.url
         # Convert types lost in the translation to JSON.
         info["datetime"] = obspy.UTCDateTime(info["datetime"])
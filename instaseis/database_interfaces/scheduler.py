@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Locality aware scheduling of batches of source-receiver pairs.
+
+Extracting seismograms for many source-receiver pairs is dominated by
+reading the elements from disc. Pairs that need the same element can share
+the buffered data and neighbouring elements mostly live in the same HDF5
+chunk. The scheduler determines the element (and the chunk) of each pair up
+front and processes the pairs sorted by them. It only reorders within
+consecutive windows of a fixed size to bound the latency and the number of
+results that have to be kept in memory. Results are always returned in the
+original order.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+
+
+# Default number of pairs that can be reordered.
+DEFAULT_WINDOW = 1000
+
+
+class LocalityScheduler(object):
+    """
+    Orders batches of source-receiver pairs to maximize the reuse of the
+    buffers and HDF5 chunks of a database.
+
+    Databases that cannot determine the element of a pair (e.g. remote
+    databases) are processed in the original order.
+
+    >>> scheduler = LocalityScheduler(db)  # doctest: +SKIP
+    >>> streams = scheduler.map(  # doctest: +SKIP
+    ...     lambda src, rec: db.get_seismograms(src, rec),
+    ...     [(source, _i) for _i in receivers])
+    """
+    def __init__(self, db, window=DEFAULT_WINDOW):
+        """
+        :param db: The database.
+        :type db: :class:`~instaseis.database_interfaces.base_instaseis_db.BaseInstaseisDB`
+        :param window: Maximum number of consecutive pairs that can be
+            reordered.
+        :type window: int, optional
+        """  # NOQA
+        if window < 1:
+            raise ValueError("The window must be at least 1.")
+        self.db = db
+        self.window = int(window)
+
+    def get_keys(self, pairs):
+        """
+        Sort keys of the pairs or ``None`` if the database does not support
+        them.
+
+        :param pairs: The source-receiver pairs.
+        :type pairs: list of tuples
+        """
+        get_keys = getattr(self.db, "_get_locality_keys", None)
+        if get_keys is None:
+            return None
+        return get_keys(list(pairs))
+
+    def iter_windows(self, pairs):
+        """
+        Yields the indices of the pairs window by window. Each window is
+        sorted in processing order - ``sorted()`` restores the original
+        order.
+
+        :param pairs: The source-receiver pairs.
+        :type pairs: list of tuples
+        """
+        pairs = list(pairs)
+        for start in range(0, len(pairs), self.window):
+            window = pairs[start:start + self.window]
+            keys = self.get_keys(window)
+            if keys is None:
+                order = np.arange(len(window))
+            else:
+                # Stable to keep the order for pairs in the same element.
+                order = np.argsort(keys, kind="mergesort")
+            yield [start + int(_i) for _i in order]
+
+    def get_order(self, pairs):
+        """
+        Processing order of the pairs as a list of indices.
+
+        :param pairs: The source-receiver pairs.
+        :type pairs: list of tuples
+        """
+        order = []
+        for window in self.iter_windows(pairs):
+            order.extend(window)
+        return order
+
+    def map(self, func, pairs):
+        """
+        Calls ``func(source, receiver)`` for all pairs in locality order and
+        returns the results in the original order.
+
+        :param func: The function to call for each pair.
+        :type func: function
+        :param pairs: The source-receiver pairs.
+        :type pairs: list of tuples
+        """
+        pairs = list(pairs)
+        results = [None] * len(pairs)
+        for window in self.iter_windows(pairs):
+            for index in window:
+                results[index] = func(*pairs[index])
+        return results
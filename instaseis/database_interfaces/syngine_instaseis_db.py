@@ -12,17 +12,20 @@ Instaseis database class for remote access using the syngine service of IRIS.
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import copy
 import io
 import numpy as np
 import obspy
 import platform
-import requests
 import warnings
 
 from instaseis import (InstaseisError, InstaseisWarning, Source, ForceSource,
                        __version__)
 from instaseis.database_interfaces.base_instaseis_db import (
     BaseInstaseisDB, DEFAULT_MU, STF_MAP, INV_KIND_MAP)
+from instaseis.database_interfaces.cache import (
+    DEFAULT_CACHE_SIZE_GB, SeismogramCache, get_key, get_request_key)
+from instaseis.database_interfaces.http_session import HTTPSession
 
 from instaseis.helpers import geocentric_to_elliptic_latitude
 
@@ -43,7 +46,8 @@ class SyngineInstaseisDB(BaseInstaseisDB):
     """
     def __init__(self, model,
                  base_url="http://service.iris.edu/irisws/syngine/1",
-                 debug=False, *args, **kwargs):
+                 debug=False, cache_dir=None,
+                 cache_size_gb=DEFAULT_CACHE_SIZE_GB, *args, **kwargs):
         """
         :param model: The model to use.
         :type model: str
@@ -51,18 +55,59 @@ class SyngineInstaseisDB(BaseInstaseisDB):
         :type base_url: str
         :param debug: Debug messages on/off.
         :type debug: bool
+        :param cache_dir: Directory of a persistent cache of the raw
+            seismograms. The seismograms cached for a different version of
+            the service or of the model are no longer used. Cached
+            seismograms are served without contacting the service and the
+            cache can be used with a warning if the service is unreachable.
+            No cache if not given.
+        :type cache_dir: str
+        :param cache_size_gb: The maximum size of the cache in GB. The least
+            recently used seismograms are removed if it grows larger.
+        :type cache_size_gb: float
         """
         self.model = model
         self.debug = debug
         self.base_url = base_url.rstrip("/")
-
-        # Download once to make sure it works and the model exists.
+        # Keep the connection to the service alive.
+        self._http = HTTPSession(max_concurrency=1, headers=HEADERS)
+
+        self._cache = None
+        cached_document = None
+        if cache_dir is not None:
+            self._cache = SeismogramCache(cache_dir=cache_dir,
+                                          cache_size_gb=cache_size_gb)
+            cached_document = self._cache.get_document(
+                [self.base_url, self.model])
+
+        try:
+            # Download once to make sure it works and the model exists.
+            info = self._download_url(
+                self._get_url(path="info", model=self.model),
+                unpack_json=True)
+            # Get the version of the service.
+            version = self._download_url(self._get_url(path="version"))
+        except Exception as e:
+            if cached_document is None:
+                raise
+            warnings.warn("Failed to connect to the syngine service due to: "
+                          "%s. Using the cached model information." % str(e),
+                          InstaseisWarning)
+            self._document = cached_document
+        else:
+            self._document = {"version": version, "info": info}
+            if self._cache is not None and \
+                    self._document != cached_document:
+                self._cache.put_document([self.base_url, self.model],
+                                         self._document)
+        if self._cache is not None:
+            # The seismograms cached for other versions of the service or
+            # the model are not used anymore.
+            self._cache_identity = get_key(self._document)
+
+        self.syngine_service_version = self._document["version"]
         self.info
 
-        # Get the version of the service.
-        self.syngine_service_version = self._download_url(self._get_url(
-            path="version"))
-
     def _get_seismograms(self, source, receiver, components=("Z", "N", "E")):
         """
         Extract seismograms.
@@ -126,12 +171,18 @@ class SyngineInstaseisDB(BaseInstaseisDB):
         else:
             raise NotImplementedError
 
+        if self._cache is not None:
+            key = get_request_key(self._cache_identity, params)
+            data = self._cache.get(key)
+            if data is not None:
+                return data
+
         url = self._get_url(path="query", **params)
 
         if self.debug:  # pragma: no cover
             print("Downloading '%s' ..." % url)
 
-        r = requests.get(url, headers=HEADERS)
+        r = self._http.get(url)
 
         if self.debug:  # pragma: no cover
             print("Downloaded '%s' with status code %i." % (url,
@@ -167,6 +218,9 @@ class SyngineInstaseisDB(BaseInstaseisDB):
         for tr in st:
             data[tr.stats.channel[-1].upper()] = tr.data
 
+        if self._cache is not None:
+            self._cache.put(key, data)
+
         return data
 
     def _get_url(self, path, **kwargs):
@@ -183,7 +237,7 @@ class SyngineInstaseisDB(BaseInstaseisDB):
         """
         if self.debug:  # pragma: no cover
             print("Downloading '%s' ..." % url)
-        r = requests.get(url, headers=HEADERS)
+        r = self._http.get(url)
         if self.debug:  # pragma: no cover
             print("Downloaded '%s' with status code %i." % (url,
                                                             r.status_code))
@@ -203,9 +257,7 @@ class SyngineInstaseisDB(BaseInstaseisDB):
         Returns a dictionary with information about the currently loaded
         database.
         """
-        info = self._download_url(self._get_url(path="info",
-                                                model=self.model),
-                                  unpack_json=True)
+        info = copy.deepcopy(self._document["info"])
         info["directory"] = self.base_url
         # Convert types lost in the translation to JSON.
         info["datetime"] = obspy.UTCDateTime(info["datetime"])
@@ -15,10 +15,15 @@ from __future__ import (absolute_import, division, print_function,
 import ctypes as C
 import glob
 import inspect
+import io
+import json
 import math
 import os
+import struct
+import zlib
 
 import numpy as np
+import obspy
 
 
 LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(
@@ -26,6 +31,11 @@ LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(
 
 cache = []
 
+# Every raw32 record starts with this magic string followed by the length of
+# the JSON header as a little endian unsigned 32 bit integer.
+RAW32_MAGIC = b"IRAW32"
+RAW32_PREFIX = struct.Struct("<6sI")
+
 
 def load_lib():
     if cache:
@@ -66,7 +76,8 @@ def elliptic_to_geocentric_latitude(lat, axis_a=6378137.0,
     """
     Convert a latitude defined on an ellipsoid to a geocentric one.
 
-    :param lat: The latitude to convert.
+    :param lat: The latitude to convert. Arrays of latitudes are converted
+        element-wise.
     :param axis_a: The length of the major axis of the planet. Defaults to
         the value of the WGS84 ellipsoid.
     :param axis_b: The length of the minor axis of the planet. Defaults to
@@ -82,10 +93,20 @@ def elliptic_to_geocentric_latitude(lat, axis_a=6378137.0,
     44.80757678401642
     >>> elliptic_to_geocentric_latitude(-45.0)
     -44.80757678401642
+    >>> lats = elliptic_to_geocentric_latitude(np.array([0.0, 45.0]))
+    >>> print(np.round(lats, 8).tolist())
+    [0.0, 44.80757678]
     """
     _f = (axis_a - axis_b) / axis_a
     E_2 = 2 * _f - _f ** 2
 
+    if np.ndim(lat):
+        lat = np.asarray(lat, dtype=np.float64)
+        singular = (np.abs(lat) < 1E-6) | (np.abs(lat - 90) < 1E-6) | \
+            (np.abs(lat + 90.0) < 1E-6)
+        return np.where(singular, lat, np.degrees(np.arctan(
+            (1 - E_2) * np.tan(np.radians(lat)))))
+
     # Singularities close to the pole and the equator. Just return the value
     # in that case.
     if abs(lat) < 1E-6 or abs(lat - 90) < 1E-6 or \
@@ -100,7 +121,8 @@ def geocentric_to_elliptic_latitude(lat, axis_a=6378137.0,
     """
     Convert a geocentric latitude to one defined on an ellipsoid.
 
-    :param lat: The latitude to convert.
+    :param lat: The latitude to convert. Arrays of latitudes are converted
+        element-wise.
     :param axis_a: The length of the major axis of the planet. Defaults to
         the value of the WGS84 ellipsoid.
     :param axis_b: The length of the minor axis of the planet. Defaults to
@@ -116,10 +138,20 @@ def geocentric_to_elliptic_latitude(lat, axis_a=6378137.0,
     45.19242321598358
     >>> geocentric_to_elliptic_latitude(-45.0)
     -45.19242321598358
+    >>> lats = geocentric_to_elliptic_latitude(np.array([0.0, 45.0]))
+    >>> print(np.round(lats, 8).tolist())
+    [0.0, 45.19242322]
     """
     _f = (axis_a - axis_b) / axis_a
     E_2 = 2 * _f - _f ** 2
 
+    if np.ndim(lat):
+        lat = np.asarray(lat, dtype=np.float64)
+        singular = (np.abs(lat) < 1E-6) | (np.abs(lat - 90) < 1E-6) | \
+            (np.abs(lat + 90.0) < 1E-6)
+        return np.where(singular, lat, np.degrees(np.arctan(
+            np.tan(np.radians(lat)) / (1 - E_2))))
+
     # Singularities close to the pole and the equator. Just return the value
     # in that case.
     if abs(lat) < 1E-6 or abs(lat - 90) < 1E-6 or \
@@ -174,3 +206,170 @@ def rfftfreq(n, d=1.0):  # pragma: no cover
     N = n // 2 + 1
     results = np.arange(0, N, dtype=int)
     return results * val
+
+
+def _delta_shuffle_compress(data):
+    """
+    Lossless compression of a float32 array.
+
+    The bit patterns are delta encoded as unsigned integers (wrapping
+    around on overflow which keeps it reversible), the bytes are shuffled
+    so all first bytes come first, then all second bytes, and so on, and
+    the result is deflate compressed. Adjacent samples of smooth signals
+    share most of their high bytes so this compresses a lot better than
+    the raw floats.
+    """
+    d = np.require(data, dtype="<f4").view("<u4")
+    delta = np.empty_like(d)
+    if len(d):
+        delta[0] = d[0]
+        delta[1:] = d[1:] - d[:-1]
+    shuffled = delta.view(np.uint8).reshape(-1, 4).T
+    return zlib.compress(np.ascontiguousarray(shuffled).tobytes())
+
+
+def _delta_shuffle_decompress(data, npts):
+    """
+    Inverse of :func:`_delta_shuffle_compress`.
+    """
+    shuffled = np.frombuffer(zlib.decompress(data), dtype=np.uint8)
+    delta = np.ascontiguousarray(shuffled.reshape(4, npts).T).view("<u4")
+    return np.cumsum(delta.ravel(), dtype="<u4").view("<f4")
+
+
+def write_raw32(st, compress=False, mu=None):
+    """
+    Serialize a stream to Instaseis' raw32 format.
+
+    A raw32 record consists of a small JSON header describing all traces
+    followed by the contiguous little endian float32 arrays of all traces.
+    This is much cheaper to produce and to parse than MiniSEED or SAC files.
+    Multiple records can simply be concatenated.
+
+    :type st: :class:`obspy.core.stream.Stream`
+    :param st: The stream to serialize.
+    :type compress: bool
+    :param compress: Delta encode, byte shuffle, and deflate compress the
+        arrays. Still lossless.
+    :type mu: float
+    :param mu: Optionally store mu in the header.
+    """
+    traces = []
+    arrays = []
+    for tr in st:
+        if compress:
+            data = _delta_shuffle_compress(tr.data)
+        else:
+            data = np.require(tr.data, dtype="<f4").tobytes()
+        arrays.append(data)
+        traces.append({
+            "network": tr.stats.network,
+            "station": tr.stats.station,
+            "location": tr.stats.location,
+            "channel": tr.stats.channel,
+            "starttime": str(tr.stats.starttime),
+            "delta": float(tr.stats.delta),
+            "npts": int(tr.stats.npts),
+            "nbytes": len(data)})
+
+    header = {
+        "compression": "delta-shuffle-deflate" if compress else None,
+        "mu": None if mu is None else float(mu),
+        "traces": traces}
+    header = json.dumps(header, sort_keys=True).encode()
+
+    return b"".join([RAW32_PREFIX.pack(RAW32_MAGIC, len(header)),
+                     header] + arrays)
+
+
+def read_raw32(data):
+    """
+    Read one or more concatenated raw32 records.
+
+    Returns an ObsPy stream. If mu is stored in the records, it will be
+    available as ``tr.stats.instaseis.mu`` for each trace.
+
+    :type data: bytes
+    :param data: The raw32 data.
+
+    >>> tr = obspy.Trace(data=np.linspace(0, 1, 5))
+    >>> st = read_raw32(write_raw32(obspy.Stream([tr]), compress=True))
+    >>> np.array_equal(st[0].data, tr.data.astype(np.float32))
+    True
+    """
+    st = obspy.Stream()
+    offset = 0
+    while offset < len(data):
+        magic, header_length = RAW32_PREFIX.unpack_from(data, offset)
+        if magic != RAW32_MAGIC:
+            raise ValueError("Not a valid raw32 record.")
+        offset += RAW32_PREFIX.size
+        header = json.loads(
+            data[offset:offset + header_length].decode())
+        offset += header_length
+
+        for trace in header["traces"]:
+            buf = data[offset:offset + trace["nbytes"]]
+            offset += trace["nbytes"]
+            if header["compression"] is None:
+                d = np.frombuffer(buf, dtype="<f4")
+            elif header["compression"] == "delta-shuffle-deflate":
+                d = _delta_shuffle_decompress(buf, trace["npts"])
+            else:
+                raise ValueError("Unknown compression: %s" %
+                                 header["compression"])
+            tr = obspy.Trace(data=np.require(d, dtype=np.float32,
+                                             requirements=["W"]))
+            for key in ("network", "station", "location", "channel",
+                        "delta"):
+                tr.stats[key] = trace[key]
+            tr.stats.starttime = obspy.UTCDateTime(trace["starttime"])
+            if header["mu"] is not None:
+                tr.stats.instaseis = obspy.core.AttribDict()
+                tr.stats.instaseis.mu = header["mu"]
+            st.traces.append(tr)
+    return st
+
+
+# Arrays describing the point sources in the body of a request.
+POINT_SOURCE_ARRAYS = ("latitudes", "longitudes", "depths_in_m", "tensors",
+                       "time_shifts", "dts", "sliprates", "sliprate_npts")
+
+
+def write_point_sources(finite_source, indices=None):
+    """
+    Serialize (a subset of) the point sources of a finite source to the body
+    of a request to the ``finite_source_raw`` route.
+
+    :param finite_source: The finite source.
+    :type finite_source: :class:`~instaseis.source.FiniteSource`
+    :param indices: Indices of the point sources to serialize. All if not
+        given.
+    """
+    if indices is None:
+        indices = slice(None)
+    with io.BytesIO() as buf:
+        np.savez(buf, **dict(
+            (_i, getattr(finite_source, _i)[indices])
+            for _i in POINT_SOURCE_ARRAYS))
+        return buf.getvalue()
+
+
+def read_point_sources(data):
+    """
+    Finite source from the body of a request to the ``finite_source_raw``
+    route.
+    """
+    # Avoid a circular import.
+    from .source import FiniteSource
+
+    with io.BytesIO(data) as buf:
+        # Never unpickle data sent by clients.
+        npz = np.load(buf, allow_pickle=False)
+        arrays = dict((_i, npz[_i]) for _i in POINT_SOURCE_ARRAYS)
+    return FiniteSource.from_arrays(
+        latitudes=arrays["latitudes"], longitudes=arrays["longitudes"],
+        depths_in_m=arrays["depths_in_m"], tensors=arrays["tensors"],
+        time_shifts=arrays["time_shifts"], dt=arrays["dts"],
+        sliprates=[_i[:_n] for _i, _n in zip(arrays["sliprates"],
+                                             arrays["sliprate_npts"])])
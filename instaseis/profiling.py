@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Profiling of the seismogram extraction.
+
+Enable it on any local database with
+:meth:`~instaseis.database_interfaces.base_instaseis_db.BaseInstaseisDB.enable_profiling`
+and it records the wall and CPU time, the bytes read from disc, and
+optionally the allocated memory of the public and internal extraction
+methods as well as of the individual stages (element lookup, HDF5 read,
+strain computation, interpolation, reconvolution, and resampling) of each
+extraction. Times and bytes read of the methods include those of all stages
+and methods they call in the same thread.
+
+>>> profiler = db.enable_profiling()  # doctest: +SKIP
+>>> st = db.get_seismograms(source=src, receiver=rec)  # doctest: +SKIP
+>>> print(profiler)  # doctest: +SKIP
+Stage                          Calls  Wall [s]  Mean [ms]  Min [ms] ...
+get_seismograms                    1     0.012     11.923    11.923 ...
+...
+>>> profiler.to_json("profile.json")  # doctest: +SKIP
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""  # NOQA
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import functools
+import io
+import json
+import threading
+
+from .database_interfaces.base_instaseis_db import _Stage
+
+
+# Stages in the order they are reported in.
+STAGES = ("element_lookup", "read_planning", "hdf5_read", "strain",
+          "interpolation", "reconvolution", "resampling", "serialization")
+
+
+class StageStatistics(object):
+    """
+    Accumulated statistics of a single method or stage.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.min_wall_time = None
+        self.max_wall_time = None
+        self.nbytes = 0
+        self.allocated_bytes = None
+
+    def add(self, stage):
+        self.calls += 1
+        self.wall_time += stage.wall_time
+        self.cpu_time += stage.cpu_time
+        if self.min_wall_time is None or stage.wall_time < self.min_wall_time:
+            self.min_wall_time = stage.wall_time
+        if self.max_wall_time is None or stage.wall_time > self.max_wall_time:
+            self.max_wall_time = stage.wall_time
+        self.nbytes += stage.nbytes
+        if stage.allocated_bytes is not None:
+            self.allocated_bytes = \
+                (self.allocated_bytes or 0) + stage.allocated_bytes
+
+    def to_dict(self):
+        return collections.OrderedDict([
+            ("calls", self.calls),
+            ("wall_time", self.wall_time),
+            ("mean_wall_time", self.wall_time / self.calls),
+            ("min_wall_time", self.min_wall_time),
+            ("max_wall_time", self.max_wall_time),
+            ("cpu_time", self.cpu_time),
+            ("mean_cpu_time", self.cpu_time / self.calls),
+            ("bytes_read", self.nbytes),
+            ("allocated_bytes", self.allocated_bytes)])
+
+
+class Profiler(object):
+    """
+    Collects the timings of a database. Don't create it directly but use
+    the ``enable_profiling()`` method of the database.
+    """
+    # Methods of the databases that are profiled.
+    PROFILED_METHODS = ("get_seismograms_finite_source", "get_seismograms",
+                        "_get_seismograms", "_get_data")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # The currently running profiled methods of each thread.
+        self._local = threading.local()
+        self.statistics = {}
+        self.started_memory_tracing = False
+
+    def _get_running_methods(self):
+        if not hasattr(self._local, "methods"):
+            self._local.methods = []
+        return self._local.methods
+
+    def observe(self, stage):
+        """
+        Record a finished stage.
+        """
+        # The bytes read by the stages are also read by all methods they
+        # are called from.
+        if stage.nbytes and stage.name not in self.PROFILED_METHODS:
+            for method in self._get_running_methods():
+                method.nbytes += stage.nbytes
+        with self._lock:
+            if stage.name not in self.statistics:
+                self.statistics[stage.name] = StageStatistics(stage.name)
+            self.statistics[stage.name].add(stage)
+
+    def wrap(self, name, func):
+        """
+        Wrap a function so that each call is recorded under the given name.
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            methods = self._get_running_methods()
+            with _Stage(name, (self.observe,)) as stage:
+                methods.append(stage)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    methods.pop()
+        return wrapper
+
+    def reset(self):
+        """
+        Discard all results so far.
+        """
+        with self._lock:
+            self.statistics = {}
+
+    def get_results(self):
+        """
+        Returns an ordered dictionary with the statistics of all recorded
+        methods and stages. Times are in seconds, all others in bytes.
+        """
+        order = self.PROFILED_METHODS + STAGES
+        with self._lock:
+            names = sorted(self.statistics.keys(), key=lambda x: (
+                order.index(x) if x in order else len(order), x))
+            return collections.OrderedDict(
+                (_i, self.statistics[_i].to_dict()) for _i in names)
+
+    def to_json(self, filename=None):
+        """
+        Export the results as JSON.
+
+        :param filename: If given, write to this file, otherwise return the
+            JSON string.
+        """
+        data = json.dumps(self.get_results(), indent=2)
+        if filename is None:
+            return data
+        with io.open(filename, "wt") as fh:
+            fh.write(data)
+
+    def get_report(self):
+        """
+        Returns the results as a human readable table.
+        """
+        header = ("%-30s %6s %9s %10s %9s %9s %9s %10s %10s" % (
+            "Stage", "Calls", "Wall [s]", "Mean [ms]", "Min [ms]",
+            "Max [ms]", "CPU [s]", "Read [MB]", "Alloc [MB]"))
+        lines = [header, "-" * len(header)]
+        for name, r in self.get_results().items():
+            if r["allocated_bytes"] is None:
+                alloc = "-"
+            else:
+                alloc = "%.3f" % (r["allocated_bytes"] / 1024.0 ** 2)
+            lines.append("%-30s %6i %9.3f %10.3f %9.3f %9.3f %9.3f %10.3f "
+                         "%10s" % (
+                             name, r["calls"], r["wall_time"],
+                             r["mean_wall_time"] * 1000.0,
+                             r["min_wall_time"] * 1000.0,
+                             r["max_wall_time"] * 1000.0, r["cpu_time"],
+                             r["bytes_read"] / 1024.0 ** 2, alloc))
+        return "\n".join(lines)
+
+    def print_report(self):
+        """
+        Print the results as a human readable table.
+        """
+        print(self.get_report())
+
+    def __str__(self):
+        return self.get_report()
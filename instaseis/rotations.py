@@ -17,6 +17,12 @@ import numpy as np
 
 
 def rotate_frame_rd(x, y, z, phi, theta):
+    """
+    Rotates cartesian coordinates to the s, phi, z frame of a source /
+    receiver at longitude phi and colatitude theta (both in degree).
+
+    Works with scalars as well as with arrays of coordinates.
+    """
     phi = np.deg2rad(phi)
     theta = np.deg2rad(theta)
     # first rotation (longitude)
@@ -32,10 +38,9 @@ def rotate_frame_rd(x, y, z, phi, theta):
     srd = np.sqrt(xp ** 2 + yp ** 2)
     zrd = zp
     phi_cp = np.arctan2(yp, xp)
-    if phi_cp < 0.0:
-        phird = 2.0 * np.pi + phi_cp
-    else:
-        phird = phi_cp
+    phird = np.where(phi_cp < 0.0, 2.0 * np.pi + phi_cp, phi_cp)
+    if not phird.ndim:
+        phird = phird[()]
     return srd, phird, zrd
 
 
@@ -206,15 +211,13 @@ def coord_transform_lat_lon_depth_to_xyz(latitude, longitude, depth_in_m,
     """
     longitude_rad = np.radians(longitude)
     latitude_rad = np.radians(latitude)
+    r = planet_radius - np.asarray(depth_in_m, dtype=np.float64)
 
-    xyz = np.empty(3)
-    xyz[0] = (planet_radius - depth_in_m) \
-        * np.cos(latitude_rad) * np.cos(longitude_rad)
-    xyz[1] = (planet_radius - depth_in_m) \
-        * np.cos(latitude_rad) * np.sin(longitude_rad)
-    xyz[2] = (planet_radius - depth_in_m) * np.sin(latitude_rad)
-
-    return xyz
+    # Shape (3,) for scalars and (N, 3) for arrays.
+    return np.stack([
+        r * np.cos(latitude_rad) * np.cos(longitude_rad),
+        r * np.cos(latitude_rad) * np.sin(longitude_rad),
+        r * np.sin(latitude_rad) * np.ones_like(longitude_rad)], axis=-1)
 
 
 def coord_transform_xyz_to_lat_lon_depth(x, y, z, planet_radius=6371e3):
@@ -232,3 +235,133 @@ def coord_transform_xyz_to_lat_lon_depth(x, y, z, planet_radius=6371e3):
     depth_in_m = planet_radius - r
 
     return latitude, longitude, depth_in_m
+
+
+# (row, column) of the upper triangle -> index in voigt notation.
+_VOIGT_INDICES = {(0, 0): 0, (1, 1): 1, (2, 2): 2, (1, 2): 3, (0, 2): 4,
+                  (0, 1): 5}
+
+
+def voigt_to_matrix(mt):
+    """
+    Symmetric tensors in voigt notation of shape (..., 6) to full matrices of
+    shape (..., 3, 3).
+    """
+    mt = np.asarray(mt)
+    A = np.empty(mt.shape[:-1] + (3, 3), dtype=mt.dtype)
+    for (i, j), k in _VOIGT_INDICES.items():
+        A[..., i, j] = mt[..., k]
+        A[..., j, i] = mt[..., k]
+    return A
+
+
+def matrix_to_voigt(A):
+    """
+    Symmetric matrices of shape (..., 3, 3) to voigt notation of shape
+    (..., 6).
+    """
+    A = np.asarray(A)
+    mt = np.empty(A.shape[:-2] + (6,), dtype=A.dtype)
+    for (i, j), k in _VOIGT_INDICES.items():
+        mt[..., k] = A[..., i, j]
+    return mt
+
+
+def get_rotation_matrix_xyz_src_to_xyz_earth(phi, theta):
+    """
+    Rotation matrices from a cartesian system xyz with z axis aligned with
+    the source / receiver to a cartesian system x,y,z where z is aligned with
+    the north pole (TNM 2007 eq 14). Transpose them for the opposite
+    direction.
+
+    :param phi: Longitudes in radian.
+    :param theta: Colatitudes in radian.
+    :returns: Array of shape (..., 3, 3) with the shape of the inputs
+        prepended.
+    """
+    phi, theta = np.broadcast_arrays(np.asarray(phi, dtype=np.float64),
+                                     np.asarray(theta, dtype=np.float64))
+    ct = np.cos(theta)
+    cp = np.cos(phi)
+    st = np.sin(theta)
+    sp = np.sin(phi)
+
+    R = np.empty(phi.shape + (3, 3))
+    R[..., 0, 0] = ct * cp
+    R[..., 0, 1] = -sp
+    R[..., 0, 2] = st * cp
+    R[..., 1, 0] = ct * sp
+    R[..., 1, 1] = cp
+    R[..., 1, 2] = st * sp
+    R[..., 2, 0] = -st
+    R[..., 2, 1] = 0.0
+    R[..., 2, 2] = ct
+    return R
+
+
+def get_rotation_matrix_xyz_to_src(phi):
+    """
+    Rotation matrices from a cartesian system x,y,z where z is aligned with
+    the source and x with phi = 0 to the AxiSEM s, phi, z system. Transpose
+    them for the opposite direction.
+
+    :param phi: Azimuths in radian.
+    :returns: Array of shape (..., 3, 3) with the shape of the input
+        prepended.
+    """
+    phi = np.asarray(phi, dtype=np.float64)
+    cp = np.cos(phi)
+    sp = np.sin(phi)
+
+    R = np.zeros(phi.shape + (3, 3))
+    R[..., 0, 0] = cp
+    R[..., 0, 1] = sp
+    R[..., 1, 0] = -sp
+    R[..., 1, 1] = cp
+    R[..., 2, 2] = 1.0
+    return R
+
+
+def get_rotation_matrix_src_to_rec(srclon, srccolat, reclon, reccolat, phi):
+    """
+    The three rotations applied to a source before extracting seismograms
+    from a reciprocal database composed into a single matrix per
+    source-receiver pair: from the cartesian system of the source to the
+    cartesian system of the earth, from there to the cartesian system of the
+    receiver, and then to the AxiSEM s, phi, z system.
+
+    All angles in radian. Apply it with :func:`rotate_symm_tensor_voigt` or
+    :func:`rotate_vector`.
+    """
+    return np.einsum(
+        "...ij,...kj,...kl->...il",
+        get_rotation_matrix_xyz_to_src(phi),
+        get_rotation_matrix_xyz_src_to_xyz_earth(reclon, reccolat),
+        get_rotation_matrix_xyz_src_to_xyz_earth(srclon, srccolat))
+
+
+def rotate_symm_tensor_voigt(mt, R):
+    """
+    Rotates symmetric tensors in voigt notation, computing R.A.Rt.
+
+    :param mt: Tensors of shape (..., 6).
+    :param R: Rotation matrices of shape (..., 3, 3).
+    :returns: The rotated tensors of shape (..., 6).
+    """
+    # Like rotate_symm_tensor_voigt_xyz_earth_to_xyz_src() this uses extended
+    # precision to cope with tensor elements of vastly different magnitudes.
+    A = voigt_to_matrix(np.require(mt, dtype=np.longdouble))
+    R = np.require(R, dtype=np.longdouble)
+    B = np.einsum("...ij,...jk,...lk->...il", R, A, R)
+    return np.require(matrix_to_voigt(B), dtype=np.float64)
+
+
+def rotate_vector(vec, R):
+    """
+    Rotates vectors, computing R.v.
+
+    :param vec: Vectors of shape (..., 3).
+    :param R: Rotation matrices of shape (..., 3, 3).
+    :returns: The rotated vectors of shape (..., 3).
+    """
+    return np.einsum("...ij,...j->...i", R, vec)
@@ -6,7 +6,12 @@ seismograms.
 
 Especially useful to be able to trust the repacking script. It works by
 generating random source and receiver locations and compares both. It is an
-infinite loop so the user has to manually cancel it after a while.
+infinite loop so the user has to manually cancel it after a while unless a
+number of comparisons is given.
+
+Lossy databases, e.g. merged databases with quantized snapshots, cannot
+produce exactly the same seismograms. Passing a tolerance compares the
+relative misfit of the waveforms instead.
 
 
 Usage:
@@ -18,6 +23,11 @@ Usage:
 
 In this example ``DB2``  and ``DB3`` will both be compared the ``DB1``.
 
+.. code-block:: bash
+
+    $ python -m instaseis.scripts.compare_dbs --tolerance=1E-2 --count=100 \
+        DB1 DB2
+
 
 Requires click, Instaseis, and ObsPy.
 
@@ -27,29 +37,71 @@ Requires click, Instaseis, and ObsPy.
     GNU Lesser General Public License, Version 3 [non-commercial/academic use]
     (http://www.gnu.org/copyleft/lgpl.html)
 """
+import itertools
 import random
 
 import click
 import instaseis
+import numpy as np
 import obspy
 
 
+def get_misfit(reference, other):
+    """
+    The largest relative L2 misfit of the traces of two streams.
+
+    :param reference: The reference stream.
+    :param other: The stream to compare. It must have the same traces in the
+        same order.
+    """
+    if len(reference) != len(other):
+        raise ValueError("The streams have different traces.")
+    misfits = []
+    for tr_ref, tr in zip(reference, other):
+        if tr_ref.stats != tr.stats:
+            raise ValueError("The streams have different traces.")
+        norm = np.sqrt(np.sum(tr_ref.data.astype(np.float64) ** 2))
+        misfit = np.sqrt(np.sum((tr.data.astype(np.float64) -
+                                 tr_ref.data) ** 2))
+        misfits.append(misfit / norm if norm else misfit)
+    return max(misfits) if misfits else 0.0
+
+
 @click.command(help="Pass a list of databases to assert that they produce the "
                     "same seismograms. The first one will be treated as the "
                     "reference.")
 @click.option("--seed", type=int,
               help="Optionally pass a seed number to make it reproducible.")
+@click.option("--tolerance", type=float,
+              help="Accept seismograms whose relative L2 misfit to the "
+                   "reference does not exceed this value instead of "
+                   "requiring them to be identical. Required for lossy, "
+                   "e.g. quantized, databases.")
+@click.option("--count", type=click.IntRange(1),
+              help="Stop after this many comparisons instead of running "
+                   "until cancelled.")
 @click.argument("databases", type=click.Path(exists=True, file_okay=False,
                                              dir_okay=True), nargs=-1)
-def compare_dbs(seed, databases):
+def compare_dbs(seed, tolerance, count, databases):
     if seed:
         random.seed(seed)
     reference = instaseis.open_db(databases[0])
     others = [instaseis.open_db(_i) for _i in databases[1:]]
 
+    for db in others:
+        mesh = getattr(getattr(db, "meshes", None), "merged", None)
+        if mesh is not None and mesh.is_quantized:
+            print("%s is quantized with a maximum relative error of the "
+                  "snapshots of %g." % (db.info.directory,
+                                        mesh.quantization_error))
+            if tolerance is None:
+                print("It will not produce identical seismograms - pass a "
+                      "tolerance.")
+
     max_depth = (reference.info.max_radius - reference.info.min_radius)
+    max_misfits = [0.0] * len(others)
 
-    while True:
+    for _ in (itertools.repeat(None) if count is None else range(count)):
         receiver = instaseis.Receiver(
             latitude=random.random() * 180.0 - 90.0,
             longitude=random.random() * 360.0 - 180.0,
@@ -74,9 +126,18 @@ def compare_dbs(seed, databases):
         oth = [_i.get_seismograms(source=source, receiver=receiver,
                                   components="ZNERT") for _i in others]
 
-        for _i, _j in zip(oth, others):
-            print(_j.info.directory, ":", ref == _i)
-            assert ref == _i, str(source) + "\n" + str(receiver)
+        for _k, (_i, _j) in enumerate(zip(oth, others)):
+            if tolerance is None:
+                print(_j.info.directory, ":", ref == _i)
+                assert ref == _i, str(source) + "\n" + str(receiver)
+                continue
+            misfit = get_misfit(ref, _i)
+            max_misfits[_k] = max(max_misfits[_k], misfit)
+            print("%s : misfit %g (max %g)" % (
+                _j.info.directory, misfit, max_misfits[_k]))
+            assert misfit <= tolerance, "Misfit %g > %g\n%s\n%s" % (
+                misfit, tolerance, str(source), str(receiver))
+
 
 if __name__ == "__main__":
     compare_dbs()
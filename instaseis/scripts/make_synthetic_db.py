@@ -0,0 +1,544 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Create synthetic Instaseis databases of arbitrary size.
+
+The databases are structurally identical to the ones written by AxiSEM but
+the mesh is a simple regular grid of spheroidal elements in the
+meridional plane and the wavefields are analytic pulses spreading from the
+source. They are useless for seismology but good enough to benchmark and
+test Instaseis with databases of realistic sizes, e.g.
+
+    $ python -m instaseis.scripts.make_synthetic_db OUTPUT_FOLDER \\
+        --size_in_gb 20 --npts 1000
+
+Requires click, netCDF4, and numpy.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import contextlib
+import math
+import os
+import shutil
+
+import click
+import netCDF4
+import numpy as np
+import obspy
+from scipy.special import erf, roots_jacobi
+
+
+# Polynomial order of the elements.
+NPOL = 4
+
+# The variables of each file for the different database types.
+DISPL_VARIABLES = {
+    "monopole": ["disp_s", "disp_z"],
+    "dipole": ["disp_s", "disp_p", "disp_z"],
+    "quadpole": ["disp_s", "disp_p", "disp_z"]}
+
+STRAIN_VARIABLES = {
+    "monopole": ["strain_dsus", "strain_dsuz", "strain_dpup", "straintrace"],
+    "dipole": ["strain_dsus", "strain_dsuz", "strain_dpup", "strain_dsup",
+               "strain_dzup", "straintrace"]}
+
+# (folder, excitation type, source type) of all files.
+RECIPROCAL_FILES = {
+    "horizontal": [("PX", "dipole", "thetaforce")],
+    "vertical": [("PZ", "monopole", "vertforce")],
+    "both": [("PX", "dipole", "thetaforce"),
+             ("PZ", "monopole", "vertforce")]}
+
+FORWARD_FILES = [("MZZ", "monopole", "mrr"),
+                 ("MXX_P_MYY", "monopole", "mtt_p_mpp"),
+                 ("MXZ_MYZ", "dipole", "mtr"),
+                 ("MXY_MXX_M_MYY", "quadpole", "mtp")]
+
+# Constant elastic parameters.
+RHO = 3300.0
+VP = 8000.0
+VS = 4500.0
+
+# Amplitude of the analytic wavefields.
+AMPLITUDE = 1E-20
+
+
+@contextlib.contextmanager
+def dummy_progressbar(iterator, *args, **kwargs):
+    yield iterator
+
+
+def _get_files(forward, components):
+    if forward:
+        return FORWARD_FILES
+    return RECIPROCAL_FILES[components]
+
+
+def _get_variables(dump_type, excitation_type):
+    if dump_type == "displ_only":
+        return DISPL_VARIABLES[excitation_type]
+    return STRAIN_VARIABLES[excitation_type]
+
+
+def get_collocation_points():
+    """
+    Returns the Gauss-Lobatto-Legendre and the Gauss-Lobatto-Jacobi (0, 1)
+    points used by AxiSEM.
+    """
+    gll = np.concatenate([[-1.0], roots_jacobi(NPOL - 1, 1, 1)[0], [1.0]])
+    glj = np.concatenate([[-1.0], roots_jacobi(NPOL - 1, 1, 2)[0], [1.0]])
+    return gll, glj
+
+
+def get_derivative_matrix(points):
+    """
+    The derivatives of all Lagrange polynomials of the given points at
+    these points. ``D[i, j]`` is the derivative of the ``j``th polynomial at
+    the ``i``th point.
+    """
+    n = len(points)
+    d = np.empty((n, n), dtype=np.float64)
+    for j in range(n):
+        y = np.zeros(n)
+        y[j] = 1.0
+        p = np.polyfit(points, y, n - 1)
+        d[:, j] = np.polyval(np.polyder(p), points)
+    return d
+
+
+def get_number_of_elements(size_in_gb, npts, dump_type="displ_only",
+                           forward=False, components="both"):
+    """
+    Estimate the number of elements required for a database of the given
+    size. Every element has on average 16 unique GLL points.
+    """
+    nvars = sum(len(_get_variables(dump_type, _i[1]))
+                for _i in _get_files(forward, components))
+    return max(int(size_in_gb * 1024 ** 3 / (16 * nvars * npts * 4)), 8)
+
+
+def create_mesh(elements, planet_radius, min_radius):
+    """
+    Create a regular mesh of spheroidal elements in the meridional plane.
+
+    Elements are numbered like in AxiSEM. Nodes 1 and 2 are on the inner
+    radius for elements in the northern hemisphere and on the outer radius
+    for elements in the southern one. The first and the last column of
+    elements touch the axis, their xi = -1 side is on the axis.
+
+    :param elements: The approximate number of elements. Elements will be
+        roughly square.
+    :param planet_radius: The outer radius in m.
+    :param min_radius: The inner radius in m.
+    """
+    depth = planet_radius - min_radius
+    mean_radius = planet_radius - depth / 2.0
+    # Even number of columns so the equator is an element boundary.
+    n_theta = int(round(math.sqrt(
+        elements * math.pi * mean_radius / depth) / 2.0)) * 2
+    n_theta = max(n_theta, 2)
+    n_rad = max(int(round(elements / n_theta)), 1)
+
+    gll, glj = get_collocation_points()
+    theta_edges = np.linspace(0.0, np.pi, n_theta + 1)
+    r_edges = np.linspace(min_radius, planet_radius, n_rad + 1)
+
+    i, j = np.meshgrid(np.arange(n_rad), np.arange(n_theta), indexing="ij")
+    i = i.ravel()
+    j = j.ravel()
+    nelem = len(i)
+
+    north = j < n_theta // 2
+    axis = (j == 0) | (j == n_theta - 1)
+
+    # Reference coordinates of the points in xi and eta direction.
+    xi = np.where(axis[:, np.newaxis], glj, gll)
+    eta = np.repeat(gll[np.newaxis, :], nelem, axis=0)
+
+    # Coordinates of the xi = -1/eta = -1 and xi = 1/eta = 1 sides.
+    theta_0 = np.where(north, theta_edges[j], theta_edges[j + 1])
+    theta_1 = np.where(north, theta_edges[j + 1], theta_edges[j])
+    r_0 = np.where(north, r_edges[i], r_edges[i + 1])
+    r_1 = np.where(north, r_edges[i + 1], r_edges[i])
+
+    theta = theta_0[:, np.newaxis] + \
+        (xi + 1.0) / 2.0 * (theta_1 - theta_0)[:, np.newaxis]
+    r = r_0[:, np.newaxis] + (eta + 1.0) / 2.0 * (r_1 - r_0)[:, np.newaxis]
+
+    # sem_mesh[elem, eta index, xi index].
+    s = r[:, :, np.newaxis] * np.sin(theta)[:, np.newaxis, :]
+    z = r[:, :, np.newaxis] * np.cos(theta)[:, np.newaxis, :]
+
+    # Points on the shared edges of elements are only stored once - identify
+    # them by their global index in radius and colatitude.
+    idx = np.arange(NPOL + 1)
+    r_idx = np.where(north[:, np.newaxis], NPOL * i[:, np.newaxis] + idx,
+                     NPOL * i[:, np.newaxis] + NPOL - idx)
+    t_idx = np.where(north[:, np.newaxis], NPOL * j[:, np.newaxis] + idx,
+                     NPOL * j[:, np.newaxis] + NPOL - idx)
+    keys = r_idx[:, :, np.newaxis] * (NPOL * n_theta + 1) + \
+        t_idx[:, np.newaxis, :]
+    _, sem_mesh = np.unique(keys.ravel(), return_inverse=True)
+    sem_mesh = sem_mesh.reshape(keys.shape).astype(np.int32)
+
+    npoints = sem_mesh.max() + 1
+    mesh_s = np.empty(npoints, dtype=np.float64)
+    mesh_z = np.empty(npoints, dtype=np.float64)
+    mesh_s[sem_mesh.ravel()] = s.ravel()
+    mesh_z[sem_mesh.ravel()] = z.ravel()
+    # Avoid tiny negative values on the axis.
+    mesh_s = np.abs(mesh_s)
+
+    midpoint_mesh = sem_mesh[:, NPOL // 2, NPOL // 2]
+    fem_mesh = np.require(np.array([
+        sem_mesh[:, 0, 0], sem_mesh[:, 0, NPOL], sem_mesh[:, NPOL, NPOL],
+        sem_mesh[:, NPOL, 0]]).T, requirements=["C"])
+
+    return {
+        "sem_mesh": sem_mesh,
+        "fem_mesh": fem_mesh,
+        "midpoint_mesh": midpoint_mesh.astype(np.int32),
+        "mp_mesh_S": mesh_s[midpoint_mesh],
+        "mp_mesh_Z": mesh_z[midpoint_mesh],
+        "eltype": np.zeros(nelem, dtype=np.int32),
+        "axis": axis.astype(np.int32),
+        "mesh_S": mesh_s,
+        "mesh_Z": mesh_z,
+        "gll": gll,
+        "glj": glj}
+
+
+def get_analytic_field(s, z, times, source_z, velocity, width, factor,
+                       variable_index):
+    """
+    A Gaussian pulse spreading from a source on the axis with geometrical
+    spreading and a directivity depending on the variable.
+
+    :param s: The s coordinates of the points.
+    :param z: The z coordinates of the points.
+    :param times: The times relative to the origin of the pulse.
+    :returns: Array of shape (len(times), len(s)).
+    """
+    distance = np.sqrt(s ** 2 + (z - source_z) ** 2)
+    angle = np.arctan2(s, source_z - z) + 0.3 * variable_index
+    amplitude = factor * AMPLITUDE * np.cos(angle) / \
+        (1.0 + distance / 1E6)
+    arrival = distance / velocity
+    return (amplitude[np.newaxis, :] * np.exp(
+        -((times[:, np.newaxis] - arrival[np.newaxis, :]) / width) ** 2))
+
+
+def _set_attributes(f, attributes):
+    for key, value in attributes.items():
+        if isinstance(value, np.ndarray):
+            f.setncattr(key, value)
+        # The setncattr_string() was added in version 1.2.3. Before that it
+        # was the default behavior.
+        elif hasattr(f, "setncattr_string"):
+            f.setncattr_string(key, value)
+        else:
+            f.setncattr(key, str(value))
+
+
+def write_file(filename, mesh, attributes, variables, times, stf, stf_d,
+               source_z, velocity, width, file_index, dump_type, transposed,
+               contiguous, compression_level, quiet):
+    """
+    Write a single netCDF file of a synthetic database.
+    """
+    npoints = len(mesh["mesh_S"])
+    nelem = len(mesh["sem_mesh"])
+    npts = len(times)
+
+    zlib = not contiguous and compression_level > 0
+
+    with netCDF4.Dataset(filename, "w", format="NETCDF4") as f:
+        _set_attributes(f, attributes)
+        f.setncattr("npoints", np.array([npoints], dtype=np.int32))
+        if dump_type == "displ_only":
+            f.setncattr("nelem_kwf_global", np.array([nelem], dtype=np.int32))
+
+        f.createDimension("gllpoints_all", npoints)
+        f.createDimension("snapshots", npts)
+
+        # The mesh.
+        m = f.createGroup("Mesh")
+        m.createDimension("elements", nelem)
+        m.createDimension("control_points", 4)
+        m.createDimension("npol", NPOL + 1)
+
+        mu = RHO * VS ** 2
+        point_arrays = [("mesh_S", mesh["mesh_S"]), ("mesh_Z", mesh["mesh_Z"]),
+                        ("mesh_vp", VP), ("mesh_vs", VS), ("mesh_rho", RHO),
+                        ("mesh_lambda", RHO * VP ** 2 - 2.0 * mu),
+                        ("mesh_mu", mu), ("mesh_xi", 1.0), ("mesh_phi", 1.0),
+                        ("mesh_eta", 1.0)]
+        for name, value in point_arrays:
+            v = m.createVariable(name, np.float32, ("gllpoints_all",))
+            v[:] = value
+
+        if dump_type == "displ_only":
+            for name, dims, dtype in [
+                    ("midpoint_mesh", ("elements",), np.int32),
+                    ("eltype", ("elements",), np.int32),
+                    ("axis", ("elements",), np.int32),
+                    ("fem_mesh", ("elements", "control_points"), np.int32),
+                    ("sem_mesh", ("elements", "npol", "npol"), np.int32),
+                    ("mp_mesh_S", ("elements",), np.float32),
+                    ("mp_mesh_Z", ("elements",), np.float32),
+                    ("gll", ("npol",), np.float64),
+                    ("glj", ("npol",), np.float64)]:
+                v = m.createVariable(name, dtype, dims)
+                v[:] = mesh[name]
+
+            g1 = get_derivative_matrix(mesh["glj"])
+            g2 = get_derivative_matrix(mesh["gll"])
+            for name, value, dims in [("G0", g1[0], ("npol",)),
+                                      ("G1", g1, ("npol", "npol")),
+                                      ("G2", g2, ("npol", "npol"))]:
+                v = m.createVariable(name, np.float64, dims)
+                v[:] = value
+
+        # The snapshots and the source time function.
+        snapshots = f.createGroup("Snapshots")
+        for name, value in [("stf_dump", stf), ("stf_d_dump", stf_d)]:
+            v = snapshots.createVariable(name, np.float32, ("snapshots",))
+            v[:] = value
+
+        # Around 32 kB per chunk as AxiSEM does it.
+        chunk = max(int(round(32768 / (npts * 4))), 1)
+        if transposed:
+            dims = ("gllpoints_all", "snapshots")
+            chunksizes = (chunk, npts)
+        else:
+            dims = ("snapshots", "gllpoints_all")
+            chunksizes = (npts, chunk)
+        if contiguous:
+            chunksizes = None
+
+        # Write around 8 MB at a time.
+        step = max(int((8 * 1024 * 1024 / 4) / npts), 1)
+        nsteps = int(math.ceil(npoints / float(step)))
+
+        for _i, name in enumerate(variables):
+            v = snapshots.createVariable(
+                name, np.float32, dims, zlib=zlib,
+                complevel=max(compression_level, 1), contiguous=contiguous,
+                chunksizes=chunksizes)
+
+            if quiet:
+                pbar = dummy_progressbar
+            else:
+                click.echo(click.style("\tWriting 'Snapshots/%s'..." % name,
+                                       fg="blue"))
+                pbar = click.progressbar
+
+            with pbar(range(nsteps), length=nsteps, label="\t  ") as idx:
+                for _j in idx:
+                    _s = slice(_j * step, (_j + 1) * step)
+                    data = get_analytic_field(
+                        s=mesh["mesh_S"][_s], z=mesh["mesh_Z"][_s],
+                        times=times, source_z=source_z, velocity=velocity,
+                        width=width, factor=1.0 + 0.2 * file_index,
+                        variable_index=_i).astype(np.float32)
+                    if transposed:
+                        v[_s, :] = data.T
+                    else:
+                        v[:, _s] = data
+
+
+def make_synthetic_db(output_folder, elements=1000, npts=500, dt=5.0,
+                      dump_type="displ_only", forward=False,
+                      components="both", merged=False, transposed=False,
+                      contiguous=False, compression_level=0,
+                      max_depth_in_km=700.0, source_depth_in_km=10.0,
+                      period=None, quiet=False):
+    """
+    Create a synthetic database.
+
+    :param output_folder: The folder to write it to. Must not yet exist.
+    :param elements: The approximate number of elements.
+    :param npts: The number of samples of the wavefields.
+    :param dt: The sampling interval of the wavefields in seconds.
+    :param dump_type: ``"displ_only"`` or ``"strain_only"``. Forward and
+        merged databases are always ``"displ_only"``.
+    :param forward: Create a forward instead of a reciprocal database.
+    :param components: ``"both"``, ``"vertical"``, or ``"horizontal"``.
+        Only for reciprocal databases.
+    :param merged: Create a merged database.
+    :param transposed: Store the snapshots with time as the fast axis.
+    :param contiguous: Store the snapshots contiguously without chunking
+        and compression.
+    :param compression_level: zlib compression level of the snapshots. 0
+        disables compression.
+    :param max_depth_in_km: Maximum depth of the database.
+    :param source_depth_in_km: Source depth of forward databases.
+    :param period: Dominant period. Defaults to five times ``dt``.
+    :param quiet: Don't print anything.
+    """
+    if os.path.exists(output_folder):
+        raise ValueError("'%s' already exists." % output_folder)
+    if dump_type not in ("displ_only", "strain_only"):
+        raise ValueError("dump_type must be 'displ_only' or 'strain_only'.")
+    if dump_type != "displ_only" and (forward or merged):
+        raise ValueError("Forward and merged databases must be "
+                         "'displ_only'.")
+    if components not in RECIPROCAL_FILES:
+        raise ValueError("components must be one of %s." % ", ".join(
+            sorted(RECIPROCAL_FILES)))
+
+    planet_radius = 6371000.0
+    min_radius = planet_radius - max_depth_in_km * 1000.0
+    if period is None:
+        period = 5.0 * dt
+
+    if not quiet:
+        click.echo(click.style("Creating mesh ...", fg="green"))
+    mesh = create_mesh(elements=elements, planet_radius=planet_radius,
+                       min_radius=min_radius)
+
+    # Error function source time function shifted by 1.5 periods.
+    src_shift_samples = int(math.ceil(1.5 * period / dt))
+    src_shift = src_shift_samples * dt
+    times = np.arange(npts) * dt
+    magnitude = 1E20
+    stf = magnitude * 0.5 * (1.0 + erf((times - src_shift) / (period / 2.0)))
+    stf_d = np.gradient(stf, dt)
+
+    # The pulse travels across the whole planet within 3/4 of the
+    # seismograms.
+    length = (npts - 1) * dt
+    velocity = 2.0 * planet_radius / max(0.75 * length - src_shift, dt)
+    width = max(period / 2.0, 2.0 * dt)
+
+    if forward:
+        source_z = planet_radius - source_depth_in_km * 1000.0
+        source_depth = source_depth_in_km
+    else:
+        source_z = planet_radius
+        source_depth = 0.0
+
+    attributes = {
+        "file version": np.array([7], dtype=np.int32),
+        "npol": np.array([NPOL], dtype=np.int32),
+        "number of strain dumps": np.array([npts], dtype=np.int32),
+        "dump type (displ_only, displ_velo, fullfields)": dump_type,
+        "simulation type": "moment" if forward else "force",
+        "background model": "synthetic",
+        "attenuation": np.array([0], dtype=np.int32),
+        "planet radius": np.array([planet_radius / 1000.0]),
+        "dominant source period": np.array([period], dtype=np.float32),
+        "git commit hash": "synthetic",
+        "datetime": str(obspy.UTCDateTime()),
+        "compiler brand": "instaseis",
+        "compiler version": "synthetic",
+        "user name": "instaseis",
+        "host name": "synthetic",
+        "kernel wavefield rmin": np.array([min_radius / 1000.0]),
+        "kernel wavefield rmax": np.array([planet_radius / 1000.0]),
+        "kernel wavefield colatmin": np.array([0.0]),
+        "kernel wavefield colatmax": np.array([180.0]),
+        "time scheme": "newmark2",
+        "source depth in km": np.array([source_depth], dtype=np.float32),
+        "Source colatitude": np.array([0.0], dtype=np.float32),
+        "Source longitude": np.array([0.0], dtype=np.float32),
+        "source time function": "errorf",
+        "scalar source magnitude": np.array([magnitude], dtype=np.float32),
+        "strain dump sampling rate in sec": np.array([dt]),
+        "source shift factor in sec": np.array([src_shift],
+                                               dtype=np.float32),
+        "source shift factor for deltat_coarse": np.array(
+            [src_shift_samples], dtype=np.int32)}
+
+    files = _get_files(forward, components)
+
+    if merged:
+        folder = os.path.join(output_folder, "_unmerged")
+    else:
+        folder = output_folder
+
+    filenames = []
+    for _i, (name, excitation_type, source_type) in enumerate(files):
+        filename = os.path.join(folder, name, "Data", "ordered_output.nc4")
+        os.makedirs(os.path.dirname(filename))
+        if not quiet:
+            click.echo(click.style("--> Creating file %i of %i: %s" % (
+                _i + 1, len(files), filename), fg="green"))
+        attributes["excitation type"] = excitation_type
+        attributes["source type"] = source_type
+        write_file(filename=filename, mesh=mesh, attributes=attributes,
+                   variables=_get_variables(dump_type, excitation_type),
+                   times=times - src_shift, stf=stf, stf_d=stf_d,
+                   source_z=source_z, velocity=velocity, width=width,
+                   file_index=_i, dump_type=dump_type,
+                   transposed=transposed, contiguous=contiguous,
+                   compression_level=compression_level, quiet=quiet)
+        filenames.append(filename)
+
+    if merged:
+        from .repack_db import merge_files
+        if not quiet:
+            click.echo(click.style("--> Merging files ...", fg="green"))
+        merge_files(filenames=filenames, output_folder=output_folder,
+                    contiguous=contiguous,
+                    compression_level=max(compression_level, 1),
+                    quiet=quiet)
+        shutil.rmtree(folder)
+
+
+@click.command()
+@click.argument("output_folder", type=click.Path(exists=False))
+@click.option("--elements", type=click.IntRange(8), default=1000,
+              help="Approximate number of elements.")
+@click.option("--size_in_gb", type=float,
+              help="Approximate size of the database. Overwrites "
+                   "--elements.")
+@click.option("--npts", type=click.IntRange(10), default=500,
+              help="Number of samples of the wavefields.")
+@click.option("--dt", type=float, default=5.0,
+              help="Sampling interval of the wavefields in seconds.")
+@click.option("--dump_type", type=click.Choice(["displ_only", "strain_only"]),
+              default="displ_only")
+@click.option("--forward", is_flag=True,
+              help="Create a forward instead of a reciprocal database.")
+@click.option("--components",
+              type=click.Choice(["both", "vertical", "horizontal"]),
+              default="both",
+              help="Components of reciprocal databases.")
+@click.option("--merged", is_flag=True, help="Create a merged database.")
+@click.option("--transposed", is_flag=True,
+              help="Store the snapshots with time as the fast axis.")
+@click.option("--contiguous", is_flag=True,
+              help="Write contiguous arrays - will turn off chunking and "
+                   "compression.")
+@click.option("--compression_level", type=click.IntRange(0, 9), default=0,
+              help="Compression level from 1 (fast) to 9 (slow). 0 turns "
+                   "off compression.")
+@click.option("--max_depth_in_km", type=float, default=700.0,
+              help="Maximum depth of the database.")
+@click.option("--source_depth_in_km", type=float, default=10.0,
+              help="Source depth of forward databases.")
+def main(output_folder, elements, size_in_gb, npts, dt, dump_type, forward,
+         components, merged, transposed, contiguous, compression_level,
+         max_depth_in_km, source_depth_in_km):
+    if size_in_gb is not None:
+        elements = get_number_of_elements(
+            size_in_gb=size_in_gb, npts=npts, dump_type=dump_type,
+            forward=forward, components=components)
+    make_synthetic_db(
+        output_folder=output_folder, elements=elements, npts=npts, dt=dt,
+        dump_type=dump_type, forward=forward, components=components,
+        merged=merged, transposed=transposed, contiguous=contiguous,
+        compression_level=compression_level, max_depth_in_km=max_depth_in_km,
+        source_depth_in_km=source_depth_in_km)
+
+
+if __name__ == "__main__":
+    main()
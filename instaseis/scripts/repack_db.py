@@ -11,14 +11,17 @@ Requires click, netCDF4, and numpy.
     GNU Lesser General Public License, Version 3 [non-commercial/academic use]
     (http://www.gnu.org/copyleft/lgpl.html)
 """
+import collections
 import contextlib
 import math
+import multiprocessing
 import os
 import sys
 
 import click
 import netCDF4
 import numpy as np
+import scipy.signal
 from scipy.spatial import cKDTree
 
 
@@ -31,38 +34,339 @@ else:
 __netcdf_version = tuple(int(i) for i in netCDF4.__version__.split("."))
 
 
+# Approximate size of the blocks of elements that are read, reordered, and
+# written in one go when merging databases.
+DEFAULT_BLOCK_SIZE_IN_MB = 64
+
+# GLL points that are at most this many points apart are read with a single
+# contiguous read - reading a few unneeded points is much cheaper than an
+# additional I/O operation.
+MAX_GAP_IN_POINTS = 128
+
+# Attribute of merged files that are not yet complete. It stores the number
+# of elements that have already been written so the merging can be resumed.
+PROGRESS_ATTRIBUTE = "merge_next_element"
+
+# Snapshot variables of the individual files for all valid combinations of
+# files, in the order of the "nvars" dimension of the merged file.
+SNAPSHOT_VARIABLES = {
+    ("PX", "PZ"): [("PX", "disp_s"), ("PX", "disp_p"), ("PX", "disp_z"),
+                   ("PZ", "disp_s"), ("PZ", "disp_z")],
+    ("PX",): [("PX", "disp_s"), ("PX", "disp_p"), ("PX", "disp_z")],
+    ("PZ",): [("PZ", "disp_s"), ("PZ", "disp_z")],
+    ("MXX_P_MYY", "MXY_MXX_M_MYY", "MXZ_MYZ", "MZZ"): [
+        ("MZZ", "disp_s"), ("MZZ", "disp_z"),
+        ("MXX_P_MYY", "disp_s"), ("MXX_P_MYY", "disp_z"),
+        ("MXZ_MYZ", "disp_s"), ("MXZ_MYZ", "disp_p"), ("MXZ_MYZ", "disp_z"),
+        ("MXY_MXX_M_MYY", "disp_s"), ("MXY_MXX_M_MYY", "disp_p"),
+        ("MXY_MXX_M_MYY", "disp_z")]}
+
+# Strategies to order the elements of merged files. Elements that are close
+# in the file are likely in the same chunk and read together.
+ELEMENT_ORDERS = ("kdtree", "hilbert", "morton", "frequency")
+
+# Number of bits per coordinate of the space filling curves.
+CURVE_ORDER = 16
+
+# Quantized snapshots are stored as 16 bit integers in the range of
+# +/- this value with a scale and an offset per element and variable.
+QUANTIZATION_LEVELS = 32767
+# Attributes of quantized files with the maximum absolute error of each
+# variable and the maximum error relative to the largest amplitude of the
+# variable.
+QUANTIZATION_ERROR_ATTRIBUTE = "quantization max error"
+QUANTIZATION_RELATIVE_ERROR_ATTRIBUTE = "quantization relative error"
+
+# Order of the zero phase Butterworth low-pass filter applied before
+# decimating the time axis and its corner frequency as a fraction of the new
+# Nyquist frequency. The corner never goes below the dominant source
+# frequency as the mesh resolves the wavefield up to that frequency.
+LOWPASS_ORDER = 6
+LOWPASS_CORNER_FRACTION = 0.8
+
+# Decimation of the time axis of the snapshots. Every ``factor``'th sample
+# starting at ``start`` is kept. The start is chosen so the peak of the
+# source time function still falls on a sample.
+Decimation = collections.namedtuple("Decimation",
+                                    ["factor", "start", "npts", "sos"])
+
+# Part of a database limited to a range of radii in km and colatitudes in
+# degrees. ``elements`` and ``points`` are the sorted ids of the elements
+# intersecting it and of their GLL points.
+Region = collections.namedtuple(
+    "Region", ["min_radius", "max_radius", "min_colatitude",
+               "max_colatitude", "elements", "points"])
+
+
+def _get_grid_coordinates(s, z, order=CURVE_ORDER):
+    """
+    Map the coordinates to integers on a 2 ** order x 2 ** order grid. Both
+    coordinates are scaled alike to preserve the aspect ratio.
+    """
+    s = np.asarray(s, dtype=np.float64)
+    z = np.asarray(z, dtype=np.float64)
+    extent = max(s.max() - s.min(), z.max() - z.min()) or 1.0
+    scale = (2 ** order - 1) / extent
+    return (np.round((s - s.min()) * scale).astype(np.int64),
+            np.round((z - z.min()) * scale).astype(np.int64))
+
+
+def get_morton_keys(x, y, order=CURVE_ORDER):
+    """
+    Position of integer grid coordinates along the Morton (Z-order) curve,
+    i.e. their interleaved bits.
+    """
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+    keys = np.zeros(x.shape, dtype=np.int64)
+    for bit in range(order):
+        keys |= ((x >> bit) & 1) << (2 * bit)
+        keys |= ((y >> bit) & 1) << (2 * bit + 1)
+    return keys
+
+
+def get_hilbert_keys(x, y, order=CURVE_ORDER):
+    """
+    Position of integer grid coordinates along the Hilbert curve covering a
+    2 ** order x 2 ** order grid. Consecutive positions are always
+    neighbouring grid cells.
+    """
+    x = np.array(x, dtype=np.int64)
+    y = np.array(y, dtype=np.int64)
+    n = 2 ** order
+    keys = np.zeros(x.shape, dtype=np.int64)
+    s = n // 2
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        keys += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+        # Rotate the quadrant so the curve continues where it left off.
+        flip = ~ry & rx
+        x[flip] = n - 1 - x[flip]
+        y[flip] = n - 1 - y[flip]
+        swap = ~ry
+        x[swap], y[swap] = y[swap], x[swap]
+        s //= 2
+    return keys
+
+
+def get_element_order(s_mp, z_mp, strategy="kdtree", access_counts=None):
+    """
+    The order in which the elements are written to a merged file as the
+    indices of the elements in their original order.
+
+    :param s_mp: The s coordinates of the midpoints of the elements.
+    :param z_mp: The z coordinates of the midpoints of the elements.
+    :param strategy: One of :data:`ELEMENT_ORDERS`. ``"kdtree"`` follows
+        the traversal of the kd-tree instaseis uses to find the elements,
+        ``"hilbert"`` and ``"morton"`` follow the respective space filling
+        curves over the midpoints, and ``"frequency"`` writes the elements
+        in the order of decreasing access counts so the most frequently
+        read elements share as few chunks as possible.
+    :param access_counts: The number of accesses of each element, e.g.
+        recorded with a representative workload. Only used by the
+        ``"frequency"`` strategy. Elements with the same counts are
+        ordered along the Hilbert curve.
+    """
+    s_mp = np.asarray(s_mp)
+    z_mp = np.asarray(z_mp)
+    if strategy == "kdtree":
+        midpoints = np.empty((s_mp.shape[0], 2), dtype=s_mp.dtype)
+        midpoints[:, 0] = s_mp
+        midpoints[:, 1] = z_mp
+        return np.asarray(cKDTree(data=midpoints).indices)
+    elif strategy == "morton":
+        return np.argsort(get_morton_keys(*_get_grid_coordinates(
+            s_mp, z_mp)), kind="mergesort")
+
+    hilbert = np.argsort(get_hilbert_keys(*_get_grid_coordinates(
+        s_mp, z_mp)), kind="mergesort")
+    if strategy == "hilbert":
+        return hilbert
+    elif strategy == "frequency":
+        if access_counts is None:
+            raise ValueError("The 'frequency' order requires the access "
+                             "counts of the elements.")
+        access_counts = np.asarray(access_counts)
+        if access_counts.shape != s_mp.shape:
+            raise ValueError("Expected access counts for %i elements, got "
+                             "%i." % (len(s_mp), access_counts.size))
+        # Stable sort so elements with the same counts stay in Hilbert
+        # order.
+        return hilbert[np.argsort(-access_counts[hilbert], kind="mergesort")]
+    raise ValueError("Unknown element order '%s'. Must be one of %s." % (
+        strategy, ", ".join(ELEMENT_ORDERS)))
+
+
+def quantize_snapshots(data):
+    """
+    Quantize the snapshots of a block of elements to 16 bit integers with a
+    scale and an offset per element and variable. The data is recovered as
+    ``quantized * scale + offset``.
+
+    :param data: The snapshots with shape (elements, nvars, jpol, ipol,
+        npts).
+
+    Returns the quantized data, the scales and the offsets with shape
+    (elements, nvars), and the maximum absolute error of each variable.
+    """
+    flat = data.reshape(data.shape[:2] + (-1,)).astype(np.float64)
+    lower = flat.min(axis=2)
+    upper = flat.max(axis=2)
+    offset = ((upper + lower) / 2.0).astype(data.dtype)
+    scale = ((upper - lower) / (2.0 * QUANTIZATION_LEVELS)).astype(data.dtype)
+    # Constant fields are exactly represented by the offset.
+    scale[scale == 0] = 1.0
+
+    quantized = np.clip(
+        np.round((flat - offset[:, :, None]) / scale[:, :, None]),
+        -QUANTIZATION_LEVELS, QUANTIZATION_LEVELS).astype(np.int16)
+    # The error of the values as the readers will see them.
+    error = np.abs(quantized * scale[:, :, None] + offset[:, :, None] - flat)
+    return (quantized.reshape(data.shape), scale, offset,
+            error.max(axis=2).max(axis=0))
+
+
+def get_decimation(dt, new_dt, period, npts, src_shift_samples):
+    """
+    Validate a new sampling interval and design the low-pass filter to
+    decimate the snapshots to it.
+
+    :param dt: The sampling interval of the database in seconds.
+    :param new_dt: The new sampling interval in seconds. Must be an integer
+        multiple of ``dt`` and less than half the dominant source period.
+    :param period: The dominant source period of the database in seconds.
+    :param npts: The number of samples of the database.
+    :param src_shift_samples: The source shift in samples.
+    """
+    factor = int(round(new_dt / dt))
+    if factor < 2 or abs(factor * dt - new_dt) > 1E-3 * new_dt:
+        raise ValueError(
+            "The new sampling interval of %g s must be a multiple of at "
+            "least two times the sampling interval of the database of "
+            "%g s." % (new_dt, dt))
+    if new_dt >= period / 2.0:
+        raise ValueError(
+            "The new sampling interval of %g s must be less than half the "
+            "dominant source period of %g s." % (new_dt, period))
+
+    corner = max(1.0 / period, LOWPASS_CORNER_FRACTION * 0.5 / new_dt)
+    sos = scipy.signal.butter(LOWPASS_ORDER, corner / (0.5 / dt),
+                              output="sos")
+    start = int(src_shift_samples) % factor
+    return Decimation(factor=factor, start=start,
+                      npts=len(range(start, npts, factor)), sos=sos)
+
+
+def decimate(data, decimation, axis):
+    """
+    Low-pass filter and decimate an array along its time axis.
+    """
+    filtered = scipy.signal.sosfiltfilt(decimation.sos, data, axis=axis)
+    index = [slice(None)] * data.ndim
+    index[axis] = slice(decimation.start, None, decimation.factor)
+    return filtered[tuple(index)].astype(data.dtype)
+
+
+def _get_file_decimation(f, new_dt):
+    """
+    The decimation of an open database file to a new sampling interval.
+    """
+    return get_decimation(
+        dt=float(np.max(f.getncattr("strain dump sampling rate in sec"))),
+        new_dt=new_dt,
+        period=float(np.max(f.getncattr("dominant source period"))),
+        npts=len(f.dimensions["snapshots"]),
+        src_shift_samples=np.max(f.getncattr(
+            "source shift factor for deltat_coarse")))
+
+
+def _get_decimated_attributes(src, decimation):
+    """
+    The global attributes that change when decimating.
+    """
+    def _get(name, value):
+        return np.array([value], dtype=np.asarray(src.getncattr(name)).dtype)
+
+    dt = float(np.max(src.getncattr("strain dump sampling rate in sec")))
+    shift = int(np.max(src.getncattr(
+        "source shift factor for deltat_coarse")))
+    return {
+        "strain dump sampling rate in sec": _get(
+            "strain dump sampling rate in sec", dt * decimation.factor),
+        "number of strain dumps": _get("number of strain dumps",
+                                       decimation.npts),
+        "source shift factor in sec": _get(
+            "source shift factor in sec", (shift - decimation.start) * dt),
+        "source shift factor for deltat_coarse": _get(
+            "source shift factor for deltat_coarse",
+            (shift - decimation.start) // decimation.factor)}
+
+
+def _read_block(variables, sem_mesh, time_axis, quantized):
+    """
+    Read and reorder a block of elements and quantize it if requested.
+    """
+    data = _read_elements(variables, sem_mesh, time_axis)
+    if quantized:
+        return quantize_snapshots(data)
+    return data
+
+
 @contextlib.contextmanager
 def dummy_progressbar(iterator, *args, **kwargs):
     yield iterator
 
 
 def repack_file(input_filename, output_filename, contiguous,
-                compression_level, transpose, quiet=False):
+                compression_level, transpose, quiet=False, dt=None):
     """
     Transposes all data in the "/Snapshots" group.
 
     :param input_filename: The input filename.
     :param output_filename: The output filename.
+    :param dt: Low-pass filter and decimate the time axis to this sampling
+        interval in seconds. See :func:`get_decimation`.
     """
     assert os.path.exists(input_filename)
     assert not os.path.exists(output_filename)
 
     with netCDF4.Dataset(input_filename, "r", format="NETCDF4") as f_in, \
             netCDF4.Dataset(output_filename, "w", format="NETCDF4") as f_out:
+        decimation = None
+        if dt is not None:
+            decimation = _get_file_decimation(f_in, dt)
         recursive_copy(src=f_in, dst=f_out, contiguous=contiguous,
                        compression_level=compression_level, quiet=quiet,
-                       transpose=transpose)
+                       transpose=transpose, decimation=decimation)
 
 
-def recursive_copy(src, dst, contiguous, compression_level, transpose, quiet):
+def recursive_copy(src, dst, contiguous, compression_level, transpose, quiet,
+                   decimation=None):
     """
     Recursively copy the whole file and transpose the all /Snapshots
     variables while at it..
+
+    With a :class:`Decimation` all variables along the "snapshots" dimension
+    are low-pass filtered and decimated and the attributes describing the
+    time axis are updated.
     """
     if src.path == "/Seismograms":
         return
 
+    attributes = {}
+    if decimation is not None and src.path == "/":
+        attributes = _get_decimated_attributes(src, decimation)
+
+    def _decimate(data, axis):
+        if decimation is None:
+            return data
+        return decimate(np.asarray(data), decimation, axis=axis)
+
     for attr in src.ncattrs():
+        if attr in attributes:
+            setattr(dst, attr, attributes[attr])
+            continue
         _s = getattr(src, attr)
         if isinstance(_s, str_type):
             # The setncattr_string() was added in version 1.2.3. Before that
@@ -86,6 +390,9 @@ def recursive_copy(src, dst, contiguous, compression_level, transpose, quiet):
         items = list(reversed(items))
 
     for name, dimension in items:
+        if decimation is not None and name == "snapshots":
+            dst.createDimension(name, decimation.npts)
+            continue
         dst.createDimension(name, len(
             dimension) if not dimension.isunlimited() else None)
 
@@ -99,13 +406,14 @@ def recursive_copy(src, dst, contiguous, compression_level, transpose, quiet):
             npts = min(shape)
             num_elems = max(shape)
             time_axis = np.argmin(shape)
+            out_npts = decimation.npts if decimation is not None else npts
             # Arbitrary limit.
-            _c = int(round(32768 / (npts * 4)))
+            _c = int(round(32768 / (out_npts * 4)))
 
             if time_axis == 0:
-                chunksizes = (npts, _c)
+                chunksizes = (out_npts, _c)
             else:
-                chunksizes = (_c, npts)
+                chunksizes = (_c, out_npts)
 
             if transpose:
                 chunksizes = list(reversed(chunksizes))
@@ -115,6 +423,11 @@ def recursive_copy(src, dst, contiguous, compression_level, transpose, quiet):
             # We could infer the chunking here but I'm not sure its worth it.
             if isinstance(chunksizes, str_type) and chunksizes == "contiguous":
                 chunksizes = None
+            elif decimation is not None and "snapshots" in \
+                    variable.dimensions:
+                chunksizes = [
+                    min(_c, decimation.npts) if _d == "snapshots" else _c
+                    for _c, _d in zip(chunksizes, variable.dimensions)]
 
         # For a contiguous output, compression and chunking has to be turned
         # off.
@@ -136,7 +449,11 @@ def recursive_copy(src, dst, contiguous, compression_level, transpose, quiet):
             if not quiet:
                 click.echo(click.style("\tCopying group '%s'..." % name,
                                        fg="blue"))
-            dst.variables[x.name][:] = src.variables[x.name][:]
+            data = src.variables[x.name][:]
+            if "snapshots" in variable.dimensions:
+                data = _decimate(data, axis=list(variable.dimensions).index(
+                    "snapshots"))
+            dst.variables[x.name][:] = data
         # The snapshots variables are incrementally copied and transposed.
         else:
             if not quiet:
@@ -162,24 +479,24 @@ def recursive_copy(src, dst, contiguous, compression_level, transpose, quiet):
                     _s = slice(_i * factor, _i * factor + factor)
                     if transpose:
                         if time_axis == 0:
-                            dst.variables[x.name][_s, :] = \
-                                src.variables[x.name][:, _s].T
+                            dst.variables[x.name][_s, :] = _decimate(
+                                src.variables[x.name][:, _s], axis=0).T
                         else:
-                            dst.variables[x.name][:, _s] = \
-                                src.variables[x.name][_s, :].T
+                            dst.variables[x.name][:, _s] = _decimate(
+                                src.variables[x.name][_s, :], axis=1).T
                     else:
                         if time_axis == 0:
-                            dst.variables[x.name][:, _s] = \
-                                src.variables[x.name][:, _s]
+                            dst.variables[x.name][:, _s] = _decimate(
+                                src.variables[x.name][:, _s], axis=0)
                         else:
-                            dst.variables[x.name][_s, :] = \
-                                src.variables[x.name][_s, :]
+                            dst.variables[x.name][_s, :] = _decimate(
+                                src.variables[x.name][_s, :], axis=1)
 
     for src_group in src.groups.values():
         dst_group = dst.createGroup(src_group.name)
         recursive_copy(src=src_group, dst=dst_group, contiguous=contiguous,
                        compression_level=compression_level, quiet=quiet,
-                       transpose=transpose)
+                       transpose=transpose, decimation=decimation)
 
 
 def recursive_copy_no_snapshots_no_seismograms_no_surface(
@@ -244,9 +561,30 @@ def recursive_copy_no_snapshots_no_seismograms_no_surface(
 
 
 def merge_files(filenames, output_folder, contiguous, compression_level,
-                quiet):
+                quiet, processes=1, block_size_in_mb=DEFAULT_BLOCK_SIZE_IN_MB,
+                resume=False, element_order="kdtree", access_counts=None,
+                elements_per_chunk=1, quantize=False):
     """
     Completely unroll and merge both files to a single database.
+
+    Returns the maximum error of quantized files relative to the largest
+    amplitude of each variable and ``None`` otherwise.
+
+    :param element_order: The order of the elements in the merged file. See
+        :func:`get_element_order` for the available strategies.
+    :param access_counts: The access counts of the elements for the
+        ``"frequency"`` order.
+    :param elements_per_chunk: The number of elements in each chunk of the
+        merged snapshots.
+    :param quantize: Store the snapshots as 16 bit integers with a scale
+        and an offset per element and variable. This halves the size of the
+        file at the expense of a small error.
+    :param processes: The number of worker processes reading and reordering
+        the snapshots.
+    :param block_size_in_mb: Approximate size of the blocks of elements
+        that are processed at once.
+    :param resume: Resume merging to an incomplete output file of an
+        interrupted earlier run.
     """
     assert len(filenames) in (1, 2, 4)
 
@@ -264,28 +602,48 @@ def merge_files(filenames, output_folder, contiguous, compression_level,
         (keys == ["MXX_P_MYY", "MXY_MXX_M_MYY", "MXZ_MYZ", "MZZ"])
 
     output = os.path.join(output_folder, "merged_output.nc4")
-    assert not os.path.exists(output)
+    resume = resume and os.path.exists(output)
+    assert resume or not os.path.exists(output)
 
     input_files = {}
+    out = None
     try:
         for key, value in files.items():
             input_files[key] = netCDF4.Dataset(value, "r", format="NETCDF4")
-        out = netCDF4.Dataset(output, "w", format="NETCDF4")
-        _merge_files(input=input_files, out=out, contiguous=contiguous,
-                     compression_level=compression_level, quiet=quiet)
+        if resume:
+            out = netCDF4.Dataset(output, "a", format="NETCDF4")
+            if PROGRESS_ATTRIBUTE not in out.ncattrs():
+                raise ValueError(
+                    "Cannot resume merging to '%s'. It is either complete or "
+                    "has been interrupted before any snapshots have been "
+                    "written. Delete it and start again." % output)
+        else:
+            out = netCDF4.Dataset(output, "w", format="NETCDF4")
+            _merge_files(input=input_files, out=out, contiguous=contiguous,
+                         compression_level=compression_level, quiet=quiet,
+                         element_order=element_order,
+                         access_counts=access_counts,
+                         elements_per_chunk=elements_per_chunk,
+                         quantize=quantize)
+        return _merge_snapshots(input=input_files, out=out, quiet=quiet,
+                                processes=processes,
+                                block_size_in_mb=block_size_in_mb)
     finally:
         for filename in input_files.values():
             try:
                 filename.close()
             except:
                 pass
-        try:
-            out.close()
-        except:
-            pass
+        if out is not None:
+            try:
+                out.close()
+            except:
+                pass
 
 
-def _merge_files(input, out, contiguous, compression_level, quiet):
+def _merge_files(input, out, contiguous, compression_level, quiet,
+                 element_order="kdtree", access_counts=None,
+                 elements_per_chunk=1, quantize=False):
     # First copy everything non-snapshot related.
     c_db = list(input.values())[0]
     recursive_copy_no_snapshots_no_seismograms_no_surface(
@@ -324,41 +682,8 @@ def _merge_files(input, out, contiguous, compression_level, quiet):
             datatype=data.dtype)
         d[:] = data[:]
 
-    # Get all the snapshots from the other databases.
-    if "PX" in input and "PZ" in input:
-        meshes = [
-            input["PX"]["Snapshots"]["disp_s"],
-            input["PX"]["Snapshots"]["disp_p"],
-            input["PX"]["Snapshots"]["disp_z"],
-            input["PZ"]["Snapshots"]["disp_s"],
-            input["PZ"]["Snapshots"]["disp_z"]]
-    elif "PX" in input and "PZ" not in input:
-        meshes = [
-            input["PX"]["Snapshots"]["disp_s"],
-            input["PX"]["Snapshots"]["disp_p"],
-            input["PX"]["Snapshots"]["disp_z"]]
-    elif "PZ" in input and "PX" not in input:
-        meshes = [
-            input["PZ"]["Snapshots"]["disp_s"],
-            input["PZ"]["Snapshots"]["disp_z"]]
-    elif "MXX_P_MYY" in input and "MXY_MXX_M_MYY" in input and \
-            "MXZ_MYZ" in input and "MZZ" in input:
-        meshes = [
-            input["MZZ"]["Snapshots"]["disp_s"],
-            input["MZZ"]["Snapshots"]["disp_z"],
-            input["MXX_P_MYY"]["Snapshots"]["disp_s"],
-            input["MXX_P_MYY"]["Snapshots"]["disp_z"],
-            input["MXZ_MYZ"]["Snapshots"]["disp_s"],
-            input["MXZ_MYZ"]["Snapshots"]["disp_p"],
-            input["MXZ_MYZ"]["Snapshots"]["disp_z"],
-            input["MXY_MXX_M_MYY"]["Snapshots"]["disp_s"],
-            input["MXY_MXX_M_MYY"]["Snapshots"]["disp_p"],
-            input["MXY_MXX_M_MYY"]["Snapshots"]["disp_z"]]
-    else:  # pragma: no cover
-        raise NotImplementedError
-
-    time_axis = np.argmin(meshes[0].shape)
-
+    meshes = [input[key]["Snapshots"][name]
+              for key, name in _get_snapshot_variables(input)]
     dtype = meshes[0].dtype
 
     # Create new dimensions.
@@ -376,40 +701,44 @@ def _merge_files(input, out, contiguous, compression_level, quiet):
     if contiguous:
         chunksizes = None
     else:
-        # Each chunk is exactly the data from one element.
+        # Each chunk is exactly the data from a number of elements.
         chunksizes = [_i.size for _i in dims]
-        chunksizes[0] = 1
+        chunksizes[0] = min(elements_per_chunk, nelem)
 
     # We'll called it MergedSnapshots
-    x = out.createVariable(
+    out.createVariable(
         varname="MergedSnapshots",
         dimensions=dimensions,
         contiguous=contiguous,
         zlib=zlib,
         chunksizes=chunksizes,
-        datatype=dtype)
-
-    utemp = np.zeros([_i.size for _i in dims[1:]], dtype=dtype, order="C")
-
-    # We also re-sort the elements to follow the traversal of a kd-tree in
-    # the same fashion instaseis uses it - this should allow for even faster
-    # I/O for spatially adjacent elements.
-
-    # Get the midpoints for each element.
-    s_mp = c_db["Mesh"]["mp_mesh_S"][:]
-    z_mp = c_db["Mesh"]["mp_mesh_Z"][:]
-
-    # Fill kd-tree.
-    midpoints = np.empty((s_mp.shape[0], 2), dtype=s_mp.dtype)
-    midpoints[:, 0] = s_mp[:]
-    midpoints[:, 1] = z_mp[:]
-    kdtree = cKDTree(data=midpoints)
-
-    # This is now the order in which we will write the indices.
-    inds = kdtree.indices
+        datatype=np.int16 if quantize else dtype)
+
+    if quantize:
+        for name in ("MergedSnapshotsScale", "MergedSnapshotsOffset"):
+            out.createVariable(
+                varname=name,
+                dimensions=[dim_elements.name, dim_nvars.name],
+                contiguous=contiguous,
+                zlib=zlib,
+                datatype=dtype)
+        out.setncattr(QUANTIZATION_ERROR_ATTRIBUTE,
+                      np.zeros(len(meshes), dtype=np.float64))
+
+    # We also re-sort the elements so spatially adjacent elements are close
+    # to each other in the file - this should allow for even faster I/O
+    # for spatially adjacent elements.
+    inds = get_element_order(c_db["Mesh"]["mp_mesh_S"][:],
+                             c_db["Mesh"]["mp_mesh_Z"][:],
+                             strategy=element_order,
+                             access_counts=access_counts)
 
     # Make sure all indices are available.
     assert list(range(nelem)) == sorted(inds)
+    if __netcdf_version >= (1, 2, 3):
+        out.setncattr_string("element order", element_order)
+    else:
+        out.setncattr("element order", str(element_order))
 
     sem_mesh = c_db["Mesh"]["sem_mesh"][:].copy()
 
@@ -424,41 +753,416 @@ def _merge_files(input, out, contiguous, compression_level, quiet):
     out["Mesh"]["eltype"][:] = out["Mesh"]["eltype"][:][inds]
     out["Mesh"]["axis"][:] = out["Mesh"]["axis"][:][inds]
 
+    # Everything but the snapshots is now in the file - from here on the
+    # merging can be resumed.
+    out.setncattr(PROGRESS_ATTRIBUTE, 0)
+    out.sync()
+
+
+def _get_snapshot_variables(input):
+    """
+    The snapshot variables of the input files in the order of the "nvars"
+    dimension of the merged file as a list of (key, name) tuples.
+    """
+    try:
+        return SNAPSHOT_VARIABLES[tuple(sorted(input.keys()))]
+    except KeyError:  # pragma: no cover
+        raise NotImplementedError
+
+
+def _read_points(variable, point_ids, time_axis):
+    """
+    Read the time series of the given sorted and unique GLL points. Points
+    close to each other are read with a single contiguous read.
+
+    Returns an array of shape (len(point_ids), npts).
+    """
+    # Split wherever reading the points in between would be too wasteful.
+    splits = np.where(np.diff(point_ids) > MAX_GAP_IN_POINTS)[0] + 1
+    data = []
+    for run in np.split(point_ids, splits):
+        _s = slice(run[0], run[-1] + 1)
+        if time_axis == 0:
+            block = np.asarray(variable[:, _s]).T
+        else:
+            block = np.asarray(variable[_s, :])
+        data.append(block[run - run[0]])
+    return np.concatenate(data, axis=0)
+
+
+def _read_elements(variables, sem_mesh, time_axis):
+    """
+    Read and reorder the data of a block of elements from the snapshot
+    variables of the unmerged files.
+
+    :param variables: The snapshot variables in the order of the merged file.
+    :param sem_mesh: The GLL point ids of the elements with shape
+        (elements, ipol, jpol).
+    :param time_axis: The time axis of the snapshot variables.
+
+    Returns an array with shape (elements, nvars, jpol, ipol, npts) which is
+    the layout of the merged file.
+    """
+    # Every GLL point is only read once even if shared by multiple elements.
+    point_ids, inverse = np.unique(sem_mesh, return_inverse=True)
+    npts = variables[0].shape[time_axis]
+    data = np.empty(sem_mesh.shape[:1] + (len(variables),) +
+                    sem_mesh.shape[1:] + (npts,),
+                    dtype=variables[0].dtype)
+    for _i, var in enumerate(variables):
+        points = _read_points(var, point_ids, time_axis)
+        data[:, _i] = points[inverse].reshape(
+            sem_mesh.shape + (npts,)).swapaxes(1, 2)
+    return data
+
+
+# Snapshot variables opened in each worker process.
+_worker_variables = []
+
+
+def _init_worker(variables):
+    """
+    Open the snapshot variables in a worker process. Each worker process
+    has its own file handles.
+    """
+    files = {}
+    for filename, name in variables:
+        if filename not in files:
+            files[filename] = netCDF4.Dataset(filename, "r",
+                                              format="NETCDF4")
+        _worker_variables.append(files[filename]["Snapshots"][name])
+
+
+def _read_elements_in_worker(args):
+    start, sem_mesh, time_axis, quantized = args
+    return start, _read_block(_worker_variables, sem_mesh, time_axis,
+                              quantized)
+
+
+def _get_pool(processes, variables):
+    """
+    A pool of worker processes. Fresh processes are used instead of forking
+    this one as HDF5 file handles must not be shared between processes.
+    """
+    if hasattr(multiprocessing, "get_context"):
+        context = multiprocessing.get_context("spawn")
+    else:  # pragma: no cover
+        context = multiprocessing
+    return context.Pool(processes=processes, initializer=_init_worker,
+                        initargs=(variables,))
+
+
+def _imap_bounded(pool, func, iterable, window):
+    """
+    Like ``pool.imap()`` but at most ``window`` results are pending at any
+    time so the memory usage stays bounded if the consumer is slower than
+    the workers.
+    """
+    pending = collections.deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def _merge_snapshots(input, out, quiet, processes=1,
+                     block_size_in_mb=DEFAULT_BLOCK_SIZE_IN_MB):
+    """
+    Write the '/MergedSnapshots' array of an output file prepared by
+    :func:`_merge_files`.
+
+    The elements are processed in blocks in the order of the output file.
+    The GLL points needed by a block are read in few large reads, reordered
+    with vectorized gathers, and each block is written as a single hyperslab.
+    With more than one process the blocks are read and reordered by worker
+    processes while this process writes them in order. The number of
+    written elements is stored in the file after each block so interrupted
+    runs can be resumed.
+
+    Quantized files also get the scales and offsets of all elements and the
+    maximum error which is returned relative to the largest amplitude of
+    each variable.
+    """
+    variables = _get_snapshot_variables(input)
+    meshes = [input[key]["Snapshots"][name] for key, name in variables]
+    time_axis = np.argmin(meshes[0].shape)
+    x = out["MergedSnapshots"]
+    nelem = x.shape[0]
+    quantized = "MergedSnapshotsScale" in out.variables
+
+    # The point ids of the elements in the order of the output file.
+    sem_mesh = np.asarray(out["Mesh"]["sem_mesh"][:])
+
+    # Elements per block - always whole chunks so each chunk is only
+    # written once.
+    elem_size = np.prod(x.shape[1:]) * x.dtype.itemsize
+    chunk_size = x.chunking()[0] if x.chunking() != "contiguous" else 1
+    block_size = int(block_size_in_mb * 1024 ** 2 // elem_size)
+    block_size = max(1, block_size // chunk_size) * chunk_size
+
+    first = int(out.getncattr(PROGRESS_ATTRIBUTE))
+    blocks = [(_i, sem_mesh[_i: _i + block_size], time_axis, quantized)
+              for _i in range(first, nelem, block_size)]
+
     if not quiet:
-        click.echo(click.style("\tCreating '/MergedSnapshots'...", fg="blue"))
+        if first:
+            click.echo(click.style(
+                "\tResuming '/MergedSnapshots' at element %i of %i..." % (
+                    first, nelem), fg="blue"))
+        else:
+            click.echo(click.style("\tCreating '/MergedSnapshots'...",
+                                   fg="blue"))
         pbar = click.progressbar
     else:
         pbar = dummy_progressbar
 
-    with pbar(range(nelem), length=nelem, label="\t  ") \
-            as indices:
-        for elem_id in indices:
-            # Get the old and new indices.
-            old_index = elem_id
-            new_index = np.where(inds == elem_id)[0][0]
-
-            gll_point_ids = sem_mesh[old_index]
-
-            # Load displacement from all GLL points.
-            for i, var in enumerate(meshes):
-                # The list of ids we have is unique but not sorted.
-                ids = gll_point_ids.flatten()
-                s_ids = np.sort(ids)
-                if time_axis == 0:
-                    temp = var[:, s_ids]
-                    for jpol in range(dim_jpol.size):
-                        for ipol in range(dim_ipol.size):
-                            idx = ipol * 5 + jpol
-                            utemp[i, jpol, ipol, :] = \
-                                temp[:, np.argwhere(s_ids == ids[idx])[0][0]]
+    pool = None
+    if processes > 1 and len(blocks) > 1:
+        pool = _get_pool(processes, variables=[
+            (input[key].filepath(), name) for key, name in variables])
+        results = _imap_bounded(pool, _read_elements_in_worker, blocks,
+                                window=2 * processes)
+    else:
+        results = ((_i[0], _read_block(meshes, *_i[1:])) for _i in blocks)
+
+    try:
+        with pbar(results, length=len(blocks), label="\t  ") as results:
+            for start, data in results:
+                if quantized:
+                    data, scale, offset, error = data
+                _s = slice(start, start + len(data))
+                if quantized:
+                    out["MergedSnapshotsScale"][_s] = scale
+                    out["MergedSnapshotsOffset"][_s] = offset
+                    # The errors are kept with the progress so resumed runs
+                    # still know them.
+                    out.setncattr(QUANTIZATION_ERROR_ATTRIBUTE, np.maximum(
+                        out.getncattr(QUANTIZATION_ERROR_ATTRIBUTE), error))
+                x[_s] = data
+                out.setncattr(PROGRESS_ATTRIBUTE, _s.stop)
+                out.sync()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    relative_error = None
+    if quantized:
+        # The largest representable amplitude of each variable.
+        amplitude = np.max(
+            np.abs(out["MergedSnapshotsOffset"][:]) +
+            QUANTIZATION_LEVELS * out["MergedSnapshotsScale"][:], axis=0)
+        error = np.atleast_1d(out.getncattr(QUANTIZATION_ERROR_ATTRIBUTE))
+        relative_error = float(np.max(error / np.where(
+            amplitude > 0, amplitude, 1.0)))
+        out.setncattr(QUANTIZATION_RELATIVE_ERROR_ATTRIBUTE, relative_error)
+        if not quiet:
+            click.echo(click.style(
+                "\tMaximum quantization error: %g (%g relative to the "
+                "largest amplitude of each variable)" % (
+                    error.max(), relative_error), fg="blue"))
+
+    # The file is complete.
+    out.delncattr(PROGRESS_ATTRIBUTE)
+    return relative_error
+
+
+def get_region(f, min_depth_in_km=None, max_depth_in_km=None,
+               min_colatitude=None, max_colatitude=None):
+    """
+    The elements of a database intersecting a depth range and a colatitude
+    band. The bounds default to those of the database.
+
+    For reciprocal databases the depths are source depths and the
+    colatitudes are epicentral distances, for forward databases they refer
+    to the receivers.
+
+    :param f: An open netCDF4 file of the database. Only databases with
+        ``displ_only`` dumps are supported.
+    """
+    dump_type = f.getncattr("dump type (displ_only, displ_velo, fullfields)")
+    if dump_type != "displ_only" or "gllpoints_all" not in f.dimensions:
+        raise NotImplementedError(
+            "Only databases with 'displ_only' dumps can be limited to a "
+            "region.")
+
+    planet_radius = float(np.max(f.getncattr("planet radius")))
+    min_radius = float(np.max(f.getncattr("kernel wavefield rmin")))
+    max_radius = float(np.max(f.getncattr("kernel wavefield rmax")))
+    colatmin = float(np.max(f.getncattr("kernel wavefield colatmin")))
+    colatmax = float(np.max(f.getncattr("kernel wavefield colatmax")))
+    if max_depth_in_km is not None:
+        min_radius = max(min_radius, planet_radius - max_depth_in_km)
+    if min_depth_in_km is not None:
+        max_radius = min(max_radius, planet_radius - min_depth_in_km)
+    if min_colatitude is not None:
+        colatmin = max(colatmin, min_colatitude)
+    if max_colatitude is not None:
+        colatmax = min(colatmax, max_colatitude)
+    if min_radius >= max_radius or colatmin >= colatmax:
+        raise ValueError("The region does not intersect the database.")
+
+    # The extent of each element from its GLL points.
+    sem_mesh = f["Mesh"]["sem_mesh"][:]
+    s = f["Mesh"]["mesh_S"][:][sem_mesh].reshape(len(sem_mesh), -1)
+    z = f["Mesh"]["mesh_Z"][:][sem_mesh].reshape(len(sem_mesh), -1)
+    r = np.sqrt(s.astype(np.float64) ** 2 + z.astype(np.float64) ** 2) / 1E3
+    colat = np.degrees(np.arctan2(s, z))
+    elements = np.where(
+        (r.max(axis=1) >= min_radius) & (r.min(axis=1) <= max_radius) &
+        (colat.max(axis=1) >= colatmin) &
+        (colat.min(axis=1) <= colatmax))[0]
+    if not len(elements):  # pragma: no cover
+        raise ValueError("No elements in the region.")
+    return Region(min_radius=min_radius, max_radius=max_radius,
+                  min_colatitude=colatmin, max_colatitude=colatmax,
+                  elements=elements, points=np.unique(sem_mesh[elements]))
+
+
+def extract_region(input_filename, output_filename, region, contiguous,
+                   compression_level, quiet=False):
+    """
+    Write the part of a database file in a region.
+
+    Only the elements of the region and their GLL points are kept. The
+    point ids in the mesh are remapped to the new GLL points and the
+    kernel wavefield attributes are set to the bounds of the region.
+
+    :param input_filename: The input filename.
+    :param output_filename: The output filename.
+    :param region: The region as returned by :func:`get_region`. All files
+        of a database share the same mesh.
+    """
+    assert os.path.exists(input_filename)
+    assert not os.path.exists(output_filename)
+
+    with netCDF4.Dataset(input_filename, "r", format="NETCDF4") as f_in, \
+            netCDF4.Dataset(output_filename, "w", format="NETCDF4") as f_out:
+        if len(f_in.dimensions["gllpoints_all"]) <= region.points[-1]:
+            raise ValueError("The file has a different mesh.")
+        _recursive_extract(src=f_in, dst=f_out, region=region,
+                           contiguous=contiguous,
+                           compression_level=compression_level, quiet=quiet)
+
+
+def _recursive_extract(src, dst, region, contiguous, compression_level,
+                       quiet):
+    """
+    Recursively copy the parts of a file in the region.
+    """
+    if src.path == "/Seismograms":
+        return
+
+    attributes = {}
+    if src.path == "/":
+        def _get(name, value):
+            return np.array([value],
+                            dtype=np.asarray(src.getncattr(name)).dtype)
+
+        attributes = {
+            "kernel wavefield rmin": _get("kernel wavefield rmin",
+                                          region.min_radius),
+            "kernel wavefield rmax": _get("kernel wavefield rmax",
+                                          region.max_radius),
+            "kernel wavefield colatmin": _get("kernel wavefield colatmin",
+                                              region.min_colatitude),
+            "kernel wavefield colatmax": _get("kernel wavefield colatmax",
+                                              region.max_colatitude),
+            "npoints": _get("npoints", len(region.points)),
+            "nelem_kwf_global": _get("nelem_kwf_global",
+                                     len(region.elements))}
+
+    for attr in src.ncattrs():
+        if attr in attributes:
+            setattr(dst, attr, attributes[attr])
+            continue
+        _s = getattr(src, attr)
+        if isinstance(_s, str_type):
+            # The setncattr_string() was added in version 1.2.3. Before that
+            # it was the default behavior.
+            if __netcdf_version >= (1, 2, 3):
+                dst.setncattr_string(attr, _s)
+            else:
+                dst.setncattr(attr, str(_s))
+        else:
+            setattr(dst, attr, _s)
+
+    # The ids to keep along each of the subsetted dimensions.
+    ids = {"elements": region.elements, "gllpoints_all": region.points}
+    if "elem_theta" in src.variables:
+        theta = src.variables["elem_theta"][:]
+        ids["surf_elems"] = np.where(
+            (theta >= region.min_colatitude) &
+            (theta <= region.max_colatitude))[0]
+
+    for name, dimension in src.dimensions.items():
+        if name in ids:
+            dst.createDimension(name, len(ids[name]))
+        else:
+            dst.createDimension(name, len(
+                dimension) if not dimension.isunlimited() else None)
+
+    # New ids of the kept GLL points.
+    new_point_ids = np.empty(region.points[-1] + 1, dtype=np.int64)
+    new_point_ids[region.points] = np.arange(len(region.points))
+
+    for name, variable in src.variables.items():
+        dimensions = variable.dimensions
+        shape = [len(ids[_d]) if _d in ids else _n
+                 for _d, _n in zip(dimensions, variable.shape)]
+
+        chunksizes = variable.chunking()
+        if isinstance(chunksizes, str_type) and chunksizes == "contiguous":
+            chunksizes = None
+        else:
+            chunksizes = [max(min(_c, _n), 1)
+                          for _c, _n in zip(chunksizes, shape)]
+        if contiguous:
+            zlib = False
+            chunksizes = None
+        else:
+            zlib = True
+
+        x = dst.createVariable(name, variable.datatype, dimensions,
+                               chunksizes=chunksizes, contiguous=contiguous,
+                               zlib=zlib, complevel=compression_level)
+
+        if not quiet:
+            click.echo(click.style("\tExtracting '%s'..." % name,
+                                   fg="blue"))
+
+        # The snapshots are copied in blocks of GLL points.
+        if "gllpoints_all" in dimensions and "snapshots" in dimensions:
+            point_axis = list(dimensions).index("gllpoints_all")
+            npts = variable.shape[1 - point_axis]
+            factor = max(int((8 * 1024 * 1024 / 4) / npts), 1)
+            for start in range(0, len(region.points), factor):
+                _s = slice(start, start + factor)
+                data = _read_points(variable, region.points[_s],
+                                    time_axis=1 - point_axis)
+                if point_axis == 0:
+                    x[_s, :] = data
                 else:
-                    temp = var[s_ids, :]
-                    for jpol in range(dim_jpol.size):
-                        for ipol in range(dim_ipol.size):
-                            idx = ipol * 5 + jpol
-                            utemp[i, jpol, ipol, :] = \
-                                temp[np.argwhere(s_ids == ids[idx])[0][0], :]
-            x[new_index] = utemp
+                    x[:, _s] = data.T
+            continue
+
+        data = variable[:]
+        for axis, dim in enumerate(dimensions):
+            if dim in ids:
+                data = np.take(data, ids[dim], axis=axis)
+        # Variables referring to GLL points.
+        if src.path == "/Mesh" and name in ("sem_mesh", "fem_mesh",
+                                            "midpoint_mesh"):
+            data = new_point_ids[data].astype(data.dtype)
+        x[:] = data
+
+    for src_group in src.groups.values():
+        dst_group = dst.createGroup(src_group.name)
+        _recursive_extract(src=src_group, dst=dst_group, region=region,
+                           contiguous=contiguous,
+                           compression_level=compression_level, quiet=quiet)
 
 
 @click.command()
@@ -471,15 +1175,67 @@ def _merge_files(input, out, contiguous, compression_level, quiet):
 @click.option("--compression_level",
               type=click.IntRange(1, 9), default=2,
               help="Compression level from 1 (fast) to 9 (slow).")
-@click.option('--method', type=click.Choice(["transpose", "repack", "merge"]),
+@click.option('--method', type=click.Choice(["transpose", "repack", "merge",
+                                             "extract"]),
               required=True,
               help="`transpose` will transpose the data arrays which "
                    "oftentimes results in faster extraction times. `repack` "
                    "will just repack the data and solve some compatibility "
                    "issues. `merge` will create a single much larger file "
-                   "which is much quicker to read but will take more space.")
+                   "which is much quicker to read but will take more space. "
+                   "`extract` will only keep the part of the database in "
+                   "the depth range and colatitude band given with the "
+                   "options below.")
+@click.option("--processes", type=click.IntRange(1), default=1,
+              help="Number of worker processes reading the snapshots when "
+                   "merging.")
+@click.option("--block_size_in_mb", type=click.IntRange(1),
+              default=DEFAULT_BLOCK_SIZE_IN_MB,
+              help="Approximate size of the blocks of elements that are "
+                   "processed at once when merging.")
+@click.option("--resume", is_flag=True,
+              help="Resume an interrupted merge into an existing output "
+                   "folder.")
+@click.option("--element_order", type=click.Choice(ELEMENT_ORDERS),
+              default="kdtree",
+              help="Order of the elements in merged files. `kdtree` follows "
+                   "the kd-tree used to find the elements, `hilbert` and "
+                   "`morton` the respective space filling curves over the "
+                   "element midpoints, and `frequency` the decreasing access "
+                   "counts given with --access_counts.")
+@click.option("--access_counts", type=click.Path(exists=True, dir_okay=False),
+              help="Text or .npy file with the number of accesses of each "
+                   "element in the order of the input files.")
+@click.option("--elements_per_chunk", type=click.IntRange(1), default=1,
+              help="Number of elements per chunk of merged files.")
+@click.option("--quantize", is_flag=True,
+              help="Store the snapshots of merged files as 16 bit integers "
+                   "with a scale and an offset per element and variable. "
+                   "Halves the size at the expense of a small error which "
+                   "is reported at the end.")
+@click.option("--dt", type=float,
+              help="Low-pass filter and decimate the time axis to this "
+                   "sampling interval in seconds when repacking or "
+                   "transposing. Must be a multiple of the current sampling "
+                   "interval and less than half the dominant source "
+                   "period.")
+@click.option("--min_depth_in_km", type=float,
+              help="Minimum source depth (receiver depth for forward "
+                   "databases) of the extracted database.")
+@click.option("--max_depth_in_km", type=float,
+              help="Maximum source depth (receiver depth for forward "
+                   "databases) of the extracted database.")
+@click.option("--min_colatitude", type=float,
+              help="Minimum epicentral distance in degrees of the extracted "
+                   "database.")
+@click.option("--max_colatitude", type=float,
+              help="Maximum epicentral distance in degrees of the extracted "
+                   "database.")
 def repack_database(input_folder, output_folder, contiguous,
-                    compression_level, method):
+                    compression_level, method, processes, block_size_in_mb,
+                    resume, element_order, access_counts,
+                    elements_per_chunk, quantize, dt, min_depth_in_km,
+                    max_depth_in_km, min_colatitude, max_colatitude):
     found_filenames = []
     for root, _, filenames in os.walk(input_folder):
         for filename in sorted(filenames, reverse=True):
@@ -490,9 +1246,52 @@ def repack_database(input_folder, output_folder, contiguous,
 
     assert found_filenames, "No files named `ordered_output.nc4` found."
 
-    os.makedirs(output_folder)
+    if resume and method != "merge":
+        raise click.UsageError("Only merging can be resumed.")
+    if quantize and method != "merge":
+        raise click.UsageError("Only merged files can be quantized.")
+    if dt is not None and method == "merge":
+        raise click.UsageError("Decimate with the `repack` or `transpose` "
+                               "method and merge the result.")
+    region = {"min_depth_in_km": min_depth_in_km,
+              "max_depth_in_km": max_depth_in_km,
+              "min_colatitude": min_colatitude,
+              "max_colatitude": max_colatitude}
+    if method == "extract":
+        if dt is not None:
+            raise click.UsageError("Decimate with the `repack` or "
+                                   "`transpose` method and extract from "
+                                   "the result.")
+        with netCDF4.Dataset(found_filenames[0], "r", format="NETCDF4") as f:
+            try:
+                region = get_region(f, **region)
+            except (ValueError, NotImplementedError) as e:
+                raise click.UsageError(str(e))
+        click.echo(click.style(
+            "Keeping %i elements and %i GLL points." % (
+                len(region.elements), len(region.points)), fg="green"))
+    elif any(_i is not None for _i in region.values()):
+        raise click.UsageError("The depth range and colatitude band are only "
+                               "used by the `extract` method.")
+    if dt is not None:
+        # Validate it before anything is written.
+        with netCDF4.Dataset(found_filenames[0], "r", format="NETCDF4") as f:
+            try:
+                _get_file_decimation(f, dt)
+            except ValueError as e:
+                raise click.BadParameter(str(e), param_hint="--dt")
+    if (element_order == "frequency") != (access_counts is not None):
+        raise click.UsageError("--access_counts must be given for and only "
+                               "for the `frequency` element order.")
+    if access_counts is not None:
+        if access_counts.endswith(".npy"):
+            access_counts = np.load(access_counts)
+        else:
+            access_counts = np.loadtxt(access_counts)
+    if not (resume and os.path.exists(output_folder)):
+        os.makedirs(output_folder)
 
-    if method in ["transpose", "repack"]:
+    if method in ["transpose", "repack", "extract"]:
         for _i, filename in enumerate(found_filenames):
             click.echo(click.style(
                 "--> Processing file %i of %i: %s" %
@@ -507,6 +1306,13 @@ def repack_database(input_folder, output_folder, contiguous,
 
             os.makedirs(os.path.dirname(output_filename))
 
+            if method == "extract":
+                extract_region(input_filename=filename,
+                               output_filename=output_filename,
+                               region=region, contiguous=contiguous,
+                               compression_level=compression_level)
+                continue
+
             if method == "transpose":
                 transpose = True
             else:
@@ -516,11 +1322,16 @@ def repack_database(input_folder, output_folder, contiguous,
                         output_filename=output_filename,
                         contiguous=contiguous,
                         transpose=transpose,
-                        compression_level=compression_level)
+                        compression_level=compression_level,
+                        dt=dt)
     elif method == "merge":
         merge_files(filenames=found_filenames, output_folder=output_folder,
                     contiguous=contiguous, compression_level=compression_level,
-                    quiet=False)
+                    quiet=False, processes=processes,
+                    block_size_in_mb=block_size_in_mb, resume=resume,
+                    element_order=element_order, access_counts=access_counts,
+                    elements_per_chunk=elements_per_chunk,
+                    quantize=quantize)
     else:
         raise NotImplementedError
 
@@ -30,6 +30,29 @@ if __name__ == "__main__":
                         help='The maximum allowed number of point sources in '
                              'a single finite source for the /finite_source '
                              'route.')
+    parser.add_argument('--max_size_of_bulk_requests', type=int,
+                        default=10000,
+                        help='The maximum allowed number of jobs in a single '
+                             'request to the /seismograms_bulk route.')
+    parser.add_argument('--max_concurrent_jobs', type=int, default=2,
+                        help='The number of jobs submitted to the /jobs '
+                             'routes that are calculated at the same time.')
+    parser.add_argument('--job_result_ttl_in_s', type=float, default=3600,
+                        help='The time in seconds the results of jobs are '
+                             'kept after they have been finished.')
+    parser.add_argument('--global_budget', type=float, default=None,
+                        help='The maximum cost of all requests that can be '
+                             'admitted at once. Disabled by default.')
+    parser.add_argument('--global_budget_refill_rate', type=float,
+                        default=None,
+                        help='The global budget refilled per second.')
+    parser.add_argument('--client_budget', type=float, default=None,
+                        help='The maximum cost of the requests of a single '
+                             'client that can be admitted at once. Disabled '
+                             'by default.')
+    parser.add_argument('--client_budget_refill_rate', type=float,
+                        default=None,
+                        help='The budget of each client refilled per second.')
 
     parser.add_argument('db_path', type=str,
                         help='Database path')
@@ -47,4 +70,11 @@ if __name__ == "__main__":
     launch_io_loop(db_path=db_path, port=args.port,
                    buffer_size_in_mb=args.buffer_size_in_mb,
                    max_size_of_finite_sources=args.max_size_of_finite_sources,
+                   max_size_of_bulk_requests=args.max_size_of_bulk_requests,
+                   max_concurrent_jobs=args.max_concurrent_jobs,
+                   job_result_ttl_in_s=args.job_result_ttl_in_s,
+                   global_budget=args.global_budget,
+                   global_budget_refill_rate=args.global_budget_refill_rate,
+                   client_budget=args.client_budget,
+                   client_budget_refill_rate=args.client_budget_refill_rate,
                    quiet=args.quiet, log_level=args.log_level)
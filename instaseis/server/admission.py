@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cost based admission control for the Instaseis server.
+
+Every request is assigned a cost which is an estimate of the number of
+samples that have to be calculated plus the number of samples that have to
+be read from disc. Requests are only admitted if there is enough budget
+left both globally and for the requesting client. Budgets are token buckets
+which are refilled at a constant rate.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import math
+import threading
+import time
+
+import tornado.web
+
+
+# Number of samples that have to be read from disc for every element that is
+# not yet buffered. Each element has 5 x 5 GLL points.
+ELEMENT_READ_COST = 25
+
+
+class AdmissionError(tornado.web.HTTPError):
+    """
+    HTTP error carrying additional headers that should be sent to the
+    client.
+    """
+    def __init__(self, status_code, msg, headers):
+        super(AdmissionError, self).__init__(status_code, log_message=msg,
+                                             reason=msg)
+        self.headers = headers
+
+
+def get_buffer_hit_rate(db):
+    """
+    Returns the average hit rate of all buffers of the database that have
+    been used so far. Zero if not known.
+
+    :param db: An open instaseis database.
+    """
+    rates = []
+    for mesh in getattr(db, "meshes", None) or []:
+        if not mesh:
+            continue
+        for buf in (mesh.strain_buffer, mesh.displ_buffer):
+            if buf.requests:
+                rates.append(buf.efficiency)
+    if not rates:
+        return 0.0
+    return sum(rates) / len(rates)
+
+
+def estimate_cost(db, receivers, components, sources=1, dt=None):
+    """
+    Estimates the cost of a request in number of samples.
+
+    The cost is the number of samples of all calculated seismograms
+    (receivers x components x point sources x resampled samples) plus the
+    number of samples that are expected to be read from disc due to buffer
+    misses.
+
+    :param db: An open instaseis database.
+    :param receivers: The number of receivers.
+    :param components: The number of components.
+    :param sources: The number of point sources.
+    :param dt: The sampling interval of the final seismograms. The
+        database's sampling interval if not given.
+    """
+    info = db.info
+    npts = info.npts
+    if dt:
+        npts = int(math.ceil(npts * info.dt / dt))
+
+    cost = receivers * components * sources * npts
+
+    # For reciprocal databases the elements are looked up at the sources,
+    # otherwise at the receivers.
+    if info.is_reciprocal:
+        lookups = sources
+    else:
+        lookups = receivers
+    misses = lookups * (1.0 - get_buffer_hit_rate(db))
+
+    return int(cost + misses * ELEMENT_READ_COST * info.npts)
+
+
+class TokenBucket(object):
+    """
+    A token bucket with a certain capacity refilled at a constant rate.
+
+    :param capacity: The maximum number of tokens.
+    :param refill_rate: Tokens added per second.
+    :param clock: Function returning the current time in seconds.
+    """
+    def __init__(self, capacity, refill_rate, clock=time.time):
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self.clock = clock
+        self._tokens = self.capacity
+        self._last = clock()
+
+    @property
+    def tokens(self):
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens +
+                           (now - self._last) * self.refill_rate)
+        self._last = now
+        return self._tokens
+
+    def time_until(self, amount):
+        """
+        Seconds until the given amount of tokens is available. None if that
+        will never be the case.
+        """
+        if amount > self.capacity:
+            return None
+        missing = amount - self.tokens
+        if missing <= 0:
+            return 0.0
+        if not self.refill_rate:
+            return None
+        return missing / self.refill_rate
+
+    def consume(self, amount):
+        self._tokens = self.tokens - amount
+
+
+class AdmissionController(object):
+    """
+    Admits requests based on a global and a per client budget.
+
+    :param global_budget: Capacity of the global token bucket. None to
+        disable the global budget.
+    :param global_refill_rate: Refill rate of the global token bucket per
+        second.
+    :param client_budget: Capacity of the token bucket of each client. None
+        to disable the per client budget.
+    :param client_refill_rate: Refill rate of each client's token bucket
+        per second.
+    :param max_clients: Maximum number of client buckets kept in memory.
+        The least recently used ones are removed first. A removed client
+        starts again with a full budget.
+    :param clock: Function returning the current time in seconds.
+    """
+    def __init__(self, global_budget=None, global_refill_rate=None,
+                 client_budget=None, client_refill_rate=None,
+                 max_clients=10000, clock=time.time):
+        self.clock = clock
+        if global_budget is not None:
+            self.global_bucket = TokenBucket(
+                global_budget, global_refill_rate or 0.0, clock=clock)
+        else:
+            self.global_bucket = None
+        self.client_budget = client_budget
+        self.client_refill_rate = client_refill_rate or 0.0
+        self.max_clients = max_clients
+        self._clients = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_client_bucket(self, client):
+        if self.client_budget is None:
+            return None
+        if client in self._clients:
+            bucket = self._clients.pop(client)
+        else:
+            bucket = TokenBucket(self.client_budget, self.client_refill_rate,
+                                 clock=self.clock)
+        self._clients[client] = bucket
+        while len(self._clients) > self.max_clients:
+            self._clients.popitem(last=False)
+        return bucket
+
+    def admit(self, client, cost):
+        """
+        Consume the cost from all budgets or raise an
+        :class:`AdmissionError` if that is not possible right now.
+
+        Returns the headers that should be sent to the client.
+
+        :param client: Identifier of the client, e.g. its IP address.
+        :param cost: The estimated cost of the request.
+        """
+        with self._lock:
+            buckets = [_i for _i in (self.global_bucket,
+                                     self._get_client_bucket(client))
+                       if _i is not None]
+
+            headers = {"Instaseis-Request-Cost": "%i" % cost}
+            if not buckets:
+                return headers
+
+            waits = [_i.time_until(cost) for _i in buckets]
+            remaining = min(_i.tokens for _i in buckets)
+            headers["Instaseis-Budget-Remaining"] = "%i" % remaining
+            headers["Instaseis-Budget-Capacity"] = "%i" % min(
+                _i.capacity for _i in buckets)
+
+            if None in waits:
+                msg = ("The estimated cost of the request (%i) exceeds the "
+                       "budget of the server (%i). Please split it into "
+                       "smaller requests." % (
+                           cost, min(_i.capacity for _i in buckets)))
+                raise AdmissionError(429, msg, headers)
+
+            wait = max(waits)
+            if wait > 0:
+                headers["Retry-After"] = "%i" % int(math.ceil(wait))
+                msg = ("Budget exceeded. The estimated cost of the request "
+                       "is %i. Please try again in %i seconds." % (
+                           cost, int(math.ceil(wait))))
+                raise AdmissionError(429, msg, headers)
+
+            for bucket in buckets:
+                bucket.consume(cost)
+            headers["Instaseis-Budget-Remaining"] = "%i" % min(
+                _i.tokens for _i in buckets)
+            return headers
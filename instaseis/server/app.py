@@ -16,6 +16,7 @@ import tornado.ioloop
 import tornado.web
 
 from ..database_interfaces import find_and_open_files
+from .instaseis_request import RAW32_CONTENT_TYPE
 
 from .routes.coordinates import CoordinatesHandler
 from .routes.events import EventHandler
@@ -24,14 +25,24 @@ from .routes.index import IndexHandler
 from .routes.info import InfoHandler
 from .routes.seismograms import SeismogramsHandler
 from .routes.seismograms_raw import RawSeismogramsHandler
+from .routes.seismograms_bulk import BulkSeismogramsHandler
 from .routes.greens import GreensFunctionHandler
 from .routes.finite_source import FiniteSourceSeismogramsHandler
+from .routes.finite_source_raw import FiniteSourceRawHandler
+from .routes.jobs import FiniteSourceJobHandler, JobHandler
+from .routes.metrics import MetricsHandler
+from .admission import AdmissionController
+from .jobs import JobManager
+from .metrics import Metrics
 
 
 # Bit of a hack: Add geojson to the content-types supported for gzipping.
 # The tests will catch if this no longer works with newer tornado versions.
 tornado.web.GZipContentEncoding.CONTENT_TYPES.add(
     "application/vnd.geo+json")
+# Same for the uncompressed raw32 format. Everything else we serve is either
+# already compressed or does not compress well enough to justify the cost.
+tornado.web.GZipContentEncoding.CONTENT_TYPES.add(RAW32_CONTENT_TYPE)
 
 
 def get_application():
@@ -41,40 +52,63 @@ def get_application():
     This is a seperate function to be able to get the same application
     objects for the tests.
     """
-    return tornado.web.Application([
+    application = tornado.web.Application([
         (r"/seismograms", SeismogramsHandler),
         (r"/seismograms_raw", RawSeismogramsHandler),
+        (r"/seismograms_bulk", BulkSeismogramsHandler),
         (r"/finite_source", FiniteSourceSeismogramsHandler),
+        (r"/finite_source_raw", FiniteSourceRawHandler),
+        (r"/jobs/finite_source", FiniteSourceJobHandler),
+        (r"/jobs/([0-9a-f]+)", JobHandler),
         (r"/greens_function", GreensFunctionHandler),
         (r"/info", InfoHandler),
         (r"/", IndexHandler),
         (r"/coordinates", CoordinatesHandler),
         (r"/event", EventHandler),
-        (r"/ttimes", TravelTimeHandler)
+        (r"/ttimes", TravelTimeHandler),
+        (r"/metrics", MetricsHandler)
     ], compress_response=True)
-
-
-def launch_io_loop(db_path, port, buffer_size_in_mb, quiet, log_level,
-                   max_size_of_finite_sources=1000,
-                   station_coordinates_callback=None,
-                   event_info_callback=None,
-                   travel_time_callback=None):  # pragma: no cover
+    application.metrics = Metrics()
+    return application
+
+
+def create_application(db_path, buffer_size_in_mb,
+                       max_size_of_finite_sources=1000,
+                       max_size_of_bulk_requests=10000,
+                       max_concurrent_jobs=2, job_result_ttl_in_s=3600,
+                       global_budget=None, global_budget_refill_rate=None,
+                       client_budget=None, client_budget_refill_rate=None,
+                       station_coordinates_callback=None,
+                       event_info_callback=None,
+                       travel_time_callback=None):
     """
-    Launch the instaseis server.
+    Return the fully configured tornado application for a database.
 
     :param db_path: Path to the database on disc.
-    :param port: The desired port of the server.
     :param buffer_size_in_mb: The buffer size in MB per buffer. In most
         cases (which is also the worst case scenario) four buffers will be
         created so over time the maximum memory usage will be four times
         this value.
-    :param quiet: Do not log.
-    :param log_level: The log level, one of CRITICAL, ERROR, WARNING, INFO,
-        DEBUG, NOTSET
     :param max_size_of_finite_sources: The maximum allowed number of point
         sources in a single finite source for the /finite_source route.
+    :param max_size_of_bulk_requests: The maximum allowed number of jobs in
+        a single request to the /seismograms_bulk route.
+    :param max_concurrent_jobs: The number of jobs submitted to the /jobs
+        routes that are calculated at the same time.
+    :param job_result_ttl_in_s: The time in seconds the results of the jobs
+        are kept after they have been finished.
+    :param global_budget: The maximum cost of all requests that can be
+        admitted at once. The cost of a request is roughly the number of
+        samples that have to be calculated and read from disc. Requests
+        exceeding the budget are rejected with HTTP 429. None to disable.
+    :param global_budget_refill_rate: The global budget refilled per second.
+    :param client_budget: Same as ``global_budget`` but per client IP.
+    :param client_budget_refill_rate: The budget of each client refilled per
+        second.
     :param station_coordinates_callback: A callback function for station
-        coordinates. If not given, certain requests will not be available.
+        coordinates. It can return a list of dictionaries or a
+        :class:`~instaseis.source.ReceiverArray`. If not given, certain
+        requests will not be available.
     :param event_info_callback: A callback function returning event
         information. If not given, certain requests will not be available.
     :param travel_time_callback: A callback function returning the travel
@@ -83,6 +117,7 @@ def launch_io_loop(db_path, port, buffer_size_in_mb, quiet, log_level,
     application = get_application()
     application.db = find_and_open_files(
         path=db_path, buffer_size_in_mb=buffer_size_in_mb)
+    application.db.add_stage_observer(application.metrics.observe_stage)
     application.station_coordinates_callback = station_coordinates_callback
     application.event_info_callback = event_info_callback
 
@@ -96,6 +131,44 @@ def launch_io_loop(db_path, port, buffer_size_in_mb, quiet, log_level,
     # might take very long then so be aware!
     application.max_size_of_finite_sources = int(max_size_of_finite_sources)
 
+    # Same for the number of jobs in a single bulk request.
+    application.max_size_of_bulk_requests = int(max_size_of_bulk_requests)
+
+    # Runs the jobs of the /jobs routes and keeps their results.
+    application.job_manager = JobManager(
+        max_workers=int(max_concurrent_jobs),
+        ttl_in_s=float(job_result_ttl_in_s))
+
+    # Cost based admission control - disabled if no budget is given.
+    if global_budget is not None or client_budget is not None:
+        application.admission_controller = AdmissionController(
+            global_budget=global_budget,
+            global_refill_rate=global_budget_refill_rate,
+            client_budget=client_budget,
+            client_refill_rate=client_budget_refill_rate)
+    else:
+        application.admission_controller = None
+
+    return application
+
+
+def launch_io_loop(db_path, port, buffer_size_in_mb, quiet, log_level,
+                   **kwargs):  # pragma: no cover
+    """
+    Launch the instaseis server.
+
+    :param db_path: Path to the database on disc.
+    :param port: The desired port of the server.
+    :param buffer_size_in_mb: The buffer size in MB per buffer.
+    :param quiet: Do not log.
+    :param log_level: The log level, one of CRITICAL, ERROR, WARNING, INFO,
+        DEBUG, NOTSET
+
+    All other keyword arguments are passed to :func:`create_application`.
+    """
+    application = create_application(
+        db_path=db_path, buffer_size_in_mb=buffer_size_in_mb, **kwargs)
+
     if not quiet:
         # Get all tornado loggers.
         access_log = logging.getLogger("tornado.access")
@@ -15,20 +15,77 @@ from abc import ABCMeta, abstractmethod
 import obspy
 import tornado
 from ..database_interfaces.base_instaseis_db import _get_seismogram_times
-from .. import Receiver, FiniteSource
+from .. import Receiver, ReceiverArray, FiniteSource
 
 from .. import __version__
 
+# Content types of the raw32 formats. Uncompressed raw32 data is further
+# compressed by the HTTP layer, raw32z data is already compressed.
+RAW32_CONTENT_TYPE = "application/vnd.instaseis.raw32"
+RAW32Z_CONTENT_TYPE = "application/vnd.instaseis.raw32z"
+
+
+def get_receiver_array(coordinates):
+    """
+    Receiver array from the result of a station coordinates callback: either
+    a :class:`~instaseis.source.ReceiverArray` which is used as it is or a
+    list of dictionaries with the network, station, latitude, and longitude
+    of each station which are placed at the surface.
+    """
+    if isinstance(coordinates, ReceiverArray):
+        return coordinates
+    return ReceiverArray(
+        latitudes=[_i["latitude"] for _i in coordinates],
+        longitudes=[_i["longitude"] for _i in coordinates],
+        networks=[_i["network"] for _i in coordinates],
+        stations=[_i["station"] for _i in coordinates],
+        depths_in_m=0.0)
+
 
 class InstaseisRequestHandler(tornado.web.RequestHandler):
     def set_default_headers(self):
         self.set_header("Access-Control-Allow-Origin", "*")
         self.set_header("Server", "InstaseisServer/%s" % __version__)
 
+    def on_finish(self):
+        metrics = getattr(self.application, "metrics", None)
+        if metrics is not None:
+            metrics.observe_request(
+                handler=type(self).__name__, method=self.request.method,
+                code=self.get_status(),
+                duration=self.request.request_time())
+
+    def write_error(self, status_code, **kwargs):
+        # Some errors carry additional headers.
+        if "exc_info" in kwargs:
+            for key, value in getattr(kwargs["exc_info"][1], "headers",
+                                      {}).items():
+                self.set_header(key, value)
+        super(InstaseisRequestHandler, self).write_error(status_code,
+                                                         **kwargs)
+
+    def admit(self, cost):
+        """
+        Check the estimated cost of the request against the budgets of the
+        server. Raises an HTTP 429 error if the request cannot be admitted
+        right now.
+
+        :param cost: The estimated cost of the request, see
+            :func:`~instaseis.server.admission.estimate_cost`.
+        """
+        controller = getattr(self.application, "admission_controller", None)
+        if controller is None:
+            return
+        headers = controller.admit(client=self.request.remote_ip, cost=cost)
+        for key, value in headers.items():
+            self.set_header(key, value)
+
 
 class InstaseisTimeSeriesHandler(with_metaclass(ABCMeta,
                                                 InstaseisRequestHandler)):
     arguments = None
+    # Output formats supported by the route.
+    formats = ("miniseed", "saczip", "raw32", "raw32z")
     connection_closed = False
     default_label = ""
     default_origin_time = obspy.UTCDateTime(0)
@@ -135,8 +192,9 @@ class InstaseisTimeSeriesHandler(with_metaclass(ABCMeta,
         # Make sure the output format is valid.
         if "format" in self.arguments:
             args.format = args.format.lower()
-            if args.format not in ("miniseed", "saczip"):
-                msg = ("Format must either be 'miniseed' or 'saczip'.")
+            if args.format not in self.formats:
+                msg = "Format must be one of %s." % (
+                    ", ".join("'%s'" % _i for _i in self.formats))
                 raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
 
         # If its essentially equal to the internal sampling rate just set it
@@ -246,21 +304,26 @@ class InstaseisTimeSeriesHandler(with_metaclass(ABCMeta,
 
         return ti["starttime"], ti["endtime"]
 
-    def set_headers(self, args):
+    def get_content_type_and_filename(self, args):
+        """
+        Returns the content type and a filename for the requested format.
+        """
         if "format" not in args:
             format = "miniseed"
         else:
             format = args.format
 
-        if format == "miniseed":
-            content_type = "application/vnd.fdsn.mseed"
-        elif format == "saczip":
-            content_type = "application/zip"
-        self.set_header("Content-Type", content_type)
+        CONTENT_TYPES_MAP = {
+            "miniseed": "application/vnd.fdsn.mseed",
+            "saczip": "application/zip",
+            "raw32": RAW32_CONTENT_TYPE,
+            "raw32z": RAW32Z_CONTENT_TYPE}
 
         FILE_ENDINGS_MAP = {
             "miniseed": "mseed",
-            "saczip": "zip"}
+            "saczip": "zip",
+            "raw32": "raw32",
+            "raw32z": "raw32z"}
 
         if "label" in args and args.label:
             label = args.label
@@ -272,6 +335,11 @@ class InstaseisTimeSeriesHandler(with_metaclass(ABCMeta,
             str(obspy.UTCDateTime()).replace(":", "_"),
             FILE_ENDINGS_MAP[format])
 
+        return CONTENT_TYPES_MAP[format], filename
+
+    def set_headers(self, args):
+        content_type, filename = self.get_content_type_and_filename(args)
+        self.set_header("Content-Type", content_type)
         self.set_header("Content-Disposition",
                         "attachment; filename=%s" % filename)
 
@@ -427,19 +495,11 @@ class InstaseisTimeSeriesHandler(with_metaclass(ABCMeta,
                 raise tornado.web.HTTPError(
                     404, log_message=msg, reason=msg)
 
-            for station in coordinates:
-                try:
-                    receivers.append(Receiver(
-                        latitude=station["latitude"],
-                        longitude=station["longitude"],
-                        network=station["network"],
-                        station=station["station"],
-                        depth_in_m=0))
-                except:
-                    msg = ("Station coordinate query returned invalid "
-                           "coordinates.")
-                    raise tornado.web.HTTPError(400, log_message=msg,
-                                                reason=msg)
+            try:
+                receivers = get_receiver_array(coordinates)
+            except:
+                msg = "Station coordinate query returned invalid coordinates."
+                raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
         return receivers
 
     def validate_receiver_parameters(self, args):
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Simple job queue for long running server requests.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import threading
+import time
+import uuid
+
+import tornado.web
+
+from future import standard_library
+with standard_library.hooks():
+    import queue
+
+
+class Job(object):
+    """
+    A single job and, once it is done, its result.
+    """
+    def __init__(self, func, kwargs):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.kwargs = kwargs
+        # One of "queued", "running", "finished", or "failed".
+        self.status = "queued"
+        self.progress = 0.0
+        self.created = time.time()
+        self.finished = None
+        # Set for finished jobs.
+        self.data = None
+        self.content_type = None
+        self.filename = None
+        # Set for failed jobs.
+        self.status_code = None
+        self.reason = None
+
+    def to_dict(self):
+        d = {
+            "id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "created": self.created}
+        if self.finished is not None:
+            d["finished"] = self.finished
+        if self.status == "failed":
+            d["status_code"] = self.status_code
+            d["reason"] = self.reason
+        return d
+
+
+class JobManager(object):
+    """
+    Runs jobs on a bounded pool of worker threads and keeps their results
+    around for a certain time.
+
+    The job functions are called with the passed keyword arguments and an
+    additional ``progress_callback`` argument which accepts a float between
+    0 and 1. They have to return a tuple of the result as bytes, its content
+    type, and a filename. Raise a :class:`tornado.web.HTTPError` to signal
+    a failed job.
+
+    :param max_workers: The number of concurrently running jobs.
+    :param max_queued_jobs: The maximum number of jobs waiting to be
+        executed. Further submissions are rejected.
+    :param ttl_in_s: Finished and failed jobs are evicted this many seconds
+        after they have been finished.
+    """
+    def __init__(self, max_workers=2, max_queued_jobs=100, ttl_in_s=3600.0):
+        self.max_workers = max_workers
+        self.max_queued_jobs = max_queued_jobs
+        self.ttl_in_s = ttl_in_s
+
+        self._jobs = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._workers = []
+
+    def _start_workers(self):
+        # Started on demand so unused job managers don't cost anything.
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.status = "running"
+
+            def progress_callback(value):
+                job.progress = min(max(float(value), 0.0), 1.0)
+
+            try:
+                job.data, job.content_type, job.filename = job.func(
+                    progress_callback=progress_callback, **job.kwargs)
+                job.progress = 1.0
+                job.status = "finished"
+            except tornado.web.HTTPError as e:
+                job.status_code = e.status_code
+                job.reason = e.reason
+                job.status = "failed"
+            except Exception:
+                job.status_code = 500
+                job.reason = "Job failed due to an internal server error."
+                job.status = "failed"
+            finally:
+                # Free the potentially large inputs.
+                job.kwargs = None
+                job.finished = time.time()
+                self._queue.task_done()
+
+    @property
+    def queue_size(self):
+        return self._queue.qsize()
+
+    def evict_expired(self):
+        """
+        Removes all finished or failed jobs whose results have expired.
+        """
+        now = time.time()
+        with self._lock:
+            expired = [key for key, job in self._jobs.items()
+                       if job.finished is not None and
+                       now - job.finished > self.ttl_in_s]
+            for key in expired:
+                del self._jobs[key]
+
+    def submit(self, func, **kwargs):
+        """
+        Submit a new job. Returns the job object.
+        """
+        self.evict_expired()
+        if self.queue_size >= self.max_queued_jobs:
+            msg = ("Too many queued jobs. Please try again later.")
+            raise tornado.web.HTTPError(503, log_message=msg, reason=msg)
+
+        job = Job(func=func, kwargs=kwargs)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._start_workers()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        """
+        Returns the job with the given id or None if it does not exist (or
+        no longer exists).
+        """
+        self.evict_expired()
+        with self._lock:
+            return self._jobs.get(job_id, None)
+
+    def expires(self, job):
+        """
+        Time at which a job will be evicted. None if not yet known.
+        """
+        if job.finished is None:
+            return None
+        return job.finished + self.ttl_in_s
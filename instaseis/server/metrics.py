@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Collects metrics of the Instaseis server and renders them in the Prometheus
+text exposition format.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import bisect
+import collections
+import threading
+
+from .util import ASYNC_THREAD_PREFIX
+
+
+# Upper bounds of the latency histogram buckets in seconds.
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (key, str(value).replace("\\", "\\\\").replace(
+            '"', '\\"').replace("\n", "\\n"))
+        for key, value in labels)
+
+
+class Histogram(object):
+    """
+    A histogram with fixed buckets.
+
+    :param buckets: The sorted upper bounds of the buckets.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_lines(self, name, labels):
+        """
+        Returns the lines of the histogram in the exposition format.
+
+        :param name: The name of the metric.
+        :param labels: List of (key, value) label tuples.
+        """
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            lines.append("%s_bucket%s %i" % (
+                name, _format_labels(labels + [("le", _format_value(bound))]),
+                total))
+        lines.append("%s_bucket%s %i" % (
+            name, _format_labels(labels + [("le", "+Inf")]), self.count))
+        lines.append("%s_sum%s %s" % (name, _format_labels(labels),
+                                      _format_value(self.sum)))
+        lines.append("%s_count%s %i" % (name, _format_labels(labels),
+                                        self.count))
+        return lines
+
+
+class Metrics(object):
+    """
+    Thread-safe collection of all metrics of a server.
+
+    Request metrics are collected by the request handlers, the timings of
+    the individual stages of the seismogram extraction by registering
+    :meth:`observe_stage` as a stage observer of the database. Everything
+    else is collected on demand when rendering.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = collections.defaultdict(int)
+        self.request_durations = {}
+        self.stage_durations = {}
+        self.bytes_read = 0
+
+    def observe_request(self, handler, method, code, duration):
+        """
+        Record a finished request.
+
+        :param handler: The name of the request handler.
+        :param method: The HTTP method.
+        :param code: The HTTP status code.
+        :param duration: The duration of the request in seconds.
+        """
+        with self._lock:
+            self.requests[(handler, method, int(code))] += 1
+            if handler not in self.request_durations:
+                self.request_durations[handler] = Histogram(self.buckets)
+            self.request_durations[handler].observe(duration)
+
+    def observe_stage(self, stage):
+        """
+        Record a single stage. Meant to be registered with
+        :meth:`~instaseis.database_interfaces.base_instaseis_db.BaseInstaseisDB.add_stage_observer`.
+        """  # NOQA
+        with self._lock:
+            if stage.name not in self.stage_durations:
+                self.stage_durations[stage.name] = Histogram(self.buckets)
+            self.stage_durations[stage.name].observe(stage.wall_time)
+            self.bytes_read += stage.nbytes
+
+    def render(self, db=None, job_manager=None):
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        :param db: If given, the buffer statistics of its meshes are
+            included.
+        :param job_manager: If given, its queue depth is included.
+        """
+        output = []
+
+        def _add(name, kind, description, samples):
+            output.append("# HELP %s %s" % (name, description))
+            output.append("# TYPE %s %s" % (name, kind))
+            for labels, value in samples:
+                output.append("%s%s %s" % (name, _format_labels(labels),
+                                           _format_value(value)))
+
+        with self._lock:
+            _add("instaseis_requests_total", "counter",
+                 "Number of finished HTTP requests.",
+                 [([("handler", h), ("method", m), ("code", c)], v)
+                  for (h, m, c), v in sorted(self.requests.items())])
+
+            name = "instaseis_request_duration_seconds"
+            output.append("# HELP %s Duration of HTTP requests." % name)
+            output.append("# TYPE %s histogram" % name)
+            for handler, hist in sorted(self.request_durations.items()):
+                output.extend(hist.get_lines(name, [("handler", handler)]))
+
+            name = "instaseis_stage_duration_seconds"
+            output.append("# HELP %s Duration of the individual stages of "
+                          "the seismogram extraction." % name)
+            output.append("# TYPE %s histogram" % name)
+            for stage, hist in sorted(self.stage_durations.items()):
+                output.extend(hist.get_lines(name, [("stage", stage)]))
+
+            _add("instaseis_disk_read_bytes_total", "counter",
+                 "Bytes read from the database files.",
+                 [([], self.bytes_read)])
+
+        _add("instaseis_async_threads", "gauge",
+             "Number of currently running extraction threads.",
+             [([], sum(1 for _i in threading.enumerate()
+                       if _i.name.startswith(ASYNC_THREAD_PREFIX)))])
+
+        if job_manager is not None:
+            _add("instaseis_job_queue_depth", "gauge",
+                 "Number of jobs waiting to be executed.",
+                 [([], job_manager.queue_size)])
+
+        buffers = []
+        meshes = getattr(db, "meshes", None)
+        if meshes:
+            for mesh_name, mesh in zip(meshes._fields, meshes):
+                if not mesh:
+                    continue
+                for buffer_name in ("strain", "displ"):
+                    buffers.append((
+                        [("mesh", mesh_name), ("buffer", buffer_name)],
+                        getattr(mesh, buffer_name + "_buffer")))
+
+        if buffers:
+            _add("instaseis_buffer_hits_total", "counter",
+                 "Number of buffer lookups that were hits.",
+                 [(label, b.hits) for label, b in buffers])
+            _add("instaseis_buffer_misses_total", "counter",
+                 "Number of buffer lookups that were misses.",
+                 [(label, b.misses) for label, b in buffers])
+            _add("instaseis_buffer_hit_ratio", "gauge",
+                 "Fraction of buffer lookups that were hits.",
+                 [(label, b.efficiency) for label, b in buffers])
+            _add("instaseis_buffer_size_bytes", "gauge",
+                 "Memory used by the buffer.",
+                 [(label, int(round(b.get_size_mb() * 1024 ** 2)))
+                  for label, b in buffers])
+            _add("instaseis_buffer_items", "gauge",
+                 "Number of items in the buffer.",
+                 [(label, len(b)) for label, b in buffers])
+
+        return "\n".join(output) + "\n"
@@ -9,6 +9,7 @@
 """
 import tornado.web
 
+from ... import ReceiverArray
 from ..instaseis_request import InstaseisRequestHandler
 
 
@@ -39,6 +40,16 @@ class CoordinatesHandler(InstaseisRequestHandler):
             raise tornado.web.HTTPError(
                 404, log_message=msg, reason=msg)
 
+        if isinstance(coordinates, ReceiverArray):
+            coordinates = [
+                {"network": net, "station": sta, "latitude": lat,
+                 "longitude": lon}
+                for net, sta, lat, lon in zip(
+                    coordinates.networks.tolist(),
+                    coordinates.stations.tolist(),
+                    coordinates.latitudes.tolist(),
+                    coordinates.longitudes.tolist())]
+
         features = []
         for station in coordinates:
             features.append(
@@ -9,7 +9,6 @@
 """
 import io
 import math
-import numpy as np
 import zipfile
 
 import obspy
@@ -19,6 +18,7 @@ import tornado.web
 from ... import FiniteSource
 from ..util import run_async, IOQueue, _validtimesetting, \
     _validate_and_write_waveforms
+from ..admission import estimate_cost
 from ..instaseis_request import InstaseisTimeSeriesHandler
 from ...source import USGSParamFileParsingException
 
@@ -30,7 +30,7 @@ from ...database_interfaces.base_instaseis_db import (
 def _get_finite_source(db, finite_source, receiver, components, units, dt,
                        kernelwidth, scale, starttime, endtime,
                        time_of_first_sample, format, label,
-                       callback):
+                       callback, progress_callback=None):
     """
     Extract a seismogram from the passed db and write it either to a MiniSEED
     or a SACZIP file.
@@ -46,16 +46,20 @@ def _get_finite_source(db, finite_source, receiver, components, units, dt,
     :param starttime: The desired start time of the seismogram.
     :param endtime: The desired end time of the seismogram.
     :param time_of_first_sample: The time of the first sample.
-    :param format: The output format. Either "miniseed" or "saczip".
+    :param format: The output format. One of "miniseed", "saczip", "raw32",
+        or "raw32z".
     :param label: Prefix for the filename within the SAC zip file.
     :param callback: callback function of the coroutine.
+    :param progress_callback: Optional progress callback passed on to
+        the database.
     """
     try:
         st = db.get_seismograms_finite_source(
             sources=finite_source, receiver=receiver, components=components,
             # Effectively results in nothing happening so we can perform the
             # differentiation here.
-            kind=INV_KIND_MAP[STF_MAP[db.info.stf]])
+            kind=INV_KIND_MAP[STF_MAP[db.info.stf]],
+            progress_callback=progress_callback)
     except Exception:
         msg = ("Could not extract finite source seismograms. Make sure, "
                "the parameters are valid, and the depth settings are correct.")
@@ -131,8 +135,8 @@ def _parse_and_resample_finite_source(request, db_info, max_size, callback):
     # calculated with the current database.
     # XXX: Also needs checks for latitude/longitude bounds if we ever
     # implement regional databases.
-    min_depth = min(_i.depth_in_m for _i in finite_source.pointsources)
-    max_depth = max(_i.depth_in_m for _i in finite_source.pointsources)
+    min_depth = finite_source.min_depth_in_m
+    max_depth = finite_source.max_depth_in_m
 
     db_min_depth = db_info.planet_radius - db_info.max_radius
     db_max_depth = db_info.planet_radius - db_info.min_radius
@@ -161,7 +165,6 @@ def _parse_and_resample_finite_source(request, db_info, max_size, callback):
     # Add two periods of samples at the beginning end the end to avoid
     # boundary effects at the ends.
     samples = int(math.ceil((2 * dominant_period / db_info.dt))) + 1
-    zeros = np.zeros(samples)
 
     shift = samples * db_info.dt
 
@@ -172,9 +175,8 @@ def _parse_and_resample_finite_source(request, db_info, max_size, callback):
     # first slipping point source.
     first_slip = finite_source.time_shift
 
-    for source in finite_source.pointsources:
-        source.sliprate = np.concatenate([zeros, source.sliprate, zeros])
-        source.time_shift += shift - first_slip
+    finite_source.pad_sliprate(samples, samples)
+    finite_source.time_shifts += shift - first_slip
 
     finite_source.additional_time_shift = shift
 
@@ -356,6 +358,11 @@ class FiniteSourceSeismogramsHandler(InstaseisTimeSeriesHandler):
         # send the seismograms will dominate.
         receivers = self.get_receivers(args)
 
+        self.admit(estimate_cost(
+            db=self.application.db, receivers=len(receivers),
+            components=len(args.components),
+            sources=finite_source.npointsources, dt=args.dt))
+
         # If a zip file is requested, initialize it here and write to custom
         # buffer object.
         if args.format == "saczip":
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+import numpy as np
+import obspy
+import tornado.gen
+import tornado.web
+
+from ... import Receiver
+from ...helpers import read_point_sources, write_raw32
+from ..admission import estimate_cost
+from ..instaseis_request import InstaseisTimeSeriesHandler
+from ..util import run_async
+
+
+@run_async
+def _get_finite_source_sum(db, finite_source, receiver, components,
+                           correct_mu, format, callback):
+    """
+    Sum the reconvolved seismograms of all point sources at the sampling of
+    the database and write them to a raw32 file.
+
+    :param db: An open instaseis database.
+    :param finite_source: An instaseis finite source.
+    :param receiver: An instaseis receiver.
+    :param components: The components.
+    :param correct_mu: Correct the source magnitudes for the actual shear
+        modulus.
+    :param format: The output format. One of "raw32" or "raw32z".
+    :param callback: callback function of the coroutine.
+    """
+    try:
+        data = db._sum_finite_source(
+            sources=finite_source, receiver=receiver, components=components,
+            correct_mu=correct_mu)
+    except Exception:
+        msg = ("Could not extract finite source seismograms. Make sure, "
+               "the parameters are valid, and the depth settings are correct.")
+        callback(tornado.web.HTTPError(400, log_message=msg, reason=msg))
+        return
+
+    st = obspy.Stream()
+    for comp in components:
+        st += obspy.Trace(data=np.require(data[comp], dtype=np.float32),
+                          header={"delta": db.info.dt,
+                                  "station": receiver.station,
+                                  "network": receiver.network,
+                                  "location": receiver.location,
+                                  "channel": comp})
+
+    with db._stage("serialization"):
+        binary_data = write_raw32(st, compress=format == "raw32z")
+    callback(binary_data)
+
+
+class FiniteSourceRawHandler(InstaseisTimeSeriesHandler):
+    """
+    Sum of the seismograms of any number of point sources at a single
+    receiver. The point sources are sent in the body of a POST request and
+    their sliprates have to be sampled like the database. The sum is not
+    resampled, differentiated, or cut so partial sums over different subsets
+    of the point sources of a finite source can be added up by the client.
+    """
+    arguments = {
+        "components": {"type": str},
+        "correctmu": {"type": int, "default": 0},
+        # Receiver parameters.
+        "receiverlatitude": {"type": float, "required": True},
+        "receiverlongitude": {"type": float, "required": True},
+        "receiverdepthinmeters": {"type": float},
+        "networkcode": {"type": str},
+        "stationcode": {"type": str},
+        "locationcode": {"type": str},
+        "format": {"type": str, "default": "raw32z"}
+    }
+    formats = ("raw32", "raw32z")
+    default_label = "instaseis_finite_source_sum"
+
+    def __init__(self, *args, **kwargs):
+        super(FiniteSourceRawHandler, self).__init__(*args, **kwargs)
+        # Set the correct default arguments.
+        self.arguments["components"]["default"] = \
+            "".join(self.application.db.default_components)
+
+    def validate_parameters(self, args):
+        if not self.application.db.info.is_reciprocal:
+            msg = ("Finite sources can only be calculated with reciprocal "
+                   "databases.")
+            raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
+
+    @tornado.web.asynchronous
+    @tornado.gen.coroutine
+    def post(self):
+        args = self.parse_arguments()
+
+        try:
+            finite_source = read_point_sources(self.request.body)
+        except Exception:
+            msg = ("Could not parse the point sources in the body of the "
+                   "request.")
+            raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
+
+        if not len(finite_source):
+            msg = "The request contains no point sources."
+            raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
+
+        max_size = self.application.max_size_of_finite_sources
+        if max_size is not None and len(finite_source) > max_size:
+            msg = ("The server only allows finite sources with at most %i "
+                   "points sources. The source in question has %i points." % (
+                       max_size, len(finite_source)))
+            raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
+
+        try:
+            receiver = Receiver(latitude=args.receiverlatitude,
+                                longitude=args.receiverlongitude,
+                                network=args.networkcode,
+                                station=args.stationcode,
+                                location=args.locationcode,
+                                depth_in_m=args.receiverdepthinmeters)
+        except Exception:
+            msg = ("Could not construct receiver with passed parameters. "
+                   "Check parameters for sanity.")
+            raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
+
+        components = list(args.components)
+        self.admit(estimate_cost(db=self.application.db, receivers=1,
+                                 components=len(components),
+                                 sources=len(finite_source)))
+
+        response = yield tornado.gen.Task(
+            _get_finite_source_sum, db=self.application.db,
+            finite_source=finite_source, receiver=receiver,
+            components=components, correct_mu=bool(args.correctmu),
+            format=args.format)
+
+        # If an exception is returned from the task, re-raise it here.
+        if isinstance(response, Exception):
+            raise response
+
+        self.set_headers(args)
+        self.write(response)
+        self.finish()
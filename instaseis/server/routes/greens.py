@@ -17,6 +17,7 @@ import tornado.web
 
 from ... import Source, Receiver, ForceSource
 from ..util import run_async, _validtimesetting, _validate_and_write_waveforms
+from ..admission import estimate_cost
 from ..instaseis_request import InstaseisTimeSeriesHandler
 
 
@@ -37,7 +38,8 @@ def _get_greens(db, epicentral_distance_degree, source_depth_in_m, units, dt,
     :param origintime: Origin time of the source.
     :param starttime: The desired start time of the seismogram.
     :param endtime: The desired end time of the seismogram.
-    :param format: The output format. Either "miniseed" or "saczip".
+    :param format: The output format. One of "miniseed", "saczip", "raw32",
+        or "raw32z".
     :param label: Prefix for the filename within the SAC zip file.
     :param callback: callback function of the coroutine.
     """
@@ -171,6 +173,10 @@ class GreensFunctionHandler(InstaseisTimeSeriesHandler):
 
         starttime, endtime = time_values
 
+        # Green's functions always consist of ten traces.
+        self.admit(estimate_cost(db=self.application.db, receivers=1,
+                                 components=10, dt=args.dt))
+
         # Yield from the task. This enables a context switch and thus
         # async behaviour.
         response, mu = yield tornado.gen.Task(
@@ -189,7 +195,7 @@ class GreensFunctionHandler(InstaseisTimeSeriesHandler):
         # Set and thus send the mu header.
         self.set_header("Instaseis-Mu", "%f" % mu)
 
-        if args.format == "miniseed":
+        if args.format in ("miniseed", "raw32", "raw32z"):
             self.write(response)
         else:
             assert args.format == "saczip"
@@ -8,6 +8,7 @@
     (http://www.gnu.org/copyleft/lgpl.html)
 """
 from ..instaseis_request import InstaseisRequestHandler
+from .seismograms_raw import RawSeismogramsHandler
 from ... import __version__
 
 
@@ -15,6 +16,7 @@ class IndexHandler(InstaseisRequestHandler):
     def get(self):
         response = {
             "type": "Instaseis Remote Server",
-            "version": __version__
+            "version": __version__,
+            "formats": list(RawSeismogramsHandler.formats)
         }
         self.write(response)
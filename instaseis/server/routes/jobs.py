@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+import io
+import zipfile
+
+import obspy
+import tornado.gen
+import tornado.web
+
+from ..admission import estimate_cost
+from ..instaseis_request import InstaseisRequestHandler
+from .finite_source import FiniteSourceSeismogramsHandler, \
+    _get_finite_source, _parse_and_resample_finite_source
+
+
+def _run_finite_source_job(db, finite_source, receivers, components, units,
+                           dt, kernelwidth, scale, time_of_first_sample,
+                           format, label, content_type, filename,
+                           progress_callback):
+    """
+    Calculate the finite source seismograms for all receivers. Runs in a
+    worker thread of the job manager.
+
+    :param receivers: List of (receiver, starttime, endtime) tuples.
+    """
+    if format == "saczip":
+        buf = io.BytesIO()
+        zip_file = zipfile.ZipFile(buf, mode="w")
+    else:
+        pieces = []
+
+    count = len(receivers)
+    for _i, (receiver, starttime, endtime) in enumerate(receivers):
+        def _progress(current, total):
+            progress_callback((_i + float(current) / total) / count)
+
+        # The extraction function runs in its own thread - just wait for it
+        # here.
+        result = []
+        thread = _get_finite_source(
+            db=db, finite_source=finite_source, receiver=receiver,
+            components=components, units=units, dt=dt,
+            kernelwidth=kernelwidth, scale=scale, starttime=starttime,
+            endtime=endtime, time_of_first_sample=time_of_first_sample,
+            format=format, label=label, callback=result.append,
+            progress_callback=_progress)
+        thread.join()
+
+        response, _ = result[0]
+        if isinstance(response, Exception):
+            raise response
+        elif isinstance(response, list):
+            for name, content in response:
+                zip_file.writestr(name, content)
+        else:
+            pieces.append(response)
+
+        progress_callback(float(_i + 1) / count)
+
+    if format == "saczip":
+        zip_file.close()
+        data = buf.getvalue()
+    else:
+        data = b"".join(pieces)
+
+    return data, content_type, filename
+
+
+class FiniteSourceJobHandler(FiniteSourceSeismogramsHandler):
+    """
+    Same parameters as the /finite_source route but the calculation is
+    performed as a job in the background.
+    """
+    @tornado.web.asynchronous
+    @tornado.gen.coroutine
+    def post(self):
+        args = self.parse_arguments()
+
+        response = yield tornado.gen.Task(
+            _parse_and_resample_finite_source,
+            request=self.request,
+            max_size=self.application.max_size_of_finite_sources,
+            db_info=self.application.db.info)
+
+        if isinstance(response, Exception):
+            raise response
+
+        finite_source = response
+
+        time_of_first_sample, min_starttime, max_endtime = \
+            self.parse_time_settings(args, finite_source=finite_source)
+
+        # Resolve everything that might fail upfront so errors are reported
+        # immediately and not only once the job is done.
+        receivers = []
+        for receiver in self.get_receivers(args):
+            time_values = self.get_phase_relative_times(
+                args=args, source=finite_source, receiver=receiver,
+                min_starttime=min_starttime, max_endtime=max_endtime)
+            if time_values is None:
+                continue
+            self.validate_geometry(source=finite_source, receiver=receiver)
+            receivers.append((receiver, time_values[0], time_values[1]))
+
+        if not receivers:
+            msg = ("No seismograms found for the given phase relative "
+                   "offsets. This could either be due to the chosen phase "
+                   "not existing for the specific source-receiver geometry "
+                   "or arriving too late/with too large offsets if the "
+                   "database is not long enough.")
+            raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
+
+        self.admit(estimate_cost(
+            db=self.application.db, receivers=len(receivers),
+            components=len(args.components),
+            sources=finite_source.npointsources, dt=args.dt))
+
+        content_type, filename = self.get_content_type_and_filename(args)
+
+        job = self.application.job_manager.submit(
+            _run_finite_source_job, db=self.application.db,
+            finite_source=finite_source, receivers=receivers,
+            components=list(args.components), units=args.units, dt=args.dt,
+            kernelwidth=args.kernelwidth, scale=args.scale,
+            time_of_first_sample=time_of_first_sample, format=args.format,
+            label=args.label, content_type=content_type, filename=filename)
+
+        self.set_status(202)
+        self.set_header("Location", "/jobs/%s" % job.id)
+        self.write(job.to_dict())
+        self.finish()
+
+
+class JobHandler(InstaseisRequestHandler):
+    def get(self, job_id):
+        job = self.application.job_manager.get(job_id)
+        if job is None:
+            msg = "Job not found. It might have expired."
+            raise tornado.web.HTTPError(404, log_message=msg, reason=msg)
+
+        # The job is concurrently updated by the worker threads.
+        status, progress = job.status, job.progress
+        self.set_header("Instaseis-Job-Status", status)
+        self.set_header("Instaseis-Job-Progress", "%.4f" % progress)
+
+        if status == "failed":
+            raise tornado.web.HTTPError(job.status_code,
+                                        log_message=job.reason,
+                                        reason=job.reason)
+        elif status != "finished":
+            self.set_status(202)
+            self.write(job.to_dict())
+            return
+
+        expires = self.application.job_manager.expires(job)
+        self.set_header("Instaseis-Job-Expires",
+                        str(obspy.UTCDateTime(expires)))
+        self.set_header("Content-Type", job.content_type)
+        self.set_header("Content-Disposition",
+                        "attachment; filename=%s" % job.filename)
+        self.write(job.data)
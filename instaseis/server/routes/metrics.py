@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from ..instaseis_request import InstaseisRequestHandler
+
+
+class MetricsHandler(InstaseisRequestHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.write(self.application.metrics.render(
+            db=self.application.db,
+            job_manager=getattr(self.application, "job_manager", None)))
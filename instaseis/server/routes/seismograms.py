@@ -23,9 +23,11 @@ import tornado.gen
 import tornado.web
 
 from ... import Source, ForceSource, Receiver
+from ...database_interfaces.scheduler import LocalityScheduler
 from ..util import run_async, IOQueue, _validtimesetting, \
     _validate_and_write_waveforms, get_gaussian_source_time_function
-from ..instaseis_request import InstaseisTimeSeriesHandler
+from ..admission import estimate_cost
+from ..instaseis_request import InstaseisTimeSeriesHandler, get_receiver_array
 
 
 # Load the JSON schema once.
@@ -34,6 +36,9 @@ DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
 with io.open(os.path.join(DATA, "finite_source_schema.json"), "rt") as fh:
     _json_schema = json.load(fh)
 
+# Number of consecutive receivers whose calculation can be reordered.
+RECEIVER_WINDOW = 100
+
 
 @run_async
 def _get_seismogram(db, source, receiver, components, units, dt, kernelwidth,
@@ -54,7 +59,8 @@ def _get_seismogram(db, source, receiver, components, units, dt, kernelwidth,
     :param endtime: The desired end time of the seismogram.
     :param scale: A scalar factor which the seismograms will be multiplied
         with.
-    :param format: The output format. Either "miniseed" or "saczip".
+    :param format: The output format. One of "miniseed", "saczip", "raw32",
+        or "raw32z".
     :param label: Prefix for the filename within the SAC zip file.
     :param callback: callback function of the coroutine.
     """
@@ -465,19 +471,12 @@ class SeismogramsHandler(InstaseisTimeSeriesHandler):
                 raise tornado.web.HTTPError(
                     404, log_message=msg, reason=msg)
 
-            for station in coordinates:
-                try:
-                    receivers.append(Receiver(
-                        latitude=station["latitude"],
-                        longitude=station["longitude"],
-                        network=station["network"],
-                        station=station["station"],
-                        depth_in_m=0))
-                except:
-                    msg = ("Could not construct receiver with passed "
-                           "parameters. Check parameters for sanity.")
-                    raise tornado.web.HTTPError(400, log_message=msg,
-                                                reason=msg)
+            try:
+                receivers = get_receiver_array(coordinates)
+            except:
+                msg = ("Could not construct receiver with passed "
+                       "parameters. Check parameters for sanity.")
+                raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
         return receivers
 
     @tornado.web.asynchronous
@@ -556,6 +555,10 @@ class SeismogramsHandler(InstaseisTimeSeriesHandler):
         # send the seismograms will dominate.
         receivers = self.get_receivers(args)
 
+        self.admit(estimate_cost(
+            db=self.application.db, receivers=len(receivers),
+            components=len(args.components), dt=args.dt))
+
         # If a zip file is requested, initialize it here and write to custom
         # buffer object.
         if args.format == "saczip":
@@ -567,41 +570,56 @@ class SeismogramsHandler(InstaseisTimeSeriesHandler):
         # we would like to raise an error.
         count = 0
 
-        # Loop over each receiver, get the synthetics and stream it to the
-        # user.
-        for receiver in receivers:
-
-            # Check if the connection is still open. The connection_closed
-            # flag is set by the on_connection_close() method. This is
-            # pretty manual right now. Maybe there is a better way? This
-            # enables to server to stop serving if the connection has been
-            # cancelled on the client side.
-            if self.connection_closed:  # pragma: no cover
-                self.flush()
-                self.finish()
-                return
+        # Loop over the receivers window by window. Within each window the
+        # synthetics are calculated in the order that makes best use of the
+        # buffers of the database but they are streamed to the user in the
+        # original order.
+        scheduler = LocalityScheduler(self.application.db,
+                                      window=RECEIVER_WINDOW)
+        for window in scheduler.iter_windows(
+                [(source, _i) for _i in receivers]):
 
             # Check if start- or end time are phase relative. If yes
             # calculate the new start- and/or end time.
-            time_values = self.get_phase_relative_times(
-                args=args, source=source, receiver=receiver,
-                min_starttime=min_starttime, max_endtime=max_endtime)
-            if time_values is None:
-                continue
-            starttime, endtime = time_values
-
-            # Validate the source-receiver geometry.
-            self.validate_geometry(source=source, receiver=receiver)
-
-            # Yield from the task. This enables a context switch and thus
-            # async behaviour.
-            response, mu = yield tornado.gen.Task(
-                _get_seismogram,
-                db=self.application.db, source=source, receiver=receiver,
-                components=list(args.components), units=args.units, dt=args.dt,
-                kernelwidth=args.kernelwidth, starttime=starttime,
-                endtime=endtime, scale=args.scale, format=args.format,
-                label=args.label)
+            times = {}
+            for index in sorted(window):
+                receiver = receivers[index]
+                time_values = self.get_phase_relative_times(
+                    args=args, source=source, receiver=receiver,
+                    min_starttime=min_starttime, max_endtime=max_endtime)
+                if time_values is None:
+                    continue
+
+                # Validate the source-receiver geometry.
+                self.validate_geometry(source=source, receiver=receiver)
+                times[index] = time_values
+
+            responses = {}
+            for index in window:
+                if index not in times:
+                    continue
+
+                # Check if the connection is still open. The
+                # connection_closed flag is set by the on_connection_close()
+                # method. This is pretty manual right now. Maybe there is a
+                # better way? This enables to server to stop serving if the
+                # connection has been cancelled on the client side.
+                if self.connection_closed:  # pragma: no cover
+                    self.flush()
+                    self.finish()
+                    return
+
+                starttime, endtime = times[index]
+                # Yield from the task. This enables a context switch and thus
+                # async behaviour.
+                responses[index] = yield tornado.gen.Task(
+                    _get_seismogram,
+                    db=self.application.db, source=source,
+                    receiver=receivers[index],
+                    components=list(args.components), units=args.units,
+                    dt=args.dt, kernelwidth=args.kernelwidth,
+                    starttime=starttime, endtime=endtime, scale=args.scale,
+                    format=args.format, label=args.label)
 
             # Check connection once again.
             if self.connection_closed:  # pragma: no cover
@@ -609,28 +627,32 @@ class SeismogramsHandler(InstaseisTimeSeriesHandler):
                 self.finish()
                 return
 
-            # Set mu just from the first station.
-            if count == 0 and not isinstance(response, Exception):
-                self.set_header("Instaseis-Mu", "%f" % mu)
-
-            # If an exception is returned from the task, re-raise it here.
-            if isinstance(response, Exception):
-                raise response
-            # It might return a list, in that case each item is a bytestring
-            # of SAC file.
-            elif isinstance(response, list):
-                assert args.format == "saczip"
-                for filename, content in response:
-                    zip_file.writestr(filename, content)
-                for data in buf:
-                    self.write(data)
-            # Otherwise it contain MiniSEED which can just directly be
-            # streamed.
-            else:
-                self.write(response)
-            self.flush()
-
-            count += 1
+            for index in sorted(responses):
+                response, mu = responses[index]
+
+                # Set mu just from the first station.
+                if count == 0 and not isinstance(response, Exception):
+                    self.set_header("Instaseis-Mu", "%f" % mu)
+
+                # If an exception is returned from the task, re-raise it
+                # here.
+                if isinstance(response, Exception):
+                    raise response
+                # It might return a list, in that case each item is a
+                # bytestring of SAC file.
+                elif isinstance(response, list):
+                    assert args.format == "saczip"
+                    for filename, content in response:
+                        zip_file.writestr(filename, content)
+                    for data in buf:
+                        self.write(data)
+                # Otherwise it contain MiniSEED which can just directly be
+                # streamed.
+                else:
+                    self.write(response)
+                self.flush()
+
+                count += 1
 
         # If nothing is written, raise an error. This should really only
         # happen with phase relative offsets with phases not coinciding with
@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+import io
+import json
+import struct
+
+import numpy as np
+import obspy
+import tornado.gen
+import tornado.web
+
+from ... import Source, ForceSource, Receiver
+from ...database_interfaces.scheduler import LocalityScheduler
+from ...helpers import write_raw32
+from ..admission import estimate_cost
+from ..instaseis_request import InstaseisTimeSeriesHandler
+from ..util import run_async
+
+
+# Each record in the response stream is prefixed by the length of the JSON
+# header and the length of the payload, both as little endian unsigned 32 bit
+# integers.
+RECORD_PREFIX = struct.Struct("<II")
+
+# Parameters that can be specified per job. They mirror the parameters of
+# the /seismograms_raw route plus some processing settings.
+JOB_PARAMETERS = {
+    "components": str,
+    "units": str,
+    "dt": float,
+    "kernelwidth": int,
+    # Source parameters.
+    "sourcelatitude": float,
+    "sourcelongitude": float,
+    "sourcedepthinmeters": float,
+    "mrr": float,
+    "mtt": float,
+    "mpp": float,
+    "mrt": float,
+    "mrp": float,
+    "mtp": float,
+    "strike": float,
+    "dip": float,
+    "rake": float,
+    "M0": float,
+    "fr": float,
+    "ft": float,
+    "fp": float,
+    "origintime": obspy.UTCDateTime,
+    # Receiver parameters.
+    "receiverlatitude": float,
+    "receiverlongitude": float,
+    "receiverdepthinmeters": float,
+    "networkcode": str,
+    "stationcode": str,
+    "locationcode": str
+}
+
+
+class BulkJobError(Exception):
+    """
+    Raised if a single job of a bulk request is invalid.
+    """
+    pass
+
+
+def _parse_job(job, db):
+    """
+    Parse and validate a single job of a bulk request.
+
+    Returns a dictionary with the source, receiver, and processing settings.
+    Raises a :class:`BulkJobError` if anything is amiss.
+
+    :param job: The job as a dictionary parsed from JSON.
+    :param db: An open instaseis database.
+    """
+    if not isinstance(job, dict):
+        raise BulkJobError("Each job must be a JSON object.")
+
+    unknown = set(job.keys()).difference(set(JOB_PARAMETERS.keys()))
+    if unknown:
+        raise BulkJobError(
+            "The following unknown parameters have been passed: %s" % (
+                ", ".join("'%s'" % _i for _i in sorted(unknown))))
+
+    args = {}
+    for key, value in job.items():
+        if value is None:
+            continue
+        try:
+            args[key] = JOB_PARAMETERS[key](value)
+        except Exception:
+            raise BulkJobError("Parameter '%s' could not be converted to "
+                               "'%s'." % (key, JOB_PARAMETERS[key].__name__))
+
+    for key in ("sourcelatitude", "sourcelongitude", "receiverlatitude",
+                "receiverlongitude"):
+        if key not in args:
+            raise BulkJobError("Required parameter '%s' not given." % key)
+
+    info = db.info
+
+    components = list(args.get("components",
+                               "".join(db.default_components)))
+    if not components:
+        raise BulkJobError("A request with no components will not return "
+                           "anything...")
+    if len(components) > 5:
+        raise BulkJobError("A maximum of 5 components can be requested.")
+
+    units = args.get("units", "displacement").lower()
+    if units not in ["displacement", "velocity", "acceleration"]:
+        raise BulkJobError("Unit must be one of 'displacement', 'velocity', "
+                           "or 'acceleration'")
+
+    dt = args.get("dt", None)
+    if dt is not None:
+        if dt and abs(dt - info.dt) / dt < 1E-7:
+            dt = info.dt
+        if dt < 0.01:
+            raise BulkJobError("The smallest possible dt is 0.01. Please "
+                               "choose a smaller value and resample locally "
+                               "if needed.")
+        if dt > info.dt:
+            raise BulkJobError("Cannot downsample. The sampling interval of "
+                               "the database is %.5f seconds. Make sure to "
+                               "choose a smaller or equal one." % info.dt)
+
+    kernelwidth = args.get("kernelwidth", 12)
+    if not (1 <= kernelwidth <= 20):
+        raise BulkJobError("`kernelwidth` must not be smaller than 1 or "
+                           "larger than 20.")
+
+    origin_time = args.get("origintime", obspy.UTCDateTime(0))
+    depth_in_m = args.get("sourcedepthinmeters", 0.0)
+
+    mt = ["mrr", "mtt", "mpp", "mrt", "mrp", "mtp"]
+    sdr = ["strike", "dip", "rake", "M0"]
+    fs = ["fr", "ft", "fp"]
+
+    try:
+        if all(_i in args for _i in mt):
+            source = Source(
+                latitude=args["sourcelatitude"],
+                longitude=args["sourcelongitude"], depth_in_m=depth_in_m,
+                m_rr=args["mrr"], m_tt=args["mtt"], m_pp=args["mpp"],
+                m_rt=args["mrt"], m_rp=args["mrp"], m_tp=args["mtp"],
+                origin_time=origin_time)
+        elif all(_i in args for _i in sdr):
+            source = Source.from_strike_dip_rake(
+                latitude=args["sourcelatitude"],
+                longitude=args["sourcelongitude"], depth_in_m=depth_in_m,
+                strike=args["strike"], dip=args["dip"], rake=args["rake"],
+                M0=args["M0"], origin_time=origin_time)
+        elif all(_i in args for _i in fs):
+            source = ForceSource(
+                latitude=args["sourcelatitude"],
+                longitude=args["sourcelongitude"], depth_in_m=depth_in_m,
+                f_r=args["fr"], f_t=args["ft"], f_p=args["fp"],
+                origin_time=origin_time)
+        else:
+            raise BulkJobError(
+                "No/insufficient source parameters specified")
+    except BulkJobError:
+        raise
+    except Exception:
+        raise BulkJobError("Could not construct the source with the passed "
+                           "parameters. Check parameters for sanity.")
+
+    try:
+        receiver = Receiver(
+            latitude=args["receiverlatitude"],
+            longitude=args["receiverlongitude"],
+            network=args.get("networkcode", None),
+            station=args.get("stationcode", None),
+            location=args.get("locationcode", None),
+            depth_in_m=args.get("receiverdepthinmeters", 0.0))
+    except Exception:
+        raise BulkJobError("Could not construct receiver with passed "
+                           "parameters. Check parameters for sanity.")
+
+    return {
+        "source": source,
+        "receiver": receiver,
+        "components": components,
+        "units": units,
+        "dt": dt,
+        "kernelwidth": kernelwidth
+    }
+
+
+def _get_locality_aware_order(jobs, db):
+    """
+    Returns the indices of the jobs in the order they should be processed.
+
+    Invalid jobs are processed first as they are essentially free. The
+    valid ones are ordered by the elements they require so that they profit
+    from the buffers of the database.
+    """
+    invalid = [_i for _i, job in enumerate(jobs)
+               if isinstance(job, BulkJobError)]
+    valid = [_i for _i, job in enumerate(jobs)
+             if not isinstance(job, BulkJobError)]
+    order = LocalityScheduler(db).get_order(
+        [(jobs[_i]["source"], jobs[_i]["receiver"]) for _i in valid])
+    return invalid + [valid[_i] for _i in order]
+
+
+def _pack_record(index, status, message=None, mu=None, payload=b""):
+    """
+    Pack a single job result to a length prefixed binary record.
+    """
+    header = {"index": index, "status": status}
+    if message is not None:
+        header["message"] = message
+    if mu is not None:
+        header["mu"] = mu
+    header = json.dumps(header, sort_keys=True).encode()
+    return RECORD_PREFIX.pack(len(header), len(payload)) + header + payload
+
+
+def unpack_bulk_response(data):
+    """
+    Unpack a response of the /seismograms_bulk route.
+
+    Returns a list of ``(header, payload)`` tuples in the order they have
+    been sent by the server. The header is a dictionary with at least the
+    ``"index"`` and ``"status"`` keys.
+
+    :type data: bytes
+    :param data: The body of the response.
+    """
+    records = []
+    offset = 0
+    while offset < len(data):
+        header_length, payload_length = RECORD_PREFIX.unpack_from(
+            data, offset)
+        offset += RECORD_PREFIX.size
+        header = json.loads(data[offset:offset + header_length].decode())
+        offset += header_length
+        payload = data[offset:offset + payload_length]
+        offset += payload_length
+        records.append((header, payload))
+    return records
+
+
+@run_async
+def _get_seismogram(db, source, receiver, components, units, dt,
+                    kernelwidth, format, callback):
+    """
+    Extract a seismogram from the passed db and write it to MiniSEED or
+    raw32.
+
+    :param db: An open instaseis database.
+    :param source: An instaseis source.
+    :param receiver: An instaseis receiver.
+    :param components: The components.
+    :param units: The desired units.
+    :param dt: dt to resample to.
+    :param kernelwidth: Width of the interpolation kernel.
+    :param format: The output format. One of "miniseed", "raw32", or
+        "raw32z".
+    :param callback: callback function of the coroutine.
+    """
+    try:
+        st = db.get_seismograms(
+            source=source, receiver=receiver, components=components,
+            kind=units, remove_source_shift=False, reconvolve_stf=False,
+            return_obspy_stream=True, dt=dt, kernelwidth=kernelwidth)
+    except Exception:
+        msg = ("Could not extract seismogram. Make sure, the components "
+               "are valid, and the depth settings are correct.")
+        callback((400, msg, None))
+        return
+
+    # Half the filesize but definitely sufficiently accurate.
+    for tr in st:
+        tr.data = np.require(tr.data, dtype=np.float32)
+
+    mu = float(st[0].stats.instaseis.mu)
+
+    with db._stage("serialization"):
+        if format == "miniseed":
+            with io.BytesIO() as fh:
+                st.write(fh, format="mseed")
+                fh.seek(0, 0)
+                binary_data = fh.read()
+        else:
+            binary_data = write_raw32(st, compress=format == "raw32z",
+                                      mu=mu)
+    callback((200, binary_data, mu))
+
+
+class BulkSeismogramsHandler(InstaseisTimeSeriesHandler):
+    # All job specific parameters are passed in the body.
+    arguments = {
+        "format": {"type": str, "default": "miniseed"}
+    }
+    formats = ("miniseed", "raw32", "raw32z")
+    default_label = "instaseis_bulk"
+
+    def validate_parameters(self, args):
+        pass
+
+    def parse_jobs(self):
+        """
+        Parse the body of the request which must contain one JSON object
+        per line.
+        """
+        if not self.request.body:
+            msg = "The jobs must be given in the body of the POST request."
+            raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
+
+        try:
+            lines = self.request.body.decode().splitlines()
+        except Exception:
+            msg = "The body of the POST request must be UTF-8 encoded."
+            raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
+
+        jobs = []
+        for _i, line in enumerate(lines):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                jobs.append(json.loads(line))
+            except Exception:
+                msg = "Line %i of the body is not valid JSON." % (_i + 1)
+                raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
+
+        if not jobs:
+            msg = "The body of the POST request contains no jobs."
+            raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
+
+        max_jobs = self.application.max_size_of_bulk_requests
+        if max_jobs and len(jobs) > max_jobs:
+            msg = ("The server only allows bulk requests with at most %i "
+                   "jobs." % max_jobs)
+            raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
+
+        return jobs
+
+    @tornado.web.asynchronous
+    @tornado.gen.coroutine
+    def post(self):
+        args = self.parse_arguments()
+        jobs = self.parse_jobs()
+
+        db = self.application.db
+        parsed_jobs = []
+        for job in jobs:
+            try:
+                parsed_jobs.append(_parse_job(job, db))
+            except BulkJobError as e:
+                parsed_jobs.append(e)
+
+        # The whole request is admitted or rejected at once.
+        self.admit(sum(
+            estimate_cost(db=db, receivers=1,
+                          components=len(_i["components"]), dt=_i["dt"])
+            for _i in parsed_jobs if not isinstance(_i, BulkJobError)))
+
+        order = _get_locality_aware_order(parsed_jobs, db=db)
+
+        self.set_header("Content-Type", "application/octet-stream")
+        self.set_header("Instaseis-Bulk-Jobs", str(len(parsed_jobs)))
+
+        for index in order:
+            # Stop serving if the client cancelled the connection.
+            if self.connection_closed:  # pragma: no cover
+                self.flush()
+                self.finish()
+                return
+
+            job = parsed_jobs[index]
+            if isinstance(job, BulkJobError):
+                self.write(_pack_record(index=index, status=400,
+                                        message=str(job)))
+                continue
+
+            try:
+                self.validate_geometry(source=job["source"],
+                                       receiver=job["receiver"])
+            except tornado.web.HTTPError as e:
+                self.write(_pack_record(index=index, status=e.status_code,
+                                        message=e.reason))
+                continue
+
+            status, data, mu = yield tornado.gen.Task(
+                _get_seismogram, db=db, format=args.format, **job)
+
+            if status == 200:
+                self.write(_pack_record(index=index, status=status, mu=mu,
+                                        payload=data))
+            else:
+                self.write(_pack_record(index=index, status=status,
+                                        message=data))
+            self.flush()
+
+        self.finish()
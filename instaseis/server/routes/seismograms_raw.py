@@ -14,20 +14,24 @@ import obspy
 import tornado.web
 
 from ... import Source, ForceSource, Receiver
+from ...helpers import write_raw32
+from ..admission import estimate_cost
 from ..instaseis_request import InstaseisTimeSeriesHandler
 from ..util import run_async
 
 
 @run_async
-def _get_seismogram(db, source, receiver, components, callback):
+def _get_seismogram(db, source, receiver, components, format, callback):
     """
     Extract a seismogram from the passed db and write it either to a MiniSEED
-    or a SACZIP file.
+    or a raw32 file.
 
     :param db: An open instaseis database.
     :param source: An instaseis source.
     :param receiver: An instaseis receiver.
     :param components: The components.
+    :param format: The output format. One of "miniseed", "raw32", or
+        "raw32z".
     :param callback: callback function of the coroutine.
     """
     # Get the most barebones seismograms possible.
@@ -58,11 +62,18 @@ def _get_seismogram(db, source, receiver, components, callback):
     for tr in st:
         tr.data = np.require(tr.data, dtype=np.float32)
 
-    with io.BytesIO() as fh:
-        st.write(fh, format="mseed")
-        fh.seek(0, 0)
-        binary_data = fh.read()
-    callback((binary_data, st[0].stats.instaseis.mu))
+    mu = st[0].stats.instaseis.mu
+
+    with db._stage("serialization"):
+        if format == "miniseed":
+            with io.BytesIO() as fh:
+                st.write(fh, format="mseed")
+                fh.seek(0, 0)
+                binary_data = fh.read()
+        else:
+            binary_data = write_raw32(st, compress=format == "raw32z",
+                                      mu=mu)
+    callback((binary_data, mu))
 
 
 class RawSeismogramsHandler(InstaseisTimeSeriesHandler):
@@ -101,8 +112,10 @@ class RawSeismogramsHandler(InstaseisTimeSeriesHandler):
         "receiverdepthinmeters": {"type": float, "default": 0.0},
         "networkcode": {"type": str},
         "stationcode": {"type": str},
-        "locationcode": {"type": str}
+        "locationcode": {"type": str},
+        "format": {"type": str, "default": "miniseed"}
     }
+    formats = ("miniseed", "raw32", "raw32z")
     default_label = "instaseis_seismogram"
 
     def validate_parameters(self, args):
@@ -196,9 +209,12 @@ class RawSeismogramsHandler(InstaseisTimeSeriesHandler):
                    "Check parameters for sanity.")
             raise tornado.web.HTTPError(400, log_message=msg, reason=msg)
 
+        self.admit(estimate_cost(db=self.application.db, receivers=1,
+                                 components=len(components)))
+
         response = yield tornado.gen.Task(
             _get_seismogram, db=self.application.db, source=source,
-            receiver=receiver, components=components)
+            receiver=receiver, components=components, format=args.format)
 
         # If an exception is returned from the task, re-raise it here.
         if isinstance(response, Exception):
@@ -20,13 +20,17 @@ from obspy.io.sac.util import utcdatetime_to_sac_nztimes
 import tornado.web
 
 from .. import ForceSource, FiniteSource
-from ..helpers import geocentric_to_elliptic_latitude
+from ..helpers import geocentric_to_elliptic_latitude, write_raw32
 from .. import __version__
 
 # Valid phase offset pattern including capture groups.
 PHASE_OFFSET_PATTERN = re.compile(r"(^[A-Za-z0-9^]+)([\+-])([\deE\.\-\+]+$)")
 
 
+# Name prefix of all threads started by run_async().
+ASYNC_THREAD_PREFIX = "instaseis-async-"
+
+
 def run_async(func):
     """
     Decorator executing a function in a thread.
@@ -35,7 +39,8 @@ def run_async(func):
     """
     @functools.wraps(func)
     def async_func(*args, **kwargs):
-        func_hl = threading.Thread(target=func, args=args, kwargs=kwargs)
+        func_hl = threading.Thread(target=func, args=args, kwargs=kwargs,
+                                   name=ASYNC_THREAD_PREFIX + func.__name__)
         func_hl.start()
         return func_hl
     return async_func
@@ -147,14 +152,19 @@ def _validate_and_write_waveforms(st, callback, starttime, endtime, scale,
     st.trim(starttime, endtime, pad=True, fill_value=0.0, nearest_sample=False)
 
     # Checked in another function and just a sanity check.
-    assert format in ("miniseed", "saczip")
+    assert format in ("miniseed", "saczip", "raw32", "raw32z")
 
     if format == "miniseed":
-        with io.BytesIO() as fh:
+        with db._stage("serialization"), io.BytesIO() as fh:
             st.write(fh, format="mseed")
             fh.seek(0, 0)
             binary_data = fh.read()
         callback((binary_data, mu))
+    # Raw float32 arrays with a small JSON header.
+    elif format in ("raw32", "raw32z"):
+        with db._stage("serialization"):
+            binary_data = write_raw32(st, compress=format == "raw32z", mu=mu)
+        callback((binary_data, mu))
     # Write a number of SAC files into an archive.
     elif format == "saczip":
         byte_strings = []
@@ -230,7 +240,7 @@ def _validate_and_write_waveforms(st, callback, starttime, endtime, scale,
             for key, value in t.items():
                 tr.stats.sac[key] = value
 
-            with io.BytesIO() as temp:
+            with db._stage("serialization"), io.BytesIO() as temp:
                 tr.write(temp, format="sac")
                 temp.seek(0, 0)
                 filename = "%s%s.sac" % (label, tr.id)
@@ -24,6 +24,8 @@ from obspy.signal.util import next_pow_2
 import obspy.io.xseed.parser
 import os
 from scipy import interp
+from scipy.signal import iirfilter, sosfilt, zpk2sos
+import warnings
 
 from . import ReceiverParseError, SourceParseError
 from . import rotations
@@ -47,15 +49,67 @@ def _purge_duplicates(f):
     @functools.wraps(f)
     def wrapper(*args, **kwds):
         ret_val = f(*args, **kwds)
+        if isinstance(ret_val, ReceiverArray):
+            return ret_val.unique()
         new_list = []
+        seen = set()
         for item in ret_val:
-            if item in new_list:
-                continue
+            try:
+                key = (type(item), tuple(sorted(item.__dict__.items())))
+                hash(key)
+            except (AttributeError, TypeError):
+                if item in new_list:
+                    continue
+            else:
+                if key in seen:
+                    continue
+                seen.add(key)
             new_list.append(item)
         return new_list
     return wrapper
 
 
+def _check_coordinates(latitudes, longitudes):
+    """
+    Raises if any of the given coordinates is out of range.
+    """
+    if not np.all((-90 <= latitudes) & (latitudes <= 90)):
+        raise ValueError("Invalid latitude value. Latitude must be "
+                         "-90 <= x <= 90.")
+    if not np.all((-180 <= longitudes) & (longitudes <= 180)):
+        raise ValueError("Invalid longitude value. Longitude must be "
+                         "-180 <= x <= 180.")
+
+
+def _get_codes(codes, count, max_length, name, strip=True):
+    """
+    Fixed width string array of stripped SEED codes.
+    """
+    if not np.ndim(codes):
+        codes = codes or ""
+        if isinstance(codes, bytes):
+            codes = codes.decode("utf-8")
+        codes = np.repeat(np.array([codes.strip()], dtype=np.unicode_), count)
+        strip = False
+    elif not isinstance(codes, np.ndarray):
+        codes = np.array([_i or "" for _i in codes])
+    if codes.dtype.kind == "S":
+        try:
+            codes = codes.astype(np.unicode_)
+        except UnicodeDecodeError:
+            codes = np.char.decode(codes, "utf-8")
+    if strip:
+        codes = np.char.strip(codes.astype(np.unicode_))
+    if codes.shape != (count,):
+        raise ValueError("Need one %s code per receiver." % name.lower())
+    # Longer codes would be truncated.
+    fixed_width_codes = codes.astype("U%i" % max_length)
+    if np.any(fixed_width_codes != codes):
+        raise ValueError("%s codes can have at most %i characters." % (
+            name, max_length))
+    return fixed_width_codes
+
+
 def moment2magnitude(M0):
     """
     Convert seismic moment M0 to moment magnitude Mw
@@ -162,39 +216,133 @@ def strike_dip_rake_from_ln(l, n):
     return strike, dip, rake
 
 
+def tensor_from_strike_dip_rake(strike, dip, rake, M0):
+    """
+    compute the moment tensor of a shear source parameterized by strike, dip
+    and rake. All parameters can also be arrays.
+
+    :param strike: strike of the fault in degree
+    :param dip: dip of the fault in degree
+    :param rake: rake of the fault in degree
+    :param M0: scalar moment
+    :return: moment tensor components in r, theta, phi coordinates
+        [m_rr, m_tt, m_pp, m_rt, m_rp, m_tp] along the last axis
+    """
+    assert np.all(np.asarray(M0) >= 0)
+
+    # formulas in Udias (17.24) are in geographic system North, East,
+    # Down, which # transforms to the geocentric as:
+    # Mtt =  Mxx, Mpp = Myy, Mrr =  Mzz
+    # Mrp = -Myz, Mrt = Mxz, Mtp = -Mxy
+    # voigt in tpr: Mtt Mpp Mrr Mrp Mrt Mtp
+    phi = np.deg2rad(strike)
+    delta = np.deg2rad(dip)
+    lambd = np.deg2rad(rake)
+
+    m_tt = (- np.sin(delta) * np.cos(lambd) * np.sin(2. * phi) -
+            np.sin(2. * delta) * np.sin(phi)**2. * np.sin(lambd)) * M0
+
+    m_pp = (np.sin(delta) * np.cos(lambd) * np.sin(2. * phi) -
+            np.sin(2. * delta) * np.cos(phi)**2. * np.sin(lambd)) * M0
+
+    m_rr = (np.sin(2. * delta) * np.sin(lambd)) * M0
+
+    m_rp = (- np.cos(phi) * np.sin(lambd) * np.cos(2. * delta) +
+            np.cos(delta) * np.cos(lambd) * np.sin(phi)) * M0
+
+    m_rt = (- np.sin(lambd) * np.sin(phi) * np.cos(2. * delta) -
+            np.cos(delta) * np.cos(lambd) * np.cos(phi)) * M0
+
+    m_tp = (- np.sin(delta) * np.cos(lambd) * np.cos(2. * phi) -
+            np.sin(2. * delta) * np.sin(2. * phi) * np.sin(lambd) / 2.) * M0
+
+    return np.stack(np.broadcast_arrays(m_rr, m_tt, m_pp, m_rt, m_rp, m_tp),
+                    axis=-1)
+
+
 def asymmetric_cosine(trise, tfall=None, npts=10000, dt=0.1):
     """
     Initialize a source time function with asymmetric cosine, normalized to 1
 
+    Arrays of rise and fall times result in one source time function per
+    row.
+
     :param trise: rise time
-    :type trise: float
+    :type trise: float or array of floats
     :param tfall: fall time, defaults to trise
-    :type trise: float, optional
+    :type trise: float or array of floats, optional
     :param npts: number of samples
     :type npts: int, optional
     :param dt: sample interval
     :type dt: float, optional
     """
     # initialize
-    if not tfall:
+    if not np.ndim(tfall) and not tfall:
         tfall = trise
+    trise = np.asarray(trise, dtype=np.float64)[..., np.newaxis]
+    tfall = np.asarray(tfall, dtype=np.float64)[..., np.newaxis]
     t = np.linspace(0, npts * dt, npts, endpoint=False)
-    asc = np.zeros(npts)
+    asc = np.zeros(np.broadcast(trise, tfall, t).shape)
 
-    # build slices
-    slrise = (t <= trise)
-    slfall = np.logical_and(t > trise, t <= trise + tfall)
+    # only the samples up to the longest rise plus fall time are not zero
+    end = np.searchsorted(t, (trise + tfall).max(), side="right")
+    t = t[:end]
 
-    # compute stf
-    asc[slrise] = (1. - np.cos(np.pi * t[slrise] / trise))
-    asc[slfall] = (1. - np.cos(np.pi * (t[slfall] - trise + tfall) / tfall))
-
-    # normalize
-    asc /= trise + tfall
+    # compute and normalize the stf
+    asc[..., :end] = np.where(
+        t <= trise, 1. - np.cos(np.pi * t / trise),
+        np.where(t <= trise + tfall,
+                 1. - np.cos(np.pi * (t - trise + tfall) / tfall), 0.)) / \
+        (trise + tfall)
 
     return asc
 
 
+def _lowpass(data, freq, df, corners=4, zerophase=False):
+    """
+    Butterworth lowpass filter along the last axis of an array.
+
+    Same as :func:`obspy.signal.filter.lowpass` but filters any number of
+    source time functions with a single filter design.
+    """
+    f = freq / (0.5 * df)
+    if f > 1:
+        f = 1.0
+        warnings.warn("Selected corner frequency is above Nyquist. "
+                      "Setting Nyquist as high corner.")
+    z, p, k = iirfilter(corners, f, btype="lowpass", ftype="butter",
+                        output="zpk")
+    sos = zpk2sos(z, p, k)
+    if zerophase:
+        firstpass = sosfilt(sos, data, axis=-1)
+        return sosfilt(sos, firstpass[..., ::-1], axis=-1)[..., ::-1]
+    return sosfilt(sos, data, axis=-1)
+
+
+def _read_values(fh, chunk_size=16 * 1024 ** 2):
+    """
+    Read all whitespace separated numbers from the rest of a binary file.
+
+    The file is read and converted in chunks so the text of large files never
+    has to be in memory as a whole.
+    """
+    values = []
+    rest = b""
+    while True:
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            break
+        chunk = rest + chunk
+        # Numbers at the end of the chunk might continue in the next one.
+        end = len(chunk)
+        while end and not chunk[end - 1:end].isspace():
+            end -= 1
+        rest = chunk[end:]
+        values.append(np.array(chunk[:end].split(), dtype=np.float64))
+    values.append(np.array(rest.split(), dtype=np.float64))
+    return np.concatenate(values)
+
+
 class SourceOrReceiver(object):
     def __init__(self, latitude, longitude, depth_in_m):
         self.latitude = float(latitude)
@@ -443,45 +591,20 @@ class Source(SourceOrReceiver):
             Mrp              :   8.47e+16 Nm
             Mtp              :   1.29e+16 Nm
         """
-        assert M0 >= 0
         if dt is not None:
             assert dt > 0
 
-        # formulas in Udias (17.24) are in geographic system North, East,
-        # Down, which # transforms to the geocentric as:
-        # Mtt =  Mxx, Mpp = Myy, Mrr =  Mzz
-        # Mrp = -Myz, Mrt = Mxz, Mtp = -Mxy
-        # voigt in tpr: Mtt Mpp Mrr Mrp Mrt Mtp
-        phi = np.deg2rad(strike)
-        delta = np.deg2rad(dip)
-        lambd = np.deg2rad(rake)
-
-        m_tt = (- np.sin(delta) * np.cos(lambd) * np.sin(2. * phi) -
-                np.sin(2. * delta) * np.sin(phi)**2. * np.sin(lambd)) * M0
-
-        m_pp = (np.sin(delta) * np.cos(lambd) * np.sin(2. * phi) -
-                np.sin(2. * delta) * np.cos(phi)**2. * np.sin(lambd)) * M0
-
-        m_rr = (np.sin(2. * delta) * np.sin(lambd)) * M0
-
-        m_rp = (- np.cos(phi) * np.sin(lambd) * np.cos(2. * delta) +
-                np.cos(delta) * np.cos(lambd) * np.sin(phi)) * M0
-
-        m_rt = (- np.sin(lambd) * np.sin(phi) * np.cos(2. * delta) -
-                np.cos(delta) * np.cos(lambd) * np.cos(phi)) * M0
-
-        m_tp = (- np.sin(delta) * np.cos(lambd) * np.cos(2. * phi) -
-                np.sin(2. * delta) * np.sin(2. * phi) * np.sin(lambd) / 2.) * \
-            M0
+        m_rr, m_tt, m_pp, m_rt, m_rp, m_tp = tensor_from_strike_dip_rake(
+            strike, dip, rake, M0)
 
         source = self(latitude, longitude, depth_in_m, m_rr, m_tt, m_pp, m_rt,
                       m_rp, m_tp, time_shift, sliprate, dt,
                       origin_time=origin_time)
 
         # storing strike, dip and rake for plotting purposes
-        source.phi = phi
-        source.delta = delta
-        source.lambd = lambd
+        source.phi = np.deg2rad(strike)
+        source.delta = np.deg2rad(dip)
+        source.lambd = np.deg2rad(rake)
 
         return source
 
@@ -876,22 +999,308 @@ class Receiver(SourceOrReceiver):
         :param filename: Filename
         :return: List of :class:`~instaseis.source.Receiver` objects.
         """
-        with open(filename, 'rt') as f:
-            receivers = []
+        receivers = ReceiverArray._from_stations_file(
+            filename, geocentric=False).to_receivers()
+        # Single receivers keep the coordinates of the scalar conversion.
+        for rec in receivers:
+            rec.latitude = elliptic_to_geocentric_latitude(rec.latitude)
+        return receivers
+
+
+class _Column(object):
+    """
+    Attribute of a single point source or receiver stored in a column of its
+    finite source or receiver array.
+    """
+    def __init__(self, name, component=None, optional=False):
+        """
+        :param name: The name of the column.
+        :param component: The component for two dimensional columns.
+        :param optional: Missing values are stored as NaN and returned as
+            None.
+        """
+        self.name = name
+        self.component = component
+        self.optional = optional
+
+    def _get_key(self, obj):
+        if self.component is None:
+            return obj._index
+        return obj._index, self.component
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = getattr(obj._columns, self.name)[self._get_key(obj)]
+        if self.optional and np.isnan(value):
+            return None
+        return value
+
+    def __set__(self, obj, value):
+        if self.optional and value is None:
+            value = np.nan
+        getattr(obj._columns, self.name)[self._get_key(obj)] = value
+
+
+class _PointSourceView(Source):
+    """
+    A single point source of a finite source.
+
+    Behaves like any other :class:`~instaseis.source.Source` object but all
+    attributes are read from and written to the columns of the finite source.
+    """
+    latitude = _Column("latitudes")
+    longitude = _Column("longitudes")
+    depth_in_m = _Column("depths_in_m", optional=True)
+    m_rr = _Column("tensors", 0)
+    m_tt = _Column("tensors", 1)
+    m_pp = _Column("tensors", 2)
+    m_rt = _Column("tensors", 3)
+    m_rp = _Column("tensors", 4)
+    m_tp = _Column("tensors", 5)
+    time_shift = _Column("time_shifts", optional=True)
+    dt = _Column("dts", optional=True)
+    origin_time = _Column("origin_times")
+
+    def __init__(self, finite_source, index):
+        self._columns = finite_source
+        self._index = index
+
+    def __eq__(self, other):
+        # Views have no instance dictionary, compare the values instead.
+        if not isinstance(other, Source):
+            return False
+        if any(getattr(self, _i) != getattr(other, _i) for _i in (
+                "latitude", "longitude", "depth_in_m", "m_rr", "m_tt", "m_pp",
+                "m_rt", "m_rp", "m_tp", "time_shift", "dt", "origin_time")):
+            return False
+        if self.sliprate is None or other.sliprate is None:
+            return self.sliprate is None and other.sliprate is None
+        return np.array_equal(self.sliprate, other.sliprate)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    @property
+    def sliprate(self):
+        return self._columns._get_sliprate(self._index)
+
+    @sliprate.setter
+    def sliprate(self, value):
+        self._columns._set_sliprate(self._index, value)
 
-            for line in f:
-                station, network, lat, lon, _, _ = line.split()
-                lat = elliptic_to_geocentric_latitude(float(lat))
-                lon = float(lon)
-                receivers.append(Receiver(lat, lon, network, station))
 
+class _ReceiverView(Receiver):
+    """
+    A single receiver of a receiver array.
+
+    Behaves like any other :class:`~instaseis.source.Receiver` object but all
+    attributes are read from and written to the columns of the array.
+    """
+    latitude = _Column("latitudes")
+    longitude = _Column("longitudes")
+    depth_in_m = _Column("depths_in_m", optional=True)
+    network = _Column("networks")
+    station = _Column("stations")
+    location = _Column("locations")
+
+    def __init__(self, receivers, index):
+        self._columns = receivers
+        self._index = index
+
+    def __eq__(self, other):
+        # Views have no instance dictionary, compare the values instead.
+        if not isinstance(other, Receiver):
+            return False
+        return all(getattr(self, _i) == getattr(other, _i) for _i in (
+            "latitude", "longitude", "depth_in_m", "network", "station",
+            "location"))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+class ReceiverArray(object):
+    """
+    A compact collection of many receivers.
+
+    Instead of one :class:`~instaseis.source.Receiver` object per receiver,
+    the coordinates are stored in arrays and the codes in fixed width string
+    arrays. Iterating over or indexing a receiver array yields
+    :class:`~instaseis.source.Receiver` objects which are views on these
+    columns. Indexing with slices, boolean masks or index arrays returns a
+    new receiver array.
+
+    :param latitudes: geocentric latitudes of the receivers in degree
+    :param longitudes: longitudes of the receivers in degree
+    :param networks: network codes of the receivers, a single code is used
+        for all receivers
+    :param stations: station codes of the receivers
+    :param locations: location codes of the receivers
+    :param depths_in_m: depths of the receivers in m
+
+    >>> import instaseis
+    >>> receivers = instaseis.ReceiverArray(
+    ...     latitudes=[10.0, 20.0, 10.0], longitudes=[30.0, 40.0, 30.0],
+    ...     networks="XX", stations=["A", "B", "A"])
+    >>> len(receivers)
+    3
+    >>> len(receivers.unique())
+    2
+    >>> print(receivers[1])  # doctest: +NORMALIZE_WHITESPACE
+    Instaseis Receiver:
+        Longitude :   40.0 deg
+        Latitude  :   20.0 deg
+        Network   : XX
+        Station   : B
+        Location  :
+    """
+    __slots__ = ("latitudes", "longitudes", "depths_in_m", "networks",
+                 "stations", "locations")
+
+    def __init__(self, latitudes, longitudes, networks=None, stations=None,
+                 locations=None, depths_in_m=None):
+        self.latitudes = np.array(latitudes, dtype=np.float64, ndmin=1)
+        count = len(self.latitudes)
+        self.longitudes = np.array(np.broadcast_to(
+            np.asarray(longitudes, dtype=np.float64), (count,)))
+        _check_coordinates(self.latitudes, self.longitudes)
+
+        # None is stored as NaN.
+        self.depths_in_m = np.array(np.broadcast_to(np.asarray(
+            depths_in_m if depths_in_m is not None else np.nan,
+            dtype=np.float64), (count,)))
+
+        self.networks = _get_codes(networks, count, 2, "Network")
+        self.stations = _get_codes(stations, count, 5, "Station")
+        self.locations = _get_codes(locations, count, 2, "Location")
+
+    @classmethod
+    def from_receivers(cls, receivers):
+        """
+        Initialize a receiver array from any number of
+        :class:`~instaseis.source.Receiver` objects.
+        """
+        receivers = list(receivers)
+        return cls(latitudes=[_i.latitude for _i in receivers],
+                   longitudes=[_i.longitude for _i in receivers],
+                   networks=[_i.network for _i in receivers],
+                   stations=[_i.station for _i in receivers],
+                   locations=[_i.location for _i in receivers],
+                   depths_in_m=[_i.depth_in_m for _i in receivers])
+
+    @classmethod
+    def parse(cls, filename_or_obj):
+        """
+        Attempts to parse anything to a receiver array. Supports the same
+        inputs as :meth:`~instaseis.source.Receiver.parse`, STATIONS files
+        are read in bulk. Duplicate receivers are removed.
+
+        Coordinates are assumed to be defined on the WGS84 ellipsoid and
+        will be converted to geocentric coordinates.
+
+        :param filename_or_obj: Filename/URL/Python object
+        """
+        if isinstance(filename_or_obj, ReceiverArray):
+            return filename_or_obj.unique()
+
+        if isinstance(filename_or_obj, (str, bytes)) and \
+                os.path.exists(filename_or_obj):
+            try:
+                return cls._from_stations_file(filename_or_obj).unique()
+            except Exception:
+                pass
+
+        return cls.from_receivers(Receiver.parse(filename_or_obj))
+
+    @classmethod
+    def _from_stations_file(cls, filename, geocentric=True):
+        """
+        Parses a custom STATIONS file format to a receiver array.
+
+        Coordinates are assumed to be defined on the WGS84 ellipsoid and
+        will be converted to geocentric coordinates unless ``geocentric`` is
+        False.
+        """
+        with io.open(filename, "rb") as fh:
+            data = fh.read()
+
+        # station, network, latitude, longitude, elevation, burial
+        columns = np.array(data.split()).reshape(-1, 6)
+        if len(columns) != len(data.splitlines()):
+            raise ValueError("Lines in a STATIONS file must have 6 values.")
+
+        latitudes = columns[:, 2].astype(np.float64)
+        if geocentric:
+            latitudes = elliptic_to_geocentric_latitude(latitudes)
+        receivers = cls(latitudes=latitudes,
+                        longitudes=columns[:, 3].astype(np.float64))
+        # The values of a split do not have to be stripped.
+        receivers.networks = _get_codes(columns[:, 1], len(columns), 2,
+                                        "Network", strip=False)
+        receivers.stations = _get_codes(columns[:, 0], len(columns), 5,
+                                        "Station", strip=False)
         return receivers
 
+    def __len__(self):
+        return len(self.latitudes)
+
+    def __iter__(self):
+        return (_ReceiverView(self, _i) for _i in range(len(self)))
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return _ReceiverView(self, range(len(self))[index])
+        # The columns are already validated.
+        receivers = ReceiverArray.__new__(ReceiverArray)
+        for name in self.__slots__:
+            setattr(receivers, name, getattr(self, name)[index])
+        return receivers
+
+    def unique(self):
+        """
+        Returns a receiver array without duplicate receivers. Preserves the
+        order and will remove duplicates occuring later in the array.
+        """
+        depths_in_m = self.depths_in_m
+        keys = [self.latitudes, self.longitudes, np.isnan(depths_in_m),
+                np.where(np.isnan(depths_in_m), 0.0, depths_in_m),
+                self.networks, self.stations, self.locations]
+        # The sort is stable so the first receiver of every group of
+        # identical receivers is the first occurrence.
+        order = np.lexsort(keys[::-1])
+        is_first = np.zeros(len(self), dtype=np.bool_)
+        is_first[:1] = True
+        for key in keys:
+            key = key[order]
+            is_first[1:] |= key[1:] != key[:-1]
+        return self[np.sort(order[is_first])]
+
+    def to_receivers(self):
+        """
+        Returns a list of independent :class:`~instaseis.source.Receiver`
+        objects.
+        """
+        return [Receiver(latitude=lat, longitude=lon, network=net,
+                         station=sta, location=loc,
+                         depth_in_m=None if np.isnan(depth) else depth)
+                for lat, lon, net, sta, loc, depth in zip(
+                    self.latitudes.tolist(), self.longitudes.tolist(),
+                    self.networks.tolist(), self.stations.tolist(),
+                    self.locations.tolist(), self.depths_in_m.tolist())]
+
 
 class FiniteSource(object):
     """
     A class to handle finite sources represented by a number of point sources.
 
+    The point sources are stored in columns: arrays of their coordinates,
+    their moment tensors and time shifts, and a single matrix of all
+    sliprates. Operations on the sliprates thus work on all point sources at
+    once. Iterating over or indexing a finite source yields
+    :class:`~instaseis.source.Source` objects that are views on these
+    columns. The point sources passed to the constructor are copied.
+
     :param pointsources: The points sources making up the finite source.
     :type pointsources: list of :class:`~instaseis.source.Source` objects
     :param CMT: The centroid of the finite source.
@@ -919,8 +1328,175 @@ class FiniteSource(object):
         self.hypocenter_depth_in_m = hypocenter_depth_in_m
         self.current = 0
 
+    @classmethod
+    def from_arrays(cls, latitudes, longitudes, depths_in_m, tensors,
+                    time_shifts=None, sliprates=None, dt=None,
+                    origin_time=obspy.UTCDateTime(0), **kwargs):
+        """
+        Initialize a finite source directly from the columns of its point
+        sources.
+
+        :param latitudes: geocentric latitudes of the point sources in degree
+        :param longitudes: longitudes of the point sources in degree
+        :param depths_in_m: depths of the point sources in m
+        :param tensors: moment tensors of the point sources in Nm as an array
+            of shape (N, 6) with the components m_rr, m_tt, m_pp, m_rt, m_rp,
+            m_tp
+        :param time_shifts: time shifts of the point sources in seconds
+        :param sliprates: sliprates of the point sources, either as an array
+            of shape (N, nsamp) or as a list of arrays of possibly different
+            lengths
+        :param dt: sampling of the sliprates, either one value for all point
+            sources or one per point source
+        :param origin_time: origin time of all point sources
+        :param kwargs: passed on to the constructor
+
+        >>> import instaseis
+        >>> source = instaseis.FiniteSource.from_arrays(
+        ...     latitudes=[0.0, 0.0], longitudes=[0.0, 1.0],
+        ...     depths_in_m=[10000.0, 10000.0],
+        ...     tensors=[[1E17, 0, 0, 0, 0, 0]] * 2, time_shifts=[0.0, 5.0],
+        ...     sliprates=np.ones((2, 4)), dt=0.5)
+        >>> source.sliprates.shape
+        (2, 4)
+        >>> print(source[1].longitude, source[1].m_rr, source[1].time_shift)
+        1.0 1e+17 5.0
+        """
+        finite_source = cls(**kwargs)
+        finite_source._set_columns(
+            latitudes=latitudes, longitudes=longitudes,
+            depths_in_m=depths_in_m, tensors=tensors, time_shifts=time_shifts,
+            sliprates=sliprates, dts=dt, origin_times=origin_time)
+        return finite_source
+
+    def _set_columns(self, latitudes, longitudes, depths_in_m, tensors,
+                     time_shifts, sliprates, dts, origin_times):
+        self.latitudes = np.array(latitudes, dtype=np.float64)
+        count = len(self.latitudes)
+
+        def _get_column(values):
+            # None is stored as NaN.
+            if values is None:
+                return np.full(count, np.nan)
+            return np.array(np.broadcast_to(
+                np.asarray(values, dtype=np.float64), (count,)))
+
+        self.longitudes = _get_column(longitudes)
+        _check_coordinates(self.latitudes, self.longitudes)
+        self.depths_in_m = _get_column(depths_in_m)
+        self.tensors = np.array(tensors, dtype=np.float64).reshape(count, 6)
+        self.time_shifts = _get_column(time_shifts)
+        self.dts = _get_column(dts)
+        if isinstance(origin_times, obspy.UTCDateTime):
+            origin_times = [origin_times] * count
+        self.origin_times = list(origin_times)
+        self.sliprates = sliprates
+        self._views = None
+
+    @property
+    def pointsources(self):
+        """
+        The point sources as a list of :class:`~instaseis.source.Source`
+        objects which are views on the columns of the finite source.
+        """
+        if self.latitudes is None:
+            return None
+        if self._views is None:
+            self._views = [_PointSourceView(self, _i)
+                           for _i in range(len(self))]
+        return self._views
+
+    @pointsources.setter
+    def pointsources(self, pointsources):
+        if pointsources is None:
+            self.latitudes = self.longitudes = self.depths_in_m = None
+            self.tensors = self.time_shifts = self.dts = None
+            self.origin_times = None
+            self._sliprates = self.sliprate_npts = None
+            self._views = None
+            return
+
+        self._set_columns(
+            latitudes=[_i.latitude for _i in pointsources],
+            longitudes=[_i.longitude for _i in pointsources],
+            depths_in_m=[_i.depth_in_m for _i in pointsources],
+            tensors=[_i.tensor for _i in pointsources],
+            time_shifts=[_i.time_shift for _i in pointsources],
+            sliprates=[_i.sliprate for _i in pointsources],
+            dts=[_i.dt for _i in pointsources],
+            origin_times=[_i.origin_time for _i in pointsources])
+
+    @property
+    def sliprates(self):
+        """
+        The sliprates of all point sources as an array of shape (N, nsamp).
+        Shorter sliprates are padded with zeros, their actual number of
+        samples is stored in ``sliprate_npts``.
+        """
+        return self._sliprates
+
+    @sliprates.setter
+    def sliprates(self, sliprates):
+        count = len(self.latitudes)
+        if isinstance(sliprates, np.ndarray) and sliprates.ndim == 2:
+            if len(sliprates) != count:
+                raise ValueError("Need one sliprate per point source.")
+            self._sliprates = np.array(sliprates, dtype=np.float64)
+            self.sliprate_npts = np.empty(count, dtype=np.int64)
+            self.sliprate_npts[:] = sliprates.shape[1]
+            return
+
+        if sliprates is None:
+            sliprates = [None] * count
+        if len(sliprates) != count:
+            raise ValueError("Need one sliprate per point source.")
+        # Missing sliprates have zero samples.
+        self.sliprate_npts = np.array(
+            [len(_i) if _i is not None else 0 for _i in sliprates],
+            dtype=np.int64)
+        self._sliprates = np.zeros(
+            (count, self.sliprate_npts.max() if count else 0))
+        for _i, sliprate in enumerate(sliprates):
+            self._sliprates[_i, :self.sliprate_npts[_i]] = sliprate
+
+    def _get_sliprate(self, index):
+        npts = self.sliprate_npts[index]
+        if not npts:
+            return None
+        return self._sliprates[index, :npts]
+
+    def _set_sliprate(self, index, sliprate):
+        if sliprate is None:
+            self._sliprates[index] = 0.0
+            self.sliprate_npts[index] = 0
+            return
+        sliprate = np.asarray(sliprate, dtype=np.float64)
+        npts = len(sliprate)
+        if npts > self._sliprates.shape[1]:
+            self._sliprates = np.pad(
+                self._sliprates,
+                ((0, 0), (0, npts - self._sliprates.shape[1])),
+                mode="constant")
+        self._sliprates[index, :npts] = sliprate
+        self._sliprates[index, npts:] = 0.0
+        self.sliprate_npts[index] = npts
+
+    @property
+    def tensors_voigt(self):
+        """
+        The moment tensors of all point sources in theta, phi, r coordinates
+        in Voigt notation as an array of shape (N, 6).
+        """
+        return self.tensors[:, [1, 2, 0, 4, 3, 5]]
+
+    def _get_scalar_moments(self):
+        t = self.tensors
+        return (t[:, 0] ** 2 + t[:, 1] ** 2 + t[:, 2] ** 2 +
+                2 * t[:, 3] ** 2 + 2 * t[:, 4] ** 2 +
+                2 * t[:, 5] ** 2) ** 0.5 * 0.5 ** 0.5
+
     def __len__(self):
-        return len(self.pointsources)
+        return len(self.latitudes)
 
     def __iter__(self):
         return self
@@ -953,8 +1529,8 @@ class FiniteSource(object):
         Coordinates are assumed to be defined on the WGS84 ellipsoid and
         will be converted to geocentric coordinates.
 
-        :param filename: path to the .srf file
-        :type filename: str
+        :param filename: path to the .srf file or an open binary file
+        :type filename: str or file-like object
         :param normalize: normalize the sliprate to 1
         :type normalize: bool, optional
 
@@ -977,67 +1553,79 @@ class FiniteSource(object):
             Max Longitude        :    9.0 deg
             Hypocenter Longitude :    0.0 deg
         """
-        with open(filename, "rt") as f:
-            # go to POINTS block
-            line = f.readline()
-            while 'POINTS' not in line:
-                line = f.readline()
-
-            npoints = int(line.split()[1])
-            sources = []
-
-            for _ in np.arange(npoints):
-                lon, lat, dep, stk, dip, area, tinit, dt = \
-                    map(float, f.readline().split())
-
-                # Convert latitude to a geocentric latitude.
-                lat = elliptic_to_geocentric_latitude(lat)
-
-                rake, slip1, nt1, slip2, nt2, slip3, nt3 = \
-                    map(float, f.readline().split())
-
-                dep *= 1e3     # km   > m
-                area *= 1e-4   # cm^2 > m^2
-                slip1 *= 1e-2  # cm   > m
-                slip2 *= 1e-2  # cm   > m
-                # slip3 *= 1e-2  # cm   > m
-
-                nt1, nt2, nt3 = map(int, (nt1, nt2, nt3))
-
-                if nt1 > 0:
-                    line = f.readline()
-                    while len(line.split()) < nt1:
-                        line = line + f.readline()
-                    stf = np.array(line.split(), dtype=float)
-                    if normalize:
-                        stf /= np.trapz(stf, dx=dt)
-
-                    M0 = area * DEFAULT_MU * slip1
-
-                    sources.append(
-                        Source.from_strike_dip_rake(
-                            lat, lon, dep, stk, dip, rake, M0,
-                            time_shift=tinit, sliprate=stf, dt=dt))
+        if hasattr(filename, "read"):
+            return self._from_srf_file(fh=filename, normalize=normalize)
 
-                if nt2 > 0:
-                    line = f.readline()
-                    while len(line.split()) < nt2:
-                        line = line + f.readline()
-                    stf = np.array(line.split(), dtype=float)
-                    if normalize:
-                        stf /= np.trapz(stf, dx=dt)
+        with io.open(filename, "rb") as fh:
+            return self._from_srf_file(fh=fh, normalize=normalize)
 
-                    M0 = area * DEFAULT_MU * slip2
-
-                    sources.append(
-                        Source.from_strike_dip_rake(
-                            lat, lon, dep, stk, dip, rake, M0,
-                            time_shift=tinit, sliprate=stf, dt=dt))
-
-                if nt3 > 0:
-                    raise NotImplementedError('Slip along u3 axis')
+    @classmethod
+    def _from_srf_file(cls, fh, normalize):
+        """
+        Internal function actually reading an SRF file from any open binary
+        buffer.
+        """
+        # go to POINTS block
+        line = b""
+        for line in fh:
+            if b'POINTS' in line:
+                break
+        npoints = int(line.split()[1])
+
+        # All numbers of the POINTS block in one array. Each point has two
+        # lines with 8 and 7 values followed by the nt1, nt2, and nt3 samples
+        # of its sliprates along the u1, u2, and u3 axes.
+        values = _read_values(fh)
+        headers = np.empty((npoints, 15))
+        offsets = np.empty(npoints, dtype=np.int64)
+        offset = 0
+        for _i in range(npoints):
+            headers[_i] = values[offset:offset + 15]
+            offsets[_i] = offset + 15
+            offset += 15 + int(headers[_i, 10] + headers[_i, 12] +
+                               headers[_i, 14])
+        if offset > len(values):
+            raise ValueError("Unexpected end of the POINTS block.")
+
+        (lon, lat, dep, stk, dip, area, tinit, dt, rake, slip1, nt1, slip2,
+            nt2, slip3, nt3) = headers.T
+
+        if np.any(nt3 > 0):
+            raise NotImplementedError('Slip along u3 axis')
+
+        # Each point results in one point source for every axis with a
+        # sliprate, first u1 then u2.
+        nt = np.stack([nt1, nt2], axis=1).astype(np.int64)
+        has_sliprate = (nt > 0).ravel()
+        point = np.arange(npoints).repeat(2)[has_sliprate]
+        nt = nt.ravel()[has_sliprate]
+        start = np.stack([offsets, offsets + nt1], axis=1).astype(
+            np.int64).ravel()[has_sliprate]
+        slip = np.stack([slip1, slip2], axis=1).ravel()[has_sliprate]
+
+        # Gather all sliprates into one zero padded matrix.
+        samples = np.arange(nt.max() if len(nt) else 0)
+        in_sliprate = samples < nt[:, np.newaxis]
+        sliprates = np.where(in_sliprate, values[np.where(
+            in_sliprate, start[:, np.newaxis] + samples, 0)], 0.0)
+
+        area = area[point] * 1e-4  # cm^2 > m^2
+        slip = slip * 1e-2         # cm   > m
+        M0 = area * DEFAULT_MU * slip
+
+        finite_source = cls.from_arrays(
+            # Convert latitude to a geocentric latitude.
+            latitudes=elliptic_to_geocentric_latitude(lat[point]),
+            longitudes=lon[point],
+            depths_in_m=dep[point] * 1e3,  # km   > m
+            tensors=tensor_from_strike_dip_rake(
+                stk[point], dip[point], rake[point], M0),
+            time_shifts=tinit[point], sliprates=sliprates, dt=dt[point])
+        finite_source.sliprate_npts[:] = nt
+        if normalize:
+            finite_source.normalize_sliprate()
 
-            return self(pointsources=sources)
+        return finite_source
 
     @classmethod
     def from_usgs_param_file(cls, filename_or_obj, npts=10000, dt=0.1,
@@ -1102,68 +1690,63 @@ class FiniteSource(object):
         if not line.startswith("#Total number of fault_segments"):
             raise USGSParamFileParsingException("Not a valid USGS param file.")
         nseg = int(line.split()[-1])
-        sources = []
+        lines = []
 
-        # parse all segments
+        # collect the point source lines of all segments
         for _ in range(nseg):
 
             # got to point source segment
             for line in fh:
-                line = line.decode()
-                if '#Lat. Lon. depth' in line:
+                if b'#Lat. Lon. depth' in line:
                     break
 
             # read all point sources until reaching next segment
             for line in fh:
-                line = line.decode()
-                if '#Fault_segment' in line:
+                if b'#Fault_segment' in line:
                     break
+                if line.strip():
+                    lines.append(line)
 
-                # Lat. Lon. depth slip rake strike dip t_rup t_ris t_fal mo
-                (lat, lon, dep, slip, rake, stk, dip, tinit, trise, tfall,
-                    M0) = map(float, line.split())
-
-                # Negative rupture times are not supported with the current
-                # logic.
-                if tinit < 0:  # pragma: no cover
-                    raise USGSParamFileParsingException(
-                        "File contains a negative rupture time "
-                        "which Instaseis cannot currently deal "
-                        "with.")
-
-                # Calculate the end time.
-                endtime = trise + tfall
-                if endtime > (npts - 1) * dt:
-                    raise USGSParamFileParsingException(
-                        "Rise + fall time are longer than the "
-                        "total length of calculated slip. "
-                        "Please use more samples.")
-
-                # Convert latitude to a geocentric latitude.
-                lat = elliptic_to_geocentric_latitude(lat)
-
-                dep *= 1e3    # km > m
-                slip *= 1e-2  # cm > m
-                M0 *= 1e-7    # dyn / cm > N * m
-
-                # These checks also take care of negative times.
-                if trise < trise_min:
-                    trise = trise_min
-
-                if tfall < trise_min:
-                    tfall = trise_min
-
-                stf = asymmetric_cosine(trise, tfall, npts, dt)
-                sources.append(
-                    Source.from_strike_dip_rake(
-                        lat, lon, dep, stk, dip, rake, M0,
-                        time_shift=tinit, sliprate=stf, dt=dt))
-
-        if not sources:
+        if not lines:
             raise USGSParamFileParsingException(
                 "No point sources found in the file.")
 
-        return cls(pointsources=sources)
+        # Lat. Lon. depth slip rake strike dip t_rup t_ris t_fal mo
+        values = _read_values(io.BytesIO(b"".join(lines)))
+        if len(values) != 11 * len(lines):
+            raise USGSParamFileParsingException(
+                "Point source lines must have 11 values.")
+        (lat, lon, dep, slip, rake, stk, dip, tinit, trise, tfall,
+            M0) = values.reshape(-1, 11).T
+
+        # Negative rupture times are not supported with the current
+        # logic.
+        if np.any(tinit < 0):  # pragma: no cover
+            raise USGSParamFileParsingException(
+                "File contains a negative rupture time "
+                "which Instaseis cannot currently deal "
+                "with.")
+
+        # Calculate the end time.
+        if np.any(trise + tfall > (npts - 1) * dt):
+            raise USGSParamFileParsingException(
+                "Rise + fall time are longer than the "
+                "total length of calculated slip. "
+                "Please use more samples.")
+
+        # These checks also take care of negative times.
+        trise = np.maximum(trise, trise_min)
+        tfall = np.maximum(tfall, trise_min)
+
+        return cls.from_arrays(
+            # Convert latitude to a geocentric latitude.
+            latitudes=elliptic_to_geocentric_latitude(lat),
+            longitudes=lon,
+            depths_in_m=dep * 1e3,  # km > m
+            tensors=tensor_from_strike_dip_rake(
+                stk, dip, rake, M0 * 1e-7),  # dyn / cm > N * m
+            time_shifts=tinit,
+            sliprates=asymmetric_cosine(trise, tfall, npts, dt), dt=dt)
 
     @classmethod
     def from_Haskell(self, latitude, longitude, depth_in_m, strike, dip, rake,
@@ -1195,7 +1778,6 @@ class FiniteSource(object):
         """
         # raise NotImplementedError
 
-        sources = []
         nsources = nl * nw
 
         colatitude = 90. - latitude
@@ -1258,24 +1840,27 @@ class FiniteSource(object):
             npts = int((trise * 2) / dt) + 1
         stf = asymmetric_cosine(trise, tfall, npts, dt)
 
-        for i in np.arange(nsources):
-            # compute strike dip and rake in the coordinate system of each
-            # source point
-            l_src = rotations.rotate_vector_xyz_earth_to_xyz_src(
-                l_xyz, np.deg2rad(src_lon[i]), np.deg2rad(src_colat[i]))
-            n_src = rotations.rotate_vector_xyz_earth_to_xyz_src(
-                n_xyz, np.deg2rad(src_lon[i]), np.deg2rad(src_colat[i]))
-            strik, dip, rake = strike_dip_rake_from_ln(l_src, n_src)
-
-            # initialize point source
-            src = Source.from_strike_dip_rake(
-                src_lat[i], src_lon[i], src_depth[i], strike, dip, rake,
-                M0 / nsources, time_shift=time_shift[i],
-                origin_time=origin_time, dt=dt, sliprate=stf)
-            sources.append(src)
+        # fault vectors in the coordinate system of each source point -
+        # the transposed rotation matrices rotate from earth to source.
+        rotmat = np.swapaxes(
+            rotations.get_rotation_matrix_xyz_src_to_xyz_earth(
+                np.deg2rad(src_lon), np.deg2rad(src_colat)), -1, -2)
+        l_src_all = rotations.rotate_vector(l_xyz, rotmat)
+        n_src_all = rotations.rotate_vector(n_xyz, rotmat)
+
+        # compute strike dip and rake in the coordinate system of each
+        # source point
+        _, dip, rake = np.array([
+            strike_dip_rake_from_ln(l_src_all[_i], n_src_all[_i])
+            for _i in range(nsources)]).T
 
         # return as FiniteSource
-        return self(pointsources=sources)
+        return self.from_arrays(
+            latitudes=src_lat, longitudes=src_lon, depths_in_m=src_depth,
+            tensors=tensor_from_strike_dip_rake(strike, dip, rake,
+                                                M0 / nsources),
+            time_shifts=time_shift, sliprates=np.tile(stf, (nsources, 1)),
+            dt=dt, origin_time=origin_time)
 
     def resample_sliprate(self, dt, nsamp):
         """
@@ -1286,89 +1871,125 @@ class FiniteSource(object):
         :param dt: desired sampling
         :param nsamp: desired number of samples
         """
-        for ps in self.pointsources:
-            ps.resample_sliprate(dt, nsamp)
+        t_new = np.linspace(0, nsamp * dt, nsamp, endpoint=False)
+        last = (self.sliprate_npts - 1)[:, np.newaxis]
+        # Fractional sample of each new time in each old sliprate - the
+        # values at the ends are repeated just like np.interp() does it.
+        position = np.clip(t_new[np.newaxis, :] / self.dts[:, np.newaxis],
+                           0, last)
+        left = np.minimum(position.astype(np.int64), np.maximum(last - 1, 0))
+        weight = position - left
+        rows = np.arange(len(self))[:, np.newaxis]
+        self.sliprates = \
+            (1.0 - weight) * self._sliprates[rows, left] + \
+            weight * self._sliprates[rows, np.minimum(left + 1, last)]
+        self.dts[:] = dt
 
     def set_sliprate_dirac(self, dt, nsamp):
         """
         :param dt: desired sampling
         :param nsamp: desired number of samples
         """
-        for ps in self.pointsources:
-            ps.set_sliprate_dirac(dt, nsamp)
+        self.sliprates = np.zeros((len(self), nsamp))
+        self._sliprates[:, 0] = 1.0 / dt
+        self.dts[:] = dt
 
     def set_sliprate_lp(self, dt, nsamp, freq, corners=4, zerophase=False):
         """
         :param dt: desired sampling
         :param nsamp: desired number of samples
         """
-        for ps in self.pointsources:
-            ps.set_sliprate_lp(dt, nsamp, freq, corners, zerophase)
+        sliprate = np.zeros(nsamp)
+        sliprate[0] = 1.0 / dt
+        sliprate = _lowpass(sliprate, freq, 1. / dt, corners, zerophase)
+        self.sliprates = np.tile(sliprate, (len(self), 1))
+        self.dts[:] = dt
+
+    def pad_sliprate(self, npts_before, npts_after):
+        """
+        Pad the sliprates of all point sources with zeros.
+
+        :param npts_before: number of zeros in front of the sliprates
+        :param npts_after: number of zeros after the sliprates
+        """
+        self._sliprates = np.pad(
+            self._sliprates, ((0, 0), (npts_before, npts_after)),
+            mode="constant")
+        self.sliprate_npts[self.sliprate_npts > 0] += npts_before + npts_after
 
     def normalize_sliprate(self):
         """
         normalize the sliprate using trapezoidal rule
         """
-        for ps in self.pointsources:
-            ps.normalize_sliprate()
+        rows = np.arange(len(self))
+        sliprates = self._sliprates
+        # Trapezoidal rule for all sliprates at once. The padding is zero.
+        integral = (sliprates.sum(axis=1) - 0.5 * (
+            sliprates[:, 0] + sliprates[rows, self.sliprate_npts - 1])) * \
+            self.dts
+        sliprates /= integral[:, np.newaxis]
 
     def lp_sliprate(self, freq, corners=4, zerophase=False):
-        for ps in self.pointsources:
-            ps.lp_sliprate(freq, corners, zerophase)
+        # Sliprates with the same sampling and length are filtered at once.
+        # Usually this is the case for all of them.
+        groups = collections.defaultdict(list)
+        for _i, key in enumerate(zip(self.dts, self.sliprate_npts)):
+            groups[key].append(_i)
+        for (dt, npts), rows in groups.items():
+            rows = np.array(rows)
+            self._sliprates[rows, :npts] = _lowpass(
+                self._sliprates[rows, :npts], freq, 1. / dt, corners,
+                zerophase)
 
     def find_hypocenter(self):
         """
         Finds the hypo- and epicenter based on the point source that has the
         smallest timeshift
         """
-        ps_hypo = min(self.pointsources, key=lambda x: x.time_shift)
-        self.hypocenter_longitude = ps_hypo.longitude
-        self.hypocenter_latitude = ps_hypo.latitude
-        self.hypocenter_depth_in_m = ps_hypo.depth_in_m
+        index = np.argmin(self.time_shifts)
+        self.hypocenter_longitude = float(self.longitudes[index])
+        self.hypocenter_latitude = float(self.latitudes[index])
+        self.hypocenter_depth_in_m = float(self.depths_in_m[index])
 
     def compute_centroid(self, planet_radius=6371e3, dt=None, nsamp=None):
         """
         computes the centroid moment tensor by summing over all pointsource
         weihted by their scalar moment
         """
-        x = 0.0
-        y = 0.0
-        z = 0.0
-        finite_M0 = self.M0
-        finite_mij = np.zeros(6)
+        weights = self._get_scalar_moments() / self.M0
         finite_time_shift = 0.0  # time shift is now included in the sliprate
 
         if dt is None:
-            dt = self[0].dt
+            dt = self.dts[0]
 
         # estimate the number of samples needed from the pointsource with
         # longest time_shift
         if nsamp is None:
-            ps_ts_max = max(self.pointsources, key=lambda x: x.time_shift)
-            nsamp = int(ps_ts_max.time_shift / dt + len(ps_ts_max.sliprate))
+            index = np.argmax(self.time_shifts)
+            nsamp = int(self.time_shifts[index] / dt +
+                        self.sliprate_npts[index])
 
-        finite_sliprate = np.zeros(nsamp)
         nfft = next_pow_2(nsamp) * 2
         self.resample_sliprate(dt, nsamp)
 
-        for ps in self.pointsources:
-            x += ps.x(planet_radius) * ps.M0 / finite_M0
-            y += ps.y(planet_radius) * ps.M0 / finite_M0
-            z += ps.z(planet_radius) * ps.M0 / finite_M0
-
-            # finite_time_shift += ps.time_shift * ps.M0 / finite_M0
-
-            mij = rotations.rotate_symm_tensor_voigt_xyz_src_to_xyz_earth(
-                ps.tensor_voigt, np.deg2rad(ps.longitude),
-                np.deg2rad(ps.colatitude))
-            finite_mij += mij
-
-            # sum sliprates with time shift applied
-            sliprate_f = np.fft.rfft(ps.sliprate, n=nfft)
-            sliprate_f *= np.exp(- 1j * rfftfreq(nfft) *
-                                 2. * np.pi * ps.time_shift / dt)
-            finite_sliprate += np.fft.irfft(sliprate_f)[:nsamp] \
-                * ps.M0 / finite_M0
+        radius = planet_radius - np.nan_to_num(self.depths_in_m)
+        latitudes = np.deg2rad(self.latitudes)
+        longitudes = np.deg2rad(self.longitudes)
+        x = np.sum(np.cos(latitudes) * np.cos(longitudes) * radius * weights)
+        y = np.sum(np.cos(latitudes) * np.sin(longitudes) * radius * weights)
+        z = np.sum(np.sin(latitudes) * radius * weights)
+
+        finite_mij = rotations.rotate_symm_tensor_voigt(
+            self.tensors_voigt,
+            rotations.get_rotation_matrix_xyz_src_to_xyz_earth(
+                longitudes, np.deg2rad(90.0 - self.latitudes))).sum(axis=0)
+
+        # sum sliprates with time shift applied
+        sliprate_f = np.fft.rfft(self._sliprates, n=nfft, axis=1)
+        sliprate_f *= np.exp(- 1j * rfftfreq(nfft)[np.newaxis, :] * 2. *
+                             np.pi * self.time_shifts[:, np.newaxis] / dt)
+        finite_sliprate = np.dot(
+            weights, np.fft.irfft(sliprate_f, axis=1)[:, :nsamp])
 
         longitude = np.rad2deg(np.arctan2(y, x))
         colatitude = np.rad2deg(
@@ -1391,7 +2012,7 @@ class FiniteSource(object):
         """
         Scalar Moment M0 in Nm
         """
-        return sum(ps.M0 for ps in self.pointsources)
+        return float(self._get_scalar_moments().sum())
 
     @property
     def moment_magnitude(self):
@@ -1402,37 +2023,35 @@ class FiniteSource(object):
 
     @property
     def min_depth_in_m(self):
-        return min(self.pointsources, key=lambda x: x.depth_in_m).depth_in_m
+        return float(self.depths_in_m.min())
 
     @property
     def max_depth_in_m(self):
-        return max(self.pointsources, key=lambda x: x.depth_in_m).depth_in_m
+        return float(self.depths_in_m.max())
 
     @property
     def min_longitude(self):
-        return min(self.pointsources, key=lambda x: x.longitude).longitude
+        return float(self.longitudes.min())
 
     @property
     def max_longitude(self):
-        return max(self.pointsources, key=lambda x: x.longitude).longitude
+        return float(self.longitudes.max())
 
     @property
     def min_latitude(self):
-        return min(self.pointsources, key=lambda x: x.latitude).latitude
+        return float(self.latitudes.min())
 
     @property
     def max_latitude(self):
-        return max(self.pointsources, key=lambda x: x.latitude).latitude
+        return float(self.latitudes.max())
 
     @property
     def rupture_duration(self):
-        ts_min = min(self.pointsources, key=lambda x: x.time_shift).time_shift
-        ts_max = max(self.pointsources, key=lambda x: x.time_shift).time_shift
-        return ts_max - ts_min
+        return float(self.time_shifts.max() - self.time_shifts.min())
 
     @property
     def time_shift(self):
-        return min(self.pointsources, key=lambda x: x.time_shift).time_shift
+        return float(self.time_shifts.min())
 
     @property
     def epicenter_latitude(self):
@@ -1444,7 +2063,7 @@ class FiniteSource(object):
 
     @property
     def npointsources(self):
-        return len(self.pointsources)
+        return len(self)
 
     def __str__(self):
         if (self.hypocenter_latitude is None and
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the asynchronous database interface.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import absolute_import
+
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import instaseis
+
+# Requires Python >= 3.5.
+asyncio = pytest.importorskip("asyncio")
+from instaseis.database_interfaces.async_instaseis_db import (  # NOQA
+    AsyncInstaseisDB)
+
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DB = os.path.join(DATA, "100s_db_bwd_displ_only")
+
+SOURCE = instaseis.Source(
+    latitude=4., longitude=3.0, depth_in_m=0, m_rr=4.71e+17, m_tt=3.81e+17,
+    m_pp=-4.74e+17, m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+RECEIVERS = instaseis.ReceiverArray(
+    latitudes=np.linspace(-40.0, 40.0, 10),
+    longitudes=np.linspace(-100.0, 100.0, 10))
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def _assert_streams_equal(st_1, st_2):
+    assert len(st_1) == len(st_2)
+    for tr_1, tr_2 in zip(st_1, st_2):
+        assert tr_1.stats == tr_2.stats
+        np.testing.assert_allclose(tr_1.data, tr_2.data)
+
+
+def test_async_seismograms(loop):
+    db = instaseis.open_db(DB)
+    async_db = AsyncInstaseisDB(db, max_workers=3, loop=loop)
+    assert async_db.db is db
+    assert async_db.info == db.info
+    assert str(async_db) == "Async" + str(db)
+
+    st = loop.run_until_complete(async_db.get_seismograms(
+        SOURCE, RECEIVERS[0], dt=2.0))
+    _assert_streams_equal(st, db.get_seismograms(SOURCE, RECEIVERS[0],
+                                                 dt=2.0))
+
+    # Results are in the order of the pairs.
+    streams = loop.run_until_complete(async_db.get_seismograms_many(
+        SOURCE, RECEIVERS, components="Z"))
+    assert len(streams) == len(RECEIVERS)
+    for st, expected in zip(streams, db.get_seismograms_batch(
+            SOURCE, RECEIVERS, components="Z")):
+        _assert_streams_equal(st, expected)
+    assert loop.run_until_complete(
+        async_db.get_seismograms_many(SOURCE, [])) == []
+
+    # The iterator yields the results as they are finished.
+    results = async_db.iter_seismograms_many(SOURCE, RECEIVERS,
+                                             components="Z")
+    iterator = results.__aiter__()
+    indices = []
+    while True:
+        try:
+            index, st = loop.run_until_complete(iterator.__anext__())
+        except StopAsyncIteration:
+            break
+        indices.append(index)
+        _assert_streams_equal(st, streams[index])
+    assert sorted(indices) == list(range(len(RECEIVERS)))
+
+    # Errors are raised when awaiting.
+    with pytest.raises(ValueError):
+        loop.run_until_complete(async_db.get_seismograms(
+            SOURCE, RECEIVERS[0], components="X"))
+
+    async_db.close()
+
+    # Opens databases and uses the default number of workers.
+    async_db = AsyncInstaseisDB(DB, read_on_demand=False)
+    assert async_db.max_workers == 4
+    assert async_db.db.read_on_demand is False
+    with pytest.raises(ValueError):
+        AsyncInstaseisDB(db, read_on_demand=False)
+    with pytest.raises(ValueError):
+        AsyncInstaseisDB(db, max_workers=0)
+
+
+def test_async_finite_source(loop):
+    db = instaseis.open_db(DB)
+    async_db = AsyncInstaseisDB(db, loop=loop)
+    finite_source = instaseis.FiniteSource.from_Haskell(
+        latitude=10.0, longitude=10.0, depth_in_m=200000.0, strike=60.0,
+        dip=45.0, rake=90.0, M0=1E20, fault_length=500000.0,
+        fault_width=100000.0, rupture_velocity=2500.0, nl=5, nw=2,
+        trise=2.0 * db.info.dt, dt=db.info.dt)
+    finite_source.resample_sliprate(dt=db.info.dt, nsamp=db.info.npts)
+
+    st = loop.run_until_complete(async_db.get_seismograms_finite_source(
+        finite_source, RECEIVERS[0], dt=2.0))
+    _assert_streams_equal(st, db.get_seismograms_finite_source(
+        finite_source, RECEIVERS[0], dt=2.0))
+
+    streams = loop.run_until_complete(
+        async_db.get_seismograms_finite_source_many(
+            finite_source, RECEIVERS[:3], components="Z"))
+    assert len(streams) == 3
+    for st, receiver in zip(streams, RECEIVERS[:3]):
+        _assert_streams_equal(st, db.get_seismograms_finite_source(
+            finite_source, receiver, components="Z"))
+
+    # Cancellation stops after the current point source.
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def _progress_callback(current, total):
+        calls.append(current)
+        started.set()
+        release.wait()
+
+    future = async_db.get_seismograms_finite_source(
+        finite_source, RECEIVERS[0], progress_callback=_progress_callback)
+    started.wait()
+    future.cancel()
+    # Let the event loop process the cancellation.
+    loop.run_until_complete(asyncio.sleep(0))
+    release.set()
+    async_db.close()
+    assert future.cancelled()
+    assert calls == [1]
+
+
+def test_cancelling_many_skips_queued_pairs(loop):
+    db = instaseis.open_db(DB)
+    async_db = AsyncInstaseisDB(db, max_workers=1, loop=loop)
+    calls = []
+    get_seismograms = db.get_seismograms
+
+    def _get_seismograms(*args, **kwargs):
+        calls.append(1)
+        return get_seismograms(*args, **kwargs)
+
+    db.get_seismograms = _get_seismograms
+
+    # Occupies the only worker.
+    release = threading.Event()
+    blocker = async_db._run(release.wait)
+    future = async_db.get_seismograms_many(SOURCE, RECEIVERS)
+    future.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        loop.run_until_complete(future)
+    release.set()
+    loop.run_until_complete(blocker)
+    async_db.close()
+    assert calls == []
+
+    # The same for an iterator that is not exhausted.
+    async_db = AsyncInstaseisDB(db, max_workers=1, loop=loop)
+    release.clear()
+    blocker = async_db._run(release.wait)
+    results = async_db.iter_seismograms_many(SOURCE, RECEIVERS)
+    results.__aiter__()
+    results.cancel()
+    loop.run_until_complete(asyncio.sleep(0))
+    release.set()
+    loop.run_until_complete(blocker)
+    async_db.close()
+    assert calls == []
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the benchmark suite and its results.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import absolute_import
+
+import copy
+import json
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+from instaseis.database_interfaces import find_and_open_files
+from instaseis.benchmark import benchmarks
+from instaseis.benchmark import server as load
+from instaseis.benchmark.results import (
+    ChunkReadCounter, compare_results, format_chunk_reads, format_comparison,
+    get_database_info, get_environment, read_results, write_results)
+
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+BWD = os.path.join(DATA, "100s_db_bwd_displ_only")
+FWD = os.path.join(DATA, "100s_db_fwd")
+
+
+def _run(cls, path):
+    return cls(path, time_per_benchmark=1.0, seed=12345, count=3,
+               plot=False).run()
+
+
+def test_run_benchmarks(tmpdir):
+    """
+    Runs some benchmarks and writes and reads the result file.
+    """
+    db = find_and_open_files(BWD)
+    assert benchmarks.BufferedHaskellFiniteSource.check_database(db) is None
+    fwd_db = find_and_open_files(FWD)
+    assert benchmarks.BufferedHaskellFiniteSource.check_database(fwd_db) == \
+        "needs a reciprocal database"
+    assert benchmarks.BufferedFullyRandom.check_database(fwd_db) is None
+
+    results = []
+    for cls, path in [(benchmarks.BufferedHaskellFiniteSource, BWD),
+                      (benchmarks.BufferedRandomGreensFunction, BWD),
+                      (benchmarks.BufferedFullyRandom, FWD)]:
+        result = _run(cls, path)
+        assert result["name"] == cls.__name__
+        assert result["status"] == "ok"
+        assert result["iterations"] == 3
+        assert result["seismograms_per_second"] == pytest.approx(
+            result["iterations_per_second"] *
+            result["seismograms_per_iteration"])
+        p = result["time_per_iteration"]["percentiles"]
+        assert p["0"] <= p["50"] <= p["100"]
+        # Finite sources look up the elements when planning the reads.
+        stages = result["stages"]
+        assert sum(stages[_i]["calls"] for _i in (
+            "element_lookup", "read_planning") if _i in stages) >= 3
+        assert result["stages"]["hdf5_read"]["bytes_read"] > 0
+        assert result["peak_rss_in_bytes"] > 0
+        cache = result["cache"]
+        assert sum(_i["hits"] + _i["misses"] for _i in cache.values()) > 0
+        assert result["chunk_reads_per_seismogram"] > 0
+        result["database"] = path
+        results.append(result)
+
+    # 20 point sources.
+    assert results[0]["seismograms_per_iteration"] == 20
+    assert results[0]["stages"]["get_seismograms"]["calls"] == 60
+
+    filename = os.path.join(tmpdir.strpath, "results.json")
+    write_results(filename, environment=get_environment(),
+                  databases=[get_database_info(db, BWD),
+                             get_database_info(fwd_db, FWD)],
+                  benchmarks=results)
+    data = read_results(filename)
+    assert data["databases"][1]["is_reciprocal"] is False
+    assert data["databases"][0]["is_merged"] is False
+    assert data["databases"][0]["element_order"] is None
+    assert data["databases"][0]["quantization_error"] is None
+
+    table = format_chunk_reads(data["databases"], data["benchmarks"])
+    lines = table.splitlines()
+    assert lines[0] == "Chunk reads per seismogram"
+    assert "100s_db_bwd_displ_only [unmerged]" in lines[1]
+    assert len(lines) == 6
+    assert lines[3].startswith("BufferedHaskellFiniteSource")
+    assert lines[5].split()[1] == "-"
+    assert format_chunk_reads(data["databases"], []) is None
+    assert data["environment"]["numpy"]
+    assert [_i["name"] for _i in data["benchmarks"]] == \
+        [_i["name"] for _i in results]
+
+    with open(filename, "wt") as fh:
+        json.dump({"benchmarks": []}, fh)
+    with pytest.raises(ValueError):
+        read_results(filename)
+
+
+class _Stage(object):
+    def __init__(self, *reads):
+        self.reads = reads
+
+
+def test_chunk_read_counter(tmpdir):
+    """
+    The chunk reads are counted with a model of the chunk cache of HDF5.
+    """
+    filename = os.path.join(tmpdir.strpath, "chunks.h5")
+    with h5py.File(filename, "w") as f:
+        f.create_dataset("chunked", data=np.zeros((300, 1000)),
+                         chunks=(10, 1000))
+        f.create_dataset("contiguous", data=np.zeros((100, 10)))
+
+    counter = ChunkReadCounter()
+    with h5py.File(filename, "r") as f:
+        chunked = f["chunked"]
+        counter(_Stage((chunked, [0, 5, 9], 0)))
+        assert counter.chunk_reads == 1
+        counter(_Stage((chunked, [10, 95], 0), (chunked, [3], 0)))
+        assert counter.chunk_reads == 3
+
+        # The default chunk cache of 1 MB holds 13 of these chunks.
+        counter.reset()
+        for _i in range(14):
+            counter(_Stage((chunked, [_i * 10], 0)))
+        assert counter.chunk_reads == 14
+        counter(_Stage((chunked, [135], 0)))
+        assert counter.chunk_reads == 14
+        # The least recently used chunk has been evicted.
+        counter(_Stage((chunked, [0], 0)))
+        assert counter.chunk_reads == 15
+
+        # Reading along the other axis touches all chunks.
+        counter.reset()
+        counter(_Stage((chunked, [1, 2], 1)))
+        assert counter.chunk_reads == 30
+
+        counter.reset()
+        counter(_Stage((f["contiguous"], [1, 2, 2], 0)))
+        counter(_Stage((f["contiguous"], [2], 0)))
+        assert counter.chunk_reads == 3
+        counter(_Stage())
+        assert counter.chunk_reads == 3
+
+
+def _get_results(*medians, **kwargs):
+    spread = kwargs.get("spread", 0.01)
+    return {
+        "databases": [{"path": "db"}],
+        "benchmarks": [
+            {"name": "B%i" % _i, "status": "ok", "database": "db",
+             "time_per_iteration": {"percentiles": {
+                 "25": m * (1 - spread), "50": m, "75": m * (1 + spread)}}}
+            for _i, m in enumerate(medians)]}
+
+
+def test_compare_results():
+    old = _get_results(1.0, 1.0, 1.0, 1.0)
+    new = _get_results(0.5, 1.5, 1.02, 1.5)
+    # The last one has very noisy results.
+    new["benchmarks"][3]["time_per_iteration"]["percentiles"]["25"] = 0.9
+    del new["benchmarks"][2]
+    new["benchmarks"].append(copy.deepcopy(new["benchmarks"][0]))
+    new["benchmarks"][-1]["name"] = "B9"
+
+    comparison = compare_results(old, new, threshold=0.05)
+    assert [_i["name"] for _i in comparison] == ["B0", "B1", "B2", "B3", "B9"]
+    assert [_i["status"] for _i in comparison] == [
+        "faster", "slower", "removed", "unchanged", "added"]
+    assert comparison[0]["change"] == pytest.approx(-0.5)
+    assert comparison[1]["change"] == pytest.approx(0.5)
+    assert comparison[2]["change"] is None
+
+    # Higher threshold.
+    comparison = compare_results(old, new, threshold=0.6)
+    assert comparison[0]["status"] == "unchanged"
+    assert comparison[1]["status"] == "unchanged"
+
+    # Benchmarks with multiple databases are identified by the database.
+    new = _get_results(1.0)
+    new["databases"].append({"path": "other"})
+    comparison = compare_results(old, new)
+    assert comparison[-1]["name"] == "B0 [db]"
+    assert comparison[-1]["status"] == "added"
+
+    table = format_comparison(compare_results(old, old))
+    assert "B3" in table
+    assert "+0.0%" in table
+
+
+def test_server_load_test():
+    """
+    Runs a short load test against an in-process server.
+    """
+    server, url = load.start_server(BWD, buffer_size_in_mb=10)
+    try:
+        results = load.LoadTest(
+            url=url, workloads=load.parse_workloads(
+                ["seismograms:2", "seismograms_raw", "greens_function",
+                 "finite_source"]),
+            concurrency=4, duration=60.0, max_requests=12, interval=0.1,
+            seed=12345, finite_source_size=3, quiet=True).run()
+    finally:
+        server.stop()
+
+    assert results["total"]["requests"] == 12
+    assert results["total"]["errors"] == 0
+    assert results["total"]["codes"] == {"200": 12}
+    assert sum(_i["requests"] for _i in results["workloads"].values()) == 12
+    assert results["total"]["latency"]["percentiles"]["50"] > 0
+    assert results["timeline"]
+    # Includes the requests to /info and /metrics.
+    assert results["server"]["requests"] >= 12
+    assert results["server"]["stages"]["element_lookup"]["count"] > 0
+    assert "finite_source" in load.format_summary(results)
+    # Must be JSON serializable.
+    json.dumps(results)
+
+    # Forward databases have no Green's functions.
+    server, url = load.start_server(FWD, buffer_size_in_mb=10)
+    try:
+        with pytest.raises(ValueError):
+            load.LoadTest(url=url, workloads={"greens_function": 1.0},
+                          max_requests=1, quiet=True).run()
+    finally:
+        server.stop()
+
+
+def test_server_load_test_helpers():
+    assert load.parse_workloads(["a", "b:3"]) == {"a": 1.0, "b": 3.0}
+    with pytest.raises(ValueError):
+        load.parse_workloads(["a:0"])
+
+    metrics = load.parse_metrics(
+        '# TYPE x counter\n'
+        'instaseis_requests_total{handler="A",method="GET",code="200"} 3\n'
+        'instaseis_requests_total{handler="B",method="GET",code="500"} 1\n'
+        'instaseis_disk_read_bytes_total 1024\n'
+        'instaseis_buffer_hits_total{mesh="px",buffer="displ"} 3\n'
+        'instaseis_buffer_misses_total{mesh="px",buffer="displ"} 1\n'
+        'instaseis_stage_duration_seconds_sum{stage="hdf5_read"} 2.0\n'
+        'instaseis_stage_duration_seconds_count{stage="hdf5_read"} 4\n')
+    assert metrics["instaseis_requests_total"][1] == (
+        {"handler": "B", "method": "GET", "code": "500"}, 1.0)
+    summary = load.summarize_metrics(metrics)
+    assert summary["requests"] == 4
+    assert summary["disk_read_bytes"] == 1024
+    assert summary["buffer_hit_ratio"] == 0.75
+    assert summary["stages"]["hdf5_read"] == {"count": 4, "mean_time": 0.5}
+
+    records = [load.Record("a", 0.0, 1.0, 200, 10),
+               load.Record("a", 0.0, 3.0, 500, 0)]
+    summary = load.summarize_records(records, duration=2.0)
+    assert summary["throughput"] == 1.0
+    assert summary["error_rate"] == 0.5
+    assert summary["codes"] == {"200": 1, "500": 1}
+    assert summary["latency"]["percentiles"]["50"] == 2.0
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the persistent cache of the remote databases.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import absolute_import
+
+import os
+
+import numpy as np
+import pytest
+
+from instaseis.database_interfaces.cache import (SeismogramCache, _encode,
+                                                 get_key, get_request_key)
+
+
+def _get_data(value):
+    return {"mu": 3E10, "Z": np.full(1000, value, dtype=np.float32),
+            "N": np.zeros(1000, dtype=np.float32)}
+
+
+def test_keys():
+    assert get_key({"a": 1, "b": [1, 2]}) == get_key({"b": [1, 2], "a": 1})
+    assert get_key({"a": 1}) != get_key({"a": 2})
+    # Parameters are compared as they are sent to the server.
+    assert get_request_key("db", {"a": 1.0, "b": "X"}) == \
+        get_request_key("db", {"b": "X", "a": np.float64(1.0)})
+    assert get_request_key("db", {"a": 1.0}) != \
+        get_request_key("db", {"a": 1.1})
+    assert get_request_key("db", {"a": 1.0}) != \
+        get_request_key("other_db", {"a": 1.0})
+
+
+def test_cache(tmpdir):
+    cache = SeismogramCache(tmpdir.strpath)
+    assert cache.get("a" * 40) is None
+    assert cache.misses == 1
+
+    cache.put("a" * 40, _get_data(1.0))
+    data = cache.get("a" * 40)
+    assert cache.hits == 1
+    assert sorted(data.keys()) == ["N", "Z", "mu"]
+    assert data["mu"] == 3E10
+    np.testing.assert_equal(data["Z"], _get_data(1.0)["Z"])
+    assert data["Z"].dtype == np.float32
+    # Stored compactly.
+    assert cache.size_in_bytes < 1000
+
+    # Other dtypes are stored as they are.
+    cache.put("b" * 40, {"mu": 1.0, "Z": np.arange(5, dtype=">f8")})
+    data = cache.get("b" * 40)
+    np.testing.assert_equal(data["Z"], np.arange(5))
+    assert data["Z"].dtype == np.float64
+
+    # Persistent and shared with other instances.
+    other = SeismogramCache(tmpdir.strpath)
+    assert len(other) == 2
+    np.testing.assert_equal(other.get("a" * 40)["Z"], _get_data(1.0)["Z"])
+    cache.put("c" * 40, _get_data(2.0))
+    np.testing.assert_equal(other.get("c" * 40)["Z"], _get_data(2.0)["Z"])
+
+    # All seismograms of a process share a single file.
+    filenames = os.listdir(os.path.join(tmpdir.strpath, "segments"))
+    assert sorted(os.path.splitext(_i)[1] for _i in filenames) == \
+        [".idx", ".seg"]
+
+    # Broken records are misses.
+    segment, offset, _ = cache._entries["a" * 40]
+    with open(cache._get_filename(segment), "r+b") as fh:
+        fh.seek(offset)
+        fh.write(b"random")
+    assert cache.get("a" * 40) is None
+    assert "a" * 40 not in cache
+
+    # Documents.
+    assert cache.get_document("http://localhost") is None
+    cache.put_document("http://localhost", {"info": {"npts": 10}})
+    assert SeismogramCache(tmpdir.strpath).get_document(
+        "http://localhost") == {"info": {"npts": 10}}
+
+    with pytest.raises(ValueError):
+        SeismogramCache(tmpdir.strpath, cache_size_gb=0)
+
+
+def test_least_recently_used_seismograms_are_evicted(tmpdir):
+    # Every record gets its own segment and there is space for eight.
+    record_size = max(len(_encode(_get_data(float(_i)))) for _i in range(11))
+    size_gb = 8.5 * record_size / 1024 ** 3
+    cache = SeismogramCache(tmpdir.strpath, cache_size_gb=size_gb,
+                            segment_size_in_mb=1E-6)
+    keys = [_i * 40 for _i in "abcdefghijk"]
+    for _i in range(8):
+        cache.put(keys[_i], _get_data(float(_i)))
+    assert len(cache) == 8
+    # Recently written seismograms are not copied.
+    assert cache.get(keys[7]) is not None
+    assert len(cache._segments) == 8
+    # Copies the oldest one to a new segment which evicts its old one.
+    assert cache.get(keys[0]) is not None
+    assert len(cache._segments) == 8
+    assert cache._entries[keys[0]][0] == list(cache._segments)[-1]
+
+    cache.put(keys[8], _get_data(8.0))
+    assert keys[1] not in cache
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.size_in_bytes <= cache.max_size_in_bytes
+    assert len(os.listdir(os.path.join(tmpdir.strpath, "segments"))) == 16
+
+    # The order of use survives a restart.
+    cache = SeismogramCache(tmpdir.strpath, cache_size_gb=size_gb,
+                            segment_size_in_mb=1E-6)
+    cache.put(keys[9], _get_data(9.0))
+    cache.put(keys[10], _get_data(10.0))
+    assert sorted(cache._entries.keys()) == sorted([keys[0]] + keys[4:])
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the database distributing requests over several servers.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import absolute_import
+
+import collections
+import re
+import threading
+
+import numpy as np
+import pytest
+import requests
+import responses
+
+import instaseis
+from instaseis.database_interfaces.cluster_instaseis_db import \
+    ClusterInstaseisDB
+from .tornado_testing_fixtures import DBS, create_async_client
+
+# Conditionally import mock either from the stdlib or as a separate library.
+import sys
+if sys.version_info[0] == 2:  # pragma: no cover
+    import mock
+else:  # pragma: no cover
+    import unittest.mock as mock
+
+
+PATH = DBS["db_bwd_displ_only"]
+
+
+def _add_cluster_callback(clients, down=()):
+    """
+    Routes the requests to the servers on localhost by their ports. Servers
+    whose ports are in ``down`` are not reachable. Returns the number of
+    requests per port and method.
+    """
+    clients = dict((_i.port, _i) for _i in clients)
+    calls = collections.Counter()
+    # The mock servers only handle one request at a time.
+    lock = threading.Lock()
+
+    def request_callback(request):
+        port = int(re.match(r"http://localhost:(\d+)/", request.url).group(1))
+        calls[(port, request.method)] += 1
+        if port in down:
+            raise requests.ConnectionError("Server %i is down." % port)
+        with lock:
+            req = clients[port].fetch(request.path_url,
+                                      method=request.method,
+                                      body=request.body)
+        return (req.code, req.headers, req.body)
+
+    pattern = re.compile(r"http://localhost.*")
+    for method in (responses.GET, responses.POST):
+        responses.add_callback(method, pattern, callback=request_callback,
+                               content_type="application/octet_stream")
+    return calls
+
+
+@pytest.fixture
+def cluster():
+    """
+    Three servers with the same database and a local database to compare.
+    """
+    clients = [create_async_client(PATH) for _ in range(3)]
+    return clients, instaseis.open_db(PATH)
+
+
+def _get_finite_source(db):
+    finite_source = instaseis.FiniteSource.from_Haskell(
+        latitude=10.0, longitude=10.0, depth_in_m=200000.0, strike=60.0,
+        dip=45.0, rake=90.0, M0=1E20, fault_length=500000.0,
+        fault_width=100000.0, rupture_velocity=2500.0, nl=10, nw=3,
+        trise=2.0 * db.info.dt, dt=db.info.dt)
+    finite_source.resample_sliprate(dt=db.info.dt, nsamp=db.info.npts)
+    return finite_source
+
+
+def _assert_streams_close(st_1, st_2):
+    assert len(st_1) == len(st_2)
+    for tr_1, tr_2 in zip(st_1, st_2):
+        assert tr_1.stats.channel == tr_2.stats.channel
+        assert tr_1.stats.delta == tr_2.stats.delta
+        np.testing.assert_allclose(tr_1.data, tr_2.data, rtol=1E-5,
+                                   atol=1E-5 * np.abs(tr_2.data).max())
+
+
+@responses.activate
+def test_cluster_finite_source(cluster):
+    """
+    The point sources are summed by all servers.
+    """
+    clients, l_db = cluster
+    ports = [_i.port for _i in clients]
+    calls = _add_cluster_callback(clients)
+
+    db = instaseis.open_db(["http://localhost:%i" % _i for _i in ports])
+    assert isinstance(db, ClusterInstaseisDB)
+    assert db.urls == ["http://localhost:%i" % _i for _i in ports]
+    assert db._http.max_concurrency == 24
+    assert db.info.npts == l_db.info.npts
+
+    finite_source = _get_finite_source(l_db)
+    receiver = instaseis.Receiver(latitude=30.0, longitude=20.0,
+                                  network="XX", station="ABC")
+    for kwargs in [{}, {"dt": 2.0},
+                   {"components": "Z", "correct_mu": True}]:
+        calls.clear()
+        st = db.get_seismograms_finite_source(
+            sources=finite_source, receiver=receiver, **kwargs)
+        _assert_streams_close(st, l_db.get_seismograms_finite_source(
+            sources=finite_source, receiver=receiver, **kwargs))
+        # 3 servers with 4 chunks each.
+        assert sum(calls.values()) == 12
+        for port in ports:
+            assert calls[(port, "POST")] >= 1
+
+    # Lists of point sources work as well.
+    st = db.get_seismograms_finite_source(
+        sources=finite_source.pointsources[:5], receiver=receiver)
+    _assert_streams_close(st, l_db.get_seismograms_finite_source(
+        sources=finite_source.pointsources[:5], receiver=receiver))
+
+    # Cancelled by the progress callback.
+    assert db.get_seismograms_finite_source(
+        sources=finite_source, receiver=receiver,
+        progress_callback=lambda current, total: True) is None
+
+
+@responses.activate
+def test_cluster_batch(cluster):
+    """
+    The receivers of a batch are distributed over all servers.
+    """
+    clients, l_db = cluster
+    ports = [_i.port for _i in clients]
+    calls = _add_cluster_callback(clients)
+    db = ClusterInstaseisDB(["http://localhost:%i" % _i for _i in ports])
+
+    source = instaseis.Source(
+        latitude=4., longitude=3.0, depth_in_m=0, m_rr=4.71e+17, m_tt=3.81e+17,
+        m_pp=-4.74e+17, m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    receivers = instaseis.ReceiverArray(
+        latitudes=np.linspace(-40.0, 40.0, 12),
+        longitudes=np.linspace(-100.0, 100.0, 12))
+
+    calls.clear()
+    streams = db.get_seismograms_batch(source, receivers, dt=2.0)
+    for st, expected in zip(streams, l_db.get_seismograms_batch(
+            source, receivers, dt=2.0)):
+        _assert_streams_close(st, expected)
+    assert sum(calls.values()) == 12
+    for port in ports:
+        assert calls[(port, "GET")] >= 1
+
+
+@responses.activate
+def test_cluster_failover(cluster):
+    """
+    Requests to servers that are down are sent to the other servers.
+    """
+    clients, l_db = cluster
+    ports = [_i.port for _i in clients]
+    calls = _add_cluster_callback(clients, down=ports[:1])
+
+    with mock.patch("instaseis.database_interfaces.http_session.time.sleep"):
+        # The first server is down from the start.
+        db = ClusterInstaseisDB(["http://localhost:%i" % _i for _i in ports],
+                                max_retries=0)
+        finite_source = _get_finite_source(l_db)
+        receiver = instaseis.Receiver(latitude=30.0, longitude=20.0)
+        st = db.get_seismograms_finite_source(sources=finite_source,
+                                              receiver=receiver)
+    _assert_streams_close(st, l_db.get_seismograms_finite_source(
+        sources=finite_source, receiver=receiver))
+
+    down = db.servers[0]
+    assert down.failures == 1
+    assert down.active == 0
+    # It is no longer used once it failed.
+    assert calls[(ports[0], "GET")] == 1
+    assert calls[(ports[0], "POST")] == 0
+    assert db.servers[1].failures == db.servers[2].failures == 0
+
+    # Used again after the failover timeout.
+    down.unavailable_until = 0.0
+    calls.clear()
+    db.get_seismograms_finite_source(sources=finite_source,
+                                     receiver=receiver)
+    assert calls[(ports[0], "POST")] == 1
+    assert down.failures == 2
+
+    # Client errors are not sent to the other servers.
+    calls.clear()
+    finite_source.depths_in_m[:] = 1E7
+    with pytest.raises(instaseis.InstaseisError) as err:
+        db.get_seismograms_finite_source(sources=finite_source,
+                                         receiver=receiver)
+    assert err.value.args[0].startswith("Status code 400 when downloading")
+
+    # All servers are down.
+    responses.reset()
+    _add_cluster_callback(clients, down=ports)
+    with pytest.raises(instaseis.InstaseisError) as err:
+        db.get_seismograms(source=_get_finite_source(l_db)[0],
+                           receiver=receiver)
+    assert err.value.args[0].startswith(
+        "The request failed with all 3 servers: Could not connect to")
+
+    with pytest.raises(ValueError):
+        ClusterInstaseisDB([])
+    with pytest.raises(ValueError):
+        ClusterInstaseisDB(["http://localhost:1", "http://localhost:1"])
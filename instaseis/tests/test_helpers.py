@@ -11,7 +11,12 @@ Tests for some helper routines.
 """
 from __future__ import absolute_import, division
 
-from instaseis.helpers import io_chunker
+import numpy as np
+import obspy
+
+from instaseis.helpers import (elliptic_to_geocentric_latitude,
+                               geocentric_to_elliptic_latitude, io_chunker,
+                               read_raw32, write_raw32)
 
 
 def test_io_chunker():
@@ -29,3 +34,62 @@ def test_io_chunker():
     # A couple more complex cases.
     assert io_chunker([0, 1, 2, 4, 6, 7, 8]) == [[0, 3], 4, [6, 9]]
     assert io_chunker([0, 2, 4, 6, 7, 8, 10]) == [0, 2, 4, [6, 9], 10]
+
+
+def test_latitude_conversions_of_arrays():
+    """
+    Arrays are converted like the individual values.
+    """
+    lats = np.concatenate([np.linspace(-90.0, 90.0, 1001),
+                           [20.0, 1E-7, -1E-7, 90.0 - 1E-7, 35.123456789]])
+    for func in (elliptic_to_geocentric_latitude,
+                 geocentric_to_elliptic_latitude):
+        converted = func(lats)
+        assert converted.dtype == np.float64
+        assert converted.shape == lats.shape
+        np.testing.assert_allclose(
+            converted, [func(_i) for _i in lats.tolist()], rtol=1E-14)
+        # The singular values are returned as they are.
+        np.testing.assert_equal(converted[[0, 500, 1000, 1002, 1003]],
+                                lats[[0, 500, 1000, 1002, 1003]])
+        # Any shape and lists.
+        np.testing.assert_array_equal(
+            func(lats[:1000].reshape(10, 100)), converted[:1000].reshape(
+                10, 100))
+        np.testing.assert_allclose(func([20.0, 45.0]),
+                                   [func(20.0), func(45.0)], rtol=1E-14)
+
+
+def test_raw32_roundtrip():
+    st = obspy.read()
+    for tr in st:
+        tr.data = np.require(tr.data, dtype=np.float32) / 7.0
+    st[1].stats.delta = 1.0 / 3.0
+
+    for compress in (False, True):
+        data = write_raw32(st, compress=compress)
+        st2 = read_raw32(data)
+        assert len(st2) == len(st)
+        for tr, tr2 in zip(st, st2):
+            assert tr.id == tr2.id
+            assert tr.stats.starttime == tr2.stats.starttime
+            # The sampling interval is not rounded.
+            assert tr.stats.delta == tr2.stats.delta
+            assert tr2.data.dtype == np.float32
+            np.testing.assert_array_equal(tr.data, tr2.data)
+            assert not hasattr(tr2.stats, "instaseis")
+
+    # Smooth data is lossless compressed quite a bit.
+    tr = obspy.Trace(data=np.sin(np.linspace(0, 10, 1000)).astype(np.float32))
+    st = obspy.Stream(traces=[tr])
+    assert len(write_raw32(st, compress=True)) < \
+        0.8 * len(write_raw32(st, compress=False))
+    np.testing.assert_array_equal(
+        read_raw32(write_raw32(st, compress=True))[0].data, tr.data)
+
+    # Records can be concatenated and mu is stored.
+    data = write_raw32(st, mu=1.5) + write_raw32(st, compress=True, mu=2.5)
+    st2 = read_raw32(data)
+    assert len(st2) == 2
+    assert st2[0].stats.instaseis.mu == 1.5
+    assert st2[1].stats.instaseis.mu == 2.5
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the pooled HTTP session of the remote databases.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import absolute_import
+
+import threading
+import time
+
+import pytest
+import requests
+import responses
+
+from instaseis.database_interfaces import http_session
+from instaseis.database_interfaces.http_session import HTTPSession
+
+
+URL = "http://localhost:8765/info"
+
+
+def _add_responses(statuses, headers=None):
+    """
+    Responds with the given status codes in turn.
+    """
+    calls = []
+
+    def _callback(request):
+        calls.append(request.url)
+        status = statuses[min(len(calls), len(statuses)) - 1]
+        if isinstance(status, Exception):
+            raise status
+        return (status, headers or {}, "body")
+
+    responses.add_callback(responses.GET, URL, callback=_callback)
+    return calls
+
+
+@responses.activate
+def test_retries(monkeypatch):
+    waits = []
+    monkeypatch.setattr(http_session.time, "sleep", waits.append)
+    session = HTTPSession(max_retries=3, backoff_in_s=0.5)
+
+    calls = _add_responses([503, 502, 200])
+    r = session.get(URL)
+    assert r.status_code == 200
+    assert r.text == "body"
+    assert len(calls) == 3
+    # Exponential backoff.
+    assert waits == [0.5, 1.0]
+
+    # Client errors are not retried.
+    del waits[:]
+    responses.reset()
+    calls = _add_responses([400, 200])
+    assert session.get(URL).status_code == 400
+    assert len(calls) == 1
+    assert waits == []
+
+    # The last response is returned once all retries are used up.
+    responses.reset()
+    calls = _add_responses([503])
+    assert session.get(URL).status_code == 503
+    assert len(calls) == 4
+    assert waits == [0.5, 1.0, 2.0]
+
+    # Longer waiting times requested by the server are respected.
+    del waits[:]
+    responses.reset()
+    _add_responses([429, 200], headers={"Retry-After": "10"})
+    assert session.get(URL).status_code == 200
+    assert waits == [10.0]
+
+    # Connection errors are retried and eventually raised.
+    del waits[:]
+    responses.reset()
+    calls = _add_responses([requests.ConnectionError("random"), 200])
+    assert session.get(URL).status_code == 200
+    assert len(calls) == 2
+
+    responses.reset()
+    _add_responses([requests.ConnectionError("random")])
+    with pytest.raises(requests.ConnectionError):
+        HTTPSession(max_retries=1).get(URL)
+
+    with pytest.raises(ValueError):
+        HTTPSession(max_concurrency=0)
+    with pytest.raises(ValueError):
+        HTTPSession(max_retries=-1)
+
+
+def test_map_keeps_order():
+    session = HTTPSession(max_concurrency=4)
+    active = []
+    max_active = []
+    lock = threading.Lock()
+
+    def _func(value):
+        with lock:
+            active.append(value)
+            max_active.append(len(active))
+        # Later items finish first.
+        time.sleep(0.001 * (20 - value))
+        with lock:
+            active.remove(value)
+        return value * 2
+
+    assert session.map(_func, range(20)) == [_i * 2 for _i in range(20)]
+    assert 1 < max(max_active) <= 4
+
+    assert session.map(_func, []) == []
+    assert HTTPSession(max_concurrency=1).map(_func, range(3)) == [0, 2, 4]
+
+
+def test_map_raises_first_error():
+    def _func(value):
+        if value in (3, 7):
+            raise ValueError(value)
+        return value
+
+    for max_concurrency in (1, 4):
+        with pytest.raises(ValueError) as err:
+            HTTPSession(max_concurrency=max_concurrency).map(
+                _func, range(10))
+        assert err.value.args[0] == 3
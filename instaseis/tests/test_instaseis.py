@@ -1930,3 +1930,42 @@ def test_no_downsampling(bwd_db):
         "The database is sampled with a sample spacing of 24.725 seconds. You "
         "must not pass a 'dt' larger than that as that would be a "
         "downsampling operation which Instaseis does not do.")
+
+
+@pytest.mark.parametrize("bwd_db", BW_DISPL_DBS)
+def test_stage_observers(bwd_db):
+    """
+    Observers are called for each stage of the seismogram extraction.
+    """
+    db = find_and_open_files(bwd_db)
+    stages = []
+    db.add_stage_observer(stages.append)
+
+    receiver = Receiver(latitude=42.6390, longitude=74.4940)
+    source = Source(latitude=89.91, longitude=0.0, depth_in_m=12000,
+                    m_rr=4.71E17, m_tt=3.81E15, m_pp=-4.74E17)
+    source.set_sliprate_dirac(db.info.dt, nsamp=100)
+
+    db.get_seismograms(source=source, receiver=receiver,
+                       components=["Z"], dt=db.info.dt / 2.0,
+                       reconvolve_stf=True, remove_source_shift=False)
+    names = [_i.name for _i in stages]
+    for name in ("element_lookup", "hdf5_read", "strain", "interpolation",
+                 "reconvolution", "resampling"):
+        assert name in names
+    assert all(_i.wall_time >= 0.0 for _i in stages)
+    assert sum(_i.nbytes for _i in stages) > 0
+    assert sum(_i.nbytes for _i in stages
+               if _i.name != "hdf5_read") == 0
+
+    # Buffered - no more reads.
+    del stages[:]
+    db.get_seismograms(source=source, receiver=receiver, components=["Z"])
+    assert "hdf5_read" not in [_i.name for _i in stages]
+    assert "element_lookup" in [_i.name for _i in stages]
+
+    # Nothing is recorded once the observer is removed.
+    db.remove_stage_observer(stages.append)
+    del stages[:]
+    db.get_seismograms(source=source, receiver=receiver, components=["Z"])
+    assert stages == []
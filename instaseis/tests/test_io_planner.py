@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the coalesced reads of finite sources.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import absolute_import
+
+import collections
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from instaseis import FiniteSource, Receiver, open_db
+from instaseis.database_interfaces import io_planner
+from instaseis.database_interfaces.base_instaseis_db import BaseInstaseisDB
+
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+DBS = [(os.path.join(DATA, "100s_db_bwd_displ_only"), "ZNE"),
+       (os.path.join(DATA, "100s_db_bwd_strain_only"), "Z")]
+for _name in ["merged_100s_db_bwd_displ_only",
+              "merged_transposed_100s_db_bwd_displ_only",
+              "repacked_transposed_100s_db_bwd_displ_only"]:
+    if _name in pytest.config.dbs["databases"]:
+        DBS.append((pytest.config.dbs["databases"][_name], "ZNERT"))
+
+
+def test_get_read_ranges():
+    assert io_planner.get_read_ranges([]) == []
+    assert io_planner.get_read_ranges([3]) == [(3, 4)]
+    assert io_planner.get_read_ranges([5, 1, 2, 3, 8, 2]) == \
+        [(1, 4), (5, 6), (8, 9)]
+    assert io_planner.get_read_ranges([5, 1, 2, 3, 8, 2], max_gap=1) == \
+        [(1, 6), (8, 9)]
+    assert io_planner.get_read_ranges([5, 1, 2, 3, 8, 2], max_gap=2) == \
+        [(1, 9)]
+
+
+def test_data_block():
+    data = np.arange(200, dtype=np.float32).reshape(10, 20)
+
+    block = io_planner.DataBlock(data, [15, 2, 3, 8], axis=1,
+                                 max_gap_in_bytes=0)
+    assert block.ranges == [(2, 4), (8, 9), (15, 16)]
+    assert block.nbytes == 10 * 4 * 4
+    assert [2, 15] in block
+    assert 8 in block
+    assert 4 not in block
+    assert [3, 19] not in block
+    np.testing.assert_equal(block.take([15, 2]), data[:, [15, 2]])
+
+    # Reads the gaps as well.
+    block = io_planner.DataBlock(data, [15, 2, 3, 8], axis=1,
+                                 max_gap_in_bytes=10 * 4 * 4)
+    assert block.ranges == [(2, 9), (15, 16)]
+    assert 4 in block
+    np.testing.assert_equal(block.take([4, 8]), data[:, [4, 8]])
+
+    block = io_planner.DataBlock(data, [1, 3], axis=0)
+    np.testing.assert_equal(block.take([3]), data[[3]])
+
+    block = io_planner.DataBlock(data, [], axis=0)
+    assert block.ranges == []
+    assert 0 not in block
+
+
+def _get_finite_source(db):
+    finite_source = FiniteSource.from_Haskell(
+        latitude=10.0, longitude=10.0, depth_in_m=200000.0, strike=60.0,
+        dip=45.0, rake=90.0, M0=1E20, fault_length=500000.0,
+        fault_width=100000.0, rupture_velocity=2500.0, nl=10, nw=3,
+        trise=2.0 * db.info.dt, dt=db.info.dt)
+    finite_source.resample_sliprate(dt=db.info.dt, nsamp=db.info.npts)
+    return finite_source
+
+
+@pytest.mark.parametrize("path, components", DBS)
+def test_coalesced_finite_source_reads(path, components, monkeypatch):
+    """
+    Coalesced reads give the same results with a lot less read operations.
+    """
+    db = open_db(path, read_on_demand=False, buffer_size_in_mb=0)
+    finite_source = _get_finite_source(db)
+    receiver = Receiver(latitude=30.0, longitude=20.0)
+
+    reads = collections.Counter()
+
+    def _observer(stage):
+        if stage.name == "hdf5_read":
+            reads["count"] += 1
+        reads[stage.name] += 1
+
+    db.add_stage_observer(_observer)
+
+    st = db.get_seismograms_finite_source(
+        sources=finite_source, receiver=receiver, components=components)
+    coalesced_reads = reads["count"]
+    assert coalesced_reads == 1
+    # Each element is only looked up once when planning the reads.
+    assert reads["read_planning"] == len(finite_source)
+    assert reads["element_lookup"] == 0
+    assert not db._planned_lookups
+    # The blocks are discarded afterwards.
+    for mesh in db.meshes:
+        if mesh is not None:
+            assert not mesh.blocks
+
+    # Small blocks result in more reads.
+    reads.clear()
+    monkeypatch.setattr(io_planner, "MAX_BLOCK_SIZE_IN_MB", 0.005)
+    st_small = db.get_seismograms_finite_source(
+        sources=finite_source, receiver=receiver, components=components)
+    assert 1 < reads["count"] <= len(finite_source)
+
+    # Element by element.
+    reads.clear()
+    monkeypatch.setattr(db, "_coalesced_reads",
+                        lambda *args, **kwargs: BaseInstaseisDB.
+                        _coalesced_reads(db, *args, **kwargs))
+    st_single = db.get_seismograms_finite_source(
+        sources=finite_source, receiver=receiver, components=components)
+    assert reads["count"] > 10 * coalesced_reads
+
+    for tr, tr_small, tr_single in zip(st, st_small, st_single):
+        np.testing.assert_allclose(tr.data, tr_single.data, rtol=1E-6,
+                                   atol=1E-6 * np.abs(tr.data).max())
+        np.testing.assert_allclose(tr_small.data, tr_single.data, rtol=1E-6,
+                                   atol=1E-6 * np.abs(tr.data).max())
+
+
+def test_coalesced_reads_skip_buffered_elements():
+    db = open_db(os.path.join(DATA, "100s_db_bwd_displ_only"),
+                 read_on_demand=False, buffer_size_in_mb=100)
+    finite_source = _get_finite_source(db)
+    receiver = Receiver(latitude=30.0, longitude=20.0)
+
+    reads = collections.Counter()
+
+    def _observer(stage):
+        if stage.name == "hdf5_read":
+            reads["count"] += 1
+
+    db.add_stage_observer(_observer)
+    db.get_seismograms_finite_source(sources=finite_source,
+                                     receiver=receiver)
+    assert reads["count"] == 1
+    # Everything is buffered now.
+    db.get_seismograms_finite_source(sources=finite_source,
+                                     receiver=receiver)
+    assert reads["count"] == 1
+
+
+def test_blocks_are_per_thread():
+    db = open_db(os.path.join(DATA, "100s_db_bwd_displ_only"))
+    mesh = db.meshes.px
+    mesh.blocks["disp_s"] = "block"
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(dict(mesh.blocks)))
+    thread.start()
+    thread.join()
+    assert other == [{}]
+    assert mesh.blocks == {"disp_s": "block"}
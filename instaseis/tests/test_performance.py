@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Performance regression tests.
+
+Not run by default - select them with
+
+    $ py.test -m perf -n 0
+
+Each test times one of the core extraction paths on the bundled test
+databases and records the peak of the allocated memory. Timings are
+normalized by the time of a fixed reference workload to make them roughly
+comparable across machines. Tests fail if they are slower or allocate more
+than the committed baseline plus a tolerance. Update the baseline after
+intended changes with
+
+    $ py.test -m perf -n 0 --update-perf-baseline
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import absolute_import, division
+
+import collections
+import io
+import json
+import math
+import os
+import timeit
+
+import numpy as np
+import pytest
+
+from instaseis import FiniteSource, Receiver, Source, open_db
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+
+pytestmark = pytest.mark.perf
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+BASELINE_FILE = os.path.join(DATA, "performance_baseline.json")
+
+# Default relative tolerances - can be overwritten per test in the baseline
+# file.
+TIME_TOLERANCE = 0.5
+MEMORY_TOLERANCE = 0.2
+# Absolute slack of the memory comparison in bytes to not fail on tiny
+# allocations.
+MEMORY_SLACK = 1024 ** 2
+
+RECEIVER = Receiver(latitude=10.0, longitude=20.0)
+
+
+def _get_time(func, repeat=5, min_time=0.05):
+    """
+    Minimum time of a single call to a function. Each of the repeats calls
+    the function often enough to take at least ``min_time`` seconds.
+    """
+    # Also serves as the warm-up.
+    start = timeit.default_timer()
+    func()
+    number = max(int(math.ceil(
+        min_time / max(timeit.default_timer() - start, 1E-6))), 1)
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def _reference():
+    """
+    A fixed mix of numpy and pure Python work all timings are normalized
+    with.
+    """
+    rng = np.random.RandomState(12345)
+    a = rng.randn(64, 64)
+    x = rng.randn(2 ** 12)
+    np.dot(a, a)
+    np.fft.irfft(np.fft.rfft(x))
+    sum(_i * _i for _i in range(2000))
+
+
+def _get_peak_memory(func):
+    """
+    Peak of the memory allocated during a call to a function in bytes. None
+    if it cannot be measured.
+    """
+    if tracemalloc is None or tracemalloc.is_tracing():  # pragma: no cover
+        return None
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _read_baseline():
+    if not os.path.exists(BASELINE_FILE):
+        return {"benchmarks": {}}
+    with io.open(BASELINE_FILE, "rt") as fh:
+        return json.load(fh)
+
+
+def _check(name, func, config):
+    """
+    Measure a function and compare against or update the baseline.
+    """
+    # Measure the reference right before to account for the current state
+    # of the machine.
+    reference_time = _get_time(_reference)
+    result = collections.OrderedDict([
+        ("normalized_time", _get_time(func) / reference_time),
+        ("allocated_bytes", _get_peak_memory(func))])
+
+    baseline = _read_baseline()
+    if config.getoption("update_perf_baseline"):
+        old = baseline["benchmarks"].get(name, {})
+        # Keep manually tuned tolerances.
+        for key in ("time_tolerance", "memory_tolerance"):
+            if key in old:
+                result[key] = old[key]
+        baseline["benchmarks"][name] = result
+        baseline["benchmarks"] = collections.OrderedDict(
+            sorted(baseline["benchmarks"].items()))
+        with io.open(BASELINE_FILE, "wt") as fh:
+            fh.write(json.dumps(baseline, indent=2) + "\n")
+        return
+
+    if name not in baseline["benchmarks"]:
+        pytest.skip("No baseline for '%s'. Create it with "
+                    "--update-perf-baseline." % name)
+    expected = baseline["benchmarks"][name]
+
+    max_time = expected["normalized_time"] * \
+        (1.0 + expected.get("time_tolerance", TIME_TOLERANCE))
+    assert result["normalized_time"] <= max_time, (
+        "'%s' got slower: %.3f instead of %.3f (tolerance %.3f)." % (
+            name, result["normalized_time"], expected["normalized_time"],
+            max_time))
+
+    if result["allocated_bytes"] is not None and \
+            expected["allocated_bytes"] is not None:
+        max_memory = expected["allocated_bytes"] * \
+            (1.0 + expected.get("memory_tolerance", MEMORY_TOLERANCE)) + \
+            MEMORY_SLACK
+        assert result["allocated_bytes"] <= max_memory, (
+            "'%s' allocates more memory: %i instead of %i bytes (tolerance "
+            "%i bytes)." % (name, result["allocated_bytes"],
+                            expected["allocated_bytes"], max_memory))
+
+
+def _get_merged_db(request, name):
+    path = request.config.dbs["databases"].get(name)
+    if path is None:  # pragma: no cover
+        pytest.skip("Merged test databases need click and netCDF4.")
+    return path
+
+
+def _extract(path, components="ZNE", depth_in_m=None):
+    """
+    Unbuffered extraction so every call reads from disc.
+    """
+    db = open_db(path, read_on_demand=False, buffer_size_in_mb=0)
+    if depth_in_m is None:
+        depth_in_m = db.info.planet_radius - db.info.max_radius + 10000.0
+    source = Source(latitude=4.0, longitude=3.0, depth_in_m=depth_in_m,
+                    m_rr=4.71e+17, m_tt=3.81e+15, m_pp=-4.74e+17,
+                    m_rt=3.99e+16, m_rp=-8.05e+16, m_tp=-1.23e+17)
+
+    def _f():
+        db.get_seismograms(source=source, receiver=RECEIVER,
+                           components=components)
+    return _f
+
+
+def test_perf_reciprocal_displ_only(request):
+    _check("reciprocal_displ_only",
+           _extract(os.path.join(DATA, "100s_db_bwd_displ_only")),
+           request.config)
+
+
+def test_perf_reciprocal_strain_only(request):
+    _check("reciprocal_strain_only",
+           _extract(os.path.join(DATA, "100s_db_bwd_strain_only"),
+                    components="Z"),
+           request.config)
+
+
+def test_perf_forward(request):
+    path = os.path.join(DATA, "100s_db_fwd")
+    depth = open_db(path).info.source_depth * 1000.0
+    _check("forward", _extract(path, depth_in_m=depth), request.config)
+
+
+def test_perf_merged_reciprocal(request):
+    _check("merged_reciprocal",
+           _extract(_get_merged_db(request, "merged_100s_db_bwd_displ_only")),
+           request.config)
+
+
+def test_perf_merged_forward(request):
+    path = _get_merged_db(request, "merged_100s_db_fwd")
+    depth = open_db(path).info.source_depth * 1000.0
+    _check("merged_forward", _extract(path, depth_in_m=depth),
+           request.config)
+
+
+def test_perf_finite_source(request):
+    db = open_db(os.path.join(DATA, "100s_db_bwd_displ_only"),
+                 read_on_demand=False, buffer_size_in_mb=0)
+    info = db.info
+    finite_source = FiniteSource.from_Haskell(
+        latitude=10.0, longitude=10.0, depth_in_m=20000.0, strike=60.0,
+        dip=45.0, rake=90.0, M0=1E20, fault_length=50000.0,
+        fault_width=10000.0, rupture_velocity=2500.0, nl=10, nw=2,
+        trise=2.0 * info.dt, dt=info.dt)
+    finite_source.lp_sliprate(freq=1.0 / info.period, zerophase=True)
+    finite_source.resample_sliprate(dt=info.dt, nsamp=info.npts)
+
+    def _f():
+        db.get_seismograms_finite_source(sources=finite_source,
+                                         receiver=RECEIVER)
+    _check("finite_source", _f, request.config)
+
+
+def test_perf_server_seismograms_route(request):
+    """
+    Sequential requests to the /seismograms route of an in-process server.
+    The allocations include the client.
+    """
+    from instaseis.benchmark import server as load
+
+    server, url = load.start_server(
+        os.path.join(DATA, "100s_db_bwd_displ_only"), buffer_size_in_mb=0)
+
+    def _f():
+        results = load.LoadTest(
+            url=url, workloads={"seismograms": 1.0}, concurrency=1,
+            max_requests=10, interval=3600.0, seed=12345, quiet=True).run()
+        assert results["total"]["errors"] == 0
+
+    try:
+        _check("server_seismograms_route", _f, request.config)
+    finally:
+        server.stop()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the profiling hooks.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import absolute_import
+
+import json
+import os
+import sys
+
+import pytest
+
+from instaseis import Source, Receiver, FiniteSource
+from instaseis.database_interfaces import find_and_open_files
+
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DB = os.path.join(DATA, "100s_db_bwd_displ_only")
+
+
+def _get_source_and_receiver(db):
+    receiver = Receiver(latitude=42.6390, longitude=74.4940)
+    source = Source(latitude=89.91, longitude=0.0, depth_in_m=12000,
+                    m_rr=4.71E17, m_tt=3.81E15, m_pp=-4.74E17)
+    source.set_sliprate_dirac(db.info.dt, nsamp=100)
+    return source, receiver
+
+
+def test_profiling():
+    """
+    Tests the profiler and its reports.
+    """
+    db = find_and_open_files(DB)
+    source, receiver = _get_source_and_receiver(db)
+
+    profiler = db.enable_profiling()
+    assert db.enable_profiling() is profiler
+
+    for _ in range(3):
+        db.get_seismograms(source=source, receiver=receiver, dt=1.0)
+    db.get_seismograms_finite_source(
+        sources=FiniteSource(pointsources=[source, source]),
+        receiver=receiver)
+
+    results = profiler.get_results()
+    assert list(results.keys())[:4] == [
+        "get_seismograms_finite_source", "get_seismograms",
+        "_get_seismograms", "_get_data"]
+    assert results["get_seismograms_finite_source"]["calls"] == 1
+    # Called three times directly and twice from the finite source.
+    assert results["get_seismograms"]["calls"] == 5
+    assert results["_get_seismograms"]["calls"] == 5
+    assert results["_get_data"]["calls"] == 5
+    # The elements of the finite source are looked up once when planning
+    # the reads.
+    assert results["element_lookup"]["calls"] == 3
+    assert results["read_planning"]["calls"] == 2
+    # Only read once - then buffered.
+    assert results["hdf5_read"]["calls"] >= 1
+    assert results["hdf5_read"]["bytes_read"] > 0
+    # The methods include the bytes read in the stages they call.
+    assert results["get_seismograms"]["bytes_read"] > 0
+    assert results["get_seismograms"]["bytes_read"] == \
+        results["_get_seismograms"]["bytes_read"] == \
+        results["_get_data"]["bytes_read"]
+    assert results["get_seismograms_finite_source"]["bytes_read"] + \
+        results["get_seismograms"]["bytes_read"] >= \
+        results["hdf5_read"]["bytes_read"]
+    assert results["resampling"]["calls"] == 9
+    assert results["reconvolution"]["calls"] == 6
+
+    for r in results.values():
+        assert r["min_wall_time"] <= r["mean_wall_time"] <= \
+            r["max_wall_time"]
+        assert r["allocated_bytes"] is None
+    assert results["get_seismograms"]["wall_time"] >= \
+        results["_get_seismograms"]["wall_time"]
+
+    assert json.loads(profiler.to_json()) == json.loads(
+        json.dumps(results))
+    report = str(profiler)
+    assert report.splitlines()[0].startswith("Stage")
+    assert len(report.splitlines()) == len(results) + 2
+
+    profiler.reset()
+    assert profiler.get_results() == {}
+
+    # Nothing is recorded anymore after disabling it.
+    assert db.disable_profiling() is profiler
+    assert db.profiler is None
+    assert db.disable_profiling() is None
+    db.get_seismograms(source=source, receiver=receiver)
+    assert profiler.get_results() == {}
+
+
+@pytest.mark.skipif(sys.version_info < (3, 4),
+                    reason="tracemalloc requires Python >= 3.4")
+def test_profiling_memory(tmpdir):
+    """
+    Memory allocations can optionally be traced.
+    """
+    import tracemalloc
+
+    db = find_and_open_files(DB)
+    source, receiver = _get_source_and_receiver(db)
+
+    profiler = db.enable_profiling(trace_memory=True)
+    assert tracemalloc.is_tracing()
+    db.get_seismograms(source=source, receiver=receiver)
+    results = profiler.get_results()
+    assert results["get_seismograms"]["allocated_bytes"] > 0
+
+    filename = str(tmpdir.join("profile.json"))
+    profiler.to_json(filename)
+    with open(filename, "rt") as fh:
+        assert json.load(fh) == json.loads(profiler.to_json())
+
+    db.disable_profiling()
+    assert not tracemalloc.is_tracing()
@@ -12,11 +12,12 @@ Tests for the receiver handling.
 from __future__ import absolute_import
 
 import io
+import numpy as np
 import obspy
 import os
 import pytest
 
-from instaseis import Receiver, ReceiverParseError
+from instaseis import Receiver, ReceiverArray, ReceiverParseError
 from instaseis.helpers import elliptic_to_geocentric_latitude
 
 DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
@@ -249,3 +250,125 @@ def test_invalid_lat_lng_values():
 
     with pytest.raises(ValueError):
         Receiver(latitude=10, longitude=-200)
+
+
+def test_receiver_array():
+    receivers = ReceiverArray(
+        latitudes=[10.0, 20.0, 10.0], longitudes=[30.0, 40.0, 30.0],
+        networks="XX", stations=[" A", "B", "A "], locations=None,
+        depths_in_m=[None, 5.0, None])
+    assert len(receivers) == 3
+    assert receivers.stations.dtype == np.dtype("U5")
+    assert receivers.networks.dtype == np.dtype("U2")
+    assert receivers.networks.tolist() == ["XX"] * 3
+    assert receivers.stations.tolist() == ["A", "B", "A"]
+
+    # Items are views behaving like normal receivers.
+    rec = receivers[1]
+    assert isinstance(rec, Receiver)
+    assert (rec.latitude, rec.longitude, rec.depth_in_m, rec.network,
+            rec.station, rec.location) == (20.0, 40.0, 5.0, "XX", "B", "")
+    assert receivers[-1].depth_in_m is None
+    assert rec.colatitude == 70.0
+    rec.station = "C"
+    assert receivers.stations[1] == "C"
+    assert [_i.station for _i in receivers] == ["A", "C", "A"]
+    with pytest.raises(IndexError):
+        receivers[3]
+
+    # Views compare equal to equal receivers and views.
+    assert receivers[0] == Receiver(latitude=10.0, longitude=30.0,
+                                    network="XX", station="A")
+    assert Receiver(latitude=10.0, longitude=30.0, network="XX",
+                    station="A") == receivers[0]
+    assert receivers[0] == receivers[2]
+    assert receivers[0] != receivers[1]
+    assert not receivers[0] != receivers[2]
+
+    # Slices and masks return new arrays.
+    assert receivers[1:].stations.tolist() == ["C", "A"]
+    assert receivers[receivers.latitudes > 15.0].stations.tolist() == ["C"]
+
+    # Round trip over independent receiver objects.
+    recs = receivers.to_receivers()
+    assert type(recs[0]) is Receiver
+    assert recs[0] == Receiver(latitude=10.0, longitude=30.0, network="XX",
+                               station="A")
+    assert ReceiverArray.from_receivers(recs).to_receivers() == recs
+
+    with pytest.raises(ValueError):
+        ReceiverArray(latitudes=[100.0], longitudes=[10.0])
+    with pytest.raises(ValueError):
+        ReceiverArray(latitudes=[10.0], longitudes=[-200.0])
+    with pytest.raises(ValueError):
+        ReceiverArray(latitudes=[10.0], longitudes=[10.0], stations="ABCDEF")
+    with pytest.raises(ValueError):
+        ReceiverArray(latitudes=[10.0, 20.0], longitudes=[10.0, 20.0],
+                      networks=["AB"])
+
+
+def test_receiver_array_unique():
+    """
+    Removes the same duplicates as Receiver.parse() does.
+    """
+    rng = np.random.RandomState(12345)
+    receivers = ReceiverArray(
+        latitudes=rng.choice([0.0, 10.0], 50),
+        longitudes=rng.choice([0.0, 10.0], 50),
+        networks=rng.choice(["A", "B"], 50),
+        stations=rng.choice(["X", "Y"], 50),
+        depths_in_m=rng.choice([np.nan, 0.0, 10.0], 50))
+
+    expected = []
+    for rec in receivers.to_receivers():
+        if rec not in expected:
+            expected.append(rec)
+    assert receivers.unique().to_receivers() == expected
+    assert len(expected) < 50
+
+    assert len(ReceiverArray(latitudes=[], longitudes=[]).unique()) == 0
+
+
+def test_parse_STATIONS_file_to_receiver_array(tmpdir):
+    filename = os.path.join(tmpdir.strpath, "STATIONS")
+    lines = (
+        "AAK        II       10.     20.   1645.0    30.0",
+        "BBK        AA       20.     30.   1645.0    30.0",
+        "AAK        II       10.     20.   1645.0    30.0"
+    )
+    with open(filename, "wt") as fh:
+        fh.write("\n".join(lines))
+
+    receivers = ReceiverArray.parse(filename)
+    assert isinstance(receivers, ReceiverArray)
+    assert len(receivers) == 2
+    np.testing.assert_allclose(
+        receivers.latitudes, [elliptic_to_geocentric_latitude(10.0),
+                              elliptic_to_geocentric_latitude(20.0)],
+        rtol=1E-14)
+    assert receivers.stations.tolist() == ["AAK", "BBK"]
+    assert [(_i.longitude, _i.network, _i.station) for _i in receivers] == \
+        [(_i.longitude, _i.network, _i.station)
+         for _i in Receiver.parse(filename)]
+
+    # The vectorized conversion agrees with the one of single values which
+    # is still used for single receivers.
+    lats = np.linspace(-89.9, 89.9, 37).round(4)
+    with open(filename, "wt") as fh:
+        fh.write("\n".join("S%03i XX %s 20. 0.0 0.0" % (_i, repr(_j))
+                           for _i, _j in enumerate(lats)))
+    expected = [elliptic_to_geocentric_latitude(float(_i)) for _i in lats]
+    np.testing.assert_allclose(ReceiverArray.parse(filename).latitudes,
+                               expected, rtol=1E-14)
+    assert [_i.latitude for _i in Receiver.parse(filename)] == expected
+
+    # Lines with a wrong number of values are not a STATIONS file.
+    with open(filename, "wt") as fh:
+        fh.write("\n".join(lines + ("CCK AA 10. 20. 0.0", "1.0")))
+    with pytest.raises(ValueError):
+        ReceiverArray._from_stations_file(filename)
+
+    # Everything else goes through Receiver.parse().
+    receivers = ReceiverArray.parse(os.path.join(DATA, "TA.Q56A..BH.xml"))
+    assert receivers.to_receivers() == Receiver.parse(
+        os.path.join(DATA, "TA.Q56A..BH.xml"))
@@ -13,7 +13,10 @@ from __future__ import absolute_import
 
 import copy
 import numpy as np
+import obspy
+import re
 import responses
+import threading
 import warnings
 import pytest
 
@@ -115,6 +118,14 @@ def test_seismogram_extraction(all_remote_dbs):
               "dt": 1.0, "kernelwidth": 6}
     _compare_streams(r_db, l_db, kwargs)
 
+    # All transfer formats must result in the same data.
+    kwargs = {"source": source, "receiver": receiver,
+              "components": components}
+    for transfer_format in ("miniseed", "raw32", "raw32z"):
+        r_db.transfer_format = transfer_format
+        _compare_streams(r_db, l_db, kwargs)
+    r_db.transfer_format = "raw32z"
+
     # Test force source.
     if "displ_only" in r_db._client.filepath:
         source = instaseis.ForceSource(
@@ -217,3 +228,233 @@ def test_source_depth_error_handling(all_remote_dbs):
         "Source is too shallow. Source would be located at a radius of "
         "6381000.0 meters. The database supports source radii from "
         "6000000.0 to 6371000.0 meters.")
+
+
+@responses.activate
+def test_concurrent_batch_extraction(all_remote_dbs):
+    """
+    Batches are requested concurrently but returned in order.
+    """
+    r_db = all_remote_dbs
+    l_db = instaseis.open_db(r_db._client.filepath)
+    assert r_db._http.max_concurrency == 8
+
+    # The mock server only handles one request at a time.
+    lock = threading.Lock()
+    threads = set()
+
+    def request_callback(request):
+        threads.add(threading.current_thread())
+        with lock:
+            req = r_db._client.fetch(request.path_url)
+        return (req.code, req.headers, req.body)
+
+    responses.add_callback(
+        responses.GET, re.compile(r"http://localhost.*"),
+        callback=request_callback,
+        content_type="application/octet_stream")
+
+    source = instaseis.Source(
+        latitude=4., longitude=3.0, depth_in_m=0, m_rr=4.71e+17, m_tt=3.81e+17,
+        m_pp=-4.74e+17, m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    receivers = instaseis.ReceiverArray(
+        latitudes=np.linspace(-40.0, 40.0, 12),
+        longitudes=np.linspace(-100.0, 100.0, 12))
+
+    r_streams = r_db.get_seismograms_batch(source, receivers, dt=2.0)
+    l_streams = l_db.get_seismograms_batch(source, receivers, dt=2.0)
+    assert len(threads) > 1
+    assert len(r_streams) == 12
+    for r_st, l_st in zip(r_streams, l_streams):
+        assert len(r_st) == len(l_st)
+        for r_tr, l_tr in zip(r_st, l_st):
+            assert r_tr.stats.__dict__ == l_tr.stats.__dict__
+            np.testing.assert_allclose(r_tr.data, l_tr.data,
+                                       atol=1E-6 * r_tr.data.ptp())
+
+    # Errors of the server are raised.
+    with mock.patch("instaseis.database_interfaces.http_session.time.sleep"):
+        responses.reset()
+        responses.add(responses.GET, re.compile(r"http://localhost.*"),
+                      status=503)
+        with pytest.raises(instaseis.InstaseisError) as err:
+            r_db.get_seismograms_batch(source, receivers[:3])
+    assert err.value.args[0].startswith("Status code 503 when downloading")
+
+
+@responses.activate
+def test_persistent_cache(all_remote_dbs, tmpdir):
+    """
+    Cached raw seismograms are used without any requests to the server as
+    long as the database on the server did not change.
+    """
+    r_db = all_remote_dbs
+    client = r_db._client
+    l_db = instaseis.open_db(client.filepath)
+    _add_callback(client)
+    url = "http://localhost:%i" % client.port
+
+    source = instaseis.Source(
+        latitude=4., longitude=3.0, depth_in_m=0, m_rr=4.71e+17, m_tt=3.81e+17,
+        m_pp=-4.74e+17, m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    receiver = instaseis.Receiver(latitude=10., longitude=20.)
+    components = r_db.available_components
+
+    c_db = instaseis.open_db(url, cache_dir=tmpdir.strpath)
+    st = c_db.get_seismograms(source=source, receiver=receiver,
+                              components=components)
+    assert c_db._cache.misses == 1
+    assert len(c_db._cache) == 1
+
+    # The cached information is revalidated but not downloaded again.
+    responses.calls.reset()
+    c_db = instaseis.open_db(url, cache_dir=tmpdir.strpath)
+    info_calls = [_i for _i in responses.calls
+                  if _i.request.url.endswith("/info")]
+    assert len(info_calls) == 1
+    assert info_calls[0].request.headers["If-None-Match"]
+    assert info_calls[0].response.status_code == 304
+    responses.calls.reset()
+    c_db.get_seismograms(source=source, receiver=receiver,
+                         components=components)
+    assert c_db._cache.hits == 1
+    assert len(responses.calls) == 0
+
+    # Without a server.
+    responses.reset()
+    with mock.patch("instaseis.database_interfaces.http_session.time.sleep"):
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            c_db = instaseis.open_db(url, cache_dir=tmpdir.strpath)
+    assert len(w) == 1
+    assert "Using the cached database information" in str(w[0].message)
+    assert c_db.info.npts == l_db.info.npts
+    assert c_db.info.datetime == l_db.info.datetime
+    np.testing.assert_allclose(c_db.info.slip, l_db.info.slip)
+    for kwargs in [{}, {"dt": 1.0, "kernelwidth": 6},
+                   {"remove_source_shift": False}]:
+        st_cached = c_db.get_seismograms(source=source, receiver=receiver,
+                                         components=components, **kwargs)
+        st_local = l_db.get_seismograms(source=source, receiver=receiver,
+                                        components=components, **kwargs)
+        for tr_cached, tr_local in zip(st_cached, st_local):
+            np.testing.assert_allclose(tr_cached.data, tr_local.data,
+                                       atol=1E-6 * tr_cached.data.ptp())
+    assert c_db._cache.hits == 3
+    for tr, tr_cached in zip(st, c_db.get_seismograms(
+            source=source, receiver=receiver, components=components)):
+        assert tr == tr_cached
+
+    # Uncached seismograms still need the server.
+    with mock.patch("instaseis.database_interfaces.http_session.time.sleep"):
+        with pytest.raises(Exception):
+            c_db.get_seismograms(source=source, components=components,
+                                 receiver=instaseis.Receiver(latitude=11.,
+                                                             longitude=20.))
+
+    # Cached seismograms of a database that changed on the server are not
+    # used anymore.
+    _add_callback(client)
+    info = copy.deepcopy(r_db._document["info"])
+    info["datetime"] = "2001-01-01T00:00:00.000000Z"
+
+    def _get(self):
+        self.write(info)
+
+    with mock.patch("instaseis.server.routes.info.InfoHandler.get", _get):
+        c_db = instaseis.open_db(url, cache_dir=tmpdir.strpath)
+    assert c_db.info.datetime == obspy.UTCDateTime(2001, 1, 1)
+    assert c_db._cache.get_document(url)["info"] == info
+    c_db.get_seismograms(source=source, receiver=receiver,
+                         components=components)
+    assert c_db._cache.hits == 0
+    assert c_db._cache.misses == 1
+
+
+@responses.activate
+def test_transfer_format_of_older_servers(all_remote_dbs):
+    """
+    Servers not listing the raw32 formats only get MiniSEED requests.
+    """
+    r_db = all_remote_dbs
+    client = r_db._client
+    _add_callback(client)
+    url = "http://localhost:%i" % client.port
+    assert r_db.transfer_format == "raw32z"
+    assert instaseis.open_db(url, transfer_format="raw32").transfer_format \
+        == "raw32"
+
+    def _get(self):
+        self.write({"type": "Instaseis Remote Server",
+                    "version": instaseis.__version__})
+
+    with mock.patch("instaseis.server.routes.index.IndexHandler.get", _get):
+        db = instaseis.open_db(url)
+    assert db.transfer_format == "miniseed"
+
+    responses.calls.reset()
+    st = db.get_seismograms(
+        source=instaseis.Source(latitude=4., longitude=3.0, depth_in_m=0,
+                                m_rr=4.71e+17),
+        receiver=instaseis.Receiver(latitude=10., longitude=20.),
+        components=r_db.available_components)
+    assert len(st) == len(r_db.available_components)
+    calls = [_i for _i in responses.calls
+             if "/seismograms_raw" in _i.request.url]
+    assert len(calls) == 1
+    assert "format=" not in calls[0].request.url
+
+    with pytest.raises(ValueError):
+        instaseis.open_db(url, transfer_format="sac")
+
+
+@responses.activate
+def test_async_remote_db(all_remote_dbs):
+    """
+    The asynchronous wrapper uses one worker per pooled connection.
+    """
+    asyncio = pytest.importorskip("asyncio")
+    from instaseis.database_interfaces.async_instaseis_db import \
+        AsyncInstaseisDB
+
+    r_db = all_remote_dbs
+    l_db = instaseis.open_db(r_db._client.filepath)
+
+    lock = threading.Lock()
+    threads = set()
+
+    def request_callback(request):
+        threads.add(threading.current_thread())
+        with lock:
+            req = r_db._client.fetch(request.path_url)
+        return (req.code, req.headers, req.body)
+
+    responses.add_callback(
+        responses.GET, re.compile(r"http://localhost.*"),
+        callback=request_callback,
+        content_type="application/octet_stream")
+
+    source = instaseis.Source(
+        latitude=4., longitude=3.0, depth_in_m=0, m_rr=4.71e+17, m_tt=3.81e+17,
+        m_pp=-4.74e+17, m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    receivers = instaseis.ReceiverArray(
+        latitudes=np.linspace(-40.0, 40.0, 12),
+        longitudes=np.linspace(-100.0, 100.0, 12))
+
+    loop = asyncio.new_event_loop()
+    async_db = AsyncInstaseisDB(r_db, loop=loop)
+    assert async_db.max_workers == r_db._http.max_concurrency
+    r_streams = loop.run_until_complete(async_db.get_seismograms_many(
+        source, receivers, dt=2.0))
+    async_db.close()
+    loop.close()
+    assert len(threads) > 1
+
+    l_streams = l_db.get_seismograms_batch(source, receivers, dt=2.0)
+    assert len(r_streams) == 12
+    for r_st, l_st in zip(r_streams, l_streams):
+        assert len(r_st) == len(l_st)
+        for r_tr, l_tr in zip(r_st, l_st):
+            assert r_tr.stats.__dict__ == l_tr.stats.__dict__
+            np.testing.assert_allclose(r_tr.data, l_tr.data,
+                                       atol=1E-6 * r_tr.data.ptp())
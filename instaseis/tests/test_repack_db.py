@@ -0,0 +1,493 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the database repacking script.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import absolute_import
+
+import os
+import subprocess
+import sys
+
+import h5py
+import numpy as np
+import pytest
+import scipy.signal
+
+import instaseis
+from instaseis.scripts.compare_dbs import get_misfit
+from instaseis.scripts.repack_db import (decimate, get_decimation,
+                                         get_element_order,
+                                         get_hilbert_keys, get_morton_keys,
+                                         quantize_snapshots)
+
+
+pytest.importorskip("netCDF4")
+pytest.importorskip("click")
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DB = os.path.join(DATA, "100s_db_bwd_displ_only")
+FILES = [os.path.join(DB, _i, "Data", "ordered_output.nc4")
+         for _i in ("PX", "PZ")]
+FWD_DB = os.path.join(DATA, "100s_db_fwd")
+FWD_FILES = [os.path.join(FWD_DB, _i, "Data", "ordered_output.nc4")
+             for _i in ("MZZ", "MXX_P_MYY", "MXZ_MYZ", "MXY_MXX_M_MYY")]
+
+# Depending on how the libraries have been built, netCDF4 might not be able
+# to write files once h5py has been imported so the merging runs in a
+# separate process.
+MERGE = """
+import netCDF4
+from instaseis.scripts.repack_db import merge_files, PROGRESS_ATTRIBUTE
+
+kwargs = dict(filenames=%(files)r, contiguous=False, compression_level=2,
+              quiet=True)
+
+if __name__ == "__main__":
+    merge_files(output_folder=%(serial)r, **kwargs)
+    # Small blocks to get many of them.
+    merge_files(output_folder=%(parallel)r, processes=2,
+                block_size_in_mb=0.05, **kwargs)
+
+    # Pretend the merging has been interrupted and resume it.
+    merge_files(output_folder=%(resumed)r, **kwargs)
+    with netCDF4.Dataset(%(resumed)r + "/merged_output.nc4", "a") as f:
+        f["MergedSnapshots"][50:] = 0.0
+        f.setncattr(PROGRESS_ATTRIBUTE, 50)
+    merge_files(output_folder=%(resumed)r, resume=True, block_size_in_mb=0.1,
+                **kwargs)
+
+    # Complete files cannot be resumed.
+    try:
+        merge_files(output_folder=%(resumed)r, resume=True, **kwargs)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError
+"""
+
+MERGE_ORDERED = """
+from instaseis.scripts.repack_db import merge_files
+
+if __name__ == "__main__":
+    merge_files(filenames=%(files)r, output_folder=%(folder)r,
+                contiguous=False, compression_level=2, quiet=True,
+                element_order="hilbert", elements_per_chunk=4)
+"""
+
+MERGE_QUANTIZED = """
+import netCDF4
+from instaseis.scripts.repack_db import merge_files, PROGRESS_ATTRIBUTE
+
+kwargs = dict(filenames=%(files)r, contiguous=False, compression_level=2,
+              quiet=True, quantize=True)
+
+if __name__ == "__main__":
+    error = merge_files(output_folder=%(folder)r, processes=2,
+                        block_size_in_mb=0.05, **kwargs)
+    assert 0 < error < 2E-5
+
+    merge_files(output_folder=%(resumed)r, **kwargs)
+    with netCDF4.Dataset(%(resumed)r + "/merged_output.nc4", "a") as f:
+        f.setncattr(PROGRESS_ATTRIBUTE, 50)
+    assert merge_files(output_folder=%(resumed)r, resume=True,
+                       **kwargs) == error
+
+    kwargs["filenames"] = %(fwd_files)r
+    merge_files(output_folder=%(fwd)r, **kwargs)
+"""
+
+DECIMATE = """
+import os
+from instaseis.scripts.repack_db import repack_file
+
+if __name__ == "__main__":
+    for filename in %(files)r:
+        component = os.path.basename(os.path.dirname(os.path.dirname(
+            filename)))
+        output = os.path.join(%(folder)r, component, "Data",
+                              "ordered_output.nc4")
+        os.makedirs(os.path.dirname(output))
+        repack_file(filename, output, contiguous=False, compression_level=2,
+                    transpose=%(transpose)r, quiet=True, dt=%(dt)r)
+"""
+
+EXTRACT = """
+import os
+import netCDF4
+from instaseis.scripts.repack_db import extract_region, get_region, \
+    merge_files
+
+if __name__ == "__main__":
+    with netCDF4.Dataset(%(files)r[0], "r") as f:
+        region = get_region(f, max_depth_in_km=100.0, max_colatitude=60.0)
+        try:
+            get_region(f, min_depth_in_km=1000.0)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError
+    assert region.min_radius == 6271.0
+    assert region.max_radius == 6371.0
+    assert region.min_colatitude == 0.0
+    assert region.max_colatitude == 60.0
+    outputs = []
+    for filename in %(files)r:
+        component = os.path.basename(os.path.dirname(os.path.dirname(
+            filename)))
+        output = os.path.join(%(folder)r, component, "Data",
+                              "ordered_output.nc4")
+        os.makedirs(os.path.dirname(output))
+        extract_region(filename, output, region=region, contiguous=False,
+                       compression_level=2, quiet=True)
+        outputs.append(output)
+    os.makedirs(%(merged)r)
+    merge_files(filenames=outputs, output_folder=%(merged)r,
+                contiguous=False, compression_level=2, quiet=True)
+"""
+
+
+def _get_env():
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(instaseis.__file__))] +
+        [_i for _i in [env.get("PYTHONPATH")] if _i])
+    # Click refuses to run with ASCII as the encoding of Python 3.
+    env["LC_ALL"] = env["LANG"] = "C.UTF-8"
+    return env
+
+
+def _run_script(tmpdir, script, **kwargs):
+    filename = os.path.join(tmpdir.strpath, "merge.py")
+    with open(filename, "wt") as fh:
+        fh.write(script % dict(files=FILES, **kwargs))
+    subprocess.check_call([sys.executable, filename], env=_get_env())
+
+
+def _compare_dbs(*args):
+    p = subprocess.Popen(
+        [sys.executable, "-m", "instaseis.scripts.compare_dbs"] +
+        list(args), env=_get_env(), stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT)
+    output = p.communicate()[0].decode()
+    return p.returncode, output
+
+
+def _assert_same_seismograms(folder):
+    db = instaseis.open_db(DB)
+    merged_db = instaseis.open_db(folder)
+    src = instaseis.Source(latitude=4., longitude=3.0, depth_in_m=0,
+                           m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                           m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    rec = instaseis.Receiver(latitude=10., longitude=20.)
+    for tr, tr_merged in zip(db.get_seismograms(src, rec),
+                             merged_db.get_seismograms(src, rec)):
+        np.testing.assert_allclose(tr.data, tr_merged.data, rtol=1E-6,
+                                   atol=1E-6 * np.abs(tr.data).max())
+
+
+def test_merge_in_parallel_and_resume(tmpdir):
+    """
+    Merging with multiple processes and resuming an interrupted merge
+    results in the same file as merging in one go.
+    """
+    folders = dict((_i, os.path.join(tmpdir.strpath, _i))
+                   for _i in ("serial", "parallel", "resumed"))
+    for folder in folders.values():
+        os.makedirs(folder)
+    _run_script(tmpdir, MERGE, **folders)
+
+    data = {}
+    for name, folder in folders.items():
+        with h5py.File(os.path.join(folder, "merged_output.nc4"), "r") as f:
+            assert "merge_next_element" not in f.attrs
+            data[name] = f["MergedSnapshots"][:]
+    np.testing.assert_array_equal(data["serial"], data["parallel"])
+    np.testing.assert_array_equal(data["serial"], data["resumed"])
+
+    # The merged database still produces the same seismograms as the
+    # original.
+    _assert_same_seismograms(folders["parallel"])
+    merged_db = instaseis.open_db(folders["parallel"])
+    assert merged_db.meshes.merged.element_order == "kdtree"
+
+
+def test_space_filling_curves():
+    x, y = np.meshgrid(np.arange(8), np.arange(8), indexing="ij")
+    x = x.ravel()
+    y = y.ravel()
+
+    # Interleaved bits with x in the lower bit.
+    np.testing.assert_array_equal(
+        get_morton_keys(x[:10], y[:10], order=3),
+        [0, 2, 8, 10, 32, 34, 40, 42, 1, 3])
+
+    # Every cell is visited once and consecutive cells are neighbours.
+    keys = get_hilbert_keys(x, y, order=3)
+    np.testing.assert_array_equal(np.sort(keys), np.arange(64))
+    order = np.argsort(keys)
+    steps = np.abs(np.diff(x[order])) + np.abs(np.diff(y[order]))
+    np.testing.assert_array_equal(steps, 1)
+
+
+def test_get_element_order():
+    s = np.array([1.0, 0.0, 3.0, 2.0, 0.5])
+    z = np.array([0.0, 2.0, 3.0, 1.0, 0.5])
+    for strategy in ("kdtree", "hilbert", "morton"):
+        order = get_element_order(s, z, strategy=strategy)
+        np.testing.assert_array_equal(np.sort(order), np.arange(5))
+
+    # Ties are broken along the Hilbert curve.
+    hilbert = get_element_order(s, z, strategy="hilbert")
+    counts = np.array([0, 5, 0, 5, 7])
+    order = get_element_order(s, z, strategy="frequency",
+                              access_counts=counts)
+    assert order[0] == 4
+    assert sorted(order[1:3]) == [1, 3]
+    np.testing.assert_array_equal(order[1:3],
+                                  [_i for _i in hilbert if _i in (1, 3)])
+    np.testing.assert_array_equal(order[3:],
+                                  [_i for _i in hilbert if _i in (0, 2)])
+
+    with pytest.raises(ValueError):
+        get_element_order(s, z, strategy="frequency")
+    with pytest.raises(ValueError):
+        get_element_order(s, z, strategy="frequency",
+                          access_counts=counts[:3])
+    with pytest.raises(ValueError):
+        get_element_order(s, z, strategy="random")
+
+
+def test_merge_with_element_order(tmpdir):
+    """
+    Merging along the Hilbert curve with multiple elements per chunk.
+    """
+    folder = os.path.join(tmpdir.strpath, "hilbert")
+    os.makedirs(folder)
+    _run_script(tmpdir, MERGE_ORDERED, folder=folder)
+
+    with h5py.File(os.path.join(folder, "merged_output.nc4"), "r") as f:
+        assert f["MergedSnapshots"].chunks[0] == 4
+        s = f["Mesh"]["mp_mesh_S"][:]
+        z = f["Mesh"]["mp_mesh_Z"][:]
+    # Already in order.
+    np.testing.assert_array_equal(
+        get_element_order(s, z, strategy="hilbert"), np.arange(len(s)))
+
+    _assert_same_seismograms(folder)
+    assert instaseis.open_db(folder).meshes.merged.element_order == \
+        "hilbert"
+
+
+def test_quantize_snapshots():
+    np.random.seed(12345)
+    data = np.random.randn(3, 2, 5, 5, 20).astype(np.float32)
+    data[0, 1] *= 1E-10
+    data[1, 0] += 10.0
+    # Constant fields are exact.
+    data[2, 1] = 4.2
+
+    quantized, scale, offset, error = quantize_snapshots(data)
+    assert quantized.dtype == np.int16
+    assert quantized.shape == data.shape
+    assert scale.shape == offset.shape == (3, 2)
+    assert np.abs(quantized).max() <= 32767
+
+    dequantized = quantized * scale[:, :, None, None, None] + \
+        offset[:, :, None, None, None]
+    diff = np.abs(dequantized - data)
+    np.testing.assert_allclose(diff.max(axis=(0, 2, 3, 4)), error)
+    # At most half a step plus some rounding.
+    assert np.all(diff.max(axis=(2, 3, 4)) <= 0.51 * scale)
+    assert diff[0, 1].max() < 1E-14
+    assert diff[2, 1].max() == 0.0
+
+
+def test_merge_quantized(tmpdir):
+    """
+    Quantized databases are half the size and produce seismograms that
+    are close to the original ones.
+    """
+    folder, resumed, fwd = [os.path.join(tmpdir.strpath, _i)
+                            for _i in ("quantized", "resumed", "fwd")]
+    for _i in (folder, resumed, fwd):
+        os.makedirs(_i)
+    _run_script(tmpdir, MERGE_QUANTIZED, folder=folder, resumed=resumed,
+                fwd=fwd, fwd_files=FWD_FILES)
+
+    filename = os.path.join(folder, "merged_output.nc4")
+    with h5py.File(filename, "r") as f:
+        assert f["MergedSnapshots"].dtype == np.int16
+        assert f["MergedSnapshotsScale"].shape == \
+            f["MergedSnapshots"].shape[:2]
+        data = f["MergedSnapshots"][:]
+        scale = f["MergedSnapshotsScale"][:]
+    with h5py.File(os.path.join(resumed, "merged_output.nc4"), "r") as f:
+        np.testing.assert_array_equal(f["MergedSnapshots"][:], data)
+        np.testing.assert_array_equal(f["MergedSnapshotsScale"][:], scale)
+    assert os.path.getsize(filename) < 0.6 * sum(
+        os.path.getsize(_i) for _i in FILES)
+
+    db = instaseis.open_db(DB)
+    merged_db = instaseis.open_db(folder)
+    mesh = merged_db.meshes.merged
+    assert mesh.is_quantized
+    assert 0 < mesh.quantization_error < 2E-5
+    assert not instaseis.open_db(DB).meshes.pz.is_quantized
+
+    src = instaseis.Source(latitude=4., longitude=3.0, depth_in_m=0,
+                           m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                           m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    receivers = instaseis.ReceiverArray(
+        latitudes=np.linspace(-40.0, 40.0, 5),
+        longitudes=np.linspace(-100.0, 100.0, 5))
+    # Also from the blocks read for batches.
+    for st, st_merged in zip(
+            db.get_seismograms_batch(src, receivers),
+            merged_db.get_seismograms_batch(src, receivers)):
+        assert get_misfit(st, st_merged) < 2E-2
+        assert get_misfit(st, st) == 0.0
+    with pytest.raises(ValueError):
+        get_misfit(st, st_merged[:1])
+
+    # Forward databases.
+    fwd_db = instaseis.open_db(fwd)
+    assert fwd_db.meshes.merged.is_quantized
+    src.depth_in_m = None
+    assert get_misfit(
+        instaseis.open_db(FWD_DB).get_seismograms(src, receivers[0]),
+        fwd_db.get_seismograms(src, receivers[0])) < 2E-2
+
+    # Only identical with a tolerance.
+    code, output = _compare_dbs("--seed", "12345", "--count", "2",
+                                "--tolerance", "2E-2", DB, folder)
+    assert code == 0, output
+    assert "is quantized" in output
+    assert output.count("misfit") == 2
+    code, output = _compare_dbs("--seed", "12345", "--count", "1", DB,
+                                folder)
+    assert code != 0
+    assert "AssertionError" in output
+
+
+def test_get_decimation():
+    decimation = get_decimation(dt=2.0, new_dt=6.0, period=20.0, npts=100,
+                                src_shift_samples=7)
+    assert decimation.factor == 3
+    # The peak of the source time function is still sampled.
+    assert decimation.start == 1
+    assert decimation.npts == 33
+
+    # Slightly inexact values are fine.
+    assert get_decimation(dt=2.0, new_dt=6.001, period=20.0, npts=100,
+                          src_shift_samples=7).factor == 3
+
+    # Low frequencies are retained, high ones are removed.
+    t = np.arange(100) * 2.0
+    data = np.array([np.sin(2 * np.pi * t / 40.0),
+                     np.sin(2 * np.pi * t / 4.5)], dtype=np.float32)
+    decimated = decimate(data, decimation, axis=1)
+    assert decimated.shape == (2, 33)
+    assert decimated.dtype == np.float32
+    np.testing.assert_allclose(decimated[0, 5:-5], data[0, 1::3][5:-5],
+                               atol=1E-2)
+    assert np.abs(decimated[1, 5:-5]).max() < 1E-2
+
+    with pytest.raises(ValueError) as err:
+        get_decimation(dt=2.0, new_dt=5.0, period=20.0, npts=100,
+                       src_shift_samples=7)
+    assert "must be a multiple" in err.value.args[0]
+    with pytest.raises(ValueError):
+        get_decimation(dt=2.0, new_dt=2.0, period=20.0, npts=100,
+                       src_shift_samples=7)
+    with pytest.raises(ValueError) as err:
+        get_decimation(dt=2.0, new_dt=10.0, period=20.0, npts=100,
+                       src_shift_samples=7)
+    assert "half the dominant source period" in err.value.args[0]
+
+
+@pytest.mark.parametrize("transpose", [False, True])
+def test_decimate_database(tmpdir, transpose):
+    """
+    Decimated databases produce the low-pass filtered seismograms of the
+    original database.
+    """
+    db = instaseis.open_db(DB)
+    folder = os.path.join(tmpdir.strpath, "decimated")
+    _run_script(tmpdir, DECIMATE, folder=folder, transpose=transpose,
+                dt=2.0 * db.info.dt)
+
+    decimated_db = instaseis.open_db(folder)
+    assert decimated_db.info.dt == pytest.approx(2.0 * db.info.dt)
+    assert decimated_db.info.npts == 36
+    assert decimated_db.info.src_shift_samples == 3
+    assert decimated_db.info.src_shift == pytest.approx(
+        6 * db.info.dt, rel=1E-6)
+    assert len(decimated_db.info.slip) == 36
+
+    decimation = get_decimation(
+        dt=db.info.dt, new_dt=decimated_db.info.dt, period=db.info.period,
+        npts=db.info.npts, src_shift_samples=db.info.src_shift_samples)
+    src = instaseis.Source(latitude=4., longitude=3.0, depth_in_m=10000,
+                           m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                           m_rt=3.99e+17, m_rp=-8.05e+17, m_tp=-1.23e+17)
+    rec = instaseis.Receiver(latitude=10., longitude=20.)
+    st = db.get_seismograms(src, rec)
+    st_decimated = decimated_db.get_seismograms(src, rec)
+    for tr, tr_decimated in zip(st, st_decimated):
+        assert tr.stats.starttime == tr_decimated.stats.starttime
+        assert tr_decimated.stats.delta == pytest.approx(2 * tr.stats.delta)
+        # The traces start at the origin time.
+        expected = scipy.signal.sosfiltfilt(decimation.sos, tr.data)[::2]
+        assert len(expected) == len(tr_decimated)
+        np.testing.assert_allclose(tr_decimated.data, expected, rtol=1E-2,
+                                   atol=1E-2 * np.abs(expected).max())
+
+
+def test_extract_region(tmpdir):
+    """
+    Databases limited to a depth range and a colatitude band produce the
+    same seismograms as the original inside of it.
+    """
+    folder = os.path.join(tmpdir.strpath, "extracted")
+    merged = os.path.join(tmpdir.strpath, "merged")
+    _run_script(tmpdir, EXTRACT, folder=folder, merged=merged)
+
+    db = instaseis.open_db(DB)
+    for path in (folder, merged):
+        extracted_db = instaseis.open_db(path)
+        assert extracted_db.info.min_radius == 6271.0 * 1E3
+        assert extracted_db.info.max_radius == 6371.0 * 1E3
+        assert extracted_db.info.min_d == 0.0
+        assert extracted_db.info.max_d == 60.0
+        if path == folder:
+            mesh = extracted_db.meshes.px
+            assert 0 < len(mesh.sem_mesh) < len(db.meshes.px.sem_mesh)
+            assert 0 < mesh.npoints < db.meshes.px.npoints
+            assert mesh.sem_mesh.max() == mesh.npoints - 1
+
+        src = instaseis.Source(latitude=4., longitude=3.0, depth_in_m=50000,
+                               m_rr=4.71e+17, m_tt=3.81e+17, m_pp=-4.74e+17,
+                               m_rt=3.99e+17, m_rp=-8.05e+17,
+                               m_tp=-1.23e+17)
+        rec = instaseis.Receiver(latitude=10., longitude=20.)
+        for tr, tr_extracted in zip(db.get_seismograms(src, rec),
+                                    extracted_db.get_seismograms(src, rec)):
+            np.testing.assert_allclose(tr_extracted.data, tr.data,
+                                       rtol=1E-6,
+                                       atol=1E-6 * np.abs(tr.data).max())
+
+        # Outside of the region.
+        src.depth_in_m = 200000.0
+        with pytest.raises(ValueError):
+            extracted_db.get_seismograms(src, rec)
+        src.depth_in_m = 50000.0
+        with pytest.raises(ValueError):
+            extracted_db.get_seismograms(
+                src, instaseis.Receiver(latitude=10., longitude=100.))
@@ -206,3 +206,119 @@ def test_coord_transform_lat_lon_depth_to_xyz_2():
 
     np.testing.assert_allclose(np.array([latitude, longitude, depth_in_m]),
                                np.array([lat, lon, dep]))
+
+
+def test_coord_transform_lat_lon_depth_to_xyz_batch():
+    latitude = np.array([23., -10., 80.])
+    longitude = np.array([32., 170., -20.])
+    depth_in_m = np.array([1100., 0., 50000.])
+    xyz = rotations.coord_transform_lat_lon_depth_to_xyz(
+        latitude, longitude, depth_in_m, planet_radius=6371e3)
+    assert xyz.shape == (3, 3)
+    for i in range(3):
+        np.testing.assert_allclose(
+            xyz[i], rotations.coord_transform_lat_lon_depth_to_xyz(
+                latitude[i], longitude[i], depth_in_m[i]))
+
+    lat, lon, dep = rotations.coord_transform_xyz_to_lat_lon_depth(
+        xyz[:, 0], xyz[:, 1], xyz[:, 2], planet_radius=6371e3)
+    np.testing.assert_allclose(lat, latitude)
+    np.testing.assert_allclose(lon, longitude)
+    np.testing.assert_allclose(dep, depth_in_m, atol=1E-6)
+
+
+def test_rotate_frame_rd_batch():
+    rng = np.random.RandomState(12345)
+    x, y, z = rng.randn(3, 10) * 6371e3
+    phi = rng.uniform(-180.0, 180.0, 10)
+    theta = rng.uniform(0.0, 180.0, 10)
+
+    s, p, zrd = rotations.rotate_frame_rd(x, y, z, phi, theta)
+    for i in range(10):
+        ref = rotations.rotate_frame_rd(x[i], y[i], z[i], phi[i], theta[i])
+        np.testing.assert_allclose([s[i], p[i], zrd[i]], ref)
+    assert np.all((p >= 0) & (p < 2 * np.pi))
+    # Scalars stay scalars.
+    assert np.isscalar(rotations.rotate_frame_rd(1.0, -2.0, 3.0, 0.0, 0.0)[1])
+
+
+def test_voigt_notation():
+    mt = np.array([1., 2., 3., 4., 5., 6.])
+    A = rotations.voigt_to_matrix(mt)
+    np.testing.assert_equal(A, [[1., 6., 5.], [6., 2., 4.], [5., 4., 3.]])
+    np.testing.assert_equal(rotations.matrix_to_voigt(A), mt)
+
+    mts = np.arange(12.0).reshape(2, 6)
+    assert rotations.voigt_to_matrix(mts).shape == (2, 3, 3)
+    np.testing.assert_equal(
+        rotations.matrix_to_voigt(rotations.voigt_to_matrix(mts)), mts)
+
+
+def test_rotation_matrices():
+    mt = np.array([1., 2., 3., 4., 5., 6.])
+    v = np.array([1., 2., 3.])
+    phi = np.radians(13.)
+    theta = np.radians(29.)
+
+    R = rotations.get_rotation_matrix_xyz_src_to_xyz_earth(phi, theta)
+    np.testing.assert_allclose(
+        rotations.rotate_symm_tensor_voigt(mt, R),
+        rotations.rotate_symm_tensor_voigt_xyz_src_to_xyz_earth(
+            mt, phi, theta), atol=1e-10)
+    np.testing.assert_allclose(
+        rotations.rotate_symm_tensor_voigt(mt, R.T),
+        rotations.rotate_symm_tensor_voigt_xyz_earth_to_xyz_src(
+            mt, phi, theta), atol=1e-10)
+    np.testing.assert_allclose(
+        rotations.rotate_vector(v, R),
+        rotations.rotate_vector_xyz_src_to_xyz_earth(v, phi, theta),
+        atol=1e-10)
+
+    R = rotations.get_rotation_matrix_xyz_to_src(phi)
+    np.testing.assert_allclose(
+        rotations.rotate_symm_tensor_voigt(mt, R),
+        rotations.rotate_symm_tensor_voigt_xyz_to_src(mt, phi), atol=1e-10)
+    np.testing.assert_allclose(
+        rotations.rotate_vector(v, R.T),
+        rotations.rotate_vector_src_to_xyz(v, phi), atol=1e-10)
+
+
+def test_composed_rotation_batch():
+    """
+    The composed rotation of a batch equals the three single rotations.
+    """
+    rng = np.random.RandomState(12345)
+    n = 20
+    srclon, reclon, phi = rng.uniform(0.0, 2.0 * np.pi, (3, n))
+    srccolat, reccolat = rng.uniform(0.0, np.pi, (2, n))
+    # Elements of vastly different magnitudes like real moment tensors.
+    mts = rng.randn(n, 6) * 10 ** rng.uniform(10.0, 20.0, (n, 6))
+    vecs = rng.randn(n, 3)
+
+    R = rotations.get_rotation_matrix_src_to_rec(
+        srclon, srccolat, reclon, reccolat, phi)
+    assert R.shape == (n, 3, 3)
+    # Orthogonal.
+    np.testing.assert_allclose(np.einsum("nij,nkj->nik", R, R),
+                               np.tile(np.eye(3), (n, 1, 1)), atol=1e-12)
+
+    mts_rot = rotations.rotate_symm_tensor_voigt(mts, R)
+    vecs_rot = rotations.rotate_vector(vecs, R)
+    assert mts_rot.shape == (n, 6)
+    assert vecs_rot.shape == (n, 3)
+
+    for i in range(n):
+        mij = rotations.rotate_symm_tensor_voigt_xyz_src_to_xyz_earth(
+            mts[i], srclon[i], srccolat[i])
+        mij = rotations.rotate_symm_tensor_voigt_xyz_earth_to_xyz_src(
+            mij, reclon[i], reccolat[i])
+        mij = rotations.rotate_symm_tensor_voigt_xyz_to_src(mij, phi[i])
+        np.testing.assert_allclose(mts_rot[i], mij,
+                                   atol=1e-14 * np.abs(mts[i]).max())
+
+        vec = rotations.rotate_vector_xyz_src_to_xyz_earth(
+            vecs[i], srclon[i], srccolat[i])
+        vec = rotations.rotate_vector_xyz_earth_to_xyz_src(
+            vec, reclon[i], reccolat[i])
+        vec = rotations.rotate_vector_xyz_to_src(vec, phi[i])
+        np.testing.assert_allclose(vecs_rot[i], vec, atol=1e-12)
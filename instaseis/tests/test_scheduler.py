@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the locality aware scheduling of source-receiver pairs.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import absolute_import
+
+import os
+
+import numpy as np
+import pytest
+
+from instaseis import (FiniteSource, Receiver, ReceiverArray, Source,
+                       open_db)
+from instaseis.database_interfaces.scheduler import LocalityScheduler
+
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+BWD = os.path.join(DATA, "100s_db_bwd_displ_only")
+BWD_STRAIN = os.path.join(DATA, "100s_db_bwd_strain_only")
+FWD = os.path.join(DATA, "100s_db_fwd")
+
+
+def _get_sources(count=40, seed=12345):
+    rng = np.random.RandomState(seed)
+    return [Source(latitude=rng.uniform(-80.0, 80.0),
+                   longitude=rng.uniform(-180.0, 180.0),
+                   depth_in_m=rng.uniform(0.0, 300000.0),
+                   m_rr=4.71e+17, m_tt=3.81e+15, m_pp=-4.74e+17,
+                   m_rt=3.99e+16, m_rp=-8.05e+16, m_tp=-1.23e+17)
+            for _ in range(count)]
+
+
+def _get_receivers(count=40, seed=12345):
+    rng = np.random.RandomState(seed)
+    return [Receiver(latitude=rng.uniform(-80.0, 80.0),
+                     longitude=rng.uniform(-180.0, 180.0))
+            for _ in range(count)]
+
+
+@pytest.mark.parametrize("path", [BWD, BWD_STRAIN, FWD])
+def test_order_is_bounded_permutation(path):
+    db = open_db(path)
+    if db.info.is_reciprocal:
+        pairs = [(_i, Receiver(latitude=10.0, longitude=20.0))
+                 for _i in _get_sources()]
+    else:
+        pairs = [(Source(latitude=0.0, longitude=0.0, m_rr=1E20), _i)
+                 for _i in _get_receivers()]
+
+    scheduler = LocalityScheduler(db, window=16)
+    windows = list(scheduler.iter_windows(pairs))
+    assert [len(_i) for _i in windows] == [16, 16, 8]
+    for _i, window in enumerate(windows):
+        assert sorted(window) == list(range(_i * 16, _i * 16 + len(window)))
+    order = scheduler.get_order(pairs)
+    assert order == sum(windows, [])
+    # Something actually got reordered.
+    assert order != list(range(len(pairs)))
+
+    # Pairs within a window are sorted by their keys.
+    keys = scheduler.get_keys(pairs[:16])
+    assert np.all(np.diff(keys[windows[0]]) >= 0)
+
+    # A window of one does not reorder anything.
+    assert LocalityScheduler(db, window=1).get_order(pairs) == \
+        list(range(len(pairs)))
+
+    # Identical pairs have identical keys.
+    keys = scheduler.get_keys([pairs[0], pairs[1], pairs[0]])
+    assert keys[0] == keys[2]
+
+    with pytest.raises(ValueError):
+        LocalityScheduler(db, window=0)
+
+
+def test_unparsed_pairs_and_databases_without_keys():
+    db = open_db(BWD)
+    receiver = Receiver(latitude=10.0, longitude=20.0)
+    sources = _get_sources(count=3)
+    # Pairs that still have to be parsed come first.
+    pairs = [(sources[0], receiver), ("source", receiver),
+             (sources[1], receiver)]
+    keys = LocalityScheduler(db).get_keys(pairs)
+    assert keys[1] == 0
+    assert keys[0] > 0 and keys[2] > 0
+    assert LocalityScheduler(db).get_order(pairs)[0] == 1
+
+    # Objects without locality information keep the original order.
+    scheduler = LocalityScheduler(object(), window=2)
+    assert scheduler.get_keys(pairs) is None
+    assert scheduler.get_order(pairs) == [0, 1, 2]
+    assert scheduler.map(lambda a, b: a, pairs) == [_i[0] for _i in pairs]
+
+
+@pytest.mark.parametrize("path", [BWD, FWD])
+def test_get_seismograms_batch(path):
+    db = open_db(path, read_on_demand=False, buffer_size_in_mb=10)
+    if db.info.is_reciprocal:
+        sources = _get_sources(count=20)
+        receivers = Receiver(latitude=10.0, longitude=20.0)
+        pairs = [(_i, receivers) for _i in sources]
+    else:
+        sources = Source(latitude=0.0, longitude=0.0, m_rr=1E20)
+        receivers = _get_receivers(count=20)
+        pairs = [(sources, _i) for _i in receivers]
+
+    streams = db.get_seismograms_batch(sources, receivers, window=8,
+                                       remove_source_shift=False)
+    assert len(streams) == 20
+    for st, (source, receiver) in zip(streams, pairs):
+        assert st == db.get_seismograms(source=source, receiver=receiver,
+                                        remove_source_shift=False)
+
+    # Receiver arrays are accepted as well.
+    if not db.info.is_reciprocal:
+        assert db.get_seismograms_batch(
+            sources, ReceiverArray.from_receivers(receivers), window=8,
+            remove_source_shift=False) == streams
+
+    # Lists of equal length are paired.
+    streams = db.get_seismograms_batch(
+        [_i[0] for _i in pairs[:3]], [_i[1] for _i in pairs[:3]])
+    assert len(streams) == 3
+
+    with pytest.raises(ValueError):
+        db.get_seismograms_batch([_i[0] for _i in pairs[:3]],
+                                 [_i[1] for _i in pairs[:2]])
+
+
+def test_scheduling_improves_buffer_reuse():
+    """
+    Interleaved pairs of two different locations are grouped so each
+    element is only read once.
+    """
+    receiver = Receiver(latitude=10.0, longitude=20.0)
+    sources = _get_sources(count=2)
+    pairs = [(sources[_i % 2], receiver) for _i in range(10)]
+
+    def _misses(window):
+        db = open_db(BWD, read_on_demand=False, buffer_size_in_mb=0.1)
+        LocalityScheduler(db, window=window).map(
+            lambda src, rec: db.get_seismograms(src, rec), pairs)
+        return db.meshes.px.strain_buffer.misses
+
+    assert _misses(window=10) == 2
+    assert _misses(window=1) == 10
+
+
+def test_finite_source_order_independent(monkeypatch):
+    db = open_db(BWD, read_on_demand=False)
+    finite_source = FiniteSource.from_Haskell(
+        latitude=10.0, longitude=10.0, depth_in_m=200000.0, strike=60.0,
+        dip=45.0, rake=90.0, M0=1E20, fault_length=500000.0,
+        fault_width=100000.0, rupture_velocity=2500.0, nl=10, nw=2,
+        trise=2.0 * db.info.dt, dt=db.info.dt)
+    finite_source.resample_sliprate(dt=db.info.dt, nsamp=db.info.npts)
+    receiver = Receiver(latitude=30.0, longitude=20.0)
+
+    sources = list(finite_source)
+    order = LocalityScheduler(db).get_order(
+        [(_i, receiver) for _i in sources])
+    assert order != list(range(len(sources)))
+
+    st = db.get_seismograms_finite_source(sources=sources,
+                                          receiver=receiver)
+    # Same result in the original order.
+    monkeypatch.setattr(LocalityScheduler, "get_order",
+                        lambda self, pairs: list(range(len(pairs))))
+    st_unordered = db.get_seismograms_finite_source(sources=sources,
+                                                    receiver=receiver)
+    for tr, tr_unordered in zip(st, st_unordered):
+        np.testing.assert_allclose(
+            tr.data, tr_unordered.data, rtol=1E-6,
+            atol=1E-6 * np.abs(tr.data).max())
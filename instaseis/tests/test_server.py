@@ -21,11 +21,15 @@ import numpy as np
 from scipy.integrate import simps
 import pytest
 from .tornado_testing_fixtures import *  # NOQA
-from .tornado_testing_fixtures import _assemble_url
+from .tornado_testing_fixtures import (_assemble_url, create_async_client, DBS,
+                                       station_coordinates_mock_callback)
 
 import instaseis
 from instaseis.helpers import geocentric_to_elliptic_latitude
 from instaseis.server import util
+from instaseis.server.admission import AdmissionController, \
+    AdmissionError, estimate_cost
+from instaseis.server.metrics import Histogram
 
 # Conditionally import mock either from the stdlib or as a separate library.
 import sys
@@ -53,7 +57,8 @@ def test_root_route(all_clients):
     assert request.code == 200
     result = json.loads(str(request.body.decode("utf8")))
     assert result == {
-        "type": "Instaseis Remote Server", "version": instaseis.__version__}
+        "type": "Instaseis Remote Server", "version": instaseis.__version__,
+        "formats": ["miniseed", "raw32", "raw32z"]}
     assert request.headers["Content-Type"] == "application/json; charset=UTF-8"
 
 
@@ -847,6 +852,73 @@ def test_seismograms_raw_route(all_clients):
         assert tr.stats.location == "XX"
 
 
+def test_raw32_formats(all_clients):
+    """
+    The raw32 formats must contain the same data as the MiniSEED files,
+    just more precise and cheaper to generate.
+    """
+    client = all_clients
+
+    params = {
+        "sourcelatitude": 10, "sourcelongitude": 10,
+        "receiverlatitude": -10, "receiverlongitude": -10,
+        "mtt": "100000", "mpp": "200000", "mrr": "300000",
+        "mrt": "400000", "mrp": "500000", "mtp": "600000",
+        "networkcode": "BW", "stationcode": "ALTM"}
+
+    request = client.fetch(_assemble_url('seismograms_raw', **params))
+    assert request.code == 200
+    assert request.headers["Content-Type"] == "application/vnd.fdsn.mseed"
+    st_mseed = obspy.read(request.buffer)
+    mu = float(request.headers["Instaseis-Mu"])
+
+    for fmt in ("raw32", "raw32z"):
+        request = client.fetch(_assemble_url('seismograms_raw', format=fmt,
+                                             **params))
+        assert request.code == 200
+        assert request.headers["Content-Type"] == \
+            "application/vnd.instaseis.%s" % fmt
+        assert request.headers["Content-Disposition"].endswith(fmt)
+        st = instaseis.helpers.read_raw32(request.body)
+        assert len(st) == len(st_mseed)
+        for tr, tr_mseed in zip(st, st_mseed):
+            assert tr.id == tr_mseed.id
+            assert tr.stats.starttime == tr_mseed.stats.starttime
+            assert tr.stats.npts == tr_mseed.stats.npts
+            np.testing.assert_allclose(tr.stats.delta, tr_mseed.stats.delta,
+                                       rtol=1E-6)
+            np.testing.assert_allclose(tr.stats.instaseis.mu, mu, rtol=1E-6)
+            np.testing.assert_array_equal(tr.data, tr_mseed.data)
+
+    # SAC zip files are not available for the raw route.
+    request = client.fetch(_assemble_url('seismograms_raw', format="saczip",
+                                         **params))
+    assert request.code == 400
+    assert request.reason == ("Format must be one of 'miniseed', 'raw32', "
+                              "'raw32z'.")
+
+    # Same for the main seismograms route.
+    params = {
+        "sourcelatitude": 10, "sourcelongitude": 10,
+        "sourcedepthinmeters": client.source_depth,
+        "receiverlatitude": -10, "receiverlongitude": -10,
+        "sourcemomenttensor": "100000,100000,100000,100000,100000,100000",
+        "format": "miniseed"}
+    request = client.fetch(_assemble_url('seismograms', **params))
+    assert request.code == 200
+    st_mseed = obspy.read(request.buffer)
+
+    params["format"] = "raw32z"
+    request = client.fetch(_assemble_url('seismograms', **params))
+    assert request.code == 200
+    st = instaseis.helpers.read_raw32(request.body)
+    assert len(st) == len(st_mseed)
+    for tr, tr_mseed in zip(st, st_mseed):
+        assert tr.id == tr_mseed.id
+        assert tr.stats.starttime == tr_mseed.stats.starttime
+        np.testing.assert_array_equal(tr.data, tr_mseed.data)
+
+
 def test_mu_is_passed_as_header_value(all_clients):
     """
     Makes sure mu is passed as a header value.
@@ -2349,6 +2421,18 @@ def test_gzipped_responses(all_clients_all_callbacks):
     assert request.code == 200
     assert "X-Consumed-Content-Encoding" not in request.headers
 
+    # Uncompressed raw32 data does get gzipped if large enough...
+    request = client.fetch(_assemble_url('seismograms_raw', format="raw32",
+                                         **params), use_gzip=True)
+    assert request.code == 200
+    if len(request.body) >= 1024:
+        assert request.headers["X-Consumed-Content-Encoding"] == "gzip"
+    # ...but not if it has already been compressed.
+    request = client.fetch(_assemble_url('seismograms_raw', format="raw32z",
+                                         **params), use_gzip=True)
+    assert request.code == 200
+    assert "X-Consumed-Content-Encoding" not in request.headers
+
     # standard seismograms route
     params = {
         "sourcelatitude": 10,
@@ -3156,6 +3240,47 @@ def test_multiple_seismograms_retrieval_saczip_format(
                                        atol=1E-10 * tr_server.data.ptp())
 
 
+def test_station_coordinates_callback_returning_receiver_array():
+    """
+    The station coordinates callback can also return a receiver array.
+    """
+    def _callback(networks, stations):
+        coordinates = station_coordinates_mock_callback(networks, stations)
+        if not coordinates:
+            return instaseis.ReceiverArray(latitudes=[], longitudes=[])
+        return instaseis.ReceiverArray(
+            latitudes=[_i["latitude"] for _i in coordinates],
+            longitudes=[_i["longitude"] for _i in coordinates],
+            networks=[_i["network"] for _i in coordinates],
+            stations=[_i["station"] for _i in coordinates],
+            depths_in_m=0.0)
+
+    path = DBS["db_bwd_displ_only"]
+    client = create_async_client(
+        path, station_coordinates_callback=station_coordinates_mock_callback)
+    client_array = create_async_client(
+        path, station_coordinates_callback=_callback)
+
+    params = {
+        "sourcelatitude": 10, "sourcelongitude": 10, "sourcedepthinmeters": 0,
+        "sourcemomenttensor": "100000,100000,100000,100000,100000,100000",
+        "network": "IU,B*", "station": "ANT*,ANM?", "format": "miniseed"}
+    streams = []
+    for c in (client, client_array):
+        request = c.fetch(_assemble_url('seismograms', **params))
+        assert request.code == 200
+        streams.append(obspy.read(request.buffer).sort())
+    assert len(streams[0]) == 6
+    _compare_streams(*streams)
+
+    for url in ["/coordinates?network=IU,B*&station=ANT*,ANM?",
+                "/coordinates?network=BW&station=FURT"]:
+        request = client.fetch(url)
+        request_array = client_array.fetch(url)
+        assert request.code == request_array.code
+        assert request.body == request_array.body
+
+
 def test_multiple_seismograms_retrieval_invalid_format(
         all_clients_station_coordinates_callback):
     """
@@ -3173,7 +3298,8 @@ def test_multiple_seismograms_retrieval_invalid_format(
 
     request = client.fetch(_assemble_url('seismograms', **params))
     assert request.code == 400
-    assert request.reason == "Format must either be 'miniseed' or 'saczip'."
+    assert request.reason == ("Format must be one of 'miniseed', 'saczip', "
+                              "'raw32', 'raw32z'.")
 
 
 def test_multiple_seismograms_retrieval_no_stations(
@@ -5101,3 +5227,332 @@ def test_sourcewidth_parameter(all_clients):
         d = st.select(component=comp)[0].data
         d_re = st_re.select(component=comp)[0].data
         assert np.abs(np.fft.rfft(d)).sum() > np.abs(np.fft.rfft(d_re)).sum()
+
+
+def test_seismograms_bulk_route(all_clients):
+    """
+    Test the bulk route. Each job must return the same data as a direct
+    extraction from the database, no matter in which order they are sent.
+    """
+    client = all_clients
+    db = instaseis.open_db(client.filepath, read_on_demand=True)
+
+    from instaseis.server.routes.seismograms_bulk import unpack_bulk_response
+
+    mt = {"mtt": 100000, "mpp": 200000, "mrr": 300000,
+          "mrt": 400000, "mrp": 500000, "mtp": 600000}
+    jobs = []
+    for lat in [-10, 20, -30]:
+        job = {"sourcelatitude": lat, "sourcelongitude": 10,
+               "sourcedepthinmeters": client.source_depth,
+               "receiverlatitude": 0, "receiverlongitude": 50,
+               "networkcode": "BW", "stationcode": "A%i" % len(jobs)}
+        job.update(mt)
+        jobs.append(job)
+    # Different units and sampling rates.
+    jobs[1]["units"] = "DISPLACEMENT"
+    jobs[2]["dt"] = db.info.dt / 2.0
+    # One invalid job in between.
+    jobs.insert(1, {"sourcelatitude": 10, "sourcelongitude": 10,
+                    "receiverlatitude": 0, "receiverlongitude": 50})
+    body = "\n".join(json.dumps(_i) for _i in jobs).encode()
+
+    request = client.fetch("/seismograms_bulk", method="POST", body=body)
+    assert request.code == 200
+    assert request.headers["Content-Type"] == "application/octet-stream"
+    assert request.headers["Instaseis-Bulk-Jobs"] == "4"
+
+    # The payloads can also be requested in the raw32 format.
+    request_raw32 = client.fetch("/seismograms_bulk?format=raw32z",
+                                 method="POST", body=body)
+    assert request_raw32.code == 200
+    raw32_records = dict((_i[0]["index"], _i) for _i in
+                         unpack_bulk_response(request_raw32.body))
+
+    records = unpack_bulk_response(request.body)
+    assert sorted(_i[0]["index"] for _i in records) == [0, 1, 2, 3]
+    records = dict((_i[0]["index"], _i) for _i in records)
+
+    header, payload = records[1]
+    assert header["status"] == 400
+    assert header["message"] == "No/insufficient source parameters specified"
+    assert payload == b""
+
+    for index in [0, 2, 3]:
+        header, payload = records[index]
+        assert header["status"] == 200
+        assert "mu" in header
+
+        job = jobs[index]
+        source = instaseis.Source(
+            latitude=job["sourcelatitude"], longitude=job["sourcelongitude"],
+            depth_in_m=job["sourcedepthinmeters"],
+            m_rr=job["mrr"], m_tt=job["mtt"], m_pp=job["mpp"],
+            m_rt=job["mrt"], m_rp=job["mrp"], m_tp=job["mtp"],
+            origin_time=obspy.UTCDateTime(0))
+        receiver = instaseis.Receiver(
+            latitude=job["receiverlatitude"],
+            longitude=job["receiverlongitude"],
+            network=job["networkcode"], station=job["stationcode"])
+        st_db = db.get_seismograms(
+            source=source, receiver=receiver,
+            dt=job.get("dt", None),
+            remove_source_shift=False, reconvolve_stf=False)
+
+        st = obspy.read(io.BytesIO(payload))
+        assert len(st) == len(db.default_components)
+        st_raw32 = instaseis.helpers.read_raw32(raw32_records[index][1])
+        for tr, tr_raw32 in zip(st, st_raw32):
+            np.testing.assert_array_equal(tr.data, tr_raw32.data)
+        np.testing.assert_allclose(header["mu"], st_db[0].stats.instaseis.mu,
+                                   rtol=1E-5)
+        for tr, tr_db in zip(st, st_db):
+            # MiniSEED cannot store arbitrary sampling rates.
+            assert tr.id == tr_db.id
+            assert abs(tr.stats.starttime - tr_db.stats.starttime) < 1E-3
+            np.testing.assert_allclose(tr.stats.delta, tr_db.stats.delta,
+                                       rtol=1E-6)
+            np.testing.assert_allclose(tr.data, tr_db.data,
+                                       rtol=1E-5, atol=1E-6 * abs(
+                                           tr_db.data).max())
+
+
+def test_seismograms_bulk_route_error_handling(all_clients):
+    """
+    Tests errors of the bulk route affecting the request as a whole and
+    errors of single jobs.
+    """
+    client = all_clients
+
+    from instaseis.server.routes.seismograms_bulk import unpack_bulk_response
+
+    request = client.fetch("/seismograms_bulk", method="POST", body=b"")
+    assert request.code == 400
+    assert request.reason == ("The jobs must be given in the body of the "
+                              "POST request.")
+
+    request = client.fetch("/seismograms_bulk", method="POST",
+                           body=b"\n  \n")
+    assert request.code == 400
+    assert request.reason == "The body of the POST request contains no jobs."
+
+    request = client.fetch("/seismograms_bulk", method="POST",
+                           body=b'{"sourcelatitude": 1}\n{abc')
+    assert request.code == 400
+    assert request.reason == "Line 2 of the body is not valid JSON."
+
+    request = client.fetch("/seismograms_bulk?random=1", method="POST",
+                           body=b'{"sourcelatitude": 1}')
+    assert request.code == 400
+    assert request.reason == ("The following unknown parameters have been "
+                              "passed: 'random'")
+
+    client.application.max_size_of_bulk_requests = 2
+    request = client.fetch("/seismograms_bulk", method="POST",
+                           body=b"{}\n{}\n{}")
+    assert request.code == 400
+    assert request.reason == ("The server only allows bulk requests with at "
+                              "most 2 jobs.")
+    client.application.max_size_of_bulk_requests = 10000
+
+    basic = {"sourcelatitude": 10, "sourcelongitude": 10,
+             "sourcedepthinmeters": client.source_depth,
+             "receiverlatitude": -10, "receiverlongitude": -10,
+             "strike": 10, "dip": 20, "rake": 30, "M0": 1E19}
+    jobs = [
+        [],
+        dict(basic, random=2),
+        dict(basic, dt="a"),
+        {"sourcelatitude": 10},
+        dict(basic, components=""),
+        dict(basic, units="random"),
+        dict(basic, dt=0.001),
+        dict(basic, dt=1000.0),
+        dict(basic, kernelwidth=0),
+        dict(basic, receiverlatitude=100),
+        dict(basic, sourcedepthinmeters=-1E6)]
+    messages = [
+        "Each job must be a JSON object.",
+        "The following unknown parameters have been passed: 'random'",
+        "Parameter 'dt' could not be converted to 'float'.",
+        "Required parameter 'sourcelongitude' not given.",
+        "A request with no components will not return anything...",
+        "Unit must be one of 'displacement', 'velocity', or 'acceleration'",
+        "The smallest possible dt is 0.01. Please choose a smaller value "
+        "and resample locally if needed.",
+        "Cannot downsample. The sampling interval of the database is "
+        "%.5f seconds. Make sure to choose a smaller or equal one." %
+        client.info.dt,
+        "`kernelwidth` must not be smaller than 1 or larger than 20.",
+        "Could not construct receiver with passed parameters. Check "
+        "parameters for sanity."]
+
+    body = "\n".join(json.dumps(_i) for _i in jobs).encode()
+    request = client.fetch("/seismograms_bulk", method="POST", body=body)
+    assert request.code == 200
+    records = dict((_i[0]["index"], _i[0])
+                   for _i in unpack_bulk_response(request.body))
+    assert len(records) == len(jobs)
+    for _i, message in enumerate(messages):
+        assert records[_i]["status"] == 400
+        assert records[_i]["message"] == message
+    # The invalid depth is caught by the geometry validation.
+    assert records[len(jobs) - 1]["status"] == 400
+    assert "depth" in records[len(jobs) - 1]["message"]
+
+
+def test_admission_controller():
+    """
+    Tests the token buckets of the admission controller with a fake clock.
+    """
+    now = [0.0]
+    controller = AdmissionController(
+        global_budget=1000, global_refill_rate=100, client_budget=500,
+        client_refill_rate=10, clock=lambda: now[0])
+
+    headers = controller.admit(client="a", cost=400)
+    assert headers["Instaseis-Request-Cost"] == "400"
+    assert headers["Instaseis-Budget-Remaining"] == "100"
+    assert headers["Instaseis-Budget-Capacity"] == "500"
+
+    # Client "a" has to wait for its own budget, client "b" does not.
+    with pytest.raises(AdmissionError) as e:
+        controller.admit(client="a", cost=200)
+    assert e.value.status_code == 429
+    assert e.value.headers["Retry-After"] == "10"
+    controller.admit(client="b", cost=500)
+
+    # Now the global budget is exhausted.
+    with pytest.raises(AdmissionError) as e:
+        controller.admit(client="c", cost=200)
+    assert e.value.headers["Retry-After"] == "1"
+
+    now[0] = 10.0
+    controller.admit(client="a", cost=200)
+
+    # Requests exceeding the capacity will never be admitted.
+    with pytest.raises(AdmissionError) as e:
+        controller.admit(client="d", cost=501)
+    assert "Retry-After" not in e.value.headers
+    assert e.value.reason.startswith(
+        "The estimated cost of the request (501) exceeds the budget")
+
+
+def test_estimate_cost(all_clients):
+    """
+    The cost scales with the number of seismograms and samples.
+    """
+    db = all_clients.application.db
+    info = db.info
+    cost = estimate_cost(db, receivers=1, components=1)
+    assert cost >= info.npts
+    assert estimate_cost(db, receivers=1, components=3) - cost == \
+        2 * info.npts
+    assert estimate_cost(db, receivers=1, components=1, sources=4) > cost
+    assert estimate_cost(db, receivers=1, components=1,
+                         dt=info.dt / 2.0) > cost
+
+
+def test_admission_control_in_routes(all_clients):
+    """
+    Requests exceeding the budget are rejected with HTTP 429.
+    """
+    client = all_clients
+    db = client.application.db
+    cost = estimate_cost(db, receivers=1, components=1)
+
+    params = {
+        "sourcelatitude": 10, "sourcelongitude": 10,
+        "receiverlatitude": -10, "receiverlongitude": -10,
+        "mtt": "100000", "mpp": "200000", "mrr": "300000",
+        "mrt": "400000", "mrp": "500000", "mtp": "600000",
+        "components": db.default_components[0],
+        "sourcedepthinmeters": client.source_depth}
+
+    client.application.admission_controller = AdmissionController(
+        client_budget=1.5 * cost, client_refill_rate=1E-3)
+    try:
+        request = client.fetch(_assemble_url('seismograms_raw', **params))
+        assert request.code == 200
+        assert int(request.headers["Instaseis-Request-Cost"]) <= cost
+        assert "Instaseis-Budget-Remaining" in request.headers
+
+        request = client.fetch(_assemble_url('seismograms_raw', **params))
+        assert request.code == 429
+        assert int(request.headers["Retry-After"]) > 0
+        assert "Instaseis-Request-Cost" in request.headers
+        assert request.reason.startswith("Budget exceeded.")
+
+        # Requests more expensive than the budget itself.
+        client.application.admission_controller = AdmissionController(
+            global_budget=cost / 2.0)
+        request = client.fetch(_assemble_url('seismograms_raw', **params))
+        assert request.code == 429
+        assert "Retry-After" not in request.headers
+    finally:
+        client.application.admission_controller = None
+
+
+def test_metrics_histogram():
+    """
+    Histogram buckets are cumulative.
+    """
+    hist = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        hist.observe(value)
+    assert hist.get_lines("a", [("b", "c")]) == [
+        'a_bucket{b="c",le="0.1"} 2',
+        'a_bucket{b="c",le="1.0"} 3',
+        'a_bucket{b="c",le="+Inf"} 4',
+        'a_sum{b="c"} 2.65',
+        'a_count{b="c"} 4']
+
+
+def test_metrics_route(all_clients):
+    """
+    Tests the /metrics route after some requests.
+    """
+    client = all_clients
+    params = {
+        "sourcelatitude": 10, "sourcelongitude": 10,
+        "receiverlatitude": -10, "receiverlongitude": -10,
+        "mtt": "100000", "mpp": "200000", "mrr": "300000",
+        "mrt": "400000", "mrp": "500000", "mtp": "600000",
+        "sourcedepthinmeters": client.source_depth}
+    for _ in range(2):
+        request = client.fetch(_assemble_url('seismograms_raw', **params))
+        assert request.code == 200
+    request = client.fetch(_assemble_url('seismograms_raw', random=1))
+    assert request.code == 400
+
+    request = client.fetch("/metrics")
+    assert request.code == 200
+    assert request.headers["Content-Type"] == "text/plain; version=0.0.4"
+    lines = request.body.decode().splitlines()
+    values = dict(_i.rsplit(" ", 1) for _i in lines
+                  if not _i.startswith("#"))
+
+    assert values['instaseis_requests_total{handler="RawSeismogramsHandler",'
+                  'method="GET",code="200"}'] == "2"
+    assert values['instaseis_requests_total{handler="RawSeismogramsHandler",'
+                  'method="GET",code="400"}'] == "1"
+    assert values['instaseis_request_duration_seconds_count'
+                  '{handler="RawSeismogramsHandler"}'] == "3"
+
+    # Not all databases require all stages.
+    for stage in ("element_lookup", "hdf5_read", "serialization"):
+        assert values['instaseis_stage_duration_seconds_count'
+                      '{stage="%s"}' % stage] != "0"
+    assert int(values["instaseis_disk_read_bytes_total"]) > 0
+    assert "instaseis_async_threads" in values
+    assert values["instaseis_job_queue_depth"] == "0"
+
+    # The second request is served from the buffers.
+    db = client.application.db
+    hits = [int(value) for key, value in values.items()
+            if key.startswith("instaseis_buffer_hits_total")]
+    assert len(hits) == 2 * len([_i for _i in db.meshes if _i])
+    assert sum(hits) >= 1
+    sizes = [int(value) for key, value in values.items()
+             if key.startswith("instaseis_buffer_size_bytes")]
+    assert sum(sizes) > 0
@@ -13,7 +13,9 @@ from __future__ import absolute_import
 
 import copy
 import io
+import json
 import os
+import time
 import zipfile
 
 import obspy
@@ -685,3 +687,201 @@ def test_uploading_file_with_too_many_sources(reciprocal_clients):
     assert request.reason == ("The server only allows finite sources with at "
                               "most 17 points sources. The source in question "
                               "has 121 points.")
+
+
+def _wait_for_job(client, url, timeout=30.0):
+    """
+    Helper function polling a job until it is no longer queued or running.
+    """
+    start = time.time()
+    while True:
+        request = client.fetch(url)
+        if request.code != 202:
+            return request
+        assert request.headers["Instaseis-Job-Status"] in ("queued",
+                                                           "running")
+        assert 0.0 <= float(request.headers["Instaseis-Job-Progress"]) <= 1.0
+        assert time.time() - start < timeout
+        time.sleep(0.05)
+
+
+def test_finite_source_job(reciprocal_clients):
+    """
+    The results of the job API must be identical to the ones of the direct
+    route.
+    """
+    client = reciprocal_clients
+
+    params = {
+        "receiverlongitude": 11,
+        "receiverlatitude": 22,
+        "receiverdepthinmeters": 0,
+        "format": "miniseed"}
+
+    with io.open(USGS_PARAM_FILE_1, "rb") as fh:
+        body = fh.read()
+
+    request = client.fetch(_assemble_url('finite_source', **params),
+                           method="POST", body=body)
+    assert request.code == 200
+    st_direct = obspy.read(request.buffer)
+
+    request = client.fetch(_assemble_url('jobs/finite_source', **params),
+                           method="POST", body=body)
+    assert request.code == 202
+    job = json.loads(request.body.decode())
+    assert job["status"] in ("queued", "running", "finished")
+    assert request.headers["Location"] == "/jobs/%s" % job["id"]
+
+    request = _wait_for_job(client, request.headers["Location"])
+    assert request.code == 200
+    assert request.headers["Instaseis-Job-Status"] == "finished"
+    assert float(request.headers["Instaseis-Job-Progress"]) == 1.0
+    assert request.headers["Content-Type"] == "application/vnd.fdsn.mseed"
+    assert "Instaseis-Job-Expires" in request.headers
+    assert request.headers["Content-Disposition"].startswith(
+        "attachment; filename=instaseis_finite_source_seismogram_")
+    st_job = obspy.read(request.buffer)
+
+    assert len(st_job) == len(st_direct)
+    for tr_job, tr_direct in zip(st_job, st_direct):
+        assert tr_job.stats == tr_direct.stats
+        np.testing.assert_array_equal(tr_job.data, tr_direct.data)
+
+    # Can be downloaded again until the result expires.
+    url = "/jobs/%s" % job["id"]
+    assert client.fetch(url).body == request.body
+    client.application.job_manager.ttl_in_s = 0.0
+    request = client.fetch(url)
+    assert request.code == 404
+    assert request.reason == "Job not found. It might have expired."
+
+
+def test_finite_source_job_error_handling(reciprocal_clients):
+    """
+    Errors are either reported directly or once the job has failed.
+    """
+    client = reciprocal_clients
+
+    params = {
+        "receiverlongitude": 11,
+        "receiverlatitude": 22,
+        "format": "saczip"}
+
+    request = client.fetch("/jobs/abcdef")
+    assert request.code == 404
+    assert request.reason == "Job not found. It might have expired."
+
+    # Errors in the parameters or the body are reported directly.
+    request = client.fetch(_assemble_url('jobs/finite_source', format="bogus",
+                                         receiverlongitude=11,
+                                         receiverlatitude=22),
+                           method="POST", body=b"")
+    assert request.code == 400
+    assert request.reason.startswith("Format must be one of")
+
+    with io.open(USGS_PARAM_FILE_EMPTY, "rb") as fh:
+        body = fh.read()
+    request = client.fetch(_assemble_url('jobs/finite_source', **params),
+                           method="POST", body=body)
+    assert request.code == 400
+    assert request.reason.startswith("The body contents could not be parsed")
+
+    # Errors during the calculation.
+    with io.open(USGS_PARAM_FILE_1, "rb") as fh:
+        body = fh.read()
+    with mock.patch.object(client.application.db,
+                           "get_seismograms_finite_source") as p:
+        p.side_effect = ValueError("random crash")
+        request = client.fetch(_assemble_url('jobs/finite_source', **params),
+                               method="POST", body=body)
+        assert request.code == 202
+        request = _wait_for_job(client, request.headers["Location"])
+    assert request.code == 400
+    assert request.reason == ("Could not extract finite source seismograms. "
+                              "Make sure, the parameters are valid, and the "
+                              "depth settings are correct.")
+
+    # Too many queued jobs.
+    client.application.job_manager.max_queued_jobs = 0
+    request = client.fetch(_assemble_url('jobs/finite_source', **params),
+                           method="POST", body=body)
+    assert request.code == 503
+    assert request.reason == "Too many queued jobs. Please try again later."
+
+
+def test_finite_source_raw(reciprocal_clients):
+    """
+    The finite_source_raw route returns the sum of the seismograms of the
+    posted point sources at the sampling of the database.
+    """
+    client = reciprocal_clients
+    db = instaseis.open_db(client.filepath)
+    components = "".join(db.default_components)
+
+    finite_source = _parse_finite_source(USGS_PARAM_FILE_1)
+    receiver = instaseis.Receiver(latitude=22.0, longitude=11.0,
+                                  network="XX", station="ABC")
+    params = {"receiverlongitude": 11, "receiverlatitude": 22,
+              "networkcode": "XX", "stationcode": "ABC",
+              "components": components}
+    expected = db._sum_finite_source(sources=finite_source,
+                                     receiver=receiver,
+                                     components=list(components))
+
+    # Partial sums of two halves add up to the full sum.
+    body_1 = instaseis.helpers.write_point_sources(finite_source,
+                                                   np.arange(50))
+    body_2 = instaseis.helpers.write_point_sources(finite_source,
+                                                   np.arange(50, 121))
+    for format in ("raw32", "raw32z"):
+        streams = []
+        for body in (body_1, body_2):
+            request = client.fetch(
+                _assemble_url("finite_source_raw", format=format, **params),
+                method="POST", body=body)
+            assert request.code == 200
+            streams.append(instaseis.helpers.read_raw32(request.body))
+        for comp in components:
+            tr_1 = streams[0].select(component=comp)[0]
+            tr_2 = streams[1].select(component=comp)[0]
+            assert tr_1.stats.network == "XX"
+            assert tr_1.stats.station == "ABC"
+            assert tr_1.stats.delta == db.info.dt
+            np.testing.assert_allclose(
+                tr_1.data + tr_2.data, expected[comp], rtol=1E-5,
+                atol=1E-6 * np.abs(expected[comp]).max())
+
+    # Invalid body.
+    request = client.fetch(_assemble_url("finite_source_raw", **params),
+                           method="POST", body=b"random")
+    assert request.code == 400
+    assert request.reason == ("Could not parse the point sources in the body "
+                              "of the request.")
+
+    # No point sources.
+    request = client.fetch(
+        _assemble_url("finite_source_raw", **params), method="POST",
+        body=instaseis.helpers.write_point_sources(finite_source,
+                                                   np.arange(0)))
+    assert request.code == 400
+    assert request.reason == "The request contains no point sources."
+
+    # Too many point sources.
+    client.application.max_size_of_finite_sources = 17
+    request = client.fetch(_assemble_url("finite_source_raw", **params),
+                           method="POST", body=body_1)
+    assert request.code == 400
+    assert request.reason == ("The server only allows finite sources with at "
+                              "most 17 points sources. The source in question "
+                              "has 50 points.")
+    client.application.max_size_of_finite_sources = 1000
+
+    # Point sources that are too deep for the database.
+    deep_source = copy.deepcopy(finite_source)
+    deep_source.depths_in_m[:] = 1E7
+    request = client.fetch(
+        _assemble_url("finite_source_raw", **params), method="POST",
+        body=instaseis.helpers.write_point_sources(deep_source))
+    assert request.code == 400
+    assert request.reason.startswith("Could not extract finite source")
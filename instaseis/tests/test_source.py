@@ -22,7 +22,8 @@ from instaseis import (Source, FiniteSource, Receiver, SourceParseError,
 from instaseis.helpers import elliptic_to_geocentric_latitude
 from instaseis.source import moment2magnitude, magnitude2moment
 from instaseis.source import (fault_vectors_lmn, strike_dip_rake_from_ln,
-                              USGSParamFileParsingException)
+                              tensor_from_strike_dip_rake, asymmetric_cosine,
+                              USGSParamFileParsingException, _read_values)
 
 DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
 EVENT_FILE = os.path.join(DATA, "GCMT_event_STRAIT_OF_GIBRALTAR.xml")
@@ -481,13 +482,13 @@ def test_sliprate_convenience_methods_finite_source():
     src = Source(latitude=0.0, longitude=90.0)
     fs = FiniteSource(pointsources=[src])
     fs.set_sliprate_dirac(2.0, 5)
-    np.testing.assert_allclose(np.array([0.5, 0, 0, 0, 0]), src.sliprate)
+    np.testing.assert_allclose(np.array([0.5, 0, 0, 0, 0]), fs[0].sliprate)
 
     src = Source(latitude=0.0, longitude=90.0)
     fs = FiniteSource(pointsources=[src])
     fs.set_sliprate_lp(2.0, 5, 0.1)
     np.testing.assert_allclose(np.array(
-        [0.023291, 0.111382, 0.211022, 0.186723, 0.045481]), src.sliprate,
+        [0.023291, 0.111382, 0.211022, 0.186723, 0.045481]), fs[0].sliprate,
         rtol=1E-3)
 
     src = Source(latitude=0.0, longitude=90.0)
@@ -495,7 +496,7 @@ def test_sliprate_convenience_methods_finite_source():
     src.dt = 0.25
     fs = FiniteSource(pointsources=[src])
     fs.normalize_sliprate()
-    np.testing.assert_allclose(np.ones(5), src.sliprate)
+    np.testing.assert_allclose(np.ones(5), fs[0].sliprate)
 
 
 def test_str_method_of_src():
@@ -601,3 +602,169 @@ def test_print_regressions():
         "\tMrt              :   2.96e+20 Nm\n"
         "\tMrp              :   4.74e+20 Nm\n"
         "\tMtp              :  -3.73e+20 Nm\n")
+
+
+def test_columns_and_views_of_finite_source():
+    """
+    The point sources of a finite source are views on its columns.
+    """
+    src = Source(latitude=10.0, longitude=20.0, depth_in_m=1000.0, m_rr=1.0,
+                 m_tp=6.0, time_shift=2.0, sliprate=np.ones(3), dt=0.5)
+    fs = FiniteSource(pointsources=[src, Source(latitude=0.0, longitude=0.0)])
+
+    np.testing.assert_equal(fs.latitudes, [10.0, 0.0])
+    np.testing.assert_equal(fs.longitudes, [20.0, 0.0])
+    np.testing.assert_equal(fs.depths_in_m, [1000.0, np.nan])
+    np.testing.assert_equal(fs.tensors, [[1.0, 0, 0, 0, 0, 6.0], [0] * 6])
+    np.testing.assert_equal(fs.tensors_voigt[0], src.tensor_voigt)
+    np.testing.assert_equal(fs.sliprates, [[1.0, 1.0, 1.0], [0, 0, 0]])
+    np.testing.assert_equal(fs.sliprate_npts, [3, 0])
+
+    # Views behave like sources.
+    assert isinstance(fs[0], Source)
+    assert fs[0].depth_in_m == 1000.0
+    assert fs[1].depth_in_m is None
+    assert fs[1].time_shift is None
+    assert fs[1].sliprate is None
+    assert fs[0].M0 == src.M0
+    assert str(fs[0]) == str(src)
+    assert fs[0] is fs.pointsources[0]
+    assert [_i.latitude for _i in fs] == [10.0, 0.0]
+
+    # Views compare equal to equal sources and views.
+    assert fs[0] == src
+    assert src == fs[0]
+    assert not fs[0] != src
+    assert fs[1] == Source(latitude=0.0, longitude=0.0)
+    assert fs[0] != fs[1]
+    assert fs[0] != Receiver(latitude=10.0, longitude=20.0)
+    assert FiniteSource(pointsources=[src])[0] == fs[0]
+
+    # Changes in either direction are visible in the other.
+    fs[1].latitude = 5.0
+    fs[1].m_rp = 3.0
+    fs[1].sliprate = np.arange(5.0)
+    fs.time_shifts[1] = 4.0
+    assert fs.latitudes[1] == 5.0
+    assert fs.tensors[1, 4] == 3.0
+    assert fs[1].time_shift == 4.0
+    np.testing.assert_equal(fs.sliprates, [[1, 1, 1, 0, 0], [0, 1, 2, 3, 4]])
+    np.testing.assert_equal(fs[0].sliprate, np.ones(3))
+    fs[0].normalize_sliprate()
+    np.testing.assert_allclose(fs.sliprates[0], [1.0, 1.0, 1.0, 0, 0])
+
+    # The original point sources are copied.
+    assert src.latitude == 10.0
+
+    fs.pad_sliprate(1, 2)
+    np.testing.assert_equal(fs.sliprate_npts, [6, 8])
+    np.testing.assert_allclose(fs[0].sliprate, [0, 1, 1, 1, 0, 0])
+
+
+def test_vectorized_sliprate_processing_finite_source():
+    """
+    Processing the sliprates of all point sources at once gives the same
+    results as processing each point source on its own.
+    """
+    rng = np.random.RandomState(12345)
+    sources = [Source(latitude=0.0, longitude=_i, time_shift=float(_i),
+                      sliprate=rng.rand(50 + 10 * (_i % 2)),
+                      dt=0.1 * (1 + _i % 3))
+               for _i in range(6)]
+    fs = FiniteSource(pointsources=sources)
+
+    fs.lp_sliprate(freq=1.0, zerophase=True)
+    for src in sources:
+        src.lp_sliprate(freq=1.0, zerophase=True)
+    for src, view in zip(sources, fs):
+        np.testing.assert_allclose(view.sliprate, src.sliprate)
+
+    fs.resample_sliprate(dt=0.15, nsamp=70)
+    fs.normalize_sliprate()
+    for src in sources:
+        src.resample_sliprate(dt=0.15, nsamp=70)
+        src.normalize_sliprate()
+    assert fs.sliprates.shape == (6, 70)
+    for src, view in zip(sources, fs):
+        np.testing.assert_allclose(view.sliprate, src.sliprate, rtol=1E-12)
+        assert view.dt == 0.15
+
+
+def test_finite_source_from_arrays():
+    """
+    Tests initializing finite sources from columns.
+    """
+    fs = FiniteSource.from_srf_file(SRF_FILE, True)
+    fs_2 = FiniteSource.from_arrays(
+        latitudes=fs.latitudes, longitudes=fs.longitudes,
+        depths_in_m=fs.depths_in_m, tensors=fs.tensors,
+        time_shifts=fs.time_shifts, sliprates=fs.sliprates, dt=fs.dts[0])
+    assert str(fs_2) == str(fs)
+    fs.compute_centroid()
+    fs_2.compute_centroid()
+    np.testing.assert_allclose(fs_2.CMT.tensor, fs.CMT.tensor)
+
+    with pytest.raises(ValueError) as err:
+        FiniteSource.from_arrays(
+            latitudes=[0.0], longitudes=[0.0], depths_in_m=[0.0],
+            tensors=np.zeros((1, 6)), sliprates=np.zeros((2, 4)))
+    assert err.value.args[0] == "Need one sliprate per point source."
+
+
+def test_vectorized_source_parameters():
+    """
+    Tensors, source time functions, and geocentric latitudes for many point
+    sources at once.
+    """
+    rng = np.random.RandomState(12345)
+    strike, dip, rake = rng.uniform(0.0, 90.0, (3, 10))
+    M0 = rng.uniform(1E15, 1E20, 10)
+    tensors = tensor_from_strike_dip_rake(strike, dip, rake, M0)
+    assert tensors.shape == (10, 6)
+    for _i in range(10):
+        src = Source.from_strike_dip_rake(
+            latitude=0.0, longitude=0.0, depth_in_m=0.0, strike=strike[_i],
+            dip=dip[_i], rake=rake[_i], M0=M0[_i])
+        np.testing.assert_equal(tensors[_i], src.tensor)
+
+    trise, tfall = rng.uniform(0.5, 5.0, (2, 10))
+    stfs = asymmetric_cosine(trise, tfall, npts=100, dt=0.1)
+    assert stfs.shape == (10, 100)
+    for _i in range(10):
+        np.testing.assert_equal(
+            stfs[_i], asymmetric_cosine(trise[_i], tfall[_i], 100, 0.1))
+
+    latitudes = np.array([-90.0, -45.0, 0.0, 12.3, 90.0])
+    np.testing.assert_allclose(
+        elliptic_to_geocentric_latitude(latitudes),
+        [elliptic_to_geocentric_latitude(_i) for _i in latitudes],
+        rtol=1E-14)
+
+
+def test_read_values_in_chunks():
+    data = b"1.0  -2.5\n 3e2\t4 \n\n 5.125"
+    for chunk_size in [1, 2, 3, 7, 100]:
+        np.testing.assert_equal(_read_values(io.BytesIO(data), chunk_size),
+                                [1.0, -2.5, 300.0, 4.0, 5.125])
+    assert len(_read_values(io.BytesIO(b""))) == 0
+
+    with pytest.raises(ValueError):
+        _read_values(io.BytesIO(b"1.0 2.0 a 3.0"))
+
+
+def test_parse_srf_file_from_open_file():
+    finitesource = FiniteSource.from_srf_file(SRF_FILE, True)
+    with io.open(SRF_FILE, "rb") as fh:
+        finitesource_2 = FiniteSource.from_srf_file(fh, True)
+    assert str(finitesource_2) == str(finitesource)
+    np.testing.assert_equal(finitesource_2.sliprates, finitesource.sliprates)
+
+
+def test_parse_invalid_usgs_param_file_lines():
+    with io.open(USGS_PARAM_FILE1, "rb") as fh:
+        data = fh.read().splitlines(True)
+    # Remove the last value of a point source.
+    data[10] = data[10].rsplit(None, 1)[0] + b"\n"
+    with pytest.raises(USGSParamFileParsingException) as e:
+        FiniteSource.from_usgs_param_file(io.BytesIO(b"".join(data)))
+    assert e.value.args[0] == "Point source lines must have 11 values."
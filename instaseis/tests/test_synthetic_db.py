@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the synthetic database generator.
+
+:copyright:
+    Lion Krischer (krischer@geophysik.uni-muenchen.de), 2016
+:license:
+    GNU Lesser General Public License, Version 3 [non-commercial/academic use]
+    (http://www.gnu.org/copyleft/lgpl.html)
+"""
+from __future__ import absolute_import
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import instaseis
+from instaseis.database_interfaces import find_and_open_files
+
+
+make_synthetic_db = pytest.importorskip(
+    "instaseis.scripts.make_synthetic_db")
+
+SOURCE = instaseis.Source(latitude=10.0, longitude=20.0, depth_in_m=10000,
+                          m_rr=1E20, m_tt=2E20, m_pp=-3E20, m_rt=1E19,
+                          m_rp=-1E19, m_tp=2E19)
+RECEIVER = instaseis.Receiver(latitude=40.0, longitude=60.0)
+
+
+def _create(tmpdir, name, **kwargs):
+    """
+    Create the database in a separate process. Depending on how the
+    libraries have been built, netCDF4 might not be able to write files once
+    h5py has been imported.
+    """
+    path = os.path.join(tmpdir.strpath, name)
+    kwargs.update(dict(output_folder=path, elements=100, npts=80, dt=10.0,
+                       quiet=True))
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(instaseis.__file__))] +
+        [_i for _i in [env.get("PYTHONPATH")] if _i])
+    subprocess.check_call([
+        sys.executable, "-c",
+        "from instaseis.scripts.make_synthetic_db import make_synthetic_db; "
+        "make_synthetic_db(**%r)" % kwargs], env=env)
+    return find_and_open_files(path)
+
+
+def test_mesh():
+    """
+    Shared points are only stored once and the elements are consistent.
+    """
+    mesh = make_synthetic_db.create_mesh(elements=100, planet_radius=6371E3,
+                                         min_radius=5671E3)
+    sem = mesh["sem_mesh"]
+    nelem = len(sem)
+    assert 80 <= nelem <= 120
+    # 16 unique points per element plus the boundaries.
+    assert 16 * nelem < len(mesh["mesh_S"]) < 25 * nelem
+    np.testing.assert_equal(mesh["fem_mesh"][:, 0], sem[:, 0, 0])
+    np.testing.assert_equal(mesh["midpoint_mesh"], sem[:, 2, 2])
+    r = np.sqrt(mesh["mesh_S"] ** 2 + mesh["mesh_Z"] ** 2)
+    assert r.min() == pytest.approx(5671E3)
+    assert r.max() == pytest.approx(6371E3)
+    assert mesh["mesh_S"].min() == 0.0
+    # Two axis elements per layer.
+    n_layers = len(np.unique(np.round(
+        np.hypot(mesh["mp_mesh_S"], mesh["mp_mesh_Z"]))))
+    assert mesh["axis"].sum() == 2 * n_layers
+
+
+def test_reciprocal_databases(tmpdir):
+    db = _create(tmpdir, "displ")
+    assert db.info.is_reciprocal
+    assert db.info.dump_type == "displ_only"
+    assert db.info.npts == 80
+    st = db.get_seismograms(source=SOURCE, receiver=RECEIVER)
+    assert len(st) == 3
+    for tr in st:
+        assert np.isfinite(tr.data).all()
+        assert np.abs(tr.data).max() > 0
+
+    # Merged and transposed databases have the same data.
+    for name, kwargs in [("merged", {"merged": True,
+                                     "compression_level": 2}),
+                         ("transposed", {"transposed": True})]:
+        other = _create(tmpdir, name, **kwargs)
+        st_other = other.get_seismograms(source=SOURCE, receiver=RECEIVER)
+        for tr, tr_other in zip(st, st_other):
+            np.testing.assert_allclose(tr.data, tr_other.data, rtol=1E-6)
+    assert other.__class__.__name__ == "ReciprocalInstaseisDB"
+    assert db.__class__.__name__ == "ReciprocalInstaseisDB"
+
+    db = _create(tmpdir, "strain", dump_type="strain_only",
+                 components="vertical")
+    assert db.info.dump_type == "strain_only"
+    assert db.info.components == "vertical only"
+    tr = db.get_seismograms(source=SOURCE, receiver=RECEIVER,
+                            components="Z")[0]
+    assert np.isfinite(tr.data).all()
+    assert np.abs(tr.data).max() > 0
+
+
+def test_forward_database(tmpdir):
+    db = _create(tmpdir, "fwd", forward=True, source_depth_in_km=20.0)
+    assert not db.info.is_reciprocal
+    assert db.info.source_depth == pytest.approx(20.0)
+    source = instaseis.Source(latitude=10.0, longitude=20.0,
+                              depth_in_m=20000, m_rr=1E20)
+    st = db.get_seismograms(source=source, receiver=RECEIVER)
+    assert all(np.abs(tr.data).max() > 0 for tr in st)
+
+    merged = _create(tmpdir, "fwd_merged", forward=True, merged=True,
+                     source_depth_in_km=20.0)
+    assert merged.__class__.__name__ == "ForwardMergedInstaseisDB"
+    st_merged = merged.get_seismograms(source=source, receiver=RECEIVER)
+    for tr, tr_merged in zip(st, st_merged):
+        np.testing.assert_allclose(tr.data, tr_merged.data, rtol=1E-6)
+
+
+def test_invalid_arguments(tmpdir):
+    path = os.path.join(tmpdir.strpath, "db")
+    with pytest.raises(ValueError):
+        make_synthetic_db.make_synthetic_db(path, forward=True,
+                                            dump_type="strain_only")
+    with pytest.raises(ValueError):
+        make_synthetic_db.make_synthetic_db(path, components="x")
+    with pytest.raises(ValueError):
+        make_synthetic_db.make_synthetic_db(tmpdir.strpath)
+
+
+def test_number_of_elements():
+    # 2 + 3 variables.
+    n = make_synthetic_db.get_number_of_elements(size_in_gb=1.0, npts=1000)
+    assert n == int(1024 ** 3 / (16 * 5 * 1000 * 4))
+    # 2 + 2 + 3 + 3 variables.
+    assert make_synthetic_db.get_number_of_elements(
+        size_in_gb=1.0, npts=1000, forward=True) == \
+        int(1024 ** 3 / (16 * 10 * 1000 * 4))
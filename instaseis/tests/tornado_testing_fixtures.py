@@ -26,6 +26,7 @@ from obspy import geodetics
 
 import instaseis
 from instaseis.server.app import get_application
+from instaseis.server.jobs import JobManager
 from instaseis.database_interfaces import find_and_open_files
 
 
@@ -243,10 +244,14 @@ def create_async_client(path, station_coordinates_callback=None,
                         travel_time_callback=None):
     application = get_application()
     application.db = find_and_open_files(path=path)
+    application.db.add_stage_observer(application.metrics.observe_stage)
     application.station_coordinates_callback = station_coordinates_callback
     application.event_info_callback = event_info_callback
     application.travel_time_callback = travel_time_callback
     application.max_size_of_finite_sources = 1000
+    application.max_size_of_bulk_requests = 10000
+    application.job_manager = JobManager()
+    application.admission_controller = None
     # Build server as in testing:311
     sock, port = bind_unused_port()
     server = HTTPServer(application, io_loop=IOLoop.instance())
@@ -367,7 +372,10 @@ def all_clients_all_callbacks(request):
 
 def _add_callback(client):
     def request_callback(request):
-        req = client.fetch(request.path_url)
+        # Forward the validators of conditional requests.
+        headers = {_k: _v for _k, _v in request.headers.items()
+                   if _k == "If-None-Match"}
+        req = client.fetch(request.path_url, headers=headers)
         return (req.code, req.headers, req.body)
 
     pattern = re.compile(r"http://localhost.*")